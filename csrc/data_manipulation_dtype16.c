@@ -1,56 +1,38 @@
 #include <Python.h>
 #include <stdint.h>
+#include <string.h>
 #include <time.h>
+#include "data_manipulation_dtype16.h"
+#include "zipnn_simd.h"
 
 ///////////////////////////////////
 /// Split Helper Functions ///////
 //////////////////////////////////
 
-// Reordering function for float bits
-static uint32_t reorder_float_bits_dtype16(float number) {
-  union {
-    float f;
-    uint32_t u;
-  } value = {.f = number};
-
-  uint32_t sign = (value.u >> 8) & 0x800080;
-  uint32_t exponent = (value.u << 1) & 0xFF00FF00;
-  uint32_t mantissa = (value.u) & 0x7F007F;
-  return exponent | sign | mantissa;
-}
-
-// Helper function to reorder all floats in a bytearray
-static void reorder_all_floats_dtype16(uint8_t *src, size_t len) {
-  uint32_t *uint_array = (uint32_t *)src;
-  size_t num_floats = len / sizeof(uint32_t);
-  for (size_t i = 0; i < num_floats; i++) {
-    uint_array[i] = reorder_float_bits_dtype16(*(float *)&uint_array[i]);
-  }
+// The bits are reordered in pairs of floats, a trailing odd float is left as
+// it is
+static size_t reordered_floats_dtype16(size_t len) {
+  return (len / sizeof(uint32_t)) * 2;
 }
 
 //
 
+// The split functions write into chunk_buffs, scratch buffers owned by the
+// calling worker and reused for every chunk it processes. Each of them holds
+// at least ceil(len / number of groups) bytes. A group that is not used gets
+// a length of 0. The source is left as it is, the bits are reordered in a
+// copy of every tile.
+
 int split_bytearray_dtype8(uint8_t *src, size_t len, uint8_t **chunk_buff,
                             size_t *unCompChunksSizeCurChunk, int bytes_mode) {
-    // FP8 handling: there is an extra copy; can be simplified.
-    chunk_buff[0] = malloc(len);
-    if (*chunk_buff == NULL) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to allocate memory for buffer");
-        return -1;
-    }
-
-    uint8_t *dst = *chunk_buff;
     unCompChunksSizeCurChunk[0] = len;
 
     switch (bytes_mode) {
-    case 10: // Extra Copy (no modification)
-        for (size_t i = 0; i < len; i++) {
-            dst[i] = src[i];
-        }
+    case 10: // No modification, compress the source in place
+        chunk_buff[0] = src;
         break;
 
     default:
-        free(chunk_buff[0]);
         return -1; // Unsupported mode
     }
 
@@ -60,80 +42,67 @@ int split_bytearray_dtype8(uint8_t *src, size_t len, uint8_t **chunk_buff,
 
 //
 
+// Split one tile, only the last tile of a chunk can have an odd length
+static void split_tile_dtype16(const uint8_t *tile, size_t n, uint8_t *dst0,
+                               uint8_t *dst1, int bytes_mode) {
+  size_t half_n = n / 2;
+  switch (bytes_mode) {
+  case 10:
+    zipnn_simd()->split16(tile, half_n, dst0, dst1);
+    if (n % 2 > 0) {
+      dst0[half_n] = tile[n - 1];
+    }
+    break;
+  case 8:
+    for (size_t i = 0; i < half_n; i++) {
+      dst0[i] = tile[2 * i + 1];
+    }
+    break;
+  default: // 1
+    for (size_t i = 0; i < half_n; i++) {
+      dst0[i] = tile[2 * i];
+    }
+    break;
+  }
+}
+
 // Helper function to split a bytearray into groups
 int split_bytearray_dtype16(uint8_t *src, size_t len, uint8_t **chunk_buffs,
                             size_t *unCompChunksSizeCurChunk, int bits_mode,
                             int bytes_mode, int is_review) {
-  if (bits_mode == 1) { // reoreder exponent
-    reorder_all_floats_dtype16(src, len);
-  }
   size_t half_len = len / 2;
-  size_t lens[] = {half_len, half_len};
-  int remainder = len % 2;
-  if (remainder > 0) {
-    lens[0] += 1;
-  }
 
   switch (bytes_mode) {
   case 10: // 2b01_010 - Byte Group to two different groups
-    chunk_buffs[0] = malloc(lens[0]);
-    chunk_buffs[1] = malloc(lens[1]);
-    unCompChunksSizeCurChunk[0] = lens[0];
-    unCompChunksSizeCurChunk[1] = lens[1];
-
-    if (chunk_buffs[0] == NULL || chunk_buffs[1] == NULL) {
-      free(chunk_buffs[0]);
-     PyErr_SetString(PyExc_MemoryError,
-                    "Failed to allocate memory, allocate 2 buffers");
-     free(chunk_buffs[1]);
-      return -1;
-    }
-
-    uint8_t *dst0 = chunk_buffs[0];
-    uint8_t *dst1 = chunk_buffs[1];
-
-    for (size_t i = 0; i < len; i += 2) {
-      *dst0++ = src[i];
-      *dst1++ = src[i + 1];
-    }
-    if (remainder > 0) {
-      *dst0 = src[len - 1];
-    }
+    unCompChunksSizeCurChunk[0] = len - half_len;
+    unCompChunksSizeCurChunk[1] = half_len;
     break;
 
   case 8: // 4b1000 - Truncate MSByte
           // We are refering to the MSBbyte as little endian, thus we omit buf2
   case 1: // 4b1000 - Truncate LSByte
     // We are refering to the LSByte  as a little endian, thus we omit buf1
-    chunk_buffs[0] = malloc(half_len);
-    chunk_buffs[1] = NULL;
     unCompChunksSizeCurChunk[0] = half_len;
     unCompChunksSizeCurChunk[1] = 0;
-
-    if (chunk_buffs[0] == NULL) {
-       PyErr_SetString(PyExc_MemoryError,
-            "Failed to allocate memory, allocate 1 buffer");
-       free(chunk_buffs[0]);
-      return -1;
-    }
-
-    dst0 = chunk_buffs[0];
-
-    if (bytes_mode == 1) {
-      for (size_t i = 0; i < len; i += 2) {
-        *dst0++ = src[i];
-      }
-    } else {
-      for (size_t i = 0; i < len; i += 2) {
-        *dst0++ = src[i + 1];
-      }
-    }
     break;
 
   default:
     // we are not support this splitting bytes_mode
     return -1;
   }
+
+  uint8_t reordered[ZIPNN_TILE_SIZE];
+  for (size_t off = 0; off < len; off += ZIPNN_TILE_SIZE) {
+    size_t n = len - off < ZIPNN_TILE_SIZE ? len - off : ZIPNN_TILE_SIZE;
+    const uint8_t *tile = src + off;
+    if (bits_mode == 1) { // reoreder exponent
+      memcpy(reordered, tile, n);
+      zipnn_simd()->reorder16(reordered, reordered_floats_dtype16(n));
+      tile = reordered;
+    }
+    split_tile_dtype16(tile, n, chunk_buffs[0] + off / 2,
+                       chunk_buffs[1] + off / 2, bytes_mode);
+  }
   return 0;
 }
 
@@ -141,76 +110,64 @@ int split_bytearray_dtype16(uint8_t *src, size_t len, uint8_t **chunk_buffs,
 /////////  Combine Functions //////
 ///////////////////////////////////
 
-// Reordering function for float bits
-static uint32_t revert_float_bits_dtype16(float number) {
-  union {
-    float f;
-    uint32_t u;
-  } value = {.f = number};
-
-  uint32_t sign = (value.u << 8) & 0x80008000;
-  uint32_t exponent = (value.u >> 1) & 0x7F807F80;
-  uint32_t mantissa = (value.u) & 0x7F007F;
-  return sign | exponent | mantissa;
-}
-
-// Helper function to reorder all floats in a bytearray
-static void revert_all_floats_dtype16(uint8_t *src, size_t len) {
-  uint32_t *uint_array = (uint32_t *)src;
-  size_t num_floats = len / sizeof(uint32_t);
-  for (size_t i = 0; i < num_floats; i++) {
-    uint_array[i] = revert_float_bits_dtype16(*(float *)&uint_array[i]);
+// Combine one tile and revert its bits while it is in L1
+static void combine_tile_dtype16(const uint8_t *buf1, const uint8_t *buf2,
+                                 uint8_t *dst, size_t n, int bits_mode,
+                                 int bytes_mode) {
+  size_t half_n = n / 2;
+  switch (bytes_mode) {
+  case 10:
+    zipnn_simd()->combine16(buf1, buf2, half_n, dst);
+    if (n % 2 > 0) {
+      dst[n - 1] = buf1[half_n];
+    }
+    break;
+  case 8:
+    for (size_t i = 0; i < half_n; i++) {
+      dst[2 * i] = 0;
+      dst[2 * i + 1] = buf1[i];
+    }
+    break;
+  default: // 1
+    for (size_t i = 0; i < half_n; i++) {
+      dst[2 * i] = buf1[i];
+      dst[2 * i + 1] = 0;
+    }
+    break;
+  }
+  if (bits_mode == 1) {
+    zipnn_simd()->revert16(dst, reordered_floats_dtype16(n));
   }
 }
 
-// Helper function to combine four chunk_buffs into a single bytearray
+// Helper function to combine two chunk_buffs into a single bytearray
 int combine_buffers_dtype16(const uint8_t *buf1, const uint8_t *buf2,
                             uint8_t *combinePtr, const size_t *bufLens,
                             int bits_mode, int bytes_mode) {
-  size_t total_len = bufLens[0] + bufLens[1];
-  size_t half_len = total_len / 2;
-
-  uint8_t *dst;
-  dst = combinePtr;
+  size_t total_len;
 
   switch (bytes_mode) {
   case 10: // 2b01_010 - Byte Group to two different groups
-    for (size_t i = 0; i < half_len; i++) {
-      *dst++ = buf1[i];
-      *dst++ = buf2[i];
-    }
-    if (bufLens[0] > bufLens[1]) { // There is a remainder
-      *dst = buf1[bufLens[0] - 1];
-    }
+    total_len = bufLens[0] + bufLens[1];
     break;
 
   case 8: // 4b1000 - Truncate MSByte
           // We are refering to the MSByte as a little endian, thus we omit buf2
   case 1: // 4b001 - Truncate LSByte
           // We are refering to the LSByte as a little endian, thus we omit buf1
-
-    if (bytes_mode == 8) {
-      for (size_t i = 0; i < bufLens[0]; i++) {
-        *dst++ = 0;
-        *dst++ = buf1[i];
-      }
-    } else {
-      for (size_t i = 0; i < bufLens[0]; i++) {
-        *dst++ = buf1[i];
-        *dst++ = 0;
-      }
-    }
+    total_len = 2 * bufLens[0];
     break;
 
   default:
-    PyErr_SetString(
-        PyExc_MemoryError,
-        "Not supporting bytes_mode for 16bits");
+    // Not supporting bytes_mode for 16bits (reported by the caller, no GIL here)
     return -1;
   }
-  //  Revert the reordering of all floats if needed
-  if (bits_mode == 1) {
-    revert_all_floats_dtype16(combinePtr, total_len);
+
+  for (size_t off = 0; off < total_len; off += ZIPNN_TILE_SIZE) {
+    size_t n = total_len - off < ZIPNN_TILE_SIZE ? total_len - off
+                                                  : ZIPNN_TILE_SIZE;
+    combine_tile_dtype16(buf1 + off / 2, buf2 + off / 2, combinePtr + off, n,
+                         bits_mode, bytes_mode);
   }
   return 0;
 }
@@ -1,6 +1,9 @@
 #include <Python.h>
 #include <stdint.h>
+#include <string.h>
 #include <time.h>
+#include "data_manipulation_dtype32.h"
+#include "zipnn_simd.h"
 
 //// Helper function that count zero bytes
 static void count_zero_bytes(const uint8_t *src, size_t len, size_t *msb_zeros,
@@ -35,49 +38,12 @@ static void count_zero_bytes(const uint8_t *src, size_t len, size_t *msb_zeros,
 ///// Split Helper Functions ///////
 ////////////////////////////////////
 //
-//// Reordering function for float bits
-uint32_t reorder_float_bits_dtype32(float number) {
-  union {
-    float f;
-    uint32_t u;
-  } value = {.f = number};
-
-  uint32_t sign = (value.u >> 8) & 0x800000;
-  uint32_t exponent = (value.u << 1) & 0xFF000000;
-  uint32_t mantissa = (value.u) & 0x7FFFFF;
-  return exponent | sign | mantissa;
-}
 //
-//// Helper function to reorder all floats in a bytearray
-void reorder_all_floats_dtype32(uint8_t *src, size_t len) {
-  uint32_t *uint_array = (uint32_t *)src;
-  size_t num_floats = len / sizeof(uint32_t);
-  for (size_t i = 0; i < num_floats; i++) {
-    uint_array[i] = reorder_float_bits_dtype32(*(float *)&uint_array[i]);
-  }
-}
-
-//
-int allocate_4chunk_buffs(uint8_t **chunk_buffs, const size_t *bufLens) {
-  chunk_buffs[0] = (bufLens[0] > 0) ? malloc(bufLens[0]) : NULL;
-  chunk_buffs[1] = (bufLens[1] > 0) ? malloc(bufLens[1]) : NULL;
-  chunk_buffs[2] = (bufLens[2] > 0) ? malloc(bufLens[2]) : NULL;
-  chunk_buffs[3] = (bufLens[3] > 0) ? malloc(bufLens[3]) : NULL;
-
-  if ((bufLens[0] > 0 && chunk_buffs[0] == NULL) ||
-      (bufLens[1] > 0 && chunk_buffs[1] == NULL) ||
-      (bufLens[2] > 0 && chunk_buffs[2] == NULL) ||
-      (bufLens[3] > 0 && chunk_buffs[3] == NULL)) {
-    PyErr_SetString(PyExc_MemoryError,
-                    "Failed to allocate memory, allocate 4 buffs");
-    return -1;
-  }
-  return 0;
-}
-
+// Writes into the caller's scratch buffers tile by tile, see
+// split_bytearray_dtype16
 int handle_split_mode_220(const uint8_t *src, size_t total_len,
                           uint8_t **chunk_buffs, size_t *bufLens,
-                          uint32_t num_buf) {
+                          uint32_t num_buf, int bits_mode) {
   size_t q_len = total_len / num_buf;
   uint32_t remainder = total_len % num_buf;
 
@@ -89,44 +55,26 @@ int handle_split_mode_220(const uint8_t *src, size_t total_len,
     }
   }
 
-  if (allocate_4chunk_buffs(chunk_buffs, bufLens) != 0)
-    return -1;
-
-  uint8_t *dst1 = chunk_buffs[0], *dst2 = chunk_buffs[1],
-          *dst3 = chunk_buffs[2], *dst4 = chunk_buffs[3];
-
-  for (size_t i = 0; i < total_len; i += 4) {
-    *dst1++ = src[i];
-    *dst2++ = src[i + 1];
-    *dst3++ = src[i + 2];
-    *dst4++ = src[i + 3];
-  }
-
-  switch (remainder) {
-  case 3:
-    *dst3++ = src[total_len - 2];
-  case 2:
-    *dst2++ = src[total_len - 1];
-  case 1:
-    *dst1++ = src[total_len - remainder];
-    break;
-  default:
-    break;
-  }
-
-  if (remainder == 3) {
-    *dst1++ = src[total_len - remainder];
-    *dst2++ = src[total_len - remainder - 1];
-    *dst3++ = src[total_len - remainder - 2];
-  }
-
-  if (remainder == 2) {
-    *dst1++ = src[total_len - remainder];
-    *dst2++ = src[total_len - remainder - 1];
+  uint8_t reordered[ZIPNN_TILE_SIZE];
+  for (size_t off = 0; off < q_len * num_buf; off += ZIPNN_TILE_SIZE) {
+    size_t n = q_len * num_buf - off < ZIPNN_TILE_SIZE ? q_len * num_buf - off
+                                                       : ZIPNN_TILE_SIZE;
+    const uint8_t *tile = src + off;
+    if (bits_mode == 1) { // reoreder exponent
+      memcpy(reordered, tile, n);
+      zipnn_simd()->reorder32(reordered, n / num_buf);
+      tile = reordered;
+    }
+    uint8_t *dst[] = {chunk_buffs[0] + off / num_buf,
+                      chunk_buffs[1] + off / num_buf,
+                      chunk_buffs[2] + off / num_buf,
+                      chunk_buffs[3] + off / num_buf};
+    zipnn_simd()->split32(tile, n / num_buf, dst);
   }
 
-  if (remainder == 1) {
-    *dst1++ = src[total_len - remainder];
+  // The trailing bytes go to the first groups, in order
+  for (uint32_t b = 0; b < remainder; b++) {
+    chunk_buffs[b][q_len] = src[q_len * 4 + b];
   }
 
   return 0;
@@ -220,9 +168,6 @@ int split_bytearray_dtype32(uint8_t *src, size_t len, uint8_t **chunk_buffs,
                             size_t *bufLens, int bits_mode, int bytes_mode,
                             int is_review) {
   uint32_t num_buf = 4;
-  if (bits_mode == 1) { // reoreder exponent
-    reorder_all_floats_dtype32(src, len);
-  }
 
   if (is_review == 1) {
     //    clock_t start, end;
@@ -238,7 +183,9 @@ int split_bytearray_dtype32(uint8_t *src, size_t len, uint8_t **chunk_buffs,
   switch (bytes_mode) {
   case 220:
     // 8b1_10_11_100 [decimal 220] - bytegroup to four groups [1,2,3,4]
-    handle_split_mode_220(src, len, chunk_buffs, bufLens, num_buf);
+    if (handle_split_mode_220(src, len, chunk_buffs, bufLens, num_buf,
+                              bits_mode) != 0)
+      return -1;
     break;
     //
     //  case 41:
@@ -271,28 +218,6 @@ int split_bytearray_dtype32(uint8_t *src, size_t len, uint8_t **chunk_buffs,
 ///////////  Combine Functions //////
 /////////////////////////////////////
 //
-//// Reordering function for float bits
-static uint32_t revert_float_bits_dtype32(float number) {
-  union {
-    float f;
-    uint32_t u;
-  } value = {.f = number};
-
-  uint32_t sign = (value.u << 8) & 0x80000000;
-  uint32_t exponent = (value.u >> 1) & 0x7F800000;
-  uint32_t mantissa = (value.u) & 0x7FFFFF;
-  return sign | exponent | mantissa;
-}
-//
-//// Helper function to reorder all floats in a bytearray
-void revert_all_floats_dtype32(uint8_t *src, size_t len) {
-  uint32_t *uint_array = (uint32_t *)src;
-  size_t num_floats = len / sizeof(uint32_t);
-  for (size_t i = 0; i < num_floats; i++) {
-    uint_array[i] = revert_float_bits_dtype32(*(float *)&uint_array[i]);
-  }
-}
-
 // static int allocate_buffer(uint8_t **result, size_t total_len) {
 //   *result = malloc(total_len);
 //   if (*result == NULL) {
@@ -388,12 +313,12 @@ void revert_all_floats_dtype32(uint8_t *src, size_t len) {
 // }
 //
 //// Helper function to combine four chunk_buffs into a single bytearray
-uint8_t combine_buffers_dtype32(uint8_t *buf1, uint8_t *buf2, uint8_t *buf3,
-                                uint8_t *buf4, uint8_t *combinePtr,
-                                const size_t *bufLens, int bits_mode,
-                                int bytes_mode) {
+int combine_buffers_dtype32(const uint8_t *buf1, const uint8_t *buf2,
+                            const uint8_t *buf3, const uint8_t *buf4,
+                            uint8_t *combinePtr, const size_t *bufLens,
+                            int bits_mode, int bytes_mode) {
   uint32_t num_buf = 4;
-  uint8_t *bufs[] = {buf1, buf2, buf3, buf4};
+  const uint8_t *bufs[] = {buf1, buf2, buf3, buf4};
   size_t total_len = 0;
   for (uint32_t b = 0; b < num_buf; b++) {
     total_len += bufLens[b];
@@ -406,11 +331,18 @@ uint8_t combine_buffers_dtype32(uint8_t *buf1, uint8_t *buf2, uint8_t *buf3,
   switch (bytes_mode) {
   case 220:
     // 8b1_10_11_100 [decimal 220] - bytegroup to four groups [1,2,3,4]
-    for (size_t i = 0; i < q_len; i++) {
-      *dst++ = bufs[0][i];
-      *dst++ = bufs[1][i];
-      *dst++ = bufs[2][i];
-      *dst++ = bufs[3][i];
+    // Combine and revert tile by tile, while the tile is in L1
+    for (size_t off = 0; off < q_len * num_buf; off += ZIPNN_TILE_SIZE) {
+      size_t n = q_len * num_buf - off < ZIPNN_TILE_SIZE
+                     ? q_len * num_buf - off
+                     : ZIPNN_TILE_SIZE;
+      const uint8_t *src[] = {bufs[0] + off / num_buf, bufs[1] + off / num_buf,
+                              bufs[2] + off / num_buf, bufs[3] + off / num_buf};
+      zipnn_simd()->combine32(src, n / num_buf, dst);
+      if (bits_mode == 1) {
+        zipnn_simd()->revert32(dst, n / num_buf);
+      }
+      dst += n;
     }
     uint32_t remainder = total_len % num_buf;
     for (uint32_t b = 0; b < num_buf; b++) {
@@ -444,14 +376,9 @@ uint8_t combine_buffers_dtype32(uint8_t *buf1, uint8_t *buf2, uint8_t *buf3,
     //    break;
     //
   default:
-    PyErr_SetString(
-        PyExc_MemoryError,
-        "Not supporting bytes_mode for 32bits");
+    // Not supporting bytes_mode for 32bits (reported by the caller, no GIL here)
     return -1;
   }
-  if (bits_mode == 1) {
-    revert_all_floats_dtype32(combinePtr, total_len);
-  }
   return 0;
 }
 
@@ -1,25 +1,13 @@
-#define PY_SSIZE_T_CLEAN
-#include "zipnn_core_functions.h"
-#include <Python.h>
-#include <stdint.h>
-#include <time.h>
+#ifndef DATA_MANIPULATION_DTYPE32_H
+#define DATA_MANIPULATION_DTYPE32_H
 
-// Helper function that count zero bytes
-static void count_zero_bytes(const uint8_t *src, size_t len, size_t *msb_zeros,
-                             size_t *mid_high, size_t *mid_low,
-                             size_t *lsb_zeros);
+#include <stddef.h>
+#include <stdint.h>
 
 ///////////////////////////////////
-/// Split Helper Functions ///////
+/// Split Functions ///////////////
 //////////////////////////////////
 
-uint32_t reorder_float_bits_dtype32(float number);
-// void reorder_all_floats_dtype32(uint8_t *src, size_t len);static int
-// allocate_4chunk_buffs(uint8_t **buf1, uint8_t **buf2, uint8_t **buf3,
-//                              uint8_t **buf4, size_t size1, size_t
-//                              size2,
-//                            size_t size3, size_t size4);
-
 int split_bytearray_dtype32(uint8_t *src, size_t len, uint8_t **chunk_buffs,
                             size_t *bufLens, int bits_mode, int bytes_mode,
                             int is_review);
@@ -28,14 +16,12 @@ int split_bytearray_dtype32(uint8_t *src, size_t len, uint8_t **chunk_buffs,
 /////////  Combine Functions //////
 ///////////////////////////////////
 
-// Reordering function for float bits
-uint32_t revert_float_bits(float number);
-void revert_all_floats(uint8_t *src, size_t len);
-int allocate_buffer(uint8_t **result, size_t total_len);
-
-uint8_t combine_buffers_dtype32(uint8_t *buf1, uint8_t *buf2, uint8_t *buf3,
-                                uint8_t *buf4, uint8_t *combinePtr,
-                                size_t *bufLens, int bits_mode, int bytes_mode);
+int combine_buffers_dtype32(const uint8_t *buf1, const uint8_t *buf2,
+                            const uint8_t *buf3, const uint8_t *buf4,
+                            uint8_t *combinePtr, const size_t *bufLens,
+                            int bits_mode, int bytes_mode);
 
 // Helper function
 int buffer_ratio_dtype32(int bytes_mode, uint32_t *buf_ratio);
+
+#endif // DATA_MANIPULATION_DTYPE32_H
@@ -0,0 +1,83 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include "zipnn_buffer.h"
+
+/////////////////////////////////////////////////////////////////////////////////////
+////////////////////////// Owned result buffer /////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// The compressed and decompressed results are returned as memoryviews over a
+// ZipnnBuffer, so the memory is released together with the last
+// memoryview / NumPy array / torch tensor that refers to it.
+// The memory comes from PyMem_RawMalloc, it can be allocated while the GIL is
+// released and it is visible to tracemalloc.
+
+typedef struct {
+  PyObject_HEAD
+  uint8_t *buf;   // Owned memory
+  Py_ssize_t len; // Length in bytes
+} ZipnnBufferObject;
+
+uint8_t *zipnn_buffer_alloc(size_t len) {
+  // PyMem_RawMalloc(0) may return NULL, always ask for at least one byte
+  return (uint8_t *)PyMem_RawMalloc(len > 0 ? len : 1);
+}
+
+void zipnn_buffer_free(uint8_t *buf) { PyMem_RawFree(buf); }
+
+uint8_t *zipnn_buffer_shrink(uint8_t *buf, size_t len) {
+  uint8_t *shrunk = (uint8_t *)PyMem_RawRealloc(buf, len > 0 ? len : 1);
+  return shrunk != NULL ? shrunk : buf;
+}
+
+static void zipnn_buffer_dealloc(ZipnnBufferObject *self) {
+  zipnn_buffer_free(self->buf);
+  Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static int zipnn_buffer_getbuffer(ZipnnBufferObject *self, Py_buffer *view,
+                                  int flags) {
+  return PyBuffer_FillInfo(view, (PyObject *)self, self->buf, self->len, 0,
+                           flags);
+}
+
+static PyBufferProcs zipnn_buffer_as_buffer = {
+    .bf_getbuffer = (getbufferproc)zipnn_buffer_getbuffer,
+    .bf_releasebuffer = NULL,
+};
+
+static Py_ssize_t zipnn_buffer_length(ZipnnBufferObject *self) {
+  return self->len;
+}
+
+static PySequenceMethods zipnn_buffer_as_sequence = {
+    .sq_length = (lenfunc)zipnn_buffer_length,
+};
+
+PyTypeObject ZipnnBufferType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "zipnn_core.Buffer",
+    .tp_doc = "Memory owned by a zipnn_core result",
+    .tp_basicsize = sizeof(ZipnnBufferObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_dealloc = (destructor)zipnn_buffer_dealloc,
+    .tp_as_buffer = &zipnn_buffer_as_buffer,
+    .tp_as_sequence = &zipnn_buffer_as_sequence,
+};
+
+PyObject *zipnn_buffer_to_memoryview(uint8_t *buf, size_t len) {
+  ZipnnBufferObject *owner = PyObject_New(ZipnnBufferObject, &ZipnnBufferType);
+  if (owner == NULL) {
+    zipnn_buffer_free(buf);
+    return NULL;
+  }
+  owner->buf = buf;
+  owner->len = (Py_ssize_t)len;
+
+  // The memoryview keeps a reference to the owner through its export
+  PyObject *view = PyMemoryView_FromObject((PyObject *)owner);
+  Py_DECREF(owner);
+  return view;
+}
@@ -0,0 +1,22 @@
+#ifndef ZIPNN_BUFFER_H
+#define ZIPNN_BUFFER_H
+
+#include <Python.h>
+#include <stdint.h>
+
+// Python object owning a PyMem_RawMalloc'd result buffer, the memory is freed
+// when the object and every view exported from it are gone
+extern PyTypeObject ZipnnBufferType;
+
+// Allocate / free result memory, safe to call without the GIL
+uint8_t *zipnn_buffer_alloc(size_t len);
+void zipnn_buffer_free(uint8_t *buf);
+
+// Shrink buf to len bytes, returns buf unchanged if it cannot be moved
+uint8_t *zipnn_buffer_shrink(uint8_t *buf, size_t len);
+
+// Wrap buf (allocated with zipnn_buffer_alloc) in a memoryview that owns it.
+// Must be called with the GIL held. On failure buf is freed and NULL returned.
+PyObject *zipnn_buffer_to_memoryview(uint8_t *buf, size_t len);
+
+#endif // ZIPNN_BUFFER_H
@@ -2,13 +2,20 @@
 #include <Python.h>
 #include <assert.h>
 #include <pthread.h>
+#include <sched.h>
 #include <stdint.h>
 #include <sys/time.h>
 #include <time.h>
 #include "data_manipulation_dtype16.h"
 #include "data_manipulation_dtype32.h"
+#include "fse.h"
+#include "hist.h"
+#define HUF_STATIC_LINKING_ONLY
 #include "huf.h"
+#include "zstd.h"
+#include "zipnn_buffer.h"
 #include "zipnn_core_functions.h"
+#include "zipnn_thread_pool.h"
 
 /////////////////////////////////////////////////////////////////////////////////////
 /////////////////////////////////////////////////////////////////////////////////////
@@ -20,227 +27,553 @@
 
 // 1. Splits input data into chunks
 // 2. Processes each chunk in parallel using worker threads
-// 3. Applies Huffman compression when beneficial
-// 4. Manages memory and thread resources safely
+// 3. Applies Huffman compression when beneficial (or FSE / zstd, see
+//    select_chunk_codec), with one Huffman table per byte group
+// 4. Writes every compressed chunk straight into the result buffer
 // 5. Returns compressed data as a Python buffer
-// The implementation uses mutex locks for thread synchronization and includes
-// comprehensive error handling and resource cleanup
+// The result buffer is allocated once with a worst case slot for every
+// (buffer, chunk) pair, the workers encode into their slots and the slots are
+// then compacted in place, so there is no per chunk output allocation and no
+// second buffer holding a copy of the compressed data. The bits of a chunk are
+// reordered and its bytes grouped tile by tile (ZIPNN_TILE_SIZE), the input
+// itself is never modified.
 
 /////////////////////////////////////////////////////////////////////////////////////
 ////  Helper Functions //////
 /////////////////////////////////////////////////////////////////////////////////////
 
 /*
- * Structure to hold arguments for parallel compressed data copying
- * Used to pass multiple parameters to thread function efficiently
+ * Allocation statistics, every malloc/calloc/realloc made by a compression or
+ * decompression call is counted together with the bytes it processed, and the
+ * byte group bytes that were stored instead of compressed. The counters are
+ * updated without the GIL from any thread.
  */
 
-struct CompressedDataCopyArgs {
-  size_t chunk_start; // starting chunk number
-  size_t chunk_end;   // ending chunk number
-  size_t thread_id;   // thread identifier
-  size_t numBuf;      // number of buffers
-  size_t numChunks;   // total number of chunks
-  uint8_t ***compressedData;
-  uint32_t **compChunksSize;
-  uint8_t *resultBuf;
-  size_t *bufferOffsets; // starting offset for each buffer
-  size_t *threadOffsets; // array to store offsets for each thread
+static struct {
+  uint64_t compress_allocs;   // Allocation calls made by zipnn_core
+  uint64_t compress_bytes;    // Input bytes compressed by zipnn_core
+  uint64_t stored_bytes;      // Byte group bytes stored without compression
+  uint64_t skipped_bytes;     // Stored bytes that never ran the entropy coder
+  uint64_t decompress_allocs; // Allocation calls made by combine_dtype
+  uint64_t decompress_bytes;  // Output bytes produced by combine_dtype
+} alloc_stats;
+
+#define ZIPNN_STAT_ADD(counter, n)                                         \
+  __atomic_fetch_add(&alloc_stats.counter, (uint64_t)(n), __ATOMIC_RELAXED)
+
+/*
+ * Every (buffer, chunk) pair has a chunk type byte in the header, the codec is
+ * picked per chunk from a sample of its bytes (select_chunk_codec).
+ */
+
+enum {
+  ZIPNN_CHUNK_RAW = 0,     // Stored as it is
+  ZIPNN_CHUNK_HUFFMAN = 1, // HUF_compress, the default
+  ZIPNN_CHUNK_FSE = 2,     // FSE_compress, one byte value dominates
+  ZIPNN_CHUNK_ZSTD = 3,    // zstd, runs of zeros (pruned rows, padding)
+  ZIPNN_CHUNK_ZERO = 4,    // All zero, there is no payload
+  ZIPNN_CHUNK_HUFFMAN_SHARED = 5, // Huffman with the table of its byte group
 };
 
+#define ZIPNN_CODEC_SAMPLES 1024 // Bytes sampled to pick the codec of a chunk
+#define ZIPNN_ZSTD_LEVEL 1       // The zero runs compress well at any level
+
+static int is_zero_chunk(const uint8_t *src, size_t len) {
+  return len > 0 && src[0] == 0 && memcmp(src, src + 1, len - 1) == 0;
+}
+
 /*
- * Thread function that copies compressed data chunks into final buffer
- * Handles interleaved copying from multiple buffers in a thread-safe manner
+ * Delta compression XORs the data with its base chunk by chunk, right before
+ * the split and right after the combine, so the chunk is still in cache and
+ * the XORed data never exists as a whole. The word loops vectorize.
  */
 
-void *copy_compressed_data_interleaved(void *arg) {
-  struct CompressedDataCopyArgs *args = (struct CompressedDataCopyArgs *)arg;
-  size_t localOffsets[args->numBuf];
+static void xor_copy(uint8_t *dst, const uint8_t *a, const uint8_t *b,
+                     size_t len) {
+  size_t i = 0;
+  for (; i + sizeof(uint64_t) <= len; i += sizeof(uint64_t)) {
+    uint64_t x, y;
+    memcpy(&x, a + i, sizeof(uint64_t));
+    memcpy(&y, b + i, sizeof(uint64_t));
+    x ^= y;
+    memcpy(dst + i, &x, sizeof(uint64_t));
+  }
+  for (; i < len; i++)
+    dst[i] = a[i] ^ b[i];
+}
 
-  // Initialize local offsets for each buffer
-  for (size_t b = 0; b < args->numBuf; b++) {
-    localOffsets[b] = args->bufferOffsets[b];
+static void xor_into(uint8_t *dst, const uint8_t *src, size_t len) {
+  xor_copy(dst, dst, src, len);
+}
 
-    // Add offsets for chunks before the starting point
-    for (size_t c = 0; c < args->chunk_start; c++) {
-      if (args->compChunksSize[b][c] > 0) {
-        localOffsets[b] += args->compChunksSize[b][c];
-      }
-    }
+/*
+ * Picks the codec of a chunk from evenly spaced samples:
+ * - all zero: no payload
+ * - mostly zeros that come in runs: zstd, its matches beat any entropy coder
+ * - one byte value above 70%: FSE, Huffman needs at least one bit per byte
+ * - otherwise Huffman, the fastest to decode
+ * Scattered zeros are left to FSE / Huffman, zstd does worse than FSE there.
+ */
+
+static uint8_t select_chunk_codec(const uint8_t *src, size_t len) {
+  uint32_t counts[256] = {0};
+  size_t step = len / ZIPNN_CODEC_SAMPLES;
+  size_t samples = 0, zeroPairs = 0;
+  if (step < 2)
+    step = 2;
+  for (size_t i = 0; i + 1 < len; i += step) {
+    counts[src[i]]++;
+    samples++;
+    // A zero followed by a zero, how often zeros come in runs
+    if (src[i] == 0 && src[i + 1] == 0)
+      zeroPairs++;
   }
+  if (samples == 0)
+    return ZIPNN_CHUNK_HUFFMAN;
 
-  for (size_t c = args->chunk_start; c < args->chunk_end && c < args->numChunks;
-       c++) {
-    // For each chunk, process all buffers
-    for (size_t b = 0; b < args->numBuf; b++) {
-      if (args->compressedData[b][c] && args->compChunksSize[b][c] > 0) {
-        memcpy(args->resultBuf + localOffsets[b], args->compressedData[b][c],
-               args->compChunksSize[b][c]);
-        free(args->compressedData[b][c]);
-        localOffsets[b] += args->compChunksSize[b][c];
-      }
-    }
+  size_t zeros = counts[0], maxCount = 0;
+  for (int v = 0; v < 256; v++) {
+    if (counts[v] > maxCount)
+      maxCount = counts[v];
   }
+  if (zeros == samples && is_zero_chunk(src, len))
+    return ZIPNN_CHUNK_ZERO;
+  // At least half zeros, and a zero is followed by a zero more often than
+  // halfway between scattered (zeros / samples) and runs (always)
+  if (zeros * 2 >= samples &&
+      2 * zeroPairs * samples >= zeros * (samples + zeros))
+    return ZIPNN_CHUNK_ZSTD;
+  if (maxCount * 10 >= samples * 7)
+    return ZIPNN_CHUNK_FSE;
+  return ZIPNN_CHUNK_HUFFMAN;
+}
 
-  return NULL;
+/*
+ * Encodes a chunk with the given codec into dst, returns the compressed size
+ * or 0 if it did not compress. The zstd context of the task is created on its
+ * first zstd chunk.
+ */
+
+static size_t encode_chunk(uint8_t *type, uint8_t *dst, size_t dstCapacity,
+                           const uint8_t *src, size_t srcSize,
+                           ZSTD_CCtx **zstdCtx) {
+  size_t compSize = 0;
+  switch (*type) {
+  case ZIPNN_CHUNK_ZERO:
+    return 0;
+
+  case ZIPNN_CHUNK_ZSTD:
+    if (*zstdCtx == NULL) {
+      *zstdCtx = ZSTD_createCCtx();
+      if (*zstdCtx == NULL)
+        return 0;
+      ZIPNN_STAT_ADD(compress_allocs, 1);
+    }
+    compSize = ZSTD_compressCCtx(*zstdCtx, dst, dstCapacity, src, srcSize,
+                                 ZIPNN_ZSTD_LEVEL);
+    return ZSTD_isError(compSize) ? 0 : compSize;
+
+  case ZIPNN_CHUNK_FSE:
+    compSize = FSE_compress(dst, dstCapacity, src, srcSize);
+    if (FSE_isError(compSize))
+      return 0;
+    if (compSize != 1)
+      return compSize;
+    // A single repeated byte, FSE leaves it to RLE which Huffman has
+    *type = ZIPNN_CHUNK_HUFFMAN;
+    dst[0] = src[0];
+    return 1;
+
+  default:
+    *type = ZIPNN_CHUNK_HUFFMAN;
+    compSize = HUF_compress(dst, dstCapacity, src, srcSize);
+    return HUF_isError(compSize) ? 0 : compSize;
+  }
 }
 
 /*
- * Prepares and combines split compressed data into a single buffer
- * Handles parallel processing of multiple compressed buffers
- *
- * Parameters:
- * - header_len: Length of the header data
- * - numBuf: Number of compression buffers
- * - numChunks: Number of chunks per buffer
- * - header: Header data to prepend
- * - compressedData: The data of the compressed chunks
- * - compChunksSize: Size of each compressed chunk
- * - compChunksType: Compression Type for each chunk
- * - totalCompressedSize: Total size of compressed data per buffer
- * - resBufSize: Output parameter for final buffer size
- * - requested_threads: Number of threads to use for processing
+ * Shared Huffman tables: the distribution of a byte group (the exponents
+ * above all) hardly changes between the chunks of a tensor, so instead of a
+ * table in every chunk one table per group is built from a few sampled chunks
+ * and stored once, after the cumulative sizes:
+ * [uint16 length][HUF_writeCTable] for every group with a shared chunk.
+ * The neighbours of the sampled values get a code too, the rare tail values
+ * are next to them. A chunk with a value the table has no code for, or whose
+ * own table (table included) would be clearly smaller when the distribution
+ * drifts, keeps its own table as a ZIPNN_CHUNK_HUFFMAN chunk.
+ * The table can also come from a dictionary trained on other tensors, then
+ * only a reference is stored: [0xFFFF][uint32 dictionary id].
  */
 
-uint8_t *prepare_python_return_buffer(
-    size_t header_len, uint32_t numBuf, size_t numChunks, uint8_t *header,
-    uint8_t ***compressedData, uint32_t **compChunksSize,
-    uint8_t **compChunksType, const size_t *totalCompressedSize,
-    size_t *resBufSize, int requested_threads) {
-  // Calculate buffer size
-  *resBufSize = header_len;
-  size_t compChunksTypeLen = numBuf * numChunks * sizeof(uint8_t);
-  size_t cumulativeChunksSizeLen = numBuf * numChunks * sizeof(size_t);
-  *resBufSize += compChunksTypeLen + cumulativeChunksSizeLen;
+#define ZIPNN_TABLE_SAMPLE_CHUNKS 4 // Chunks sampled to build the tables
+#define ZIPNN_TABLE_DICT_REF 0xFFFF // Table length of a dictionary reference
+#define ZIPNN_DICT_CAPSULE "zipnn_core.dictionary"
+#define ZIPNN_MAX_BUF 4
 
-  for (uint32_t b = 0; b < numBuf; b++) {
-    *resBufSize += totalCompressedSize[b];
-  }
+typedef struct {
+  HUF_CElt *table;                     // NULL, the group has no shared table
+  uint32_t ctable[HUF_CTABLE_SIZE_U32(HUF_SYMBOLVALUE_MAX)];
+  uint8_t serialized[HUF_CTABLEBOUND]; // The table as stored in the stream
+  uint16_t serializedLen;
+  unsigned maxSymbolValue;             // Largest value of the table
+  uint32_t dictId;                     // 0, the table is in the stream
+} SharedTable;
 
-  // Allocate result buffer
-  memcpy(&header[24], resBufSize, sizeof(size_t));
-  uint8_t *resultBuf = (uint8_t *)malloc(*resBufSize);
-  if (!resultBuf) {
-    PyErr_SetString(
-        PyExc_MemoryError,
-        "Failed to allocate memory for result buffer in split function");
-    return NULL;
+/*
+ * A dictionary of the tables of every byte group of one dtype (a capsule from
+ * load_dictionary), with their decoding tables built once
+ */
+
+typedef struct {
+  uint32_t id;
+  uint32_t numBuf;
+  SharedTable tables[ZIPNN_MAX_BUF];
+  HUF_DTable *dtableX1[ZIPNN_MAX_BUF]; // Single symbol decoding tables
+  HUF_DTable *dtableX2[ZIPNN_MAX_BUF]; // Double symbols decoding tables
+} ZipnnDictionary;
+
+// dictionary is None or a capsule of numBuf groups, returns -1 with an error
+static int get_dictionary(PyObject *obj, uint32_t numBuf,
+                          ZipnnDictionary **dict) {
+  *dict = NULL;
+  if (obj == NULL || obj == Py_None)
+    return 0;
+  *dict = PyCapsule_GetPointer(obj, ZIPNN_DICT_CAPSULE);
+  if (*dict == NULL)
+    return -1;
+  if ((*dict)->numBuf != numBuf) {
+    PyErr_SetString(PyExc_ValueError,
+                    "The dictionary is for another number of byte groups");
+    return -1;
   }
+  return 0;
+}
 
-  // Copy header and chunk types
-  size_t offset = 0;
-  memcpy(resultBuf, header, header_len);
-  offset += header_len;
+// Splits one chunk into its byte groups, buffers[b] gets unCompChunksSize[b]
+// bytes (a single group points into src)
+static int split_chunk(uint8_t *src, size_t len, uint32_t numBuf,
+                       int bits_mode, int bytes_mode, int is_redata,
+                       uint8_t **buffers, size_t *unCompChunksSize) {
+  if (numBuf == 1)
+    return split_bytearray_dtype8(src, len, buffers, unCompChunksSize,
+                                  bytes_mode);
+  if (numBuf == 2)
+    return split_bytearray_dtype16(src, len, buffers, unCompChunksSize,
+                                   bits_mode, bytes_mode, is_redata);
+  return split_bytearray_dtype32(src, len, buffers, unCompChunksSize,
+                                 bits_mode, bytes_mode, is_redata);
+}
 
-  // Copy chunk types
+/*
+ * Builds the shared table of every byte group from the histogram of up to
+ * maxSamples evenly spaced chunks, plus one for every neighbour of a sampled
+ * value. Groups with a single sampled value are left without one (RLE and all
+ * zero chunks are smaller). With a delta base (or NULL) the samples are the
+ * XOR of the chunks with it. Returns 0 on success.
+ */
+
+static int build_shared_tables(uint8_t *src, const uint8_t *base, size_t len,
+                               size_t origChunkSize, size_t numChunks,
+                               size_t maxSamples, uint32_t numBuf,
+                               int bits_mode, int bytes_mode, int is_redata,
+                               SharedTable *tables) {
+  size_t groupSize = (origChunkSize + numBuf - 1) / numBuf;
+  size_t samples = numChunks < maxSamples ? numChunks : maxSamples;
+  unsigned counts[numBuf][HUF_SYMBOLVALUE_MAX + 1];
+  unsigned chunkCounts[HUF_SYMBOLVALUE_MAX + 1];
+  uint8_t *scratch[numBuf];
+  uint8_t *delta = NULL;
+  int status = 0;
+
+  memset(counts, 0, sizeof(counts));
   for (uint32_t b = 0; b < numBuf; b++) {
-    if (compChunksType[b]) {
-      memcpy(resultBuf + offset + b * numChunks, compChunksType[b],
-             numChunks * sizeof(uint8_t));
+    tables[b].table = NULL;
+    tables[b].dictId = 0;
+    scratch[b] = NULL;
+  }
+  if (numBuf > 1) {
+    for (uint32_t b = 0; b < numBuf; b++) {
+      scratch[b] = malloc(groupSize);
+      if (!scratch[b]) {
+        status = -1;
+        goto tables_done;
+      }
+    }
+    ZIPNN_STAT_ADD(compress_allocs, numBuf);
+  }
+  if (base != NULL) {
+    delta = malloc(origChunkSize);
+    if (!delta) {
+      status = -1;
+      goto tables_done;
     }
+    ZIPNN_STAT_ADD(compress_allocs, 1);
   }
-  offset += compChunksTypeLen;
 
-  // Calculate cumulative sizes
-  size_t *sizePtr = (size_t *)(resultBuf + offset);
-  for (uint32_t b = 0; b < numBuf; b++) {
-    size_t cumulative = 0;
-    for (size_t c = 0; c < numChunks; c++) {
-      cumulative += compChunksSize[b][c];
-      sizePtr[b * numChunks + c] = cumulative;
+  for (size_t i = 0; i < samples; i++) {
+    size_t c = i * numChunks / samples;
+    size_t offset = c * origChunkSize;
+    size_t chunkSize =
+        c == numChunks - 1 ? len - offset : origChunkSize;
+    uint8_t *buffers[numBuf];
+    size_t unCompChunksSize[numBuf];
+    for (uint32_t b = 0; b < numBuf; b++) {
+      buffers[b] = scratch[b];
+      unCompChunksSize[b] = 0;
+    }
+    uint8_t *chunk = src + offset;
+    if (delta != NULL) {
+      xor_copy(delta, chunk, base + offset, chunkSize);
+      chunk = delta;
+    }
+    if (split_chunk(chunk, chunkSize, numBuf, bits_mode, bytes_mode,
+                    is_redata, buffers, unCompChunksSize) != 0) {
+      status = -1;
+      goto tables_done;
+    }
+    for (uint32_t b = 0; b < numBuf; b++) {
+      unsigned maxSymbolValue = HUF_SYMBOLVALUE_MAX;
+      if (unCompChunksSize[b] == 0)
+        continue;
+      HIST_count_simple(chunkCounts, &maxSymbolValue, buffers[b],
+                        unCompChunksSize[b]);
+      for (unsigned v = 0; v <= maxSymbolValue; v++)
+        counts[b][v] += chunkCounts[v];
     }
   }
-  offset += cumulativeChunksSizeLen;
 
-  // Calculate number of threads and chunks per thread
-  size_t num_threads = requested_threads;
-  size_t chunks_per_thread = numChunks / num_threads;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    SharedTable *shared = &tables[b];
+    uint8_t sampled[HUF_SYMBOLVALUE_MAX + 1];
+    unsigned values = 0, maxValue = 0;
+    for (unsigned v = 0; v <= HUF_SYMBOLVALUE_MAX; v++) {
+      sampled[v] = counts[b][v] != 0;
+      values += sampled[v];
+    }
+    if (values < 2)
+      continue;
+    for (unsigned v = 0; v <= HUF_SYMBOLVALUE_MAX; v++) {
+      if (!sampled[v] && ((v > 0 && sampled[v - 1]) ||
+                          (v < HUF_SYMBOLVALUE_MAX && sampled[v + 1])))
+        counts[b][v] = 1;
+      if (counts[b][v] != 0)
+        maxValue = v;
+    }
+    HUF_CElt *table = (HUF_CElt *)shared->ctable;
+    memset(shared->ctable, 0, sizeof(shared->ctable));
+    unsigned tableLog =
+        HUF_optimalTableLog(HUF_TABLELOG_DEFAULT, groupSize, maxValue);
+    size_t maxNbBits = HUF_buildCTable(table, counts[b], maxValue, tableLog);
+    if (HUF_isError(maxNbBits))
+      continue;
+    size_t serializedLen =
+        HUF_writeCTable(shared->serialized, sizeof(shared->serialized), table,
+                        maxValue, (unsigned)maxNbBits);
+    if (HUF_isError(serializedLen) || serializedLen == 0)
+      continue;
+    shared->serializedLen = (uint16_t)serializedLen;
+    shared->maxSymbolValue = maxValue;
+    shared->table = table;
+  }
 
-  // Ensure minimum chunk size per thread
-  if (chunks_per_thread < 10) {
-    num_threads = numChunks / 10;
-    if (num_threads == 0)
-      num_threads = 1;
-    chunks_per_thread = numChunks / num_threads;
+tables_done:
+  for (uint32_t b = 0; b < numBuf; b++) {
+    free(scratch[b]);
   }
+  free(delta);
+  return status;
+}
 
-  size_t leftover_chunks = numChunks % num_threads;
+/*
+ * Encodes a Huffman chunk with the shared table of its group, or with its own
+ * table (the HUF_compress format) if that is smaller, and sets the type.
+ * Returns the compressed size or 0 if it did not compress.
+ */
 
-  // Calculate buffer offsets
-  size_t *bufferOffsets = (size_t *)malloc(numBuf * sizeof(size_t));
-  if (!bufferOffsets) {
-    free(resultBuf);
-    return NULL;
+static size_t encode_chunk_shared(uint8_t *type, uint8_t *dst,
+                                  size_t dstCapacity, const uint8_t *src,
+                                  size_t srcSize, const SharedTable *shared) {
+  unsigned count[HUF_SYMBOLVALUE_MAX + 1];
+  unsigned maxSymbolValue = HUF_SYMBOLVALUE_MAX;
+  size_t largest = HIST_count_simple(count, &maxSymbolValue, src, srcSize);
+  *type = ZIPNN_CHUNK_HUFFMAN;
+  if (largest == srcSize) {
+    // A single repeated byte, stored as Huffman RLE
+    dst[0] = src[0];
+    return 1;
   }
 
-  bufferOffsets[0] = offset;
-  for (size_t b = 1; b < numBuf; b++) {
-    bufferOffsets[b] = bufferOffsets[b - 1] + totalCompressedSize[b - 1];
+  HUF_CREATE_STATIC_CTABLE(own, HUF_SYMBOLVALUE_MAX);
+  uint8_t ownHeader[HUF_CTABLEBOUND];
+  unsigned tableLog =
+      HUF_optimalTableLog(HUF_TABLELOG_DEFAULT, srcSize, maxSymbolValue);
+  size_t maxNbBits = HUF_buildCTable(own, count, maxSymbolValue, tableLog);
+  size_t headerSize = HUF_isError(maxNbBits)
+                          ? maxNbBits
+                          : HUF_writeCTable(ownHeader, sizeof(ownHeader), own,
+                                            maxSymbolValue,
+                                            (unsigned)maxNbBits);
+  // The own table has to save more than 1/64 to pay for building its
+  // decoding table again
+  int sharedValid =
+      maxSymbolValue <= shared->maxSymbolValue &&
+      HUF_validateCTable(shared->table, count, maxSymbolValue);
+  size_t sharedSize =
+      sharedValid
+          ? HUF_estimateCompressedSize(shared->table, count, maxSymbolValue)
+          : 0;
+  if (!HUF_isError(headerSize) && headerSize != 0 &&
+      (!sharedValid ||
+       headerSize + HUF_estimateCompressedSize(own, count, maxSymbolValue) +
+               sharedSize / 64 <
+           sharedSize)) {
+    // The distribution drifted, keep a table in this chunk
+    if (headerSize >= dstCapacity)
+      return 0;
+    memcpy(dst, ownHeader, headerSize);
+    size_t compSize = HUF_compress4X_usingCTable(
+        dst + headerSize, dstCapacity - headerSize, src, srcSize, own);
+    return HUF_isError(compSize) || compSize == 0 ? 0 : headerSize + compSize;
   }
 
-  // Allocate thread resources
-  pthread_t *threads = malloc(num_threads * sizeof(pthread_t));
-  struct CompressedDataCopyArgs *thread_args =
-      malloc(num_threads * sizeof(struct CompressedDataCopyArgs));
-  size_t *threadOffsets = calloc(num_threads * numBuf, sizeof(size_t));
+  if (!sharedValid)
+    return 0;
+  *type = ZIPNN_CHUNK_HUFFMAN_SHARED;
+  size_t compSize = HUF_compress4X_usingCTable(dst, dstCapacity, src, srcSize,
+                                               shared->table);
+  return HUF_isError(compSize) ? 0 : compSize;
+}
 
-  if (!threads || !thread_args || !threadOffsets) {
-    free(resultBuf);
-    free(bufferOffsets);
-    free(threads);
-    free(thread_args);
-    free(threadOffsets);
-    return NULL;
+/*
+ * Early abort of incompressible byte groups: the first checkCompTh chunks of
+ * every group are always Huffman compressed and their sizes summed up. The
+ * worker finishing the last of them decides for the whole group, if the
+ * summed ratio does not pass compThreshold all the remaining chunks of the
+ * group are stored without calling the entropy coder (mantissa bytes rarely
+ * compress). The decision only depends on the data: a chunk past the checked
+ * ones waits for it, so the output is the same whatever order the workers
+ * finish in.
+ */
+
+enum { TH_UNDECIDED = 0, TH_COMPRESS = 1, TH_STORE = 2 };
+
+typedef struct {
+  size_t origSize;  // Bytes of the checked chunks
+  size_t compSize;  // Their size after compression (or stored)
+  size_t chunks;    // Checked chunks done
+} ThresholdCheck;
+
+static void threshold_check_add(ThresholdCheck *check, uint8_t *isThCheck,
+                                size_t checkCompTh, double compThreshold,
+                                size_t origSize, size_t compSize) {
+  __atomic_fetch_add(&check->origSize, origSize, __ATOMIC_RELAXED);
+  __atomic_fetch_add(&check->compSize, compSize, __ATOMIC_RELAXED);
+  // The acquire-release on the counter orders the sizes of the other chunks
+  if (__atomic_add_fetch(&check->chunks, 1, __ATOMIC_ACQ_REL) != checkCompTh)
+    return;
+  size_t orig = __atomic_load_n(&check->origSize, __ATOMIC_RELAXED);
+  size_t comp = __atomic_load_n(&check->compSize, __ATOMIC_RELAXED);
+  uint8_t state =
+      (comp < orig * compThreshold) ? TH_COMPRESS : TH_STORE;
+  __atomic_store_n(isThCheck, state, __ATOMIC_RELEASE);
+}
+
+/*
+ * The decision of a group, for a chunk past the checked ones. The queue hands
+ * the chunks out in order, so all the checked chunks are already taken by
+ * workers that never wait, and the decision comes unless one of them fails.
+ * Returns TH_UNDECIDED after a failure.
+ */
+
+static uint8_t threshold_check_wait(const uint8_t *isThCheck,
+                                    const int *failed) {
+  uint8_t state;
+  while ((state = __atomic_load_n(isThCheck, __ATOMIC_ACQUIRE)) ==
+         TH_UNDECIDED) {
+    if (__atomic_load_n(failed, __ATOMIC_ACQUIRE))
+      return TH_UNDECIDED;
+    sched_yield();
   }
+  return state;
+}
 
-  // Launch threads
-  for (size_t t = 0; t < num_threads; t++) {
-    size_t chunk_start = t * chunks_per_thread;
-    size_t chunk_end = (t + 1) * chunks_per_thread;
+/*
+ * Layout of the result buffer while the workers run:
+ * [header][chunk types][cumulative sizes][room for the shared tables]
+ * [slot 0,0][slot 0,1]...[slot b,c]...
+ * The slots are ordered like the final data ([numBuf][numChunks]), so every
+ * chunk only moves towards the start of the buffer when compacting.
+ */
 
-    // Add leftover chunks to last thread
-    if (t == num_threads - 1) {
-      chunk_end += leftover_chunks;
-    }
+static inline uint8_t *compression_slot(uint8_t *dataStart, size_t slotSize,
+                                        size_t numChunks, uint32_t b,
+                                        size_t c) {
+  return dataStart + (b * numChunks + c) * slotSize;
+}
 
-    thread_args[t] =
-        (struct CompressedDataCopyArgs){.chunk_start = chunk_start,
-                                        .chunk_end = chunk_end,
-                                        .thread_id = t,
-                                        .numBuf = numBuf,
-                                        .numChunks = numChunks,
-                                        .compressedData = compressedData,
-                                        .compChunksSize = compChunksSize,
-                                        .resultBuf = resultBuf,
-                                        .bufferOffsets = bufferOffsets,
-                                        .threadOffsets = threadOffsets};
-
-    if (pthread_create(&threads[t], NULL, copy_compressed_data_interleaved,
-                       &thread_args[t]) != 0) {
-      for (size_t i = 0; i < t; i++) {
-        pthread_join(threads[i], NULL);
+/*
+ * Moves the compressed chunks from their slots to their final positions from
+ * dataStart on, writes the cumulative sizes and returns the size of the data.
+ * Destinations never pass their source, so a single forward pass of memmove
+ * is safe.
+ */
+
+static size_t compact_compressed_slots(size_t *sizePtr, uint8_t *slotStart,
+                                       uint8_t *dataStart, size_t slotSize,
+                                       uint32_t numBuf, size_t numChunks,
+                                       uint32_t **compChunksSize) {
+  size_t offset = 0;
+
+  for (uint32_t b = 0; b < numBuf; b++) {
+    size_t cumulative = 0;
+    for (size_t c = 0; c < numChunks; c++) {
+      uint8_t *slot = compression_slot(slotStart, slotSize, numChunks, b, c);
+      if (dataStart + offset != slot) {
+        memmove(dataStart + offset, slot, compChunksSize[b][c]);
       }
-      free(threads);
-      free(thread_args);
-      free(threadOffsets);
-      free(bufferOffsets);
-      free(resultBuf);
-      return NULL;
+      offset += compChunksSize[b][c];
+      cumulative += compChunksSize[b][c];
+      sizePtr[b * numChunks + c] = cumulative;
     }
   }
+  return offset;
+}
 
-  // Wait for all threads
-  for (size_t t = 0; t < num_threads; t++) {
-    pthread_join(threads[t], NULL);
-  }
+// Bytes of the shared table of a group in the stream
+static size_t shared_table_size(const SharedTable *table) {
+  if (table->table == NULL)
+    return 0;
+  return sizeof(uint16_t) +
+         (table->dictId != 0 ? sizeof(uint32_t) : table->serializedLen);
+}
 
-  // Cleanup
-  free(threads);
-  free(thread_args);
-  free(threadOffsets);
-  free(bufferOffsets);
+/*
+ * Writes the shared table (or dictionary reference) of every group that has
+ * a shared chunk to dst and returns their size
+ */
 
-  return resultBuf;
+static size_t write_shared_tables(uint8_t *dst, const SharedTable *tables,
+                                  uint32_t numBuf, size_t numChunks,
+                                  uint8_t **compChunksType) {
+  size_t offset = 0;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    if (tables[b].table == NULL ||
+        memchr(compChunksType[b], ZIPNN_CHUNK_HUFFMAN_SHARED, numChunks) ==
+            NULL)
+      continue;
+    if (tables[b].dictId != 0) {
+      uint16_t ref = ZIPNN_TABLE_DICT_REF;
+      memcpy(dst + offset, &ref, sizeof(uint16_t));
+      memcpy(dst + offset + sizeof(uint16_t), &tables[b].dictId,
+             sizeof(uint32_t));
+    } else {
+      memcpy(dst + offset, &tables[b].serializedLen, sizeof(uint16_t));
+      memcpy(dst + offset + sizeof(uint16_t), tables[b].serialized,
+             tables[b].serializedLen);
+    }
+    offset += shared_table_size(&tables[b]);
+  }
+  return offset;
 }
 
 ////////////////////////////////////////////////////////////
@@ -261,444 +594,662 @@ uint8_t *prepare_python_return_buffer(
 //     4b1000 [8] - truncate the LSByte
 
 /*
- * Structure holding all thread-specific data for compression
- * Used to pass parameters to worker threads efficiently
+ * The chunks of all the inputs (jobs) of a call, in job order. Every task
+ * takes the next chunk until none is left, so a batch of small and large
+ * tensors keeps the workers busy together.
  */
 
 typedef struct {
-  Py_buffer *data;                   // Input data buffer
-  size_t numChunks;                  // Total number of chunks to process
-  size_t origChunkSize;              // Original size of each chunk
-  uint32_t numBuf;                   // Number of buffers (2 or 4)
-  int bits_mode;                     // Bit reordering mode
-  int bytes_mode;                    // Byte grouping mode
-  int is_redata;                     // Flag for data reprocessing
-  uint32_t threads;                  // Number of worker threads
-  uint8_t ***buffers;                // array for ibyte grouped data
-  size_t **unCompChunksSize;         // Sizes of uncompressed chunks
-  uint8_t ***compressedData;         // Compressed data output
-  uint32_t **compChunksSize;         // Sizes of compressed chunks
-  uint8_t **compChunksType;          // Compression type for each chunk
-  uint8_t *isThCheck;                // Threshold check flags - TBD
-  int checkCompTh;                   // Compression threshold check
-  double compThreshold;              // Compression ratio threshold
-  pthread_mutex_t *next_chunk_mutex; // Mutex for thread synchronization
-  size_t *next_chunk;                // Next chunk to be processed
-} CompressionThreadData;
+  pthread_mutex_t mutex; // Mutex for thread synchronization
+  size_t next;           // Next chunk, counted over all the jobs
+  size_t numJobs;        // Number of jobs
+  size_t *jobStart;      // First chunk of every job, the total at numJobs
+} ChunkQueue;
 
 /*
- * Worker thread function that performs the actual compression
- * Each thread processes chunks in a thread-safe manner
+ * Takes the next chunk: its job and its index within the job. *job is the
+ * cursor of the calling task, the chunks it takes only move forward.
+ * Returns -1 when no chunk is left.
  */
 
-static void *compression_worker(void *arg) {
-  CompressionThreadData *thread_data = (CompressionThreadData *)arg;
-  size_t current_chunk;
-  while (1) {
-    // Get next chunk to process
-    pthread_mutex_lock(thread_data->next_chunk_mutex);
-    current_chunk = (*thread_data->next_chunk)++;
-    pthread_mutex_unlock(thread_data->next_chunk_mutex);
-
-    // Exit if all chunks have been processed
-    if (current_chunk >= thread_data->numChunks) {
-      break;
-    }
+static int chunk_queue_next(ChunkQueue *queue, size_t *job, size_t *chunk) {
+  pthread_mutex_lock(&queue->mutex);
+  size_t next = queue->next++;
+  pthread_mutex_unlock(&queue->mutex);
+
+  if (next >= queue->jobStart[queue->numJobs])
+    return -1;
+  while (next >= queue->jobStart[*job + 1])
+    (*job)++;
+  *chunk = next - queue->jobStart[*job];
+  return 0;
+}
 
-    // Calculate offset and chunk size
-    size_t offset = current_chunk * thread_data->origChunkSize;
-    size_t curOrigChunkSize =
-        (current_chunk == thread_data->numChunks - 1)
-            ? (thread_data->data->len - offset) // Last chunk
-            : thread_data->origChunkSize;       // Regular chunk
-    
-    // Byte Grouping + Byte Ordering
-
-    if (thread_data->numBuf == 1) {
-      // NEW: FP8 handeling
-      if(split_bytearray_dtype8(thread_data->data->buf + offset, curOrigChunkSize,thread_data->buffers[current_chunk],thread_data->unCompChunksSize[current_chunk],thread_data->bytes_mode)!=0){
-        pthread_exit((void *)-1);
-      }
-    } 
-
-    else if (thread_data->numBuf == 2) {
-      // Handle 16-bit data type splitting
-      if (split_bytearray_dtype16(
-              thread_data->data->buf + offset, curOrigChunkSize,
-              thread_data->buffers[current_chunk],
-              thread_data->unCompChunksSize[current_chunk],
-              thread_data->bits_mode, thread_data->bytes_mode,
-              thread_data->is_redata) != 0) {
-        pthread_exit((void *)-1);
-      }
-    } else { // numBuf == 4
-      // Handle 32-bit data type splitting
-      if (split_bytearray_dtype32(
-              thread_data->data->buf + offset, curOrigChunkSize,
-              thread_data->buffers[current_chunk],
-              thread_data->unCompChunksSize[current_chunk],
-              thread_data->bits_mode, thread_data->bytes_mode,
-              thread_data->is_redata) != 0) {
-        pthread_exit((void *)-1);
-      }
-    }
+/*
+ * Number of tasks of a call: never more than its chunks, and another task
+ * only if it gets ZIPNN_MIN_TASK_NS of work, estimated from the CPU time per
+ * KB measured on the earlier calls. Inputs of up to ZIPNN_INLINE_BYTES run on
+ * the calling thread alone, a single task never touches the pool.
+ */
 
-    // Process each buffer
-    for (uint32_t b = 0; b < thread_data->numBuf; b++) {
-      // Allocate memory for compressed data
-      thread_data->compressedData[b][current_chunk] =
-          malloc(thread_data->origChunkSize);
-      if (!thread_data->compressedData[b][current_chunk]) {
-        pthread_exit((void *)-1);
-      }
+#define ZIPNN_MIN_TASK_NS 250000       // Work that pays for waking a worker
+#define ZIPNN_INLINE_BYTES (64 * 1024) // Never worth a second thread
 
-      if (thread_data->buffers[current_chunk][b] != NULL) {
-        // Always try to compress initially
-        size_t uncompSize;
-        if (thread_data->numBuf == 1){
-          uncompSize = thread_data->unCompChunksSize[current_chunk][b];
-        }
-        else {
-          uncompSize = thread_data->unCompChunksSize[current_chunk][b];
-        }
-        // Attempt Huffman compression
-        thread_data->compChunksSize[b][current_chunk] =
-            HUF_compress(thread_data->compressedData[b][current_chunk],
-                         thread_data->origChunkSize,
-                         thread_data->buffers[current_chunk][b], uncompSize);
-
-        // Check if compression was beneficial
-        if (thread_data->compChunksSize[b][current_chunk] != 0 &&
-            thread_data->compChunksSize[b][current_chunk] <
-                (uncompSize * thread_data->compThreshold)) {
-          // Compression not beneficial - use original data
-          thread_data->compChunksType[b][current_chunk] =
-              1; // Compressed with Huffman
-          free(thread_data->buffers[current_chunk][b]);
-        } else {
-          // Compression not beneficial - use original data
-          free(thread_data->compressedData[b][current_chunk]);
-          thread_data->compChunksSize[b][current_chunk] = uncompSize;
-          thread_data->compChunksType[b][current_chunk] = 0; // not compressed
-          thread_data->compressedData[b][current_chunk] =
-              thread_data->buffers[current_chunk][b];
-        }
-      }
-    }
+typedef struct {
+  uint64_t nsPerKb;     // Thread CPU time per input KB, moving average
+  uint64_t inlineCalls; // Calls that ran on the calling thread alone
+  uint64_t poolCalls;   // Calls that ran several tasks
+} TaskCost;
+
+// The starting costs are those of Huffman on one core, until measured
+static TaskCost compressCost = {.nsPerKb = 1500};
+static TaskCost decompressCost = {.nsPerKb = 500};
+static int adaptiveTasks = 1; // 0 - every call runs min(threads, chunks)
+
+static uint32_t tasks_for_work(TaskCost *cost, uint32_t threads,
+                               size_t totalChunks, size_t totalBytes) {
+  if (threads > totalChunks)
+    threads = (uint32_t)totalChunks;
+  if (__atomic_load_n(&adaptiveTasks, __ATOMIC_RELAXED)) {
+    uint64_t nsPerKb = __atomic_load_n(&cost->nsPerKb, __ATOMIC_RELAXED);
+    uint64_t worthTasks =
+        totalBytes <= ZIPNN_INLINE_BYTES
+            ? 1
+            : (uint64_t)(totalBytes / 1024) * nsPerKb / ZIPNN_MIN_TASK_NS;
+    if (worthTasks < threads)
+      threads = (uint32_t)worthTasks;
   }
-  pthread_exit(NULL);
+  if (threads <= 1) {
+    __atomic_fetch_add(&cost->inlineCalls, 1, __ATOMIC_RELAXED);
+    return 1;
+  }
+  __atomic_fetch_add(&cost->poolCalls, 1, __ATOMIC_RELAXED);
+  return threads;
+}
+
+// CPU time of the calling thread, the time a task was actually running
+static uint64_t thread_cpu_ns(void) {
+  struct timespec ts;
+  clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts);
+  return (uint64_t)ts.tv_sec * 1000000000ull + (uint64_t)ts.tv_nsec;
+}
+
+// Folds the CPU time of all the tasks of a call into the cost per KB, the
+// calls below ZIPNN_INLINE_BYTES are too short to measure
+static void task_cost_update(TaskCost *cost, uint64_t busyNs,
+                             size_t totalBytes) {
+  if (totalBytes < ZIPNN_INLINE_BYTES)
+    return;
+  uint64_t sample = busyNs / (totalBytes / 1024);
+  uint64_t nsPerKb = __atomic_load_n(&cost->nsPerKb, __ATOMIC_RELAXED);
+  nsPerKb = (nsPerKb * 7 + sample) / 8;
+  __atomic_store_n(&cost->nsPerKb, nsPerKb > 0 ? nsPerKb : 1,
+                   __ATOMIC_RELAXED);
 }
 
-///////////////////////////////////////////////////////////
-///////////////////////////////////////////////////////////
 /*
- * Main Python-callable compression function
- * Handles initialization, thread management, and cleanup
+ * One input of a compression call, with everything its chunks need. The
+ * output of every job is the same as a call with that job alone.
  */
-///////////////////////////////////////////////////////////
-///////////////////////////////////////////////////////////
 
-PyObject *py_zipnn_core(PyObject *self, PyObject *args) {
-  Py_buffer header, data;
-  uint32_t numBuf, bits_mode, bytes_mode, is_redata, checkThAfterPercent,
-      threads;
-  size_t origChunkSize;
-  float compThreshold;
-  // uint8_t isPrint = 0;
+typedef struct {
+  Py_buffer header;                        // Python header, copied first
+  Py_buffer data;                          // Input data buffer
+  Py_buffer base;                          // Delta base, buf NULL for none
+  ZipnnDictionary *dict;                   // Dictionary tables, or NULL
+  size_t numChunks;                        // Total number of chunks to process
+  size_t origChunkSize;                    // Original size of each chunk
+  uint32_t numBuf;                         // Number of buffers (1, 2 or 4)
+  int bits_mode;                           // Bit reordering mode
+  int bytes_mode;                          // Byte grouping mode
+  int is_redata;                           // Flag for data reprocessing
+  uint8_t *resultBuf;                      // Output of the job
+  size_t resBufSize;                       // Its final size
+  size_t dataOffset;                       // Header and chunk index size
+  size_t slotSize;                         // Capacity of one slot
+  uint8_t *dataStart;                      // First slot in the result buffer
+  uint32_t *compChunksSize[ZIPNN_MAX_BUF]; // Sizes of compressed chunks
+  uint8_t *compChunksType[ZIPNN_MAX_BUF];  // Compression type for each chunk
+  SharedTable sharedTables[ZIPNN_MAX_BUF]; // Shared Huffman table per buffer
+  size_t sharedTablesLen;                  // Room for the shared tables
+  uint8_t isThCheck[ZIPNN_MAX_BUF];        // Threshold decision per buffer
+  ThresholdCheck thCheck[ZIPNN_MAX_BUF];   // Sizes of the checked chunks
+  size_t checkCompTh;                      // Chunks checked before deciding
+} CompressionJob;
 
-  // struct timeval startTime, endTime;
-  // gettimeofday(&startTime, NULL);
+/*
+ * Structure holding all thread-specific data for compression
+ * Used to pass parameters to worker threads efficiently
+ */
 
-  // Parse Python arguments
-  if (!PyArg_ParseTuple(args, "y*y*iiiinfii", &header, &data, &numBuf,
-                        &bits_mode, &bytes_mode, &is_redata, &origChunkSize,
-                        &compThreshold, &checkThAfterPercent, &threads)) {
-    return NULL;
-  }
+typedef struct {
+  CompressionJob *jobs;  // The inputs of the call
+  uint32_t maxNumBuf;    // Most buffers of a job
+  size_t scratchSize;    // Capacity of one byte group scratch
+  size_t deltaSize;      // Capacity of the delta scratch, 0 without a base
+  int codecSelect;       // Pick the codec of every chunk
+  double compThreshold;  // Compression ratio threshold
+  ChunkQueue *queue;     // The chunks of all the jobs
+  uint64_t busyNs;       // CPU time of all the tasks
+  int failed;            // Set by a failing task, stops the waiting ones
+} CompressionThreadData;
 
-  // Initialize compression parameters
-  size_t numChunks = (data.len + origChunkSize - 1) / origChunkSize;
-  size_t totalCompressedSize[numBuf];
-  uint8_t isThCheck[numBuf];
-  uint32_t checkCompTh =
-      (uint32_t)ceil((double)numChunks / checkThAfterPercent);
+/*
+ * Builds the shared tables of a job and allocates its chunk index and result
+ * buffer. Runs without the GIL, returns an error message or NULL.
+ */
 
-  // Memory allocation and initialization
-  for (uint32_t b = 0; b < numBuf; b++) {
-    totalCompressedSize[b] = 0;
-    isThCheck[b] = 0;
+static const char *compression_job_prepare(CompressionJob *job,
+                                           int sharedTable,
+                                           uint32_t checkThAfterPercent) {
+  uint32_t numBuf = job->numBuf;
+  size_t numChunks = (job->data.len + job->origChunkSize - 1) /
+                     job->origChunkSize;
+  job->numChunks = numChunks;
+  // The decision is made after checkThAfterPercent% of the chunks (at least
+  // one), 0 or 100 and above compress every chunk
+  job->checkCompTh = numChunks;
+  if (checkThAfterPercent > 0 && checkThAfterPercent < 100) {
+    job->checkCompTh =
+        (size_t)ceil((double)numChunks * checkThAfterPercent / 100);
+    if (job->checkCompTh == 0)
+      job->checkCompTh = 1;
   }
 
-  uint8_t ***buffers =
-      malloc(numChunks * sizeof(uint8_t **)); //[numChunks][numBuf]
-  size_t **unCompChunksSize =
-      malloc(numChunks * sizeof(size_t *)); //[numChunks][numBuf]
-  if (!buffers || !unCompChunksSize) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate buffers || unCompChunksSize");
-    goto compression_error;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    job->isThCheck[b] = TH_UNDECIDED;
+    job->thCheck[b] = (ThresholdCheck){0, 0, 0};
+    job->sharedTables[b].table = NULL;
+    job->sharedTables[b].dictId = 0;
   }
 
-  for (size_t c = 0; c < numChunks; c++) {
-    buffers[c] = malloc(numBuf * sizeof(uint8_t *));
-    unCompChunksSize[c] = malloc(numBuf * sizeof(size_t));
-    if (!buffers[c] || !unCompChunksSize[c]) {
-      PyErr_SetString(PyExc_MemoryError, "Failed to allocate buffers[c] || unCompChunksSize[c]");
-      goto compression_error;
+  // A single chunk has nothing to share its table with
+  if (sharedTable && numChunks > 1) {
+    if (build_shared_tables(job->data.buf, job->base.buf, job->data.len,
+                            job->origChunkSize, numChunks,
+                            ZIPNN_TABLE_SAMPLE_CHUNKS, numBuf, job->bits_mode,
+                            job->bytes_mode, job->is_redata,
+                            job->sharedTables) != 0)
+      return "Failed to build the shared Huffman tables";
+  }
+  // The tables of a dictionary are used even by a single chunk
+  if (sharedTable && job->dict != NULL) {
+    for (uint32_t b = 0; b < numBuf; b++) {
+      if (job->dict->tables[b].table == NULL)
+        continue;
+      job->sharedTables[b] = job->dict->tables[b];
+      job->sharedTables[b].table = (HUF_CElt *)job->sharedTables[b].ctable;
     }
   }
-
-  uint8_t ***compressedData =
-      malloc(numBuf * sizeof(uint8_t **)); // [numBuf][numChunks]
-  uint8_t **compChunksType =
-      malloc(numBuf * sizeof(uint8_t *)); // [numBuf][numChunks]
-  uint32_t **compChunksSize =
-      calloc(numBuf, sizeof(uint32_t *)); // [numBuf][numChunks]
-  if (!compressedData || !compChunksType || !compChunksSize) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate compressedData || compChunksType || compChunksSize");
-    goto compression_error;
+  job->sharedTablesLen = 0;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    job->sharedTablesLen += shared_table_size(&job->sharedTables[b]);
   }
 
+  // The sizes and types of every chunk, in one allocation
+  uint32_t *sizes = calloc(numBuf * (numChunks + 1),
+                           sizeof(uint32_t) + sizeof(uint8_t));
+  if (!sizes)
+    return "Failed to allocate compChunksType || compChunksSize";
+  uint8_t *types = (uint8_t *)(sizes + numBuf * (numChunks + 1));
   for (uint32_t b = 0; b < numBuf; b++) {
-    compressedData[b] = malloc(numChunks * sizeof(uint8_t *));
-    compChunksType[b] = malloc(numChunks * sizeof(uint8_t));
-    compChunksSize[b] = calloc(numChunks, sizeof(uint32_t));
-    if (!compressedData[b] || !compChunksType[b] || !compChunksSize[b]) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate compressedData[b] || compChunksType[b] || compChunksSize[b]");
-      goto compression_error;
-    }
+    job->compChunksSize[b] = sizes + b * (numChunks + 1);
+    job->compChunksType[b] = types + b * (numChunks + 1);
   }
 
-  // struct timeval startTimeReal, endTimeReal;
-
-  // Start compression threads
-  // gettimeofday(&startTimeReal, NULL);
-  pthread_t *thread_handles = NULL;
-  CompressionThreadData *thread_data = NULL;
-  pthread_mutex_t next_chunk_mutex = PTHREAD_MUTEX_INITIALIZER;
-  size_t next_chunk = 0;
-
-  thread_handles = malloc(threads * sizeof(pthread_t));
-  thread_data = malloc(threads * sizeof(CompressionThreadData));
-  if (!thread_handles || !thread_data) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate thread resources");
-    goto cleanup_threads;
-  }
-
-  // Create threads
-  for (uint32_t i = 0; i < threads; i++) {
-    thread_data[i] =
-        (CompressionThreadData){.data = &data,
-                                .numChunks = numChunks,
-                                .origChunkSize = origChunkSize,
-                                .numBuf = numBuf,
-                                .bits_mode = bits_mode,
-                                .bytes_mode = bytes_mode,
-                                .is_redata = is_redata,
-                                .threads = threads,
-                                .buffers = buffers,
-                                .unCompChunksSize = unCompChunksSize,
-                                .compressedData = compressedData,
-                                .compChunksSize = compChunksSize,
-                                .compChunksType = compChunksType,
-                                .isThCheck = isThCheck,
-                                .checkCompTh = checkCompTh,
-                                .compThreshold = compThreshold,
-                                .next_chunk_mutex = &next_chunk_mutex,
-                                .next_chunk = &next_chunk};
-
-    if (pthread_create(&thread_handles[i], NULL, compression_worker,
-                       &thread_data[i]) != 0) {
-      PyErr_SetString(PyExc_RuntimeError, "Failed to create thread");
-      goto cleanup_threads;
-    }
-  }
+  // A byte group of a chunk is never larger than its share of the chunk,
+  // a slot holds it either compressed or stored (a codec whose output does
+  // not fit in the slot fails, and the chunk is stored)
+  size_t groupSize = (job->origChunkSize + numBuf - 1) / numBuf;
+  job->slotSize = HUF_compressBound(groupSize);
+  job->dataOffset = job->header.len + numBuf * numChunks * sizeof(uint8_t) +
+                    numBuf * numChunks * sizeof(size_t);
+
+  // One allocation for the whole result, it is shrunk after compacting
+  job->resultBuf = zipnn_buffer_alloc(job->dataOffset + job->sharedTablesLen +
+                                      numBuf * numChunks * job->slotSize);
+  if (job->resultBuf == NULL)
+    return "Failed to allocate memory for result buffer in split function";
+  job->dataStart = job->resultBuf + job->dataOffset + job->sharedTablesLen;
+  ZIPNN_STAT_ADD(compress_allocs, 2);
+  ZIPNN_STAT_ADD(compress_bytes, job->data.len);
+  return NULL;
+}
 
-  // Wait for all threads
-  for (uint32_t i = 0; i < threads; i++) {
-    void *thread_result;
-    pthread_join(thread_handles[i], &thread_result);
-    if (thread_result != NULL) {
-      PyErr_SetString(PyExc_RuntimeError, "Thread processing failed");
-      goto cleanup_threads;
-    }
-  }
-  free(thread_handles);
-  free(thread_data);
-  pthread_mutex_destroy(&next_chunk_mutex);
-  goto continue_processing;
+/*
+ * Compresses chunk c of a job into its slots, scratch holds the byte groups
+ * and delta the chunk XORed with the base of the job. Returns 0 on success.
+ */
 
-cleanup_threads:
-  if (thread_handles)
-    free(thread_handles);
-  if (thread_data){
-    free(thread_data);
+static int compress_chunk(CompressionThreadData *thread_data,
+                          CompressionJob *job, size_t current_chunk,
+                          uint8_t **scratch, uint8_t *delta,
+                          ZSTD_CCtx **zstdCtx) {
+  // Calculate offset and chunk size
+  size_t offset = current_chunk * job->origChunkSize;
+  size_t curOrigChunkSize = (current_chunk == job->numChunks - 1)
+                                ? (job->data.len - offset) // Last chunk
+                                : job->origChunkSize;      // Regular chunk
+  uint8_t *buffers[job->numBuf];
+  size_t unCompChunksSize[job->numBuf];
+  for (uint32_t b = 0; b < job->numBuf; b++) {
+    buffers[b] = scratch[b];
+    unCompChunksSize[b] = 0;
   }
-  pthread_mutex_destroy(&next_chunk_mutex);
-  goto compression_error;  
-  return NULL;
-
-  ////////////// The end of multi Threading part 1
-  ////////////////////////////////
 
-// Process results and calculate total sizes
-continue_processing:
+  uint8_t *chunk = (uint8_t *)job->data.buf + offset;
+  if (job->base.buf != NULL) {
+    xor_copy(delta, chunk, (const uint8_t *)job->base.buf + offset,
+             curOrigChunkSize);
+    chunk = delta;
+  }
 
-  for (uint32_t b = 0; b < numBuf; b++) {
-    size_t totalCompressed = 0;
-    size_t totalUncompressed = 0;
+  // Byte Grouping + Byte Ordering (FP8, 16-bit or 32-bit data types)
+  if (split_chunk(chunk, curOrigChunkSize, job->numBuf, job->bits_mode,
+                  job->bytes_mode, job->is_redata, buffers,
+                  unCompChunksSize) != 0) {
+    return -1;
+  }
 
-    for (size_t chunk = 0; chunk < numChunks; chunk++) {
-      totalCompressed += compChunksSize[b][chunk];
-      totalUncompressed += unCompChunksSize[chunk][b];
+  // Process each buffer, the output goes straight into its slot
+  for (uint32_t b = 0; b < job->numBuf; b++) {
+    uint8_t *slot = compression_slot(job->dataStart, job->slotSize,
+                                     job->numChunks, b, current_chunk);
+    size_t uncompSize = unCompChunksSize[b];
+    if (uncompSize == 0) {
+      job->compChunksSize[b][current_chunk] = 0;
+      job->compChunksType[b][current_chunk] = ZIPNN_CHUNK_RAW;
+      continue;
+    }
 
-      // Check if compression is beneficial after checkCompTh chunks
-      if (chunk == checkCompTh &&
-          totalCompressed * 1.0 > totalUncompressed * compThreshold) {
-        //            noNeedToCompress[b] = 1;
+    // The group did not pass the threshold check, store it as it is
+    // (all zero chunks, such as padding, still take no space)
+    uint8_t verdict = TH_COMPRESS;
+    if (current_chunk >= job->checkCompTh) {
+      verdict = threshold_check_wait(&job->isThCheck[b], &thread_data->failed);
+      if (verdict == TH_UNDECIDED)
+        return -1;
+    }
+    if (verdict == TH_STORE) {
+      if (thread_data->codecSelect && is_zero_chunk(buffers[b], uncompSize)) {
+        job->compChunksSize[b][current_chunk] = 0;
+        job->compChunksType[b][current_chunk] = ZIPNN_CHUNK_ZERO;
+        continue;
       }
+      memcpy(slot, buffers[b], uncompSize);
+      job->compChunksSize[b][current_chunk] = uncompSize;
+      job->compChunksType[b][current_chunk] = ZIPNN_CHUNK_RAW;
+      ZIPNN_STAT_ADD(stored_bytes, uncompSize);
+      ZIPNN_STAT_ADD(skipped_bytes, uncompSize);
+      continue;
     }
-    totalCompressedSize[b] = totalCompressed;
-  }
-  // gettimeofday(&endTimeReal, NULL);
-  // double compressMl1TimeReal =
-  //    (endTimeReal.tv_sec - startTimeReal.tv_sec) +
-  //    (endTimeReal.tv_usec - startTimeReal.tv_usec) / 1e6;
-  // printf("compress ML1: %f seconds\n", compressMl1TimeReal);
-
-  // Prepare final result buffe
-  PyObject *py_result;
-  uint8_t *resultBuf;
-  size_t resBufSize;
-
-  // printf("start prepare: %f seconds\n", compressMl1TimeReal);
-  // printf("compChunksSize[0][0] %u\n", compChunksSize[0][0]);
-  resultBuf = prepare_python_return_buffer(
-      header.len, numBuf, numChunks, header.buf, compressedData, compChunksSize,
-      compChunksType, totalCompressedSize, &resBufSize, threads);
-
-  if (resultBuf == NULL) goto compression_error; 
-  // gettimeofday(&endTimeReal, NULL);
-  // double compressPrepareTimeReal =
-  //    (endTimeReal.tv_sec - startTimeReal.tv_sec) +
-  //    (endTimeReal.tv_usec - startTimeReal.tv_usec) / 1e6;
-  // printf("compress Prepare: %f seconds\n", compressPrepareTimeReal);
-
-  if (resultBuf == NULL) {
-    // Free all Mallocs
-    // print Error
-    return NULL;
-  }
 
-  // gettimeofday(&startTimeReal, NULL);
-  // Create Python buffer view
-  Py_buffer view; // create buffer to avoid copy
-  PyBuffer_FillInfo(&view, NULL, resultBuf, resBufSize, 0, PyBUF_WRITABLE);
-  py_result = PyMemoryView_FromBuffer(&view);
+    uint8_t type = thread_data->codecSelect
+                       ? select_chunk_codec(buffers[b], uncompSize)
+                       : ZIPNN_CHUNK_HUFFMAN;
+    const SharedTable *shared = &job->sharedTables[b];
+    size_t compSize =
+        type == ZIPNN_CHUNK_HUFFMAN && shared->table != NULL
+            ? encode_chunk_shared(&type, slot, job->slotSize, buffers[b],
+                                  uncompSize, shared)
+            : encode_chunk(&type, slot, job->slotSize, buffers[b],
+                           uncompSize, zstdCtx);
+
+    // Check if compression was beneficial
+    if (type == ZIPNN_CHUNK_ZERO ||
+        (compSize != 0 &&
+         compSize < (uncompSize * thread_data->compThreshold))) {
+      job->compChunksSize[b][current_chunk] = compSize;
+      job->compChunksType[b][current_chunk] = type;
+    } else {
+      // Compression not beneficial - use original data
+      memcpy(slot, buffers[b], uncompSize);
+      job->compChunksSize[b][current_chunk] = uncompSize;
+      job->compChunksType[b][current_chunk] = ZIPNN_CHUNK_RAW;
+      ZIPNN_STAT_ADD(stored_bytes, uncompSize);
+    }
 
-  // gettimeofday(&endTimeReal, NULL);
-  // double freeTimeReal = (endTimeReal.tv_sec - startTimeReal.tv_sec) +
-  //                      (endTimeReal.tv_usec - startTimeReal.tv_usec) / 1e6;
-  // printf("compress free: %f seconds\n", freeTimeReal);
+    if (current_chunk < job->checkCompTh) {
+      threshold_check_add(&job->thCheck[b], &job->isThCheck[b],
+                          job->checkCompTh, thread_data->compThreshold,
+                          uncompSize, job->compChunksSize[b][current_chunk]);
+    }
+  }
+  return 0;
+}
 
-  // gettimeofday(&endTime, NULL);
-  // double compressAll = (endTime.tv_sec - startTime.tv_sec) +
-  //                     (endTime.tv_usec - startTime.tv_usec) / 1e6;
-  // printf("compress All: %f seconds\n", compressAll);
-  //
+/*
+ * Worker thread function that performs the actual compression
+ * Each thread processes chunks in a thread-safe manner
+ */
 
-  // Cleanup and return
-  for (size_t c = 0; c < numChunks; c++) {
-    for (uint32_t b = 0; b < numBuf; b++) {
-      if (buffers[c][b]) {
-        //free(buffers[c][b]);
+static void *compression_worker(void *arg) {
+  CompressionThreadData *thread_data = (CompressionThreadData *)arg;
+  size_t job = 0, current_chunk;
+  void *status = NULL;
+  uint64_t startNs = thread_cpu_ns();
+
+  // Scratch for the byte groups, reused for every chunk of this task
+  uint8_t *scratch[ZIPNN_MAX_BUF] = {NULL};
+  uint8_t *delta = NULL;
+  ZSTD_CCtx *zstdCtx = NULL;
+  if (thread_data->maxNumBuf > 1) {
+    for (uint32_t b = 0; b < thread_data->maxNumBuf; b++) {
+      scratch[b] = malloc(thread_data->scratchSize);
+      if (!scratch[b]) {
+        status = (void *)-1;
+        goto worker_done;
       }
     }
-    if (buffers[c]) {
-      free(buffers[c]);
-    }
-    if (unCompChunksSize[c]){
-      free(unCompChunksSize[c]);
+    ZIPNN_STAT_ADD(compress_allocs, thread_data->maxNumBuf);
+  }
+  if (thread_data->deltaSize > 0) {
+    delta = malloc(thread_data->deltaSize);
+    if (!delta) {
+      status = (void *)-1;
+      goto worker_done;
     }
+    ZIPNN_STAT_ADD(compress_allocs, 1);
   }
-  if (buffers){
-    free(buffers);
+
+  // Exit when all chunks have been processed
+  while (chunk_queue_next(thread_data->queue, &job, &current_chunk) == 0) {
+    if (compress_chunk(thread_data, &thread_data->jobs[job], current_chunk,
+                       scratch, delta, &zstdCtx) != 0) {
+      __atomic_store_n(&thread_data->failed, 1, __ATOMIC_RELEASE);
+      status = (void *)-1;
+      break;
+    }
   }
-  if (unCompChunksSize){
-    free(unCompChunksSize);
+
+worker_done:
+  for (uint32_t b = 0; b < ZIPNN_MAX_BUF; b++) {
+    free(scratch[b]);
   }
+  free(delta);
+  ZSTD_freeCCtx(zstdCtx);
+  __atomic_fetch_add(&thread_data->busyNs, thread_cpu_ns() - startNs,
+                     __ATOMIC_RELAXED);
+  return status;
+}
+
+/*
+ * Writes the header, chunk index and shared tables of a compressed job and
+ * compacts its chunks, the compressed length goes to bytes 24-31
+ */
+
+static void compression_job_finish(CompressionJob *job) {
+  uint32_t numBuf = job->numBuf;
+  size_t numChunks = job->numChunks;
+  uint8_t *resultBuf = job->resultBuf;
+
+  memcpy(resultBuf, job->header.buf, job->header.len);
   for (uint32_t b = 0; b < numBuf; b++) {
-    if (compressedData[b]) {
-      free(compressedData[b]);
-    }
-    if (compChunksType[b]) {
-      free(compChunksType[b]);
-    }
-    if (compChunksSize[b]) {
-      free(compChunksSize[b]);
-    }
+    memcpy(resultBuf + job->header.len + b * numChunks, job->compChunksType[b],
+           numChunks * sizeof(uint8_t));
   }
-  if (compressedData){
-    free(compressedData);
+  // The tables of the groups that use them, then the chunks
+  size_t resBufSize =
+      job->dataOffset + write_shared_tables(resultBuf + job->dataOffset,
+                                            job->sharedTables, numBuf,
+                                            numChunks, job->compChunksType);
+  resBufSize += compact_compressed_slots(
+      (size_t *)(resultBuf + job->header.len + numBuf * numChunks),
+      job->dataStart, resultBuf + resBufSize, job->slotSize, numBuf,
+      numChunks, job->compChunksSize);
+  memcpy(&resultBuf[24], &resBufSize, sizeof(size_t));
+
+  // Give the unused tail of the slots back
+  job->resultBuf = zipnn_buffer_shrink(resultBuf, resBufSize);
+  job->resBufSize = resBufSize;
+  ZIPNN_STAT_ADD(compress_allocs, 1);
+}
+
+/*
+ * Compresses all the jobs, their chunks share one queue of worker tasks.
+ * Runs without the GIL. Returns an error message (and sets *errType) or NULL,
+ * the result buffers are left in the jobs either way.
+ */
+
+static const char *compress_jobs(CompressionJob *jobs, size_t numJobs,
+                                 int codecSelect, int sharedTable,
+                                 double compThreshold,
+                                 uint32_t checkThAfterPercent,
+                                 uint32_t threads, PyObject **errType) {
+  const char *errMsg = NULL;
+  *errType = PyExc_MemoryError;
+  size_t jobStart[numJobs + 1];
+  uint32_t maxNumBuf = 1;
+  size_t scratchSize = 0;
+  size_t deltaSize = 0;
+  size_t totalBytes = 0;
+
+  jobStart[0] = 0;
+  for (size_t j = 0; j < numJobs; j++) {
+    errMsg = compression_job_prepare(&jobs[j], sharedTable,
+                                     checkThAfterPercent);
+    if (errMsg)
+      return errMsg;
+    jobStart[j + 1] = jobStart[j] + jobs[j].numChunks;
+    totalBytes += jobs[j].data.len;
+    if (jobs[j].numBuf > maxNumBuf)
+      maxNumBuf = jobs[j].numBuf;
+    size_t groupSize =
+        (jobs[j].origChunkSize + jobs[j].numBuf - 1) / jobs[j].numBuf;
+    if (jobs[j].numBuf > 1 && groupSize > scratchSize)
+      scratchSize = groupSize;
+    size_t chunkSize = jobs[j].origChunkSize < (size_t)jobs[j].data.len
+                           ? jobs[j].origChunkSize
+                           : (size_t)jobs[j].data.len;
+    if (jobs[j].base.buf != NULL && chunkSize > deltaSize)
+      deltaSize = chunkSize;
   }
-  if (compChunksType){
-    free(compChunksType);
+
+  // Run the compression tasks on the worker pool, every task pulls chunks
+  // until none is left
+  ChunkQueue queue = {.mutex = PTHREAD_MUTEX_INITIALIZER,
+                      .next = 0,
+                      .numJobs = numJobs,
+                      .jobStart = jobStart};
+  CompressionThreadData thread_data = {.jobs = jobs,
+                                       .maxNumBuf = maxNumBuf,
+                                       .scratchSize = scratchSize,
+                                       .deltaSize = deltaSize,
+                                       .codecSelect = codecSelect,
+                                       .compThreshold = compThreshold,
+                                       .queue = &queue,
+                                       .busyNs = 0,
+                                       .failed = 0};
+  if (zipnn_pool_run(compression_worker, &thread_data, 0,
+                     tasks_for_work(&compressCost, threads, jobStart[numJobs],
+                                    totalBytes)) != 0) {
+    *errType = PyExc_RuntimeError;
+    errMsg = "Thread processing failed";
   }
-  if (compChunksSize){
-    free(compChunksSize);
+  pthread_mutex_destroy(&queue.mutex);
+  task_cost_update(&compressCost, thread_data.busyNs, totalBytes);
+  if (errMsg)
+    return errMsg;
+
+  for (size_t j = 0; j < numJobs; j++) {
+    compression_job_finish(&jobs[j]);
   }
+  return NULL;
+}
 
-  return py_result;
+// Frees what compress_jobs allocated, the result buffer unless it was taken
+static void compression_job_free(CompressionJob *job) {
+  free(job->compChunksSize[0]);
+  zipnn_buffer_free(job->resultBuf);
+  job->compChunksSize[0] = NULL;
+  job->resultBuf = NULL;
+}
 
-  // Handle Error
-  /**/
-  compression_error:
-    if (buffers) {
-      for (size_t c = 0; c < numChunks; c++) {
-	if (buffers[c] != NULL) {
-	  free(buffers[c]);
-	  for (uint32_t b = 0; b < numBuf; b++) {
-	    if (buffers[c][b] != NULL) {
-	      free(buffers[c][b]);
-	    }
-	  }
-	}
-      }
-      free(buffers);
-    }
-    
-    if (unCompChunksSize) {
-      for (size_t c = 0; c < numChunks; c++) {
-	if (unCompChunksSize[c] != NULL) {
-          free(unCompChunksSize[c]);
-	}
-      }
-      free(unCompChunksSize);
+///////////////////////////////////////////////////////////
+///////////////////////////////////////////////////////////
+/*
+ * Main Python-callable compression function
+ * Handles initialization, thread management, and cleanup
+ */
+///////////////////////////////////////////////////////////
+///////////////////////////////////////////////////////////
+
+PyObject *py_zipnn_core(PyObject *self, PyObject *args) {
+  CompressionJob job = {0};
+  uint32_t checkThAfterPercent, threads;
+  float compThreshold;
+  int codecSelect = 0; // 0 - Huffman only, 1 - pick the codec of every chunk
+  int sharedTable = 0; // 1 - one Huffman table per byte group
+  PyObject *dictObj = NULL; // Dictionary capsule, its tables come first
+
+  // Parse Python arguments, the buffers stay pinned until PyBuffer_Release,
+  // the optional delta base is XORed into every chunk before its split
+  if (!PyArg_ParseTuple(args, "y*y*iiiinfii|iiOy*", &job.header, &job.data,
+                        &job.numBuf, &job.bits_mode, &job.bytes_mode,
+                        &job.is_redata, &job.origChunkSize, &compThreshold,
+                        &checkThAfterPercent, &threads, &codecSelect,
+                        &sharedTable, &dictObj, &job.base)) {
+    return NULL;
+  }
+  if (job.numBuf < 1 || job.numBuf > ZIPNN_MAX_BUF ||
+      job.origChunkSize == 0) {
+    PyErr_SetString(PyExc_ValueError, "Wrong number of byte groups or chunk");
+    goto parse_failed;
+  }
+  if (job.base.buf != NULL && job.base.len != job.data.len) {
+    PyErr_SetString(PyExc_ValueError,
+                    "The delta base must have the length of the data");
+    goto parse_failed;
+  }
+  if (get_dictionary(dictObj, job.numBuf, &job.dict) != 0)
+    goto parse_failed;
+
+  // Everything up to the result object is plain C, so other Python threads
+  // can run (read files, parse safetensors, decompress another tensor)
+  PyObject *errType;
+  const char *errMsg;
+  Py_BEGIN_ALLOW_THREADS
+  errMsg = compress_jobs(&job, 1, codecSelect, sharedTable, compThreshold,
+                         checkThAfterPercent, threads, &errType);
+  Py_END_ALLOW_THREADS
+  PyBuffer_Release(&job.header);
+  PyBuffer_Release(&job.data);
+  PyBuffer_Release(&job.base);
+
+  if (errMsg) {
+    compression_job_free(&job);
+    PyErr_SetString(errType, errMsg);
+    return NULL;
+  }
+
+  // The memoryview owns resultBuf, no copy and no leak
+  uint8_t *resultBuf = job.resultBuf;
+  job.resultBuf = NULL;
+  compression_job_free(&job);
+  return zipnn_buffer_to_memoryview(resultBuf, job.resBufSize);
+
+parse_failed:
+  PyBuffer_Release(&job.header);
+  PyBuffer_Release(&job.data);
+  PyBuffer_Release(&job.base);
+  return NULL;
+}
+
+/*
+ * compress_batch(jobs, compThreshold, checkThAfterPercent, threads,
+ * codecSelect, sharedTable): compresses many inputs in one call, every job is
+ * a tuple (header, data, numBuf, bits_mode, bytes_mode, is_redata, chunk
+ * size, dictionary or None[, delta base]). The chunks of all the jobs share the workers, so
+ * small inputs do not leave them idle. Returns a list with the output of
+ * every job, the same as zipnn_core gives for it.
+ */
+PyObject *py_compress_batch(PyObject *self, PyObject *args) {
+  PyObject *jobList;
+  uint32_t checkThAfterPercent, threads;
+  float compThreshold;
+  int codecSelect, sharedTable;
+
+  if (!PyArg_ParseTuple(args, "O!fiiii", &PyList_Type, &jobList,
+                        &compThreshold, &checkThAfterPercent, &threads,
+                        &codecSelect, &sharedTable)) {
+    return NULL;
+  }
+  Py_ssize_t numJobs = PyList_GET_SIZE(jobList);
+  CompressionJob *jobs = calloc(numJobs > 0 ? numJobs : 1,
+                                sizeof(CompressionJob));
+  if (!jobs)
+    return PyErr_NoMemory();
+  PyObject *result = NULL;
+  Py_ssize_t parsed = 0;
+
+  for (; parsed < numJobs; parsed++) {
+    CompressionJob *job = &jobs[parsed];
+    PyObject *item = PyList_GET_ITEM(jobList, parsed);
+    PyObject *dictObj = Py_None;
+    if (!PyTuple_Check(item)) {
+      PyErr_SetString(PyExc_TypeError,
+                      "a job is a tuple (header, data, numBuf, bits_mode, "
+                      "bytes_mode, is_redata, chunk, dict[, base])");
+      goto batch_done;
     }
-    if (compressedData) {
-      for (uint32_t b = 0; b < numBuf; b++) {
-	if (compressedData[b] != NULL) {
-          free(compressedData[b]);
-	}
-      }
-      free(compressedData);
+    if (!PyArg_ParseTuple(item, "y*y*iiiin|Oy*", &job->header, &job->data,
+                          &job->numBuf, &job->bits_mode, &job->bytes_mode,
+                          &job->is_redata, &job->origChunkSize, &dictObj,
+                          &job->base))
+      goto batch_done;
+    if (job->numBuf < 1 || job->numBuf > ZIPNN_MAX_BUF ||
+        job->origChunkSize == 0) {
+      PyErr_SetString(PyExc_ValueError,
+                      "Wrong number of byte groups or chunk");
+      parsed++;
+      goto batch_done;
     }
-    if (compChunksType) {
-      for (uint32_t b = 0; b < numBuf; b++) {
-	if (compChunksType[b] != NULL) {
-          free(compChunksType[b]);
-	}
-      }
-      free(compChunksType);
+    if (job->base.buf != NULL && job->base.len != job->data.len) {
+      PyErr_SetString(PyExc_ValueError,
+                      "The delta base must have the length of the data");
+      parsed++;
+      goto batch_done;
     }
-    if (compChunksSize) {
-      for (uint32_t b = 0; b < numBuf; b++) {
-	if (compChunksSize[b]) {
-          free(compChunksSize[b]);
-	}
-      }
-      free(compChunksSize);
+    if (get_dictionary(dictObj, job->numBuf, &job->dict) != 0) {
+      parsed++;
+      goto batch_done;
     }
-    return NULL;
+  }
+
+  PyObject *errType;
+  const char *errMsg;
+  Py_BEGIN_ALLOW_THREADS
+  errMsg = compress_jobs(jobs, numJobs, codecSelect, sharedTable,
+                         compThreshold, checkThAfterPercent, threads,
+                         &errType);
+  Py_END_ALLOW_THREADS
+  if (errMsg) {
+    PyErr_SetString(errType, errMsg);
+    goto batch_done;
+  }
+
+  result = PyList_New(numJobs);
+  for (Py_ssize_t j = 0; result != NULL && j < numJobs; j++) {
+    // The memoryview owns resultBuf, no copy and no leak
+    PyObject *view =
+        zipnn_buffer_to_memoryview(jobs[j].resultBuf, jobs[j].resBufSize);
+    jobs[j].resultBuf = NULL;
+    if (view == NULL)
+      Py_CLEAR(result);
+    else
+      PyList_SET_ITEM(result, j, view);
+  }
+
+batch_done:
+  // Every parsed job holds its buffers until here
+  for (Py_ssize_t j = 0; j < parsed; j++) {
+    PyBuffer_Release(&jobs[j].header);
+    PyBuffer_Release(&jobs[j].data);
+    PyBuffer_Release(&jobs[j].base);
+    compression_job_free(&jobs[j]);
+  }
+  free(jobs);
+  return result;
 }
 
 ////////////////////////////////////////////////////////////////////////////
@@ -718,8 +1269,7 @@ continue_processing:
 //    - No need for thread coordination beyond getting next chunk ID
 // 3. Decompresses data chunks in parallel using worker threads, with each
 // thread:
-//    --  Handling both Huffman-compressed and uncompressed data (in the Future
-//    adding other compression methods)
+//    --  Handling Huffman, FSE, zstd, all-zero and uncompressed chunks
 //    --  Having direct access to its input/output locations
 //    -- Working completely independently once it has its chunk assignment
 // 4. Combines multiple buffers back into original format without requiring
@@ -729,7 +1279,7 @@ continue_processing:
 
 // 1. Parses compressed data format including metadata
 // 2. Decompresses data chunks in parallel using worker threads
-// 3. Handles both Huffman-compressed and uncompressed data
+// 3. Handles Huffman, FSE, zstd, all-zero and uncompressed chunks
 // 4. Combines multiple buffers back into original format
 // 5. Manages memory safely with proper cleanup
 // 6. Supports both 16-bit (2 buffer) and 32-bit (4 buffer) data types
@@ -737,131 +1287,517 @@ continue_processing:
 // The implementation includes thread synchronization, error handling, and
 // careful memory management to ensure reliable decompression of data. Cop
 
+/*
+ * One input of a decompression call, the chunk index of data compressed by
+ * py_zipnn_core and the original bytes [offset, offset + length) to return.
+ * Only the chunks covering the range are decoded.
+ */
+
+typedef struct {
+  Py_buffer data;                   // Input compressed data buffer
+  ZipnnDictionary *dict;            // Dictionary tables, or NULL
+  uint32_t numBuf;                  // Number of buffers (1, 2 or 4)
+  uint32_t bits_mode;               // Bit reordering mode
+  uint32_t bytes_mode;              // Byte grouping mode
+  size_t origChunkSize;             // Original size of each chunk
+  size_t origSize;                  // Original total data size
+  size_t offset;                    // First original byte to return
+  size_t length;                    // Original bytes to return
+  size_t numChunks;                 // Total number of chunks in the data
+  size_t firstChunk;                // First chunk to process, to resultBuf
+  size_t endChunk;                  // One past the last chunk to process
+  size_t coverStart;                // Original offset of the first chunk
+  size_t coverLen;                  // Original bytes of the chunks
+  const uint8_t *compChunksType;    // [numBuf][numChunks] types, in data
+  size_t *compChunksPos;            // [numBuf][numChunks + 1] chunk positions
+  uint8_t *ptrCompressData[ZIPNN_MAX_BUF];  // Compressed data of every buffer
+  HUF_DTable *sharedDTables[ZIPNN_MAX_BUF]; // Shared Huffman table per buffer
+  HUF_DTable *ownedDTables[ZIPNN_MAX_BUF];  // The ones read from the stream
+  uint8_t *resultBuf;               // Final output buffer
+  uint8_t *outBuf;                  // Caller buffer to decode into, or NULL
+  const uint8_t *base;              // Delta base of origSize bytes, or NULL
+} DecompressionJob;
+
 /*
  * Structure for thread-specific decompression data
  * Holds all necessary information for parallel decompression of data chunks
  */
 
 typedef struct {
-  size_t chunk_id;           // Total number of chunks to process
-  uint32_t numBuf;           // Number of buffers (2 or 4)
-  uint32_t bits_mode;        // Bit reordering mode
-  uint32_t bytes_mode;       // Byte grouping mode
-  uint8_t **ptrCompressData; // Array of pointers to compressed data buffers
-  uint32_t(*compChunksType); // Array of compression types for each chunk
-  size_t(
-      *compCumulativeChunksPos);  // Cumulative positions for compressed chunks
-  size_t(*compChunksLen);         // Length of each compressed chunk
-  uint8_t *resultBuf;             // Final output buffer
-  uint8_t ***deCompressedDataPtr; // array for decompressed data
-  size_t(*decompLen);             // Length of decompressed chunks
-  size_t origChunkSize;           // Original size of each chunk
-  pthread_mutex_t *next_chunk_mutex; // Mutex for thread synchronization
-  size_t *next_chunk;                // Next chunk to be processed
+  DecompressionJob *jobs; // The inputs of the call
+  uint32_t maxNumBuf;     // Most buffers of a job
+  size_t scratchSize;     // Capacity of one byte group scratch
+  ChunkQueue *queue;      // The chunks of all the jobs
+  uint64_t busyNs;        // CPU time of all the tasks
 } ChunkThreadData;
 
+// Original bytes of buffer b of chunk c, the last chunk gives the remainder
+// of its length to the first buffers
+static size_t chunk_group_len(const DecompressionJob *job, size_t c,
+                              uint32_t b) {
+  if (c < job->numChunks - 1)
+    return job->origChunkSize / job->numBuf;
+  size_t lastLen = job->origSize - job->origChunkSize * (job->numChunks - 1);
+  return lastLen / job->numBuf + (b < lastLen % job->numBuf ? 1 : 0);
+}
+
 /*
- * Worker thread function for parallel decompression
- * Each thread processes chunks independently using thread-safe mechanisms
+ * Builds the single (X1) or double symbols (X2) decoding table of a shared
+ * Huffman table. Returns NULL on failure, with *corrupted (if not NULL) set
+ * when the table itself doesn't read.
  */
 
-static void *decompression_chunk_worker(void *arg) {
-  ChunkThreadData *data = (ChunkThreadData *)arg;
-  size_t current_chunk;
-  while (1) {
-    // Get next chunk to process
-    pthread_mutex_lock(data->next_chunk_mutex);
-    current_chunk = (*data->next_chunk)++;
-    pthread_mutex_unlock(data->next_chunk_mutex);
-
-    if (current_chunk >= data->chunk_id) {
-      break; // No more chunks to process
+static HUF_DTable *read_shared_dtable(const uint8_t *table, size_t tableLen,
+                                      int doubleSymbols, int *corrupted) {
+  HUF_DTable *dtable =
+      malloc(HUF_DTABLE_SIZE(HUF_TABLELOG_MAX) * sizeof(HUF_DTable));
+  if (corrupted)
+    *corrupted = 0;
+  if (!dtable)
+    return NULL;
+  size_t readSize;
+  if (!doubleSymbols) {
+    dtable[0] = (uint32_t)(HUF_TABLELOG_MAX - 1) * 0x01000001;
+    readSize = HUF_readDTableX1(dtable, table, tableLen);
+  } else {
+    dtable[0] = (uint32_t)HUF_TABLELOG_MAX * 0x01000001;
+    readSize = HUF_readDTableX2(dtable, table, tableLen);
+  }
+  if (HUF_isError(readSize) || readSize != tableLen) {
+    free(dtable);
+    if (corrupted)
+      *corrupted = 1;
+    return NULL;
+  }
+  return dtable;
+}
+
+/*
+ * Decodes a compressed (not stored) chunk of dstLen bytes into dst, returns 0
+ * on success. The zstd context of the task is created on its first zstd chunk.
+ */
+
+static int decode_chunk(uint8_t type, uint8_t *dst, size_t dstLen,
+                        const uint8_t *src, size_t srcLen,
+                        const HUF_DTable *sharedDTable, ZSTD_DCtx **zstdCtx) {
+  size_t decompressedSize;
+  switch (type) {
+  case ZIPNN_CHUNK_HUFFMAN:
+    decompressedSize = HUF_decompress(dst, dstLen, src, srcLen);
+    return HUF_isError(decompressedSize) ? -1 : 0;
+
+  case ZIPNN_CHUNK_HUFFMAN_SHARED:
+    if (sharedDTable == NULL)
+      return -1;
+    decompressedSize =
+        HUF_decompress4X_usingDTable(dst, dstLen, src, srcLen, sharedDTable);
+    return HUF_isError(decompressedSize) || decompressedSize != dstLen ? -1
+                                                                       : 0;
+
+  case ZIPNN_CHUNK_FSE:
+    decompressedSize = FSE_decompress(dst, dstLen, src, srcLen);
+    return FSE_isError(decompressedSize) || decompressedSize != dstLen ? -1
+                                                                       : 0;
+
+  case ZIPNN_CHUNK_ZSTD:
+    if (*zstdCtx == NULL) {
+      *zstdCtx = ZSTD_createDCtx();
+      if (*zstdCtx == NULL)
+        return -1;
+      ZIPNN_STAT_ADD(decompress_allocs, 1);
     }
+    decompressedSize = ZSTD_decompressDCtx(*zstdCtx, dst, dstLen, src, srcLen);
+    return ZSTD_isError(decompressedSize) || decompressedSize != dstLen ? -1
+                                                                        : 0;
+
+  case ZIPNN_CHUNK_ZERO:
+    memset(dst, 0, dstLen);
+    return 0;
+
+  default:
+    return -1;
+  }
+}
 
-    // Track which buffers need cleanup
-    int freeDeCompressedDataPtr[data->numBuf];
-    // Process each buffer for current chunk
-    for (uint32_t b = 0; b < data->numBuf; b++) {
-      // Handle uncompressed data
-      if (data->compChunksType[b * data->chunk_id + current_chunk] == 0) {
-        freeDeCompressedDataPtr[b] = 0;
-        // Calculate pointer to uncompressed data
-        data->deCompressedDataPtr[b][current_chunk] =
-            data->ptrCompressData[b] +
-            data->compCumulativeChunksPos[b * (data->chunk_id + 1) +
-                                          current_chunk];
-        // Handle Huffman compressed data
-      } else if (data->compChunksType[b * data->chunk_id + current_chunk] ==
-                 1) {
-        size_t decomp_length =
-            data->decompLen[current_chunk * data->numBuf + b];
-
-        // Allocate buffer for decompressed data
-        data->deCompressedDataPtr[b][current_chunk] = malloc(decomp_length);
-        freeDeCompressedDataPtr[b] = 1;
-        if (!data->deCompressedDataPtr[b][current_chunk]) {
-          pthread_exit((void *)-1);
-        }
-
-        // Huffman decompression
-        size_t decompressedSize = HUF_decompress(
-            data->deCompressedDataPtr[b][current_chunk], decomp_length,
-            (void *)(data->ptrCompressData[b] +
-                     data->compCumulativeChunksPos[b * (data->chunk_id + 1) +
-                                                   current_chunk]),
-            data->compChunksLen[b * data->chunk_id + current_chunk]);
-        if (HUF_isError(decompressedSize)) {
-          free(data->deCompressedDataPtr[b][current_chunk]);
-          pthread_exit((void *)-1);
-        }
+/*
+ * Decodes chunk c of a job to its place in the result, scratch holds the
+ * decoded byte groups. A delta job XORs the chunk with its base once it is
+ * combined. Returns 0 on success.
+ */
+
+static int decompress_chunk(const DecompressionJob *job, size_t current_chunk,
+                            uint8_t **scratch, ZSTD_DCtx **zstdCtx) {
+  uint32_t numBuf = job->numBuf;
+  // Decoded (or stored) data of every buffer for current chunk
+  uint8_t *deCompressedDataPtr[numBuf];
+  size_t decompLen[numBuf];
+  uint8_t *combinePtr =
+      job->resultBuf + job->origChunkSize * (current_chunk - job->firstChunk);
+
+  // Process each buffer for current chunk
+  for (uint32_t b = 0; b < numBuf; b++) {
+    uint8_t type = job->compChunksType[b * job->numChunks + current_chunk];
+    const size_t *pos =
+        &job->compChunksPos[b * (job->numChunks + 1) + current_chunk];
+    uint8_t *chunkData = job->ptrCompressData[b] + pos[0];
+    decompLen[b] = chunk_group_len(job, current_chunk, b);
+    // Handle uncompressed data, it is used where it is
+    if (type == ZIPNN_CHUNK_RAW) {
+      deCompressedDataPtr[b] = chunkData;
+      // Handle compressed data
+    } else {
+      deCompressedDataPtr[b] = numBuf == 1 ? combinePtr : scratch[b];
+      if (decode_chunk(type, deCompressedDataPtr[b], decompLen[b], chunkData,
+                       pos[1] - pos[0], job->sharedDTables[b],
+                       zstdCtx) != 0) {
+        return -1;
       }
     }
+  }
 
-    // Combine decompressed buffers into final output
-    uint8_t *combinePtr = data->resultBuf + data->origChunkSize * current_chunk;
-    // Handle 8-bit (1 buffer)
-    if (data->numBuf == 1) {
-      size_t *current_decompLen = &data->decompLen[current_chunk * data->numBuf];
-      memcpy(combinePtr, data->deCompressedDataPtr[0][current_chunk], current_decompLen[0]);
+  // Combine decompressed buffers into final output, the byte groups are
+  // interleaved and reverted tile by tile while the chunk is still in cache
+  int status = 0;
+  // Handle 8-bit (1 buffer), only a stored chunk is left to copy
+  if (numBuf == 1) {
+    if (deCompressedDataPtr[0] != combinePtr) {
+      memcpy(combinePtr, deCompressedDataPtr[0], decompLen[0]);
     }
     // Handle 16-bit (2 buffer) or 32-bit (4 buffer) data types
-    else if (data->numBuf == 2) {
-      // Get decompLen array for current chunk
-      size_t *current_decompLen =
-          &data->decompLen[current_chunk * data->numBuf];
-
-      if (combine_buffers_dtype16(data->deCompressedDataPtr[0][current_chunk],
-                                  data->deCompressedDataPtr[1][current_chunk],
-                                  combinePtr, current_decompLen,
-                                  data->bits_mode, data->bytes_mode) != 0) {
-        pthread_exit((void *)-1);
-      }
-    } else { // 4 buffer case
-      // Get decompLen array for current chunk
-      size_t *current_decompLen =
-          &data->decompLen[current_chunk * data->numBuf];
-
-      if (combine_buffers_dtype32(data->deCompressedDataPtr[0][current_chunk],
-                                  data->deCompressedDataPtr[1][current_chunk],
-                                  data->deCompressedDataPtr[2][current_chunk],
-                                  data->deCompressedDataPtr[3][current_chunk],
-                                  combinePtr, current_decompLen,
-                                  data->bits_mode, data->bytes_mode) != 0) {
-        pthread_exit((void *)-1);
+  } else if (numBuf == 2) {
+    status = combine_buffers_dtype16(deCompressedDataPtr[0],
+                                     deCompressedDataPtr[1], combinePtr,
+                                     decompLen, job->bits_mode,
+                                     job->bytes_mode);
+  } else {
+    status = combine_buffers_dtype32(
+        deCompressedDataPtr[0], deCompressedDataPtr[1], deCompressedDataPtr[2],
+        deCompressedDataPtr[3], combinePtr, decompLen, job->bits_mode,
+        job->bytes_mode);
+  }
+  if (status == 0 && job->base != NULL) {
+    size_t chunkLen = 0;
+    for (uint32_t b = 0; b < numBuf; b++)
+      chunkLen += decompLen[b];
+    xor_into(combinePtr, job->base + job->origChunkSize * current_chunk,
+             chunkLen);
+  }
+  return status;
+}
+
+/*
+ * Worker thread function for parallel decompression
+ * Each thread processes chunks independently using thread-safe mechanisms
+ */
+
+static void *decompression_chunk_worker(void *arg) {
+  ChunkThreadData *data = (ChunkThreadData *)arg;
+  size_t job = 0, current_chunk;
+  void *status = NULL;
+  uint64_t startNs = thread_cpu_ns();
+
+  // Scratch for the decoded byte groups, reused for every chunk of this task.
+  // A single group is decoded straight into the result, it needs none.
+  uint8_t *scratch[ZIPNN_MAX_BUF] = {NULL};
+  ZSTD_DCtx *zstdCtx = NULL;
+  if (data->maxNumBuf > 1) {
+    for (uint32_t b = 0; b < data->maxNumBuf; b++) {
+      scratch[b] = malloc(data->scratchSize);
+      if (!scratch[b]) {
+        status = (void *)-1;
+        goto worker_done;
       }
     }
-    for (uint32_t b = 0; b < data->numBuf; b++) {
-      if (freeDeCompressedDataPtr[b] == 1) {
-        free(data->deCompressedDataPtr[b][current_chunk]);
+    ZIPNN_STAT_ADD(decompress_allocs, data->maxNumBuf);
+  }
+
+  // No more chunks to process ends the task
+  while (chunk_queue_next(data->queue, &job, &current_chunk) == 0) {
+    const DecompressionJob *current = &data->jobs[job];
+    if (decompress_chunk(current, current->firstChunk + current_chunk,
+                         scratch, &zstdCtx) != 0) {
+      status = (void *)-1;
+      break;
+    }
+  }
+
+worker_done:
+  // The caller raises the error, if any
+  for (uint32_t b = 0; b < ZIPNN_MAX_BUF; b++) {
+    free(scratch[b]);
+  }
+  ZSTD_freeDCtx(zstdCtx);
+  __atomic_fetch_add(&data->busyNs, thread_cpu_ns() - startNs,
+                     __ATOMIC_RELAXED);
+  return status;
+}
+
+// The error of compressed data whose index doesn't fit it
+static const char *corrupted_data(PyObject **errType) {
+  *errType = PyExc_ValueError;
+  return "The compressed data is corrupted";
+}
+
+/*
+ * Parses the chunk index and shared tables of a job and allocates the result
+ * for the chunks covering its range. The data may be any bytes of a file (a
+ * range or a memory map of it), every size of the index is checked against the
+ * data before a chunk is decoded. Runs without the GIL, returns an error
+ * message (and sets *errType) or NULL.
+ */
+
+static const char *decompression_job_prepare(DecompressionJob *job,
+                                             PyObject **errType) {
+  uint32_t numBuf = job->numBuf;
+  size_t origChunkSize = job->origChunkSize;
+  *errType = PyExc_MemoryError;
+
+  if (job->length == 0) {
+    job->coverStart = job->offset;
+    job->resultBuf = job->outBuf ? job->outBuf : zipnn_buffer_alloc(0);
+    return job->resultBuf ? NULL : "Failed to allocate resultBuf";
+  }
+  // Calculate chunk and buffer sizes
+  if (origChunkSize == 0)
+    return corrupted_data(errType);
+  size_t numChunks = (job->origSize + origChunkSize - 1) / origChunkSize;
+  const uint8_t *dataEnd = (const uint8_t *)job->data.buf + job->data.len;
+  // The chunk types and the cumulative sizes must fit the data
+  if (numChunks > (size_t)job->data.len / (numBuf * (1 + sizeof(size_t))))
+    return corrupted_data(errType);
+  job->numChunks = numChunks;
+  // The chunks covering the range, they are decoded to the start of resultBuf
+  job->firstChunk = job->offset / origChunkSize;
+  job->endChunk = (job->offset + job->length + origChunkSize - 1) /
+                  origChunkSize;
+  job->coverStart = job->firstChunk * origChunkSize;
+  job->coverLen = (job->endChunk == numChunks ? job->origSize
+                                              : job->endChunk * origChunkSize) -
+                  job->coverStart;
+
+  // Only the byte grouping is checked, the buffers are always equal
+  uint32_t oneBufRatio[ZIPNN_MAX_BUF];
+  if ((numBuf == 2 && buffer_ratio_dtype16(job->bytes_mode, oneBufRatio) == -1) ||
+      (numBuf == 4 && buffer_ratio_dtype32(job->bytes_mode, oneBufRatio) == -1))
+    return corrupted_data(errType);
+
+  // Parse input buffer layout - data is organized as:
+  // [chunk types][cumulative sizes][shared Huffman tables]
+  // [compressed data for each buffer]
+  const uint8_t *ptrChunksType = job->data.buf;
+  const uint8_t *ptrChunksCumulative = ptrChunksType + numBuf * numChunks;
+  uint8_t *ptrSharedTables =
+      (uint8_t *)ptrChunksCumulative + numBuf * numChunks * sizeof(size_t);
+  job->compChunksType = ptrChunksType;
+
+  for (size_t i = 0; i < numBuf * numChunks; i++) {
+    // 0 - no compression, 1 - Huffman, 2 - FSE, 3 - zstd, 4 - all zero,
+    // 5 - Huffman with the shared table
+    if (ptrChunksType[i] > ZIPNN_CHUNK_HUFFMAN_SHARED)
+      return corrupted_data(errType);
+  }
+
+  // Position markers for chunks, the cumulative sizes after a leading zero
+  job->compChunksPos = malloc(numBuf * (numChunks + 1) * sizeof(size_t));
+  if (!job->compChunksPos)
+    return "Failed to allocate the chunk positions";
+  ZIPNN_STAT_ADD(decompress_allocs, 1);
+  for (uint32_t b = 0; b < numBuf; b++) {
+    size_t *pos = &job->compChunksPos[b * (numChunks + 1)];
+    pos[0] = 0;
+    memcpy(pos + 1, ptrChunksCumulative + b * numChunks * sizeof(size_t),
+           numChunks * sizeof(size_t));
+    // The sizes only grow, a stored chunk holds exactly its original bytes
+    for (size_t c = 0; c < numChunks; c++) {
+      if (pos[c + 1] < pos[c] ||
+          (ptrChunksType[b * numChunks + c] == ZIPNN_CHUNK_RAW &&
+           pos[c + 1] - pos[c] != chunk_group_len(job, c, b)))
+        return corrupted_data(errType);
+    }
+  }
+
+  // The shared table of every buffer with a shared chunk, decoded once and
+  // used by all the workers
+  for (uint32_t b = 0; b < numBuf; b++) {
+    const uint8_t *types = ptrChunksType + b * numChunks;
+    const size_t *pos = &job->compChunksPos[b * (numChunks + 1)];
+    const uint8_t *shared = memchr(types, ZIPNN_CHUNK_HUFFMAN_SHARED, numChunks);
+    if (shared == NULL)
+      continue;
+    size_t firstShared = shared - types;
+    // The single or double symbols decoder is picked like HUF_decompress
+    // does, from the sizes of a chunk that uses the table
+    int doubleSymbols =
+        HUF_selectDecoder(chunk_group_len(job, firstShared, b),
+                          pos[firstShared + 1] - pos[firstShared]) != 0;
+    uint16_t tableLen;
+    if ((size_t)(dataEnd - ptrSharedTables) < sizeof(uint16_t))
+      return corrupted_data(errType);
+    memcpy(&tableLen, ptrSharedTables, sizeof(uint16_t));
+    ptrSharedTables += sizeof(uint16_t);
+    if (tableLen == ZIPNN_TABLE_DICT_REF) {
+      uint32_t dictId;
+      if ((size_t)(dataEnd - ptrSharedTables) < sizeof(uint32_t))
+        return corrupted_data(errType);
+      memcpy(&dictId, ptrSharedTables, sizeof(uint32_t));
+      ptrSharedTables += sizeof(uint32_t);
+      if (job->dict == NULL || job->dict->id != dictId ||
+          job->dict->tables[b].table == NULL) {
+        *errType = PyExc_ValueError;
+        return "The data was compressed with a dictionary that was not given";
       }
+      job->sharedDTables[b] =
+          doubleSymbols ? job->dict->dtableX2[b] : job->dict->dtableX1[b];
+      continue;
     }
+    if ((size_t)(dataEnd - ptrSharedTables) < tableLen)
+      return corrupted_data(errType);
+    int corrupted;
+    job->ownedDTables[b] = read_shared_dtable(ptrSharedTables, tableLen,
+                                              doubleSymbols, &corrupted);
+    if (job->ownedDTables[b] == NULL)
+      return corrupted ? corrupted_data(errType)
+                       : "Failed to read a shared Huffman table";
+    ZIPNN_STAT_ADD(decompress_allocs, 1);
+    job->sharedDTables[b] = job->ownedDTables[b];
+    ptrSharedTables += tableLen;
+  }
+
+  // The compressed data of all the buffers must fit what is left
+  size_t dataLeft = dataEnd - ptrSharedTables;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    size_t bufLen = job->compChunksPos[(b + 1) * (numChunks + 1) - 1];
+    if (bufLen > dataLeft)
+      return corrupted_data(errType);
+    dataLeft -= bufLen;
+  }
+
+  job->ptrCompressData[0] = ptrSharedTables;
+  for (uint32_t b = 1; b < numBuf; b++) {
+    job->ptrCompressData[b] = job->ptrCompressData[b - 1] +
+                              job->compChunksPos[b * (numChunks + 1) - 1];
+  }
+
+  // The caller buffer holds exactly the whole original data
+  if (job->outBuf) {
+    job->resultBuf = job->outBuf;
+    return NULL;
+  }
+  job->resultBuf = zipnn_buffer_alloc(job->coverLen);
+  if (!job->resultBuf)
+    return "Failed to allocate resultBuf";
+  ZIPNN_STAT_ADD(decompress_allocs, 1);
+  ZIPNN_STAT_ADD(decompress_bytes, job->coverLen);
+  return NULL;
+}
+
+/*
+ * Decompresses all the jobs, their chunks share one queue of worker tasks.
+ * Runs without the GIL. Returns an error message (and sets *errType) or NULL.
+ */
+
+static const char *decompress_jobs(DecompressionJob *jobs, size_t numJobs,
+                                   uint32_t threads, PyObject **errType) {
+  size_t jobStart[numJobs + 1];
+  uint32_t maxNumBuf = 1;
+  size_t scratchSize = 0;
+  size_t totalBytes = 0;
+
+  jobStart[0] = 0;
+  for (size_t j = 0; j < numJobs; j++) {
+    const char *errMsg = decompression_job_prepare(&jobs[j], errType);
+    if (errMsg)
+      return errMsg;
+    jobStart[j + 1] = jobStart[j] + (jobs[j].endChunk - jobs[j].firstChunk);
+    totalBytes += jobs[j].coverLen;
+    if (jobs[j].numBuf > maxNumBuf)
+      maxNumBuf = jobs[j].numBuf;
+    if (jobs[j].numBuf > 1 &&
+        jobs[j].origChunkSize / jobs[j].numBuf + 1 > scratchSize)
+      scratchSize = jobs[j].origChunkSize / jobs[j].numBuf + 1;
+  }
+
+  ////////////// Multi threading /////////////////////////////
+  ChunkQueue queue = {.mutex = PTHREAD_MUTEX_INITIALIZER,
+                      .next = 0,
+                      .numJobs = numJobs,
+                      .jobStart = jobStart};
+  ChunkThreadData thread_data = {.jobs = jobs,
+                                 .maxNumBuf = maxNumBuf,
+                                 .scratchSize = scratchSize,
+                                 .queue = &queue,
+                                 .busyNs = 0};
+
+  // Run the decompression tasks on the worker pool
+  int status = zipnn_pool_run(
+      decompression_chunk_worker, &thread_data, 0,
+      tasks_for_work(&decompressCost, threads, jobStart[numJobs], totalBytes));
+  pthread_mutex_destroy(&queue.mutex);
+  task_cost_update(&decompressCost, thread_data.busyNs, totalBytes);
+  if (status != 0) {
+    *errType = PyExc_RuntimeError;
+    return "Thread processing failed";
+  }
+  return NULL;
+}
+
+// Frees what decompress_jobs allocated, the result buffer unless it was taken
+// or belongs to the caller
+static void decompression_job_free(DecompressionJob *job) {
+  for (uint32_t b = 0; b < ZIPNN_MAX_BUF; b++) {
+    free(job->ownedDTables[b]);
+    job->ownedDTables[b] = NULL;
   }
+  free(job->compChunksPos);
+  job->compChunksPos = NULL;
+  if (job->resultBuf != job->outBuf)
+    zipnn_buffer_free(job->resultBuf);
+  job->resultBuf = NULL;
+}
 
-  pthread_exit(NULL);
+// The range of a decompressed job, it owns the result buffer of the job
+static PyObject *decompression_job_result(DecompressionJob *job) {
+  // The memoryview owns resultBuf, no copy and no leak
+  PyObject *result = zipnn_buffer_to_memoryview(job->resultBuf, job->coverLen);
+  job->resultBuf = NULL;
+  if (result == NULL ||
+      (job->offset == job->coverStart && job->length == job->coverLen))
+    return result;
+  // A slice of the covering chunks, it keeps resultBuf alive
+  PyObject *slice =
+      PySequence_GetSlice(result, job->offset - job->coverStart,
+                          job->offset - job->coverStart + job->length);
+  Py_DECREF(result);
+  return slice;
 }
 
 ///////////////////////////////////////////////////////////
 ///////////////////////////////////////////////////////////
+/*
+ * Decompresses a single job, see DecompressionJob. Releases its data.
+ */
+///////////////////////////////////////////////////////////
+///////////////////////////////////////////////////////////
+
+static PyObject *decompress_chunks(DecompressionJob *job, uint32_t threads) {
+  PyObject *errType;
+  const char *errMsg;
+
+  // From here on only plain C runs, let other Python threads progress
+  Py_BEGIN_ALLOW_THREADS
+  errMsg = decompress_jobs(job, 1, threads, &errType);
+  Py_END_ALLOW_THREADS
+  PyBuffer_Release(&job->data);
+
+  PyObject *result = NULL;
+  if (errMsg)
+    PyErr_SetString(errType, errMsg);
+  else
+    result = decompression_job_result(job);
+  decompression_job_free(job);
+  return result;
+}
+
 /*
  * Main Python-callable decompression function
  * Handles decompression of data compressed by py_zipnn_core
@@ -874,291 +1810,480 @@ static void *decompression_chunk_worker(void *arg) {
  * - origChunkSize: Original size of each chunk
  * - origSize: Original total data size
  * - threads: Number of worker threads to use
+ * - dict: Dictionary of the referenced shared tables, optional
  */
-///////////////////////////////////////////////////////////
-///////////////////////////////////////////////////////////
-
 PyObject *py_combine_dtype(PyObject *self, PyObject *args) {
-  Py_buffer data;
-  // clock_t sTime, eTime;
-  // sTime = clock();
-  // Calculate chunk and buffer sizes
-  uint32_t numBuf, bits_mode, bytes_mode, threads;
-  size_t origChunkSize, origSize;
+  DecompressionJob job = {0};
+  uint32_t threads;
+  PyObject *dictObj = NULL;
+
+  // Parse Python arguments, the buffer stays pinned until PyBuffer_Release
+  if (!PyArg_ParseTuple(args, "y*iiinni|O", &job.data, &job.numBuf,
+                        &job.bits_mode, &job.bytes_mode, &job.origChunkSize,
+                        &job.origSize, &threads, &dictObj)) {
+    return NULL;
+  }
+  if (job.numBuf < 1 || job.numBuf > ZIPNN_MAX_BUF ||
+      job.origChunkSize == 0) {
+    PyBuffer_Release(&job.data);
+    PyErr_SetString(PyExc_ValueError, "Wrong number of byte groups or chunk");
+    return NULL;
+  }
+  if (get_dictionary(dictObj, job.numBuf, &job.dict) != 0) {
+    PyBuffer_Release(&job.data);
+    return NULL;
+  }
+  job.length = job.origSize;
+  return decompress_chunks(&job, threads);
+}
+
+/*
+ * Python-callable byte range decompression, the arguments of combine_dtype
+ * followed by the offset and length of the original bytes to return
+ */
+PyObject *py_decompress_range(PyObject *self, PyObject *args) {
+  DecompressionJob job = {0};
+  uint32_t threads;
+  PyObject *dictObj = NULL;
+
+  if (!PyArg_ParseTuple(args, "y*iiinnnni|O", &job.data, &job.numBuf,
+                        &job.bits_mode, &job.bytes_mode, &job.origChunkSize,
+                        &job.origSize, &job.offset, &job.length, &threads,
+                        &dictObj)) {
+    return NULL;
+  }
+  if (job.numBuf < 1 || job.numBuf > ZIPNN_MAX_BUF ||
+      job.origChunkSize == 0) {
+    PyBuffer_Release(&job.data);
+    PyErr_SetString(PyExc_ValueError, "Wrong number of byte groups or chunk");
+    return NULL;
+  }
+  if (get_dictionary(dictObj, job.numBuf, &job.dict) != 0) {
+    PyBuffer_Release(&job.data);
+    return NULL;
+  }
+  if (job.offset > job.origSize || job.length > job.origSize - job.offset) {
+    PyBuffer_Release(&job.data);
+    PyErr_SetString(PyExc_ValueError, "Range is out of the original data");
+    return NULL;
+  }
+  return decompress_chunks(&job, threads);
+}
+
+/*
+ * decompress_into(data, numBuf, bits_mode, bytes_mode, chunk, origSize, out,
+ * threads, dict, base): the arguments of combine_dtype and a writable buffer
+ * of exactly origSize bytes, the combined output is written straight into it.
+ * With a delta base of origSize bytes every chunk is XORed with it in place.
+ */
+PyObject *py_decompress_into(PyObject *self, PyObject *args) {
+  DecompressionJob job = {0};
+  Py_buffer out;
+  Py_buffer base = {0};
+  uint32_t threads;
+  PyObject *dictObj = NULL;
+
+  if (!PyArg_ParseTuple(args, "y*iiinnw*i|Oy*", &job.data, &job.numBuf,
+                        &job.bits_mode, &job.bytes_mode, &job.origChunkSize,
+                        &job.origSize, &out, &threads, &dictObj, &base)) {
+    return NULL;
+  }
+  const char *argError = NULL;
+  if (job.numBuf < 1 || job.numBuf > ZIPNN_MAX_BUF || job.origChunkSize == 0)
+    argError = "Wrong number of byte groups or chunk";
+  else if ((size_t)out.len != job.origSize)
+    argError = "The output buffer must have the length of the original data";
+  else if (base.buf != NULL && (size_t)base.len != job.origSize)
+    argError = "The delta base must have the length of the original data";
+  if (argError != NULL || get_dictionary(dictObj, job.numBuf, &job.dict) != 0) {
+    if (argError != NULL)
+      PyErr_SetString(PyExc_ValueError, argError);
+    PyBuffer_Release(&job.data);
+    PyBuffer_Release(&out);
+    PyBuffer_Release(&base);
+    return NULL;
+  }
+  job.length = job.origSize;
+  job.outBuf = out.buf;
+  job.base = base.buf;
+
+  PyObject *errType;
+  const char *errMsg;
+  Py_BEGIN_ALLOW_THREADS
+  errMsg = decompress_jobs(&job, 1, threads, &errType);
+  Py_END_ALLOW_THREADS
+  PyBuffer_Release(&job.data);
+  decompression_job_free(&job);
+  PyBuffer_Release(&out);
+  PyBuffer_Release(&base);
+  if (errMsg) {
+    PyErr_SetString(errType, errMsg);
+    return NULL;
+  }
+  Py_RETURN_NONE;
+}
+
+/*
+ * xor_into(out, a, b): writes a ^ b into out, all three of the same length,
+ * for the delta compression of the codecs without byte grouping
+ */
+PyObject *py_xor_into(PyObject *self, PyObject *args) {
+  Py_buffer out, a, b;
 
-  if (!PyArg_ParseTuple(args, "y*iiinni", &data, &numBuf, &bits_mode,
-                        &bytes_mode, &origChunkSize, &origSize, &threads)) {
+  if (!PyArg_ParseTuple(args, "w*y*y*", &out, &a, &b)) {
+    return NULL;
+  }
+  if (a.len != out.len || b.len != out.len) {
+    PyBuffer_Release(&out);
+    PyBuffer_Release(&a);
+    PyBuffer_Release(&b);
+    PyErr_SetString(PyExc_ValueError, "The buffers must have the same length");
     return NULL;
   }
-  size_t numChunks = (origSize + origChunkSize - 1) / origChunkSize;
-  uint32_t unCompChunkSize[numChunks][numBuf];
-  uint32_t oneBufRatio[numBuf];
-  uint32_t oneUnCompChunkSize[numBuf];
+  Py_BEGIN_ALLOW_THREADS
+  xor_copy(out.buf, a.buf, b.buf, out.len);
+  Py_END_ALLOW_THREADS
+  PyBuffer_Release(&out);
+  PyBuffer_Release(&a);
+  PyBuffer_Release(&b);
+  Py_RETURN_NONE;
+}
 
-  // Handle buffer ratio calculations based on data type (16-bit or 32-bit)
-  if (1) { // TBD when support auto byte_reorder
-    if (numBuf == 1){
-      // Do nothing
+/*
+ * decompress_batch(jobs, threads): decompresses many inputs in one call,
+ * every job is a tuple (data, numBuf, bits_mode, bytes_mode, chunk size,
+ * original size, dictionary or None[, out[, base]]) like the arguments of
+ * combine_dtype. The chunks of all the jobs share the workers. A job with a
+ * writable out buffer of its original size decodes straight into it, e.g. the
+ * frames of a streaming file into their offsets of one output, and a job with
+ * a delta base of that size too is XORed with it chunk by chunk. Returns a
+ * list with the decompressed data of every job, None for the jobs with an out.
+ */
+PyObject *py_decompress_batch(PyObject *self, PyObject *args) {
+  PyObject *jobList;
+  uint32_t threads;
+
+  if (!PyArg_ParseTuple(args, "O!i", &PyList_Type, &jobList, &threads)) {
+    return NULL;
+  }
+  Py_ssize_t numJobs = PyList_GET_SIZE(jobList);
+  DecompressionJob *jobs = calloc(numJobs > 0 ? numJobs : 1,
+                                  sizeof(DecompressionJob));
+  // The out and the base of every job
+  Py_buffer *outs = calloc(numJobs > 0 ? 2 * numJobs : 1, sizeof(Py_buffer));
+  if (!jobs || !outs) {
+    free(jobs);
+    free(outs);
+    return PyErr_NoMemory();
+  }
+  Py_buffer *bases = outs + numJobs;
+  PyObject *result = NULL;
+  Py_ssize_t parsed = 0;
+
+  for (; parsed < numJobs; parsed++) {
+    DecompressionJob *job = &jobs[parsed];
+    PyObject *item = PyList_GET_ITEM(jobList, parsed);
+    PyObject *dictObj = Py_None;
+    if (!PyTuple_Check(item)) {
+      PyErr_SetString(PyExc_TypeError,
+                      "a job is a tuple (data, numBuf, bits_mode, "
+                      "bytes_mode, chunk, original size, dict[, out[, "
+                      "base]])");
+      goto batch_done;
     }
-    else if (numBuf == 2) {
-      if (buffer_ratio_dtype16(bytes_mode, oneBufRatio) == -1) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to calculate bufffer ratio");
-        return NULL; //
-      }
-    } else { // numBuf == 4
-      if (buffer_ratio_dtype32(bytes_mode, oneBufRatio) == -1) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to calculate bufffer ratio");
-        return NULL;
-      }
+    if (!PyArg_ParseTuple(item, "y*iiinn|Ow*y*", &job->data, &job->numBuf,
+                          &job->bits_mode, &job->bytes_mode,
+                          &job->origChunkSize, &job->origSize, &dictObj,
+                          &outs[parsed], &bases[parsed]))
+      goto batch_done;
+    job->length = job->origSize;
+    job->outBuf = outs[parsed].buf;
+    job->base = bases[parsed].buf;
+    if (job->numBuf < 1 || job->numBuf > ZIPNN_MAX_BUF ||
+        job->origChunkSize == 0) {
+      PyErr_SetString(PyExc_ValueError,
+                      "Wrong number of byte groups or chunk");
+      parsed++;
+      goto batch_done;
     }
-    for (uint32_t b = 0; b < numBuf; b++) {
-      oneBufRatio[b] = numBuf;
-      oneUnCompChunkSize[b] = origChunkSize / oneBufRatio[b];
+    if (job->outBuf && (size_t)outs[parsed].len != job->origSize) {
+      PyErr_SetString(
+          PyExc_ValueError,
+          "The output buffer must have the length of the original data");
+      parsed++;
+      goto batch_done;
     }
-    for (size_t c = 0; c < numChunks; c++) {
-      for (uint32_t b = 0; b < numBuf; b++) {
-        unCompChunkSize[c][b] = oneUnCompChunkSize[b];
-      }
+    if (job->base && (size_t)bases[parsed].len != job->origSize) {
+      PyErr_SetString(
+          PyExc_ValueError,
+          "The delta base must have the length of the original data");
+      parsed++;
+      goto batch_done;
+    }
+    if (get_dictionary(dictObj, job->numBuf, &job->dict) != 0) {
+      parsed++;
+      goto batch_done;
     }
-  } else {
-    // TBD when support dynamic byte_reorder
   }
 
-  // Parse input buffer layout - data is organized as:
-  // [chunk types][cumulative sizes][compressed data for each buffer]
-  uint8_t *ptrChunksType = (uint8_t *)data.buf;
-  size_t *ptrChunksCumulative = (size_t *)(ptrChunksType + numBuf * numChunks);
-  uint8_t *ptrCompressData[numBuf];
-  ptrCompressData[0] = (uint8_t *)(ptrChunksCumulative + numBuf * numChunks);
-
-  // Arrays to track compression metadata
-  size_t cumulativeChunksSize[numBuf]
-                             [numChunks];     // Cumulative size for each chunk
-  uint32_t compChunksType[numBuf][numChunks]; // Compression type for each chunk
-  size_t compCumulativeChunksPos[numBuf]
-                                [numChunks + 1]; // Position markers for chunks
-  size_t compChunksLen[numBuf][numChunks]; // Length of each compressed chunk
-
-  // Initialize decompression buffers and metadata
-  uint8_t *resultBuf = NULL; // Final output buffer
-  size_t decompLen[numChunks]
-                  [numBuf]; // Decompressed length for each chunk/buffer
-  uint8_t ***deCompressedDataPtr =
-      malloc(numBuf * sizeof(uint8_t **)); //[numBuf][numChunks]
-  if (deCompressedDataPtr == NULL) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate deCompressedDataPtr");
-    goto decompression_error;
+  PyObject *errType;
+  const char *errMsg;
+  Py_BEGIN_ALLOW_THREADS
+  errMsg = decompress_jobs(jobs, numJobs, threads, &errType);
+  Py_END_ALLOW_THREADS
+  if (errMsg) {
+    PyErr_SetString(errType, errMsg);
+    goto batch_done;
   }
-  for (uint32_t b = 0; b < numBuf; b++) {
-    deCompressedDataPtr[b] = malloc(numChunks * sizeof(uint8_t *));
-    if (deCompressedDataPtr[b] == NULL) {
-       PyErr_SetString(PyExc_MemoryError, "Failed to allocate deCompressedDataPtr[b]");
-       goto decompression_error;
-    }
-    for (size_t c = 0; c < numChunks; c++) {
-      deCompressedDataPtr[b][c] = NULL;
+
+  result = PyList_New(numJobs);
+  for (Py_ssize_t j = 0; result != NULL && j < numJobs; j++) {
+    PyObject *view;
+    if (jobs[j].outBuf) {
+      view = Py_None;
+      Py_INCREF(view);
+    } else {
+      view = decompression_job_result(&jobs[j]);
     }
+    if (view == NULL)
+      Py_CLEAR(result);
+    else
+      PyList_SET_ITEM(result, j, view);
   }
 
-  // Calculate positions for the decompression
-  for (uint32_t b = 0; b < numBuf; b++) {
-    compCumulativeChunksPos[b][0] = 0;
-    compCumulativeChunksPos[b][0] = 0;
+batch_done:
+  // Every parsed job holds its buffers until here
+  for (Py_ssize_t j = 0; j < parsed; j++) {
+    PyBuffer_Release(&jobs[j].data);
+    decompression_job_free(&jobs[j]);
+    if (outs[j].obj != NULL)
+      PyBuffer_Release(&outs[j]);
+    if (bases[j].obj != NULL)
+      PyBuffer_Release(&bases[j]);
   }
+  free(jobs);
+  free(outs);
+  return result;
+}
 
-  for (uint32_t b = 0; b < numBuf; b++) {
-    for (size_t c = 0; c < numChunks; c++) {
-      compChunksType[b][c] = (*ptrChunksType++);
-      cumulativeChunksSize[b][c] = (*ptrChunksCumulative++);
-    }
+////////////////////////////////////////////////////////////////////////////
+//////////////////////////   Dictionaries //////////////////////////////////
+////////////////////////////////////////////////////////////////////////////
+
+/*
+ * train_tables(data, numBuf, bits_mode, bytes_mode, chunk): the shared table
+ * of every byte group built from all the chunks of data (samples of tensors
+ * of one dtype). Returns [uint16 length][HUF_writeCTable] per group, the
+ * length is 0 for a group without a table.
+ */
+PyObject *py_train_tables(PyObject *self, PyObject *args) {
+  Py_buffer data;
+  uint32_t numBuf, bits_mode, bytes_mode;
+  size_t origChunkSize;
+
+  if (!PyArg_ParseTuple(args, "y*iiin", &data, &numBuf, &bits_mode,
+                        &bytes_mode, &origChunkSize)) {
+    return NULL;
   }
-  for (size_t c = 0; c < numChunks; c++) {
-    for (uint32_t b = 0; b < numBuf; b++) {
-      compCumulativeChunksPos[b][c + 1] = cumulativeChunksSize[b][c];
-      compChunksLen[b][c] =
-          compCumulativeChunksPos[b][c + 1] - compCumulativeChunksPos[b][c];
-    }
+  if (numBuf < 1 || numBuf > ZIPNN_MAX_BUF || origChunkSize == 0 ||
+      data.len == 0) {
+    PyBuffer_Release(&data);
+    PyErr_SetString(PyExc_ValueError, "Nothing to train the tables on");
+    return NULL;
+  }
+  size_t numChunks = (data.len + origChunkSize - 1) / origChunkSize;
+  SharedTable tables[numBuf];
+  int status;
+
+  Py_BEGIN_ALLOW_THREADS
+  status = build_shared_tables(data.buf, NULL, data.len, origChunkSize,
+                               numChunks, numChunks, numBuf, bits_mode,
+                               bytes_mode, 0, tables);
+  Py_END_ALLOW_THREADS
+  PyBuffer_Release(&data);
+  if (status != 0) {
+    PyErr_SetString(PyExc_MemoryError, "Failed to build the tables");
+    return NULL;
   }
 
-  for (size_t c = 0; c < numChunks; c++) {
-    for (uint32_t b = 0; b < numBuf; b++) {
-
-      if (compChunksType[b][c] == 0) {
-        // No compression is needed
-      } else {
-        if (compChunksType[b][c] == 1) {
-          // Open with Huffman compression
-        } else {
-          //printf("Unexpected compress type: compChunksType[%u][%zu] = %d\n", b, c, compChunksType[b][c]);
-          PyErr_SetString(
-              PyExc_MemoryError,
-              "Compress Type is not correct in Decompression function");
-          return NULL;
-        }
-      }
-    }
+  uint8_t out[ZIPNN_MAX_BUF * (sizeof(uint16_t) + HUF_CTABLEBOUND)];
+  size_t outLen = 0;
+  for (uint32_t b = 0; b < numBuf; b++) {
+    uint16_t tableLen = tables[b].table != NULL ? tables[b].serializedLen : 0;
+    memcpy(out + outLen, &tableLen, sizeof(uint16_t));
+    memcpy(out + outLen + sizeof(uint16_t), tables[b].serialized, tableLen);
+    outLen += sizeof(uint16_t) + tableLen;
   }
+  return PyBytes_FromStringAndSize((const char *)out, outLen);
+}
 
-  for (uint32_t b = 1; b < numBuf; b++) {
-    ptrCompressData[b] =
-        ptrCompressData[b - 1] + cumulativeChunksSize[b - 1][numChunks - 1];
+static void dictionary_free(ZipnnDictionary *dict) {
+  for (uint32_t b = 0; b < ZIPNN_MAX_BUF; b++) {
+    free(dict->dtableX1[b]);
+    free(dict->dtableX2[b]);
   }
-  for (size_t c = 0; c < numChunks; c++) {
-    if (c < numChunks - 1) {
-      for (uint32_t b = 0; b < numBuf; b++) {
-        decompLen[c][b] = unCompChunkSize[c][b];
-      }
-    } else {
-      size_t oneChunkSize = 0;
-      for (uint32_t b = 0; b < numBuf; b++) {
-        oneChunkSize += unCompChunkSize[0][b];
-      }
+  free(dict);
+}
 
-      size_t lastDecompLen =
-          (origSize - oneChunkSize * (numChunks - 1)) / numBuf;
-      uint32_t remainder = (origSize - oneChunkSize * (numChunks - 1)) % numBuf;
-      for (uint32_t b = 0; b < numBuf; b++) {
-        if (b < remainder) {
-          decompLen[c][b] = lastDecompLen + 1;
-        } else {
-          decompLen[c][b] = lastDecompLen;
-        }
-      }
+static void dictionary_capsule_destructor(PyObject *capsule) {
+  dictionary_free(PyCapsule_GetPointer(capsule, ZIPNN_DICT_CAPSULE));
+}
+
+/*
+ * load_dictionary(tables, numBuf, id): a capsule with the tables of
+ * train_tables ready for compression and decompression (the decoding tables
+ * are built here once). id is stored in the streams that use it.
+ */
+PyObject *py_load_dictionary(PyObject *self, PyObject *args) {
+  Py_buffer tables;
+  uint32_t numBuf, id;
+
+  if (!PyArg_ParseTuple(args, "y*iI", &tables, &numBuf, &id)) {
+    return NULL;
+  }
+  if (numBuf < 1 || numBuf > ZIPNN_MAX_BUF || id == 0) {
+    PyBuffer_Release(&tables);
+    PyErr_SetString(PyExc_ValueError, "Wrong number of byte groups or id");
+    return NULL;
+  }
+  ZipnnDictionary *dict = calloc(1, sizeof(ZipnnDictionary));
+  if (!dict) {
+    PyBuffer_Release(&tables);
+    return PyErr_NoMemory();
+  }
+  dict->id = id;
+  dict->numBuf = numBuf;
+
+  const uint8_t *ptr = tables.buf;
+  const uint8_t *end = ptr + tables.len;
+  const char *errMsg = NULL;
+  for (uint32_t b = 0; b < numBuf && !errMsg; b++) {
+    SharedTable *table = &dict->tables[b];
+    uint16_t tableLen;
+    if (end - ptr < (ptrdiff_t)sizeof(uint16_t)) {
+      errMsg = "The dictionary tables are truncated";
+      break;
+    }
+    memcpy(&tableLen, ptr, sizeof(uint16_t));
+    ptr += sizeof(uint16_t);
+    if (tableLen == 0)
+      continue;
+    if (tableLen > HUF_CTABLEBOUND || end - ptr < tableLen) {
+      errMsg = "The dictionary tables are truncated";
+      break;
     }
+    unsigned maxSymbolValue = HUF_SYMBOLVALUE_MAX;
+    unsigned hasZeroWeights;
+    size_t readSize =
+        HUF_readCTable((HUF_CElt *)table->ctable, &maxSymbolValue, ptr,
+                       tableLen, &hasZeroWeights);
+    dict->dtableX1[b] = read_shared_dtable(ptr, tableLen, 0, NULL);
+    dict->dtableX2[b] = read_shared_dtable(ptr, tableLen, 1, NULL);
+    if (HUF_isError(readSize) || readSize != tableLen ||
+        !dict->dtableX1[b] || !dict->dtableX2[b]) {
+      errMsg = "Failed to read a dictionary table";
+      break;
+    }
+    memcpy(table->serialized, ptr, tableLen);
+    table->serializedLen = tableLen;
+    table->maxSymbolValue = maxSymbolValue;
+    table->dictId = id;
+    table->table = (HUF_CElt *)table->ctable;
+    ptr += tableLen;
   }
-
-  resultBuf = malloc(origSize);
-  if (!resultBuf) {
-        PyErr_SetString(PyExc_MemoryError, "Failed to allocate resultBuf");
-        goto decompression_error;
+  PyBuffer_Release(&tables);
+  if (errMsg) {
+    dictionary_free(dict);
+    PyErr_SetString(PyExc_ValueError, errMsg);
     return NULL;
   }
-  // eTime = clock();
-  // double metadataTime = (double)(eTime - sTime) / CLOCKS_PER_SEC;
-  //  printf ("metadataTime %f\n", metadataTime);
 
-  //  clock_t startTime, endTime;
-  //  startTime = clock();
-  // struct timeval startTimeReal, endTimeReal;
-  // gettimeofday(&startTimeReal, NULL);
+  PyObject *capsule =
+      PyCapsule_New(dict, ZIPNN_DICT_CAPSULE, dictionary_capsule_destructor);
+  if (!capsule)
+    dictionary_free(dict);
+  return capsule;
+}
 
-  ////////////// Multi threading /////////////////////////////
-  pthread_t *thread_handles = NULL;
-  ChunkThreadData *thread_data = NULL;
-  pthread_mutex_t next_chunk_mutex = PTHREAD_MUTEX_INITIALIZER;
-  size_t next_chunk = 0;
-  int mutex_initialized = 1;
-  thread_handles = malloc(threads * sizeof(pthread_t));
-  thread_data = malloc(threads * sizeof(ChunkThreadData));
-  if (!thread_handles || !thread_data) {
-    PyErr_SetString(PyExc_MemoryError, "Failed to allocate thread resources");
-    goto cleanup_threads;
-  }
-
-  // Create threads
-  for (uint32_t i = 0; i < threads; i++) {
-    thread_data[i] = (ChunkThreadData){
-        .chunk_id = numChunks,
-        .numBuf = numBuf,
-        .bits_mode = bits_mode,
-        .bytes_mode = bytes_mode,
-        .ptrCompressData = ptrCompressData,
-        .compChunksType = (uint32_t *)compChunksType,
-        .compCumulativeChunksPos = (size_t *)compCumulativeChunksPos,
-        .compChunksLen = (size_t *)compChunksLen,
-        .resultBuf = resultBuf,
-        .deCompressedDataPtr = deCompressedDataPtr,
-        .decompLen = (size_t *)decompLen,
-        .origChunkSize = origChunkSize,
-        .next_chunk_mutex = &next_chunk_mutex,
-        .next_chunk = &next_chunk
-
-    };
-    if (pthread_create(&thread_handles[i], NULL, decompression_chunk_worker,
-                       &thread_data[i]) != 0) {
-      PyErr_SetString(PyExc_RuntimeError, "Failed to create thread");
-      goto cleanup_threads;
-    }
-  }
+////////////////////////////////////////////////////////////////////////////
+//////////////////////   Allocation statistics ////////////////////////////
+////////////////////////////////////////////////////////////////////////////
 
-  // Wait for all threads
-  for (uint32_t i = 0; i < threads; i++) {
-    void *thread_result;
-    pthread_join(thread_handles[i], &thread_result);
-    if (thread_result != NULL) {
-      PyErr_SetString(PyExc_RuntimeError, "Thread processing failed");
-      goto cleanup_threads;
-    }
-  }
-  free(thread_handles);
-  free(thread_data);
-  pthread_mutex_destroy(&next_chunk_mutex);
-  mutex_initialized = 0;
-  goto continue_processing;
-
-cleanup_threads:
-  if (thread_handles)
-    free(thread_handles);
-  if (thread_data)
-    free(thread_data);
-  if (mutex_initialized)
-    pthread_mutex_destroy(&next_chunk_mutex);
-  goto decompression_error;
-  return NULL;
+// get_alloc_stats(): allocation calls and bytes processed since the module
+// was loaded (or the last reset_alloc_stats), plus allocation calls per GB,
+// the byte group bytes stored without compression and how many of them
+// skipped the entropy coder after an early abort
+PyObject *py_get_alloc_stats(PyObject *self, PyObject *args) {
+  uint64_t compress_allocs =
+      __atomic_load_n(&alloc_stats.compress_allocs, __ATOMIC_RELAXED);
+  uint64_t compress_bytes =
+      __atomic_load_n(&alloc_stats.compress_bytes, __ATOMIC_RELAXED);
+  uint64_t stored_bytes =
+      __atomic_load_n(&alloc_stats.stored_bytes, __ATOMIC_RELAXED);
+  uint64_t skipped_bytes =
+      __atomic_load_n(&alloc_stats.skipped_bytes, __ATOMIC_RELAXED);
+  uint64_t decompress_allocs =
+      __atomic_load_n(&alloc_stats.decompress_allocs, __ATOMIC_RELAXED);
+  uint64_t decompress_bytes =
+      __atomic_load_n(&alloc_stats.decompress_bytes, __ATOMIC_RELAXED);
+  double gb = 1024.0 * 1024.0 * 1024.0;
+
+  return Py_BuildValue(
+      "{s:K,s:K,s:d,s:K,s:K,s:K,s:K,s:d}", "compress_allocs",
+      (unsigned long long)compress_allocs, "compress_bytes",
+      (unsigned long long)compress_bytes, "compress_allocs_per_gb",
+      compress_bytes ? compress_allocs / (compress_bytes / gb) : 0.0,
+      "stored_bytes", (unsigned long long)stored_bytes,
+      "entropy_skipped_bytes", (unsigned long long)skipped_bytes,
+      "decompress_allocs", (unsigned long long)decompress_allocs,
+      "decompress_bytes", (unsigned long long)decompress_bytes,
+      "decompress_allocs_per_gb",
+      decompress_bytes ? decompress_allocs / (decompress_bytes / gb) : 0.0);
+}
 
-  ////////////// Finish Multi threading /////////////////////////////
-  PyObject *py_result;
-  //   endTime = clock();
-  //   double decompressTime = (double)(endTime - startTime) / CLOCKS_PER_SEC;
-  // gettimeofday(&endTimeReal, NULL);
-  // double decompressTimeReal =
-  //    (endTimeReal.tv_sec - startTimeReal.tv_sec) +
-  //     (endTimeReal.tv_usec - startTimeReal.tv_usec) / 1e6;
-  //   printf ("thread decompressTime %f\n", decompressTime);
-  // printf("Real thread time: %f seconds\n", decompressTimeReal);
-
-  // clock_t sT, eT;
-  // sT = clock();
-
-  Py_buffer view; // create buffer to avoid copy
-continue_processing:
-  PyBuffer_FillInfo(&view, NULL, resultBuf, origSize, 0, PyBUF_WRITABLE);
-  py_result = PyMemoryView_FromBuffer(&view);
-  // eT = clock();
-  // double resultTime = (double)(eT - sT) / CLOCKS_PER_SEC;
-  //   printf ("resultTime %f\n", resultTime);
-
-  // sT = clock();
-  for (uint32_t b = 0; b < numBuf; b++) {
-    free(deCompressedDataPtr[b]);
-  }
-  free(deCompressedDataPtr);
-  // eT = clock();
-  // double freeTime = (double)(eT - sT) / CLOCKS_PER_SEC;
-  //   printf ("free %f\n", freeTime);
-
-  //  free(resultBuf);
-  //  PyBuffer_Release(&data);
-  return py_result;
-
-  // Handle Error
-  decompression_error:
-   if (deCompressedDataPtr) {
-     for (uint32_t b = 0; b < numBuf; b++) {
-       for (size_t c = 0; c < numChunks; c++) {
-         if (deCompressedDataPtr[b][c] != NULL) {	     
-           free(deCompressedDataPtr[b][c]);
-	 }
-       }
-       if (deCompressedDataPtr[b] != NULL) {	     
-           free(deCompressedDataPtr[b]);
-       }
-     }
-    free(deCompressedDataPtr);
-  }
-
-  if (resultBuf) {
-    free(resultBuf);	  
+/*
+ * get_task_stats(): the measured CPU time per KB of compression and
+ * decompression and the number of calls that ran inline or on the pool
+ */
+PyObject *py_get_task_stats(PyObject *self, PyObject *args) {
+  return Py_BuildValue(
+      "{s:K,s:K,s:K,s:K,s:K,s:K}", "compress_ns_per_kb",
+      (unsigned long long)__atomic_load_n(&compressCost.nsPerKb,
+                                          __ATOMIC_RELAXED),
+      "compress_inline_calls",
+      (unsigned long long)__atomic_load_n(&compressCost.inlineCalls,
+                                          __ATOMIC_RELAXED),
+      "compress_pool_calls",
+      (unsigned long long)__atomic_load_n(&compressCost.poolCalls,
+                                          __ATOMIC_RELAXED),
+      "decompress_ns_per_kb",
+      (unsigned long long)__atomic_load_n(&decompressCost.nsPerKb,
+                                          __ATOMIC_RELAXED),
+      "decompress_inline_calls",
+      (unsigned long long)__atomic_load_n(&decompressCost.inlineCalls,
+                                          __ATOMIC_RELAXED),
+      "decompress_pool_calls",
+      (unsigned long long)__atomic_load_n(&decompressCost.poolCalls,
+                                          __ATOMIC_RELAXED));
+}
+
+// set_adaptive_threads(enabled): with False every call runs as many tasks as
+// its threads and chunks allow, for measuring
+PyObject *py_set_adaptive_threads(PyObject *self, PyObject *args) {
+  int enabled;
+  if (!PyArg_ParseTuple(args, "p", &enabled)) {
+    return NULL;
   }
-  return NULL;
+  __atomic_store_n(&adaptiveTasks, enabled, __ATOMIC_RELAXED);
+  Py_RETURN_NONE;
+}
+
+PyObject *py_reset_alloc_stats(PyObject *self, PyObject *args) {
+  __atomic_store_n(&alloc_stats.compress_allocs, 0, __ATOMIC_RELAXED);
+  __atomic_store_n(&alloc_stats.compress_bytes, 0, __ATOMIC_RELAXED);
+  __atomic_store_n(&alloc_stats.stored_bytes, 0, __ATOMIC_RELAXED);
+  __atomic_store_n(&alloc_stats.skipped_bytes, 0, __ATOMIC_RELAXED);
+  __atomic_store_n(&alloc_stats.decompress_allocs, 0, __ATOMIC_RELAXED);
+  __atomic_store_n(&alloc_stats.decompress_bytes, 0, __ATOMIC_RELAXED);
+  Py_RETURN_NONE;
 }
@@ -8,5 +8,7 @@ PyObject *py_zipnn_core(PyObject *self, PyObject *args);
 PyObject *py_combine_dtype(PyObject *self, PyObject *args);
 PyObject *py_zipnn_core32(PyObject *self, PyObject *args);
 PyObject *py_combine_dtype32(PyObject *self, PyObject *args);
+PyObject *py_get_alloc_stats(PyObject *self, PyObject *args);
+PyObject *py_reset_alloc_stats(PyObject *self, PyObject *args);
 
 #endif // SPLIT_FUNCTIONS_H
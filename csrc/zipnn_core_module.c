@@ -1,9 +1,21 @@
+#include "zipnn_buffer.h"
 #include "zipnn_core_functions.h"
+#include "zipnn_simd.h"
+#include "zipnn_thread_pool.h"
 #include <Python.h>
 
 // Declare functions from other source files
 extern PyObject *py_zipnn_core(PyObject *, PyObject *);
 extern PyObject *py_combine_dtype(PyObject *, PyObject *);
+extern PyObject *py_decompress_range(PyObject *, PyObject *);
+extern PyObject *py_compress_batch(PyObject *, PyObject *);
+extern PyObject *py_decompress_batch(PyObject *, PyObject *);
+extern PyObject *py_decompress_into(PyObject *, PyObject *);
+extern PyObject *py_xor_into(PyObject *, PyObject *);
+extern PyObject *py_train_tables(PyObject *, PyObject *);
+extern PyObject *py_get_task_stats(PyObject *, PyObject *);
+extern PyObject *py_set_adaptive_threads(PyObject *, PyObject *);
+extern PyObject *py_load_dictionary(PyObject *, PyObject *);
 
 // Method definitions
 static PyMethodDef SplitMethods[] = {
@@ -11,6 +23,57 @@ static PyMethodDef SplitMethods[] = {
      "Split a bytearray into four buffers using dtype16"},
     {"combine_dtype", py_combine_dtype, METH_VARARGS,
      "Combine four buffers into a single bytearray using dtype16"},
+    {"decompress_range", py_decompress_range, METH_VARARGS,
+     "Decompress only the chunks covering an original byte range, the "
+     "arguments of combine_dtype followed by offset and length"},
+    {"decompress_into", py_decompress_into, METH_VARARGS,
+     "Decompress straight into a writable buffer of the original length, the "
+     "arguments of combine_dtype with the buffer before threads"},
+    {"xor_into", py_xor_into, METH_VARARGS,
+     "Write a ^ b into out, three buffers of the same length"},
+    {"compress_batch", py_compress_batch, METH_VARARGS,
+     "Compress a list of inputs in one call, their chunks share the workers"},
+    {"decompress_batch", py_decompress_batch, METH_VARARGS,
+     "Decompress a list of inputs in one call, their chunks share the "
+     "workers"},
+    {"train_tables", py_train_tables, METH_VARARGS,
+     "Build the Huffman table of every byte group from all the chunks of the "
+     "data, for a dictionary"},
+    {"load_dictionary", py_load_dictionary, METH_VARARGS,
+     "Load the tables of train_tables with a dictionary id, the result is "
+     "passed to zipnn_core, combine_dtype and decompress_range"},
+    {"set_num_workers", py_set_num_workers, METH_VARARGS,
+     "Set the number of background workers in the native pool (-1 for the "
+     "default), the pool restarts with the new size on the next call"},
+    {"get_num_workers", py_get_num_workers, METH_NOARGS,
+     "Return the number of background workers in the native pool"},
+    {"pin_workers", py_pin_workers, METH_VARARGS,
+     "Pin worker i to cpus[i % len(cpus)], None removes the pinning"},
+    {"shutdown_pool", py_shutdown_pool, METH_NOARGS,
+     "Stop the native worker pool, it is started again when needed"},
+    {"get_alloc_stats", py_get_alloc_stats, METH_NOARGS,
+     "Return the allocation calls and bytes of compression and decompression, "
+     "the allocation calls per GB, and the bytes stored without compression "
+     "(entropy_skipped_bytes of them after an early abort)"},
+    {"reset_alloc_stats", py_reset_alloc_stats, METH_NOARGS,
+     "Reset the allocation statistics"},
+    {"get_task_stats", py_get_task_stats, METH_NOARGS,
+     "Return the measured CPU time per KB of compression and decompression "
+     "and the calls that ran inline on the calling thread or on the pool"},
+    {"set_adaptive_threads", py_set_adaptive_threads, METH_VARARGS,
+     "With False every call runs as many tasks as its threads and chunks "
+     "allow, instead of as many as its measured work is worth"},
+    {"get_simd_level", py_get_simd_level, METH_NOARGS,
+     "Return the instruction set used for byte grouping and bit reordering"},
+    {"set_simd_level", py_set_simd_level, METH_VARARGS,
+     "Use the given instruction set ('scalar', 'sse4', 'avx2', 'avx512', "
+     "'neon'), None picks the best one this CPU supports"},
+    {"supported_simd_levels", py_supported_simd_levels, METH_NOARGS,
+     "Return the instruction sets this build and CPU support"},
+    {"benchmark_kernel", py_benchmark_kernel, METH_VARARGS,
+     "Run a byte grouping kernel of the current instruction set over size "
+     "bytes for a number of iterations and return the GB/s"},
+    {NULL, NULL, 0, NULL}
 };
 
 // Module definition
@@ -19,5 +82,21 @@ static struct PyModuleDef splitmodule = {PyModuleDef_HEAD_INIT, "zipnn_core",
 
 // Module initialization function
 PyMODINIT_FUNC PyInit_zipnn_core(void) {
-  return PyModule_Create(&splitmodule);
+  // Results are memoryviews over a Buffer that owns the native memory
+  if (PyType_Ready(&ZipnnBufferType) < 0)
+    return NULL;
+
+  zipnn_simd_init();
+
+  PyObject *m = PyModule_Create(&splitmodule);
+  if (m == NULL)
+    return NULL;
+
+  Py_INCREF(&ZipnnBufferType);
+  if (PyModule_AddObject(m, "Buffer", (PyObject *)&ZipnnBufferType) < 0) {
+    Py_DECREF(&ZipnnBufferType);
+    Py_DECREF(m);
+    return NULL;
+  }
+  return m;
 }
@@ -0,0 +1,980 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include "zipnn_simd.h"
+
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define ZIPNN_SIMD_X86 1
+#include <immintrin.h>
+#endif
+
+#if defined(__aarch64__) && defined(__ARM_NEON)
+#define ZIPNN_SIMD_NEON 1
+#include <arm_neon.h>
+#endif
+
+/////////////////////////////////////////////////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+////////////////////////// SIMD Kernels ////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// The byte grouping (split / combine) and the exponent reordering run once
+// per byte of every tensor, on both compression and decompression.
+// 1. Every kernel has a scalar version, which is also used for the tails
+// 2. SSE4.1, AVX2 and AVX-512BW versions are compiled with target attributes,
+//    so the extension is built without -m flags and runs on any x86-64 CPU
+// 3. NEON versions are used on aarch64
+// 4. The instruction set is picked once at import time from cpuid (or the
+//    ZIPNN_SIMD_LEVEL environment variable) and can be changed from Python
+// All versions produce exactly the same bytes.
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  Scalar //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+static inline uint16_t load16(const uint8_t *p) {
+  uint16_t v;
+  memcpy(&v, p, sizeof(v));
+  return v;
+}
+
+static inline void store16(uint8_t *p, uint16_t v) { memcpy(p, &v, sizeof(v)); }
+
+static inline uint32_t load32(const uint8_t *p) {
+  uint32_t v;
+  memcpy(&v, p, sizeof(v));
+  return v;
+}
+
+static inline void store32(uint8_t *p, uint32_t v) { memcpy(p, &v, sizeof(v)); }
+
+// Reordering of the float bits: (sign, exponent, mantissa) ->
+// (exponent, sign, mantissa), so the exponent fills the most significant byte
+static inline uint16_t reorder_bits16(uint16_t h) {
+  return ((h << 1) & 0xFF00) | ((h >> 8) & 0x0080) | (h & 0x007F);
+}
+
+static inline uint16_t revert_bits16(uint16_t h) {
+  return ((h << 8) & 0x8000) | ((h >> 1) & 0x7F80) | (h & 0x007F);
+}
+
+static inline uint32_t reorder_bits32(uint32_t u) {
+  return ((u << 1) & 0xFF000000) | ((u >> 8) & 0x00800000) | (u & 0x007FFFFF);
+}
+
+static inline uint32_t revert_bits32(uint32_t u) {
+  return ((u << 8) & 0x80000000) | ((u >> 1) & 0x7F800000) | (u & 0x007FFFFF);
+}
+
+static void split16_scalar(const uint8_t *src, size_t n, uint8_t *dst0,
+                           uint8_t *dst1) {
+  for (size_t i = 0; i < n; i++) {
+    dst0[i] = src[2 * i];
+    dst1[i] = src[2 * i + 1];
+  }
+}
+
+static void combine16_scalar(const uint8_t *src0, const uint8_t *src1, size_t n,
+                             uint8_t *dst) {
+  for (size_t i = 0; i < n; i++) {
+    dst[2 * i] = src0[i];
+    dst[2 * i + 1] = src1[i];
+  }
+}
+
+static void split32_scalar(const uint8_t *src, size_t n, uint8_t *const *dst) {
+  for (size_t i = 0; i < n; i++) {
+    dst[0][i] = src[4 * i];
+    dst[1][i] = src[4 * i + 1];
+    dst[2][i] = src[4 * i + 2];
+    dst[3][i] = src[4 * i + 3];
+  }
+}
+
+static void combine32_scalar(const uint8_t *const *src, size_t n,
+                             uint8_t *dst) {
+  for (size_t i = 0; i < n; i++) {
+    dst[4 * i] = src[0][i];
+    dst[4 * i + 1] = src[1][i];
+    dst[4 * i + 2] = src[2][i];
+    dst[4 * i + 3] = src[3][i];
+  }
+}
+
+static void reorder16_scalar(uint8_t *buf, size_t n) {
+  for (size_t i = 0; i < n; i++) {
+    store16(buf + 2 * i, reorder_bits16(load16(buf + 2 * i)));
+  }
+}
+
+static void revert16_scalar(uint8_t *buf, size_t n) {
+  for (size_t i = 0; i < n; i++) {
+    store16(buf + 2 * i, revert_bits16(load16(buf + 2 * i)));
+  }
+}
+
+static void reorder32_scalar(uint8_t *buf, size_t n) {
+  for (size_t i = 0; i < n; i++) {
+    store32(buf + 4 * i, reorder_bits32(load32(buf + 4 * i)));
+  }
+}
+
+static void revert32_scalar(uint8_t *buf, size_t n) {
+  for (size_t i = 0; i < n; i++) {
+    store32(buf + 4 * i, revert_bits32(load32(buf + 4 * i)));
+  }
+}
+
+static const zipnn_kernels scalar_kernels = {
+    .name = "scalar",
+    .split16 = split16_scalar,
+    .combine16 = combine16_scalar,
+    .split32 = split32_scalar,
+    .combine32 = combine32_scalar,
+    .reorder16 = reorder16_scalar,
+    .revert16 = revert16_scalar,
+    .reorder32 = reorder32_scalar,
+    .revert32 = revert32_scalar,
+};
+
+// The tail of a SIMD kernel, from element i on
+static void tail_split32(const uint8_t *src, size_t i, size_t n,
+                         uint8_t *const *dst) {
+  uint8_t *rest[4] = {dst[0] + i, dst[1] + i, dst[2] + i, dst[3] + i};
+  split32_scalar(src + 4 * i, n - i, rest);
+}
+
+static void tail_combine32(const uint8_t *const *src, size_t i, size_t n,
+                           uint8_t *dst) {
+  const uint8_t *rest[4] = {src[0] + i, src[1] + i, src[2] + i, src[3] + i};
+  combine32_scalar(rest, n - i, dst + 4 * i);
+}
+
+#ifdef ZIPNN_SIMD_X86
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  SSE4.1 //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+#define ZIPNN_SSE4 __attribute__((target("sse4.1")))
+
+ZIPNN_SSE4 static void split16_sse4(const uint8_t *src, size_t n, uint8_t *dst0,
+                                    uint8_t *dst1) {
+  const __m128i mask =
+      _mm_setr_epi8(0, 2, 4, 6, 8, 10, 12, 14, 1, 3, 5, 7, 9, 11, 13, 15);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m128i a = _mm_shuffle_epi8(
+        _mm_loadu_si128((const __m128i *)(src + 2 * i)), mask);
+    __m128i b = _mm_shuffle_epi8(
+        _mm_loadu_si128((const __m128i *)(src + 2 * i + 16)), mask);
+    _mm_storeu_si128((__m128i *)(dst0 + i), _mm_unpacklo_epi64(a, b));
+    _mm_storeu_si128((__m128i *)(dst1 + i), _mm_unpackhi_epi64(a, b));
+  }
+  split16_scalar(src + 2 * i, n - i, dst0 + i, dst1 + i);
+}
+
+ZIPNN_SSE4 static void combine16_sse4(const uint8_t *src0, const uint8_t *src1,
+                                      size_t n, uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m128i a = _mm_loadu_si128((const __m128i *)(src0 + i));
+    __m128i b = _mm_loadu_si128((const __m128i *)(src1 + i));
+    _mm_storeu_si128((__m128i *)(dst + 2 * i), _mm_unpacklo_epi8(a, b));
+    _mm_storeu_si128((__m128i *)(dst + 2 * i + 16), _mm_unpackhi_epi8(a, b));
+  }
+  combine16_scalar(src0 + i, src1 + i, n - i, dst + 2 * i);
+}
+
+ZIPNN_SSE4 static void split32_sse4(const uint8_t *src, size_t n,
+                                    uint8_t *const *dst) {
+  // Gather the bytes of every group of four words, then transpose
+  const __m128i mask =
+      _mm_setr_epi8(0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    const uint8_t *s = src + 4 * i;
+    __m128i v0 = _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *)s), mask);
+    __m128i v1 =
+        _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *)(s + 16)), mask);
+    __m128i v2 =
+        _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *)(s + 32)), mask);
+    __m128i v3 =
+        _mm_shuffle_epi8(_mm_loadu_si128((const __m128i *)(s + 48)), mask);
+    __m128i t0 = _mm_unpacklo_epi32(v0, v1);
+    __m128i t1 = _mm_unpackhi_epi32(v0, v1);
+    __m128i t2 = _mm_unpacklo_epi32(v2, v3);
+    __m128i t3 = _mm_unpackhi_epi32(v2, v3);
+    _mm_storeu_si128((__m128i *)(dst[0] + i), _mm_unpacklo_epi64(t0, t2));
+    _mm_storeu_si128((__m128i *)(dst[1] + i), _mm_unpackhi_epi64(t0, t2));
+    _mm_storeu_si128((__m128i *)(dst[2] + i), _mm_unpacklo_epi64(t1, t3));
+    _mm_storeu_si128((__m128i *)(dst[3] + i), _mm_unpackhi_epi64(t1, t3));
+  }
+  tail_split32(src, i, n, dst);
+}
+
+ZIPNN_SSE4 static void combine32_sse4(const uint8_t *const *src, size_t n,
+                                      uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m128i a = _mm_loadu_si128((const __m128i *)(src[0] + i));
+    __m128i b = _mm_loadu_si128((const __m128i *)(src[1] + i));
+    __m128i c = _mm_loadu_si128((const __m128i *)(src[2] + i));
+    __m128i d = _mm_loadu_si128((const __m128i *)(src[3] + i));
+    __m128i ab_lo = _mm_unpacklo_epi8(a, b);
+    __m128i ab_hi = _mm_unpackhi_epi8(a, b);
+    __m128i cd_lo = _mm_unpacklo_epi8(c, d);
+    __m128i cd_hi = _mm_unpackhi_epi8(c, d);
+    uint8_t *o = dst + 4 * i;
+    _mm_storeu_si128((__m128i *)o, _mm_unpacklo_epi16(ab_lo, cd_lo));
+    _mm_storeu_si128((__m128i *)(o + 16), _mm_unpackhi_epi16(ab_lo, cd_lo));
+    _mm_storeu_si128((__m128i *)(o + 32), _mm_unpacklo_epi16(ab_hi, cd_hi));
+    _mm_storeu_si128((__m128i *)(o + 48), _mm_unpackhi_epi16(ab_hi, cd_hi));
+  }
+  tail_combine32(src, i, n, dst);
+}
+
+ZIPNN_SSE4 static void reorder16_sse4(uint8_t *buf, size_t n) {
+  const __m128i hi = _mm_set1_epi16(0xFF00), sign = _mm_set1_epi16(0x0080),
+                low = _mm_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i v = _mm_loadu_si128((const __m128i *)(buf + 2 * i));
+    __m128i r = _mm_or_si128(
+        _mm_or_si128(_mm_and_si128(_mm_slli_epi16(v, 1), hi),
+                     _mm_and_si128(_mm_srli_epi16(v, 8), sign)),
+        _mm_and_si128(v, low));
+    _mm_storeu_si128((__m128i *)(buf + 2 * i), r);
+  }
+  reorder16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_SSE4 static void revert16_sse4(uint8_t *buf, size_t n) {
+  const __m128i sign = _mm_set1_epi16((short)0x8000),
+                exp = _mm_set1_epi16(0x7F80), low = _mm_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i v = _mm_loadu_si128((const __m128i *)(buf + 2 * i));
+    __m128i r = _mm_or_si128(
+        _mm_or_si128(_mm_and_si128(_mm_slli_epi16(v, 8), sign),
+                     _mm_and_si128(_mm_srli_epi16(v, 1), exp)),
+        _mm_and_si128(v, low));
+    _mm_storeu_si128((__m128i *)(buf + 2 * i), r);
+  }
+  revert16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_SSE4 static void reorder32_sse4(uint8_t *buf, size_t n) {
+  const __m128i hi = _mm_set1_epi32((int)0xFF000000),
+                sign = _mm_set1_epi32(0x00800000),
+                low = _mm_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 4 <= n; i += 4) {
+    __m128i v = _mm_loadu_si128((const __m128i *)(buf + 4 * i));
+    __m128i r = _mm_or_si128(
+        _mm_or_si128(_mm_and_si128(_mm_slli_epi32(v, 1), hi),
+                     _mm_and_si128(_mm_srli_epi32(v, 8), sign)),
+        _mm_and_si128(v, low));
+    _mm_storeu_si128((__m128i *)(buf + 4 * i), r);
+  }
+  reorder32_scalar(buf + 4 * i, n - i);
+}
+
+ZIPNN_SSE4 static void revert32_sse4(uint8_t *buf, size_t n) {
+  const __m128i sign = _mm_set1_epi32((int)0x80000000),
+                exp = _mm_set1_epi32(0x7F800000),
+                low = _mm_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 4 <= n; i += 4) {
+    __m128i v = _mm_loadu_si128((const __m128i *)(buf + 4 * i));
+    __m128i r = _mm_or_si128(
+        _mm_or_si128(_mm_and_si128(_mm_slli_epi32(v, 8), sign),
+                     _mm_and_si128(_mm_srli_epi32(v, 1), exp)),
+        _mm_and_si128(v, low));
+    _mm_storeu_si128((__m128i *)(buf + 4 * i), r);
+  }
+  revert32_scalar(buf + 4 * i, n - i);
+}
+
+static const zipnn_kernels sse4_kernels = {
+    .name = "sse4",
+    .split16 = split16_sse4,
+    .combine16 = combine16_sse4,
+    .split32 = split32_sse4,
+    .combine32 = combine32_sse4,
+    .reorder16 = reorder16_sse4,
+    .revert16 = revert16_sse4,
+    .reorder32 = reorder32_sse4,
+    .revert32 = revert32_sse4,
+};
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  AVX2 //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// The byte shuffles of AVX2 stay inside 128-bit lanes, the lanes are put in
+// order with a cross-lane permute at the end
+
+#define ZIPNN_AVX2 __attribute__((target("avx2")))
+
+ZIPNN_AVX2 static void split16_avx2(const uint8_t *src, size_t n, uint8_t *dst0,
+                                    uint8_t *dst1) {
+  const __m256i mask = _mm256_setr_epi8(
+      0, 2, 4, 6, 8, 10, 12, 14, 1, 3, 5, 7, 9, 11, 13, 15, 0, 2, 4, 6, 8, 10,
+      12, 14, 1, 3, 5, 7, 9, 11, 13, 15);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m256i a = _mm256_shuffle_epi8(
+        _mm256_loadu_si256((const __m256i *)(src + 2 * i)), mask);
+    __m256i b = _mm256_shuffle_epi8(
+        _mm256_loadu_si256((const __m256i *)(src + 2 * i + 32)), mask);
+    // [even, odd | even, odd] -> [even, even | odd, odd]
+    a = _mm256_permute4x64_epi64(a, _MM_SHUFFLE(3, 1, 2, 0));
+    b = _mm256_permute4x64_epi64(b, _MM_SHUFFLE(3, 1, 2, 0));
+    _mm256_storeu_si256((__m256i *)(dst0 + i),
+                        _mm256_permute2x128_si256(a, b, 0x20));
+    _mm256_storeu_si256((__m256i *)(dst1 + i),
+                        _mm256_permute2x128_si256(a, b, 0x31));
+  }
+  split16_scalar(src + 2 * i, n - i, dst0 + i, dst1 + i);
+}
+
+ZIPNN_AVX2 static void combine16_avx2(const uint8_t *src0, const uint8_t *src1,
+                                      size_t n, uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m256i a = _mm256_loadu_si256((const __m256i *)(src0 + i));
+    __m256i b = _mm256_loadu_si256((const __m256i *)(src1 + i));
+    __m256i lo = _mm256_unpacklo_epi8(a, b);
+    __m256i hi = _mm256_unpackhi_epi8(a, b);
+    _mm256_storeu_si256((__m256i *)(dst + 2 * i),
+                        _mm256_permute2x128_si256(lo, hi, 0x20));
+    _mm256_storeu_si256((__m256i *)(dst + 2 * i + 32),
+                        _mm256_permute2x128_si256(lo, hi, 0x31));
+  }
+  combine16_scalar(src0 + i, src1 + i, n - i, dst + 2 * i);
+}
+
+ZIPNN_AVX2 static void split32_avx2(const uint8_t *src, size_t n,
+                                    uint8_t *const *dst) {
+  const __m256i mask = _mm256_setr_epi8(
+      0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15, 0, 4, 8, 12, 1, 5,
+      9, 13, 2, 6, 10, 14, 3, 7, 11, 15);
+  const __m256i order = _mm256_setr_epi32(0, 4, 1, 5, 2, 6, 3, 7);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    const uint8_t *s = src + 4 * i;
+    __m256i v0 =
+        _mm256_shuffle_epi8(_mm256_loadu_si256((const __m256i *)s), mask);
+    __m256i v1 = _mm256_shuffle_epi8(
+        _mm256_loadu_si256((const __m256i *)(s + 32)), mask);
+    __m256i v2 = _mm256_shuffle_epi8(
+        _mm256_loadu_si256((const __m256i *)(s + 64)), mask);
+    __m256i v3 = _mm256_shuffle_epi8(
+        _mm256_loadu_si256((const __m256i *)(s + 96)), mask);
+    __m256i t0 = _mm256_unpacklo_epi32(v0, v1);
+    __m256i t1 = _mm256_unpackhi_epi32(v0, v1);
+    __m256i t2 = _mm256_unpacklo_epi32(v2, v3);
+    __m256i t3 = _mm256_unpackhi_epi32(v2, v3);
+    _mm256_storeu_si256(
+        (__m256i *)(dst[0] + i),
+        _mm256_permutevar8x32_epi32(_mm256_unpacklo_epi64(t0, t2), order));
+    _mm256_storeu_si256(
+        (__m256i *)(dst[1] + i),
+        _mm256_permutevar8x32_epi32(_mm256_unpackhi_epi64(t0, t2), order));
+    _mm256_storeu_si256(
+        (__m256i *)(dst[2] + i),
+        _mm256_permutevar8x32_epi32(_mm256_unpacklo_epi64(t1, t3), order));
+    _mm256_storeu_si256(
+        (__m256i *)(dst[3] + i),
+        _mm256_permutevar8x32_epi32(_mm256_unpackhi_epi64(t1, t3), order));
+  }
+  tail_split32(src, i, n, dst);
+}
+
+ZIPNN_AVX2 static void combine32_avx2(const uint8_t *const *src, size_t n,
+                                      uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m256i a = _mm256_loadu_si256((const __m256i *)(src[0] + i));
+    __m256i b = _mm256_loadu_si256((const __m256i *)(src[1] + i));
+    __m256i c = _mm256_loadu_si256((const __m256i *)(src[2] + i));
+    __m256i d = _mm256_loadu_si256((const __m256i *)(src[3] + i));
+    __m256i ab_lo = _mm256_unpacklo_epi8(a, b);
+    __m256i ab_hi = _mm256_unpackhi_epi8(a, b);
+    __m256i cd_lo = _mm256_unpacklo_epi8(c, d);
+    __m256i cd_hi = _mm256_unpackhi_epi8(c, d);
+    __m256i o0 = _mm256_unpacklo_epi16(ab_lo, cd_lo);
+    __m256i o1 = _mm256_unpackhi_epi16(ab_lo, cd_lo);
+    __m256i o2 = _mm256_unpacklo_epi16(ab_hi, cd_hi);
+    __m256i o3 = _mm256_unpackhi_epi16(ab_hi, cd_hi);
+    uint8_t *o = dst + 4 * i;
+    _mm256_storeu_si256((__m256i *)o, _mm256_permute2x128_si256(o0, o1, 0x20));
+    _mm256_storeu_si256((__m256i *)(o + 32),
+                        _mm256_permute2x128_si256(o2, o3, 0x20));
+    _mm256_storeu_si256((__m256i *)(o + 64),
+                        _mm256_permute2x128_si256(o0, o1, 0x31));
+    _mm256_storeu_si256((__m256i *)(o + 96),
+                        _mm256_permute2x128_si256(o2, o3, 0x31));
+  }
+  tail_combine32(src, i, n, dst);
+}
+
+ZIPNN_AVX2 static void reorder16_avx2(uint8_t *buf, size_t n) {
+  const __m256i hi = _mm256_set1_epi16((short)0xFF00),
+                sign = _mm256_set1_epi16(0x0080),
+                low = _mm256_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m256i v = _mm256_loadu_si256((const __m256i *)(buf + 2 * i));
+    __m256i r = _mm256_or_si256(
+        _mm256_or_si256(_mm256_and_si256(_mm256_slli_epi16(v, 1), hi),
+                        _mm256_and_si256(_mm256_srli_epi16(v, 8), sign)),
+        _mm256_and_si256(v, low));
+    _mm256_storeu_si256((__m256i *)(buf + 2 * i), r);
+  }
+  reorder16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_AVX2 static void revert16_avx2(uint8_t *buf, size_t n) {
+  const __m256i sign = _mm256_set1_epi16((short)0x8000),
+                exp = _mm256_set1_epi16(0x7F80),
+                low = _mm256_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m256i v = _mm256_loadu_si256((const __m256i *)(buf + 2 * i));
+    __m256i r = _mm256_or_si256(
+        _mm256_or_si256(_mm256_and_si256(_mm256_slli_epi16(v, 8), sign),
+                        _mm256_and_si256(_mm256_srli_epi16(v, 1), exp)),
+        _mm256_and_si256(v, low));
+    _mm256_storeu_si256((__m256i *)(buf + 2 * i), r);
+  }
+  revert16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_AVX2 static void reorder32_avx2(uint8_t *buf, size_t n) {
+  const __m256i hi = _mm256_set1_epi32((int)0xFF000000),
+                sign = _mm256_set1_epi32(0x00800000),
+                low = _mm256_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m256i v = _mm256_loadu_si256((const __m256i *)(buf + 4 * i));
+    __m256i r = _mm256_or_si256(
+        _mm256_or_si256(_mm256_and_si256(_mm256_slli_epi32(v, 1), hi),
+                        _mm256_and_si256(_mm256_srli_epi32(v, 8), sign)),
+        _mm256_and_si256(v, low));
+    _mm256_storeu_si256((__m256i *)(buf + 4 * i), r);
+  }
+  reorder32_scalar(buf + 4 * i, n - i);
+}
+
+ZIPNN_AVX2 static void revert32_avx2(uint8_t *buf, size_t n) {
+  const __m256i sign = _mm256_set1_epi32((int)0x80000000),
+                exp = _mm256_set1_epi32(0x7F800000),
+                low = _mm256_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m256i v = _mm256_loadu_si256((const __m256i *)(buf + 4 * i));
+    __m256i r = _mm256_or_si256(
+        _mm256_or_si256(_mm256_and_si256(_mm256_slli_epi32(v, 8), sign),
+                        _mm256_and_si256(_mm256_srli_epi32(v, 1), exp)),
+        _mm256_and_si256(v, low));
+    _mm256_storeu_si256((__m256i *)(buf + 4 * i), r);
+  }
+  revert32_scalar(buf + 4 * i, n - i);
+}
+
+static const zipnn_kernels avx2_kernels = {
+    .name = "avx2",
+    .split16 = split16_avx2,
+    .combine16 = combine16_avx2,
+    .split32 = split32_avx2,
+    .combine32 = combine32_avx2,
+    .reorder16 = reorder16_avx2,
+    .revert16 = revert16_avx2,
+    .reorder32 = reorder32_avx2,
+    .revert32 = revert32_avx2,
+};
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  AVX-512 //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// The bytes are grouped inside every 128-bit lane with a byte shuffle, then
+// the lanes are put in order with one cross-lane permute
+
+#define ZIPNN_AVX512 __attribute__((target("avx512f,avx512bw")))
+
+ZIPNN_AVX512 static void split16_avx512(const uint8_t *src, size_t n,
+                                        uint8_t *dst0, uint8_t *dst1) {
+  const __m512i mask = _mm512_broadcast_i32x4(
+      _mm_setr_epi8(0, 2, 4, 6, 8, 10, 12, 14, 1, 3, 5, 7, 9, 11, 13, 15));
+  const __m512i order = _mm512_setr_epi64(0, 2, 4, 6, 1, 3, 5, 7);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m512i v = _mm512_shuffle_epi8(
+        _mm512_loadu_si512((const void *)(src + 2 * i)), mask);
+    v = _mm512_permutexvar_epi64(order, v);
+    _mm256_storeu_si256((__m256i *)(dst0 + i), _mm512_castsi512_si256(v));
+    _mm256_storeu_si256((__m256i *)(dst1 + i),
+                        _mm512_extracti64x4_epi64(v, 1));
+  }
+  split16_scalar(src + 2 * i, n - i, dst0 + i, dst1 + i);
+}
+
+ZIPNN_AVX512 static void combine16_avx512(const uint8_t *src0,
+                                          const uint8_t *src1, size_t n,
+                                          uint8_t *dst) {
+  const __m512i mask = _mm512_broadcast_i32x4(
+      _mm_setr_epi8(0, 8, 1, 9, 2, 10, 3, 11, 4, 12, 5, 13, 6, 14, 7, 15));
+  const __m512i order = _mm512_setr_epi64(0, 4, 1, 5, 2, 6, 3, 7);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m512i v = _mm512_inserti64x4(
+        _mm512_castsi256_si512(_mm256_loadu_si256((const __m256i *)(src0 + i))),
+        _mm256_loadu_si256((const __m256i *)(src1 + i)), 1);
+    v = _mm512_shuffle_epi8(_mm512_permutexvar_epi64(order, v), mask);
+    _mm512_storeu_si512((void *)(dst + 2 * i), v);
+  }
+  combine16_scalar(src0 + i, src1 + i, n - i, dst + 2 * i);
+}
+
+// Both the byte shuffle and the lane permute of split32 are 4x4 transposes,
+// so combine32 uses the same two in the reverse order
+ZIPNN_AVX512 static void split32_avx512(const uint8_t *src, size_t n,
+                                        uint8_t *const *dst) {
+  const __m512i mask = _mm512_broadcast_i32x4(
+      _mm_setr_epi8(0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15));
+  const __m512i order =
+      _mm512_setr_epi32(0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m512i v = _mm512_shuffle_epi8(
+        _mm512_loadu_si512((const void *)(src + 4 * i)), mask);
+    v = _mm512_permutexvar_epi32(order, v);
+    _mm_storeu_si128((__m128i *)(dst[0] + i), _mm512_castsi512_si128(v));
+    _mm_storeu_si128((__m128i *)(dst[1] + i), _mm512_extracti32x4_epi32(v, 1));
+    _mm_storeu_si128((__m128i *)(dst[2] + i), _mm512_extracti32x4_epi32(v, 2));
+    _mm_storeu_si128((__m128i *)(dst[3] + i), _mm512_extracti32x4_epi32(v, 3));
+  }
+  tail_split32(src, i, n, dst);
+}
+
+ZIPNN_AVX512 static void combine32_avx512(const uint8_t *const *src, size_t n,
+                                          uint8_t *dst) {
+  const __m512i mask = _mm512_broadcast_i32x4(
+      _mm_setr_epi8(0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15));
+  const __m512i order =
+      _mm512_setr_epi32(0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m512i v = _mm512_castsi128_si512(
+        _mm_loadu_si128((const __m128i *)(src[0] + i)));
+    v = _mm512_inserti32x4(v, _mm_loadu_si128((const __m128i *)(src[1] + i)),
+                           1);
+    v = _mm512_inserti32x4(v, _mm_loadu_si128((const __m128i *)(src[2] + i)),
+                           2);
+    v = _mm512_inserti32x4(v, _mm_loadu_si128((const __m128i *)(src[3] + i)),
+                           3);
+    v = _mm512_shuffle_epi8(_mm512_permutexvar_epi32(order, v), mask);
+    _mm512_storeu_si512((void *)(dst + 4 * i), v);
+  }
+  tail_combine32(src, i, n, dst);
+}
+
+ZIPNN_AVX512 static void reorder16_avx512(uint8_t *buf, size_t n) {
+  const __m512i hi = _mm512_set1_epi16((short)0xFF00),
+                sign = _mm512_set1_epi16(0x0080),
+                low = _mm512_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m512i v = _mm512_loadu_si512((const void *)(buf + 2 * i));
+    __m512i r = _mm512_or_si512(
+        _mm512_or_si512(_mm512_and_si512(_mm512_slli_epi16(v, 1), hi),
+                        _mm512_and_si512(_mm512_srli_epi16(v, 8), sign)),
+        _mm512_and_si512(v, low));
+    _mm512_storeu_si512((void *)(buf + 2 * i), r);
+  }
+  reorder16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_AVX512 static void revert16_avx512(uint8_t *buf, size_t n) {
+  const __m512i sign = _mm512_set1_epi16((short)0x8000),
+                exp = _mm512_set1_epi16(0x7F80),
+                low = _mm512_set1_epi16(0x007F);
+  size_t i = 0;
+  for (; i + 32 <= n; i += 32) {
+    __m512i v = _mm512_loadu_si512((const void *)(buf + 2 * i));
+    __m512i r = _mm512_or_si512(
+        _mm512_or_si512(_mm512_and_si512(_mm512_slli_epi16(v, 8), sign),
+                        _mm512_and_si512(_mm512_srli_epi16(v, 1), exp)),
+        _mm512_and_si512(v, low));
+    _mm512_storeu_si512((void *)(buf + 2 * i), r);
+  }
+  revert16_scalar(buf + 2 * i, n - i);
+}
+
+ZIPNN_AVX512 static void reorder32_avx512(uint8_t *buf, size_t n) {
+  const __m512i hi = _mm512_set1_epi32((int)0xFF000000),
+                sign = _mm512_set1_epi32(0x00800000),
+                low = _mm512_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m512i v = _mm512_loadu_si512((const void *)(buf + 4 * i));
+    __m512i r = _mm512_or_si512(
+        _mm512_or_si512(_mm512_and_si512(_mm512_slli_epi32(v, 1), hi),
+                        _mm512_and_si512(_mm512_srli_epi32(v, 8), sign)),
+        _mm512_and_si512(v, low));
+    _mm512_storeu_si512((void *)(buf + 4 * i), r);
+  }
+  reorder32_scalar(buf + 4 * i, n - i);
+}
+
+ZIPNN_AVX512 static void revert32_avx512(uint8_t *buf, size_t n) {
+  const __m512i sign = _mm512_set1_epi32((int)0x80000000),
+                exp = _mm512_set1_epi32(0x7F800000),
+                low = _mm512_set1_epi32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    __m512i v = _mm512_loadu_si512((const void *)(buf + 4 * i));
+    __m512i r = _mm512_or_si512(
+        _mm512_or_si512(_mm512_and_si512(_mm512_slli_epi32(v, 8), sign),
+                        _mm512_and_si512(_mm512_srli_epi32(v, 1), exp)),
+        _mm512_and_si512(v, low));
+    _mm512_storeu_si512((void *)(buf + 4 * i), r);
+  }
+  revert32_scalar(buf + 4 * i, n - i);
+}
+
+static const zipnn_kernels avx512_kernels = {
+    .name = "avx512",
+    .split16 = split16_avx512,
+    .combine16 = combine16_avx512,
+    .split32 = split32_avx512,
+    .combine32 = combine32_avx512,
+    .reorder16 = reorder16_avx512,
+    .revert16 = revert16_avx512,
+    .reorder32 = reorder32_avx512,
+    .revert32 = revert32_avx512,
+};
+
+#endif // ZIPNN_SIMD_X86
+
+#ifdef ZIPNN_SIMD_NEON
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  NEON //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// The structured loads and stores (vld2 / vld4, vst2 / vst4) group and
+// interleave the bytes directly
+
+static void split16_neon(const uint8_t *src, size_t n, uint8_t *dst0,
+                         uint8_t *dst1) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    uint8x16x2_t v = vld2q_u8(src + 2 * i);
+    vst1q_u8(dst0 + i, v.val[0]);
+    vst1q_u8(dst1 + i, v.val[1]);
+  }
+  split16_scalar(src + 2 * i, n - i, dst0 + i, dst1 + i);
+}
+
+static void combine16_neon(const uint8_t *src0, const uint8_t *src1, size_t n,
+                           uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    uint8x16x2_t v;
+    v.val[0] = vld1q_u8(src0 + i);
+    v.val[1] = vld1q_u8(src1 + i);
+    vst2q_u8(dst + 2 * i, v);
+  }
+  combine16_scalar(src0 + i, src1 + i, n - i, dst + 2 * i);
+}
+
+static void split32_neon(const uint8_t *src, size_t n, uint8_t *const *dst) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    uint8x16x4_t v = vld4q_u8(src + 4 * i);
+    vst1q_u8(dst[0] + i, v.val[0]);
+    vst1q_u8(dst[1] + i, v.val[1]);
+    vst1q_u8(dst[2] + i, v.val[2]);
+    vst1q_u8(dst[3] + i, v.val[3]);
+  }
+  tail_split32(src, i, n, dst);
+}
+
+static void combine32_neon(const uint8_t *const *src, size_t n, uint8_t *dst) {
+  size_t i = 0;
+  for (; i + 16 <= n; i += 16) {
+    uint8x16x4_t v;
+    v.val[0] = vld1q_u8(src[0] + i);
+    v.val[1] = vld1q_u8(src[1] + i);
+    v.val[2] = vld1q_u8(src[2] + i);
+    v.val[3] = vld1q_u8(src[3] + i);
+    vst4q_u8(dst + 4 * i, v);
+  }
+  tail_combine32(src, i, n, dst);
+}
+
+static void reorder16_neon(uint8_t *buf, size_t n) {
+  const uint16x8_t hi = vdupq_n_u16(0xFF00), sign = vdupq_n_u16(0x0080),
+                   low = vdupq_n_u16(0x007F);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    uint16x8_t v = vreinterpretq_u16_u8(vld1q_u8(buf + 2 * i));
+    uint16x8_t r = vorrq_u16(vorrq_u16(vandq_u16(vshlq_n_u16(v, 1), hi),
+                                       vandq_u16(vshrq_n_u16(v, 8), sign)),
+                             vandq_u16(v, low));
+    vst1q_u8(buf + 2 * i, vreinterpretq_u8_u16(r));
+  }
+  reorder16_scalar(buf + 2 * i, n - i);
+}
+
+static void revert16_neon(uint8_t *buf, size_t n) {
+  const uint16x8_t sign = vdupq_n_u16(0x8000), exp = vdupq_n_u16(0x7F80),
+                   low = vdupq_n_u16(0x007F);
+  size_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    uint16x8_t v = vreinterpretq_u16_u8(vld1q_u8(buf + 2 * i));
+    uint16x8_t r = vorrq_u16(vorrq_u16(vandq_u16(vshlq_n_u16(v, 8), sign),
+                                       vandq_u16(vshrq_n_u16(v, 1), exp)),
+                             vandq_u16(v, low));
+    vst1q_u8(buf + 2 * i, vreinterpretq_u8_u16(r));
+  }
+  revert16_scalar(buf + 2 * i, n - i);
+}
+
+static void reorder32_neon(uint8_t *buf, size_t n) {
+  const uint32x4_t hi = vdupq_n_u32(0xFF000000), sign = vdupq_n_u32(0x00800000),
+                   low = vdupq_n_u32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 4 <= n; i += 4) {
+    uint32x4_t v = vreinterpretq_u32_u8(vld1q_u8(buf + 4 * i));
+    uint32x4_t r = vorrq_u32(vorrq_u32(vandq_u32(vshlq_n_u32(v, 1), hi),
+                                       vandq_u32(vshrq_n_u32(v, 8), sign)),
+                             vandq_u32(v, low));
+    vst1q_u8(buf + 4 * i, vreinterpretq_u8_u32(r));
+  }
+  reorder32_scalar(buf + 4 * i, n - i);
+}
+
+static void revert32_neon(uint8_t *buf, size_t n) {
+  const uint32x4_t sign = vdupq_n_u32(0x80000000), exp = vdupq_n_u32(0x7F800000),
+                   low = vdupq_n_u32(0x007FFFFF);
+  size_t i = 0;
+  for (; i + 4 <= n; i += 4) {
+    uint32x4_t v = vreinterpretq_u32_u8(vld1q_u8(buf + 4 * i));
+    uint32x4_t r = vorrq_u32(vorrq_u32(vandq_u32(vshlq_n_u32(v, 8), sign),
+                                       vandq_u32(vshrq_n_u32(v, 1), exp)),
+                             vandq_u32(v, low));
+    vst1q_u8(buf + 4 * i, vreinterpretq_u8_u32(r));
+  }
+  revert32_scalar(buf + 4 * i, n - i);
+}
+
+static const zipnn_kernels neon_kernels = {
+    .name = "neon",
+    .split16 = split16_neon,
+    .combine16 = combine16_neon,
+    .split32 = split32_neon,
+    .combine32 = combine32_neon,
+    .reorder16 = reorder16_neon,
+    .revert16 = revert16_neon,
+    .reorder32 = reorder32_neon,
+    .revert32 = revert32_neon,
+};
+
+#endif // ZIPNN_SIMD_NEON
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  Dispatch //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// Every instruction set compiled in, from the slowest to the fastest
+static const zipnn_kernels *const all_kernels[] = {
+    &scalar_kernels,
+#ifdef ZIPNN_SIMD_X86
+    &sse4_kernels,
+    &avx2_kernels,
+    &avx512_kernels,
+#endif
+#ifdef ZIPNN_SIMD_NEON
+    &neon_kernels,
+#endif
+};
+
+#define ZIPNN_NUM_KERNELS (sizeof(all_kernels) / sizeof(all_kernels[0]))
+
+static const zipnn_kernels *selected_kernels = &scalar_kernels;
+
+static int cpu_supports(const zipnn_kernels *kernels) {
+#ifdef ZIPNN_SIMD_X86
+  __builtin_cpu_init();
+  if (kernels == &sse4_kernels)
+    return __builtin_cpu_supports("sse4.1");
+  if (kernels == &avx2_kernels)
+    return __builtin_cpu_supports("avx2");
+  if (kernels == &avx512_kernels)
+    return __builtin_cpu_supports("avx512f") &&
+           __builtin_cpu_supports("avx512bw");
+#endif
+  // Scalar, and NEON which every aarch64 CPU has
+  (void)kernels;
+  return 1;
+}
+
+static const zipnn_kernels *find_kernels(const char *name) {
+  for (size_t k = 0; k < ZIPNN_NUM_KERNELS; k++) {
+    if (strcmp(all_kernels[k]->name, name) == 0)
+      return all_kernels[k];
+  }
+  return NULL;
+}
+
+static const zipnn_kernels *best_kernels(void) {
+  const zipnn_kernels *best = &scalar_kernels;
+  for (size_t k = 0; k < ZIPNN_NUM_KERNELS; k++) {
+    if (cpu_supports(all_kernels[k]))
+      best = all_kernels[k];
+  }
+  return best;
+}
+
+const zipnn_kernels *zipnn_simd(void) {
+  return __atomic_load_n(&selected_kernels, __ATOMIC_RELAXED);
+}
+
+void zipnn_simd_init(void) {
+  const zipnn_kernels *kernels = best_kernels();
+  // ZIPNN_SIMD_LEVEL caps the instruction set, e.g. "scalar" or "avx2"
+  const char *level = getenv("ZIPNN_SIMD_LEVEL");
+  if (level != NULL) {
+    const zipnn_kernels *requested = find_kernels(level);
+    if (requested != NULL && cpu_supports(requested))
+      kernels = requested;
+  }
+  __atomic_store_n(&selected_kernels, kernels, __ATOMIC_RELAXED);
+}
+
+////////////////////////////////////////////////////////////
+//////////////// Python callable Functions /////////////////
+/////////////////////////////////////////////////////////////
+
+PyObject *py_get_simd_level(PyObject *self, PyObject *args) {
+  return PyUnicode_FromString(zipnn_simd()->name);
+}
+
+// set_simd_level(name): use the given instruction set, None picks the best
+// one this CPU supports
+PyObject *py_set_simd_level(PyObject *self, PyObject *args) {
+  const char *name = NULL;
+  if (!PyArg_ParseTuple(args, "z", &name)) {
+    return NULL;
+  }
+  const zipnn_kernels *kernels = best_kernels();
+  if (name != NULL) {
+    kernels = find_kernels(name);
+    if (kernels == NULL) {
+      PyErr_Format(PyExc_ValueError, "Unknown SIMD level '%s'", name);
+      return NULL;
+    }
+    if (!cpu_supports(kernels)) {
+      PyErr_Format(PyExc_ValueError, "SIMD level '%s' is not supported by "
+                   "this CPU", name);
+      return NULL;
+    }
+  }
+  __atomic_store_n(&selected_kernels, kernels, __ATOMIC_RELAXED);
+  Py_RETURN_NONE;
+}
+
+PyObject *py_supported_simd_levels(PyObject *self, PyObject *args) {
+  PyObject *levels = PyList_New(0);
+  if (levels == NULL) {
+    return NULL;
+  }
+  for (size_t k = 0; k < ZIPNN_NUM_KERNELS; k++) {
+    if (!cpu_supports(all_kernels[k]))
+      continue;
+    PyObject *name = PyUnicode_FromString(all_kernels[k]->name);
+    if (name == NULL || PyList_Append(levels, name) < 0) {
+      Py_XDECREF(name);
+      Py_DECREF(levels);
+      return NULL;
+    }
+    Py_DECREF(name);
+  }
+  return levels;
+}
+
+// benchmark_kernel(kernel, size, iterations): run one kernel of the current
+// SIMD level over size bytes and return the throughput in GB/s
+PyObject *py_benchmark_kernel(PyObject *self, PyObject *args) {
+  const char *kernel;
+  Py_ssize_t size;
+  int iterations;
+  if (!PyArg_ParseTuple(args, "sni", &kernel, &size, &iterations)) {
+    return NULL;
+  }
+  if (size < 4 || iterations < 1) {
+    PyErr_SetString(PyExc_ValueError, "size must be >= 4 and iterations >= 1");
+    return NULL;
+  }
+
+  const char *names[] = {"split16",   "combine16", "split32",   "combine32",
+                         "reorder16", "revert16",  "reorder32", "revert32"};
+  int which = -1;
+  for (int k = 0; k < (int)(sizeof(names) / sizeof(names[0])); k++) {
+    if (strcmp(names[k], kernel) == 0)
+      which = k;
+  }
+  if (which < 0) {
+    PyErr_Format(PyExc_ValueError, "Unknown kernel '%s'", kernel);
+    return NULL;
+  }
+
+  uint8_t *src = malloc(size);
+  uint8_t *dst = malloc(size);
+  if (!src || !dst) {
+    free(src);
+    free(dst);
+    return PyErr_NoMemory();
+  }
+
+  const zipnn_kernels *k = zipnn_simd();
+  size_t n16 = size / 2, n32 = size / 4;
+  uint8_t *groups[4] = {dst, dst + n32, dst + 2 * n32, dst + 3 * n32};
+  const uint8_t *src_groups[4] = {src, src + n32, src + 2 * n32,
+                                  src + 3 * n32};
+  struct timespec start, end;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (Py_ssize_t i = 0; i < size; i++)
+    src[i] = (uint8_t)(i * 2654435761u >> 13);
+  clock_gettime(CLOCK_MONOTONIC, &start);
+  for (int it = 0; it < iterations; it++) {
+    switch (which) {
+    case 0: k->split16(src, n16, dst, dst + n16); break;
+    case 1: k->combine16(src, src + n16, n16, dst); break;
+    case 2: k->split32(src, n32, groups); break;
+    case 3: k->combine32(src_groups, n32, dst); break;
+    case 4: k->reorder16(src, n16); break;
+    case 5: k->revert16(src, n16); break;
+    case 6: k->reorder32(src, n32); break;
+    default: k->revert32(src, n32); break;
+    }
+  }
+  clock_gettime(CLOCK_MONOTONIC, &end);
+  Py_END_ALLOW_THREADS
+
+  free(src);
+  free(dst);
+  double seconds =
+      (end.tv_sec - start.tv_sec) + (end.tv_nsec - start.tv_nsec) / 1e9;
+  return PyFloat_FromDouble((double)size * iterations / seconds / 1e9);
+}
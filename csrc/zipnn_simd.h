@@ -0,0 +1,45 @@
+#ifndef ZIPNN_SIMD_H
+#define ZIPNN_SIMD_H
+
+#include <Python.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// Byte grouping and bit reordering kernels. Every instruction set produces
+// exactly the same bytes as the scalar version, only the speed differs.
+typedef struct {
+  const char *name;
+  // dst0[i] = src[2i], dst1[i] = src[2i + 1] for i in [0, n)
+  void (*split16)(const uint8_t *src, size_t n, uint8_t *dst0, uint8_t *dst1);
+  // Inverse of split16
+  void (*combine16)(const uint8_t *src0, const uint8_t *src1, size_t n,
+                    uint8_t *dst);
+  // dst[g][i] = src[4i + g] for g in [0, 4) and i in [0, n)
+  void (*split32)(const uint8_t *src, size_t n, uint8_t *const *dst);
+  // Inverse of split32
+  void (*combine32)(const uint8_t *const *src, size_t n, uint8_t *dst);
+  // Move the sign bit below the exponent of n 16-bit floats, in place
+  void (*reorder16)(uint8_t *buf, size_t n);
+  void (*revert16)(uint8_t *buf, size_t n);
+  // Same for n 32-bit floats
+  void (*reorder32)(uint8_t *buf, size_t n);
+  void (*revert32)(uint8_t *buf, size_t n);
+} zipnn_kernels;
+
+// The byte transforms of a chunk run tile by tile, so a tile is reordered and
+// split (or combined and reverted) while it is still in L1
+#define ZIPNN_TILE_SIZE (16 * 1024)
+
+// Kernels of the selected instruction set, picked at import time
+const zipnn_kernels *zipnn_simd(void);
+
+// Select the best instruction set this CPU supports
+void zipnn_simd_init(void);
+
+// Python callable functions
+PyObject *py_get_simd_level(PyObject *self, PyObject *args);
+PyObject *py_set_simd_level(PyObject *self, PyObject *args);
+PyObject *py_supported_simd_levels(PyObject *self, PyObject *args);
+PyObject *py_benchmark_kernel(PyObject *self, PyObject *args);
+
+#endif // ZIPNN_SIMD_H
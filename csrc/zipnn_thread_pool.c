@@ -0,0 +1,339 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <pthread.h>
+#include <sched.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include "zipnn_thread_pool.h"
+
+/////////////////////////////////////////////////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+////////////////////////// Worker Pool /////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+/////////////////////////////////////////////////////////////////////////////////////
+
+// A long-lived pool of worker threads shared by compression, decompression
+// and the copy phase:
+// 1. The workers are started lazily on the first call that needs them
+// 2. A call submits a job of `count` task invocations, the workers and the
+//    calling thread take invocations until none is left
+// 3. Several Python threads may submit jobs at the same time, the jobs are
+//    served in order
+// 4. The pool can be resized, pinned to CPUs and shut down from Python, and
+//    it is reset in a forked child (the workers do not survive a fork)
+
+// Beyond this the extra threads only add contention
+#define ZIPNN_POOL_MAX_DEFAULT_THREADS 16
+
+typedef struct zipnn_job {
+  zipnn_task_fn fn;       // Task to run
+  uint8_t *args;          // Base of the per-invocation arguments
+  size_t arg_size;        // Stride between arguments (0 - shared arguments)
+  uint32_t count;         // Number of invocations
+  uint32_t next;          // Next invocation to hand out
+  uint32_t remaining;     // Invocations not finished yet
+  int failed;             // Set when an invocation returned non NULL
+  pthread_cond_t done;    // Signalled when remaining drops to 0
+  struct zipnn_job *next_job;
+} zipnn_job;
+
+static struct {
+  pthread_mutex_t lock;
+  pthread_cond_t work;     // Signalled when a job is queued or on shutdown
+  pthread_t *workers;
+  uint32_t num_started;    // Number of running workers
+  int32_t num_workers;     // Requested number of workers (-1 - default)
+  int stopping;            // Set while the workers are shut down
+  zipnn_job *head, *tail;  // Jobs with invocations left to hand out
+  int *cpus;               // CPUs to pin the workers to (round robin)
+  size_t num_cpus;
+  int atfork_registered;
+} pool = {.lock = PTHREAD_MUTEX_INITIALIZER,
+          .work = PTHREAD_COND_INITIALIZER,
+          .num_workers = -1};
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  Helper Functions //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+static uint32_t default_num_workers(void) {
+  long cpus = sysconf(_SC_NPROCESSORS_ONLN);
+  if (cpus > ZIPNN_POOL_MAX_DEFAULT_THREADS)
+    cpus = ZIPNN_POOL_MAX_DEFAULT_THREADS;
+  // The calling thread is the remaining one
+  return cpus > 1 ? (uint32_t)(cpus - 1) : 0;
+}
+
+static uint32_t configured_num_workers(void) {
+  return pool.num_workers < 0 ? default_num_workers()
+                              : (uint32_t)pool.num_workers;
+}
+
+// Must be called with pool.lock held
+static void pin_worker(uint32_t w) {
+#ifdef __linux__
+  cpu_set_t set;
+  CPU_ZERO(&set);
+  if (pool.num_cpus == 0) {
+    for (int c = 0; c < CPU_SETSIZE; c++)
+      CPU_SET(c, &set);
+  } else {
+    CPU_SET(pool.cpus[w % pool.num_cpus], &set);
+  }
+  pthread_setaffinity_np(pool.workers[w], sizeof(set), &set);
+#else
+  (void)w;
+#endif
+}
+
+// Must be called with pool.lock held
+static void unlink_job(zipnn_job *job) {
+  zipnn_job *prev = NULL;
+  for (zipnn_job *j = pool.head; j != NULL; prev = j, j = j->next_job) {
+    if (j == job) {
+      if (prev)
+        prev->next_job = j->next_job;
+      else
+        pool.head = j->next_job;
+      if (pool.tail == j)
+        pool.tail = prev;
+      return;
+    }
+  }
+}
+
+// Hand out the next invocation of a job, must be called with pool.lock held
+static uint32_t take_invocation(zipnn_job *job) {
+  uint32_t idx = job->next++;
+  if (job->next == job->count)
+    unlink_job(job);
+  return idx;
+}
+
+// Run one invocation outside of the lock and record its result
+static void run_invocation(zipnn_job *job, uint32_t idx) {
+  pthread_mutex_unlock(&pool.lock);
+  void *result = job->fn(job->args + idx * job->arg_size);
+  pthread_mutex_lock(&pool.lock);
+  if (result != NULL)
+    job->failed = 1;
+  if (--job->remaining == 0)
+    pthread_cond_broadcast(&job->done);
+}
+
+static void *pool_worker(void *arg) {
+  (void)arg;
+  pthread_mutex_lock(&pool.lock);
+  while (1) {
+    while (pool.head == NULL && !pool.stopping)
+      pthread_cond_wait(&pool.work, &pool.lock);
+    if (pool.head == NULL)
+      break; // Shutting down and nothing left to hand out
+    zipnn_job *job = pool.head;
+    run_invocation(job, take_invocation(job));
+  }
+  pthread_mutex_unlock(&pool.lock);
+  return NULL;
+}
+
+// The workers do not exist in a forked child, start from a clean pool
+static void pool_atfork_child(void) {
+  pthread_mutex_init(&pool.lock, NULL);
+  pthread_cond_init(&pool.work, NULL);
+  free(pool.workers);
+  pool.workers = NULL;
+  pool.num_started = 0;
+  pool.stopping = 0;
+  pool.head = NULL;
+  pool.tail = NULL;
+}
+
+// Start the workers if needed, must be called with pool.lock held
+static void ensure_started(void) {
+  if (pool.num_started > 0 || pool.stopping)
+    return;
+  uint32_t num_workers = configured_num_workers();
+  if (num_workers == 0)
+    return;
+
+  if (!pool.atfork_registered) {
+    pthread_atfork(NULL, NULL, pool_atfork_child);
+    pool.atfork_registered = 1;
+  }
+
+  pool.workers = malloc(num_workers * sizeof(pthread_t));
+  if (!pool.workers)
+    return; // Run everything on the calling thread
+  for (uint32_t w = 0; w < num_workers; w++) {
+    if (pthread_create(&pool.workers[w], NULL, pool_worker, NULL) != 0)
+      break;
+    pool.num_started++;
+    if (pool.num_cpus > 0)
+      pin_worker(w);
+  }
+  if (pool.num_started == 0) {
+    free(pool.workers);
+    pool.workers = NULL;
+  }
+}
+
+// Stop and join all the workers, queued jobs are finished first
+static void pool_shutdown(void) {
+  pthread_mutex_lock(&pool.lock);
+  if (pool.num_started == 0 || pool.stopping) {
+    pthread_mutex_unlock(&pool.lock);
+    return;
+  }
+  pool.stopping = 1;
+  pthread_cond_broadcast(&pool.work);
+  pthread_t *workers = pool.workers;
+  uint32_t num_started = pool.num_started;
+  pthread_mutex_unlock(&pool.lock);
+
+  for (uint32_t w = 0; w < num_started; w++)
+    pthread_join(workers[w], NULL);
+
+  pthread_mutex_lock(&pool.lock);
+  free(workers);
+  pool.workers = NULL;
+  pool.num_started = 0;
+  pool.stopping = 0;
+  pthread_mutex_unlock(&pool.lock);
+}
+
+/////////////////////////////////////////////////////////////////////////////////////
+////  Submitting work //////
+/////////////////////////////////////////////////////////////////////////////////////
+
+int zipnn_pool_run(zipnn_task_fn fn, void *args, size_t arg_size,
+                   uint32_t count) {
+  if (count == 0)
+    return 0;
+  // A single invocation runs inline, without the pool and its lock
+  if (count == 1)
+    return fn(args) == NULL ? 0 : -1;
+
+  zipnn_job job = {.fn = fn,
+                   .args = (uint8_t *)args,
+                   .arg_size = arg_size,
+                   .count = count,
+                   .next = 0,
+                   .remaining = count,
+                   .failed = 0,
+                   .next_job = NULL};
+  pthread_cond_init(&job.done, NULL);
+
+  pthread_mutex_lock(&pool.lock);
+  ensure_started();
+  if (pool.num_started > 0) {
+    if (pool.tail)
+      pool.tail->next_job = &job;
+    else
+      pool.head = &job;
+    pool.tail = &job;
+    pthread_cond_broadcast(&pool.work);
+  }
+
+  // The calling thread works on its own job as well
+  while (job.next < job.count)
+    run_invocation(&job, take_invocation(&job));
+
+  while (job.remaining > 0)
+    pthread_cond_wait(&job.done, &pool.lock);
+  pthread_mutex_unlock(&pool.lock);
+
+  pthread_cond_destroy(&job.done);
+  return job.failed ? -1 : 0;
+}
+
+////////////////////////////////////////////////////////////
+//////////////// Python callable Functions /////////////////
+/////////////////////////////////////////////////////////////
+
+// set_num_workers(n): number of background workers, the calling thread also
+// works on every job. A negative value restores the default. The running
+// workers are stopped and the new size is started on the next call.
+PyObject *py_set_num_workers(PyObject *self, PyObject *args) {
+  int num_workers;
+  if (!PyArg_ParseTuple(args, "i", &num_workers)) {
+    return NULL;
+  }
+  Py_BEGIN_ALLOW_THREADS
+  pool_shutdown();
+  pthread_mutex_lock(&pool.lock);
+  pool.num_workers = num_workers < 0 ? -1 : num_workers;
+  pthread_mutex_unlock(&pool.lock);
+  Py_END_ALLOW_THREADS
+  Py_RETURN_NONE;
+}
+
+PyObject *py_get_num_workers(PyObject *self, PyObject *args) {
+  uint32_t num_workers;
+  pthread_mutex_lock(&pool.lock);
+  num_workers = configured_num_workers();
+  pthread_mutex_unlock(&pool.lock);
+  return PyLong_FromUnsignedLong(num_workers);
+}
+
+// pin_workers(cpus): pin worker i to cpus[i % len(cpus)], None or an empty
+// sequence removes the pinning
+PyObject *py_pin_workers(PyObject *self, PyObject *args) {
+  PyObject *cpus_obj;
+  if (!PyArg_ParseTuple(args, "O", &cpus_obj)) {
+    return NULL;
+  }
+#ifndef __linux__
+  PyErr_SetString(PyExc_NotImplementedError,
+                  "Pinning workers is only supported on Linux");
+  return NULL;
+#else
+  int *cpus = NULL;
+  Py_ssize_t num_cpus = 0;
+  if (cpus_obj != Py_None) {
+    PyObject *seq = PySequence_Fast(cpus_obj, "cpus must be a sequence of ints");
+    if (!seq) {
+      return NULL;
+    }
+    num_cpus = PySequence_Fast_GET_SIZE(seq);
+    cpus = num_cpus > 0 ? malloc(num_cpus * sizeof(int)) : NULL;
+    if (num_cpus > 0 && !cpus) {
+      Py_DECREF(seq);
+      return PyErr_NoMemory();
+    }
+    for (Py_ssize_t i = 0; i < num_cpus; i++) {
+      long cpu = PyLong_AsLong(PySequence_Fast_GET_ITEM(seq, i));
+      if (cpu == -1 && PyErr_Occurred()) {
+        free(cpus);
+        Py_DECREF(seq);
+        return NULL;
+      }
+      if (cpu < 0 || cpu >= CPU_SETSIZE) {
+        free(cpus);
+        Py_DECREF(seq);
+        PyErr_SetString(PyExc_ValueError, "cpu index out of range");
+        return NULL;
+      }
+      cpus[i] = (int)cpu;
+    }
+    Py_DECREF(seq);
+  }
+
+  pthread_mutex_lock(&pool.lock);
+  free(pool.cpus);
+  pool.cpus = cpus;
+  pool.num_cpus = (size_t)num_cpus;
+  for (uint32_t w = 0; w < pool.num_started; w++)
+    pin_worker(w);
+  pthread_mutex_unlock(&pool.lock);
+  Py_RETURN_NONE;
+#endif
+}
+
+// shutdown_pool(): stop the workers, the next call starts them again
+PyObject *py_shutdown_pool(PyObject *self, PyObject *args) {
+  Py_BEGIN_ALLOW_THREADS
+  pool_shutdown();
+  Py_END_ALLOW_THREADS
+  Py_RETURN_NONE;
+}
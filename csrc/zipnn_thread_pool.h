@@ -0,0 +1,25 @@
+#ifndef ZIPNN_THREAD_POOL_H
+#define ZIPNN_THREAD_POOL_H
+
+#include <Python.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// A task has the signature of a pthread start routine, it returns NULL on
+// success and any other value on failure
+typedef void *(*zipnn_task_fn)(void *arg);
+
+// Run fn(args + i * arg_size) for i in [0, count) on the shared worker pool
+// and wait for all of them. The calling thread takes part in the work, so it
+// must not hold the GIL. With arg_size 0 every invocation gets the same args.
+// Returns 0 when every invocation returned NULL, -1 otherwise.
+int zipnn_pool_run(zipnn_task_fn fn, void *args, size_t arg_size,
+                   uint32_t count);
+
+// Python callable functions
+PyObject *py_set_num_workers(PyObject *self, PyObject *args);
+PyObject *py_get_num_workers(PyObject *self, PyObject *args);
+PyObject *py_pin_workers(PyObject *self, PyObject *args);
+PyObject *py_shutdown_pool(PyObject *self, PyObject *args);
+
+#endif // ZIPNN_THREAD_POOL_H
@@ -0,0 +1,95 @@
+/*
+ * Vendored zstd (include/zstd) built as one translation unit, the same way as
+ * its single file library (build/single_file_libs/zstd-in.c) without the
+ * multithreading, the worker pool of zipnn runs the chunks in parallel.
+ *
+ * zstd carries its own copy of the FSE and HUF entropy coders under the same
+ * names as include/FiniteStateEntropy, they are renamed here so both can be
+ * linked into zipnn_core. After updating the zstd submodule, a clash shows up
+ * as a "multiple definition" link error and belongs in this list.
+ */
+
+#define FSE_NCountWriteBound ZIPNN_ZSTD_FSE_NCountWriteBound
+#define FSE_buildCTable_rle ZIPNN_ZSTD_FSE_buildCTable_rle
+#define FSE_buildCTable_wksp ZIPNN_ZSTD_FSE_buildCTable_wksp
+#define FSE_compressBound ZIPNN_ZSTD_FSE_compressBound
+#define FSE_compress_usingCTable ZIPNN_ZSTD_FSE_compress_usingCTable
+#define FSE_getErrorName ZIPNN_ZSTD_FSE_getErrorName
+#define FSE_isError ZIPNN_ZSTD_FSE_isError
+#define FSE_normalizeCount ZIPNN_ZSTD_FSE_normalizeCount
+#define FSE_optimalTableLog ZIPNN_ZSTD_FSE_optimalTableLog
+#define FSE_optimalTableLog_internal ZIPNN_ZSTD_FSE_optimalTableLog_internal
+#define FSE_readNCount ZIPNN_ZSTD_FSE_readNCount
+#define FSE_versionNumber ZIPNN_ZSTD_FSE_versionNumber
+#define FSE_writeNCount ZIPNN_ZSTD_FSE_writeNCount
+#define HIST_count ZIPNN_ZSTD_HIST_count
+#define HIST_countFast ZIPNN_ZSTD_HIST_countFast
+#define HIST_countFast_wksp ZIPNN_ZSTD_HIST_countFast_wksp
+#define HIST_count_simple ZIPNN_ZSTD_HIST_count_simple
+#define HIST_count_wksp ZIPNN_ZSTD_HIST_count_wksp
+#define HIST_isError ZIPNN_ZSTD_HIST_isError
+#define HUF_buildCTable_wksp ZIPNN_ZSTD_HUF_buildCTable_wksp
+#define HUF_compress1X_repeat ZIPNN_ZSTD_HUF_compress1X_repeat
+#define HUF_compress1X_usingCTable ZIPNN_ZSTD_HUF_compress1X_usingCTable
+#define HUF_compress4X_repeat ZIPNN_ZSTD_HUF_compress4X_repeat
+#define HUF_compress4X_usingCTable ZIPNN_ZSTD_HUF_compress4X_usingCTable
+#define HUF_compressBound ZIPNN_ZSTD_HUF_compressBound
+#define HUF_decompress1X1_DCtx_wksp ZIPNN_ZSTD_HUF_decompress1X1_DCtx_wksp
+#define HUF_decompress1X2_DCtx_wksp ZIPNN_ZSTD_HUF_decompress1X2_DCtx_wksp
+#define HUF_decompress1X_DCtx_wksp ZIPNN_ZSTD_HUF_decompress1X_DCtx_wksp
+#define HUF_decompress1X_usingDTable ZIPNN_ZSTD_HUF_decompress1X_usingDTable
+#define HUF_decompress4X_hufOnly_wksp ZIPNN_ZSTD_HUF_decompress4X_hufOnly_wksp
+#define HUF_decompress4X_usingDTable ZIPNN_ZSTD_HUF_decompress4X_usingDTable
+#define HUF_estimateCompressedSize ZIPNN_ZSTD_HUF_estimateCompressedSize
+#define HUF_getErrorName ZIPNN_ZSTD_HUF_getErrorName
+#define HUF_isError ZIPNN_ZSTD_HUF_isError
+#define HUF_optimalTableLog ZIPNN_ZSTD_HUF_optimalTableLog
+#define HUF_readCTable ZIPNN_ZSTD_HUF_readCTable
+#define HUF_readDTableX1_wksp ZIPNN_ZSTD_HUF_readDTableX1_wksp
+#define HUF_readDTableX2_wksp ZIPNN_ZSTD_HUF_readDTableX2_wksp
+#define HUF_readStats ZIPNN_ZSTD_HUF_readStats
+#define HUF_selectDecoder ZIPNN_ZSTD_HUF_selectDecoder
+#define HUF_validateCTable ZIPNN_ZSTD_HUF_validateCTable
+
+#define DEBUGLEVEL 0
+#define MEM_MODULE
+#undef XXH_NAMESPACE
+#define XXH_NAMESPACE ZSTD_
+#undef XXH_PRIVATE_API
+#define XXH_PRIVATE_API
+#undef XXH_INLINE_ALL
+#define XXH_INLINE_ALL
+#define ZSTD_LEGACY_SUPPORT 0
+#define ZSTD_TRACE 0
+#define ZSTD_DISABLE_ASM 1
+
+#define ZSTD_DEPS_NEED_MALLOC
+#define ZSTD_DEPS_NEED_MATH64
+#include "common/zstd_deps.h"
+
+#include "common/debug.c"
+#include "common/entropy_common.c"
+// From here on zstd maps the error checks to ERR_isError itself
+#undef FSE_isError
+#undef HUF_isError
+#include "common/error_private.c"
+#include "common/fse_decompress.c"
+#include "common/zstd_common.c"
+
+#include "compress/fse_compress.c"
+#include "compress/hist.c"
+#include "compress/huf_compress.c"
+#include "compress/zstd_compress_literals.c"
+#include "compress/zstd_compress_sequences.c"
+#include "compress/zstd_compress_superblock.c"
+#include "compress/zstd_compress.c"
+#include "compress/zstd_double_fast.c"
+#include "compress/zstd_fast.c"
+#include "compress/zstd_lazy.c"
+#include "compress/zstd_ldm.c"
+#include "compress/zstd_opt.c"
+
+#include "decompress/huf_decompress.c"
+#include "decompress/zstd_ddict.c"
+#include "decompress/zstd_decompress.c"
+#include "decompress/zstd_decompress_block.c"
@@ -67,11 +67,31 @@ def compress_file(
     verification=False,#
     test=False,#
     is_streaming=False,
-    threads=None
+    threads=None,
+    streaming_index=False
 ):
     import zipnn
 
     streaming_chunk_size = parse_streaming_chunk_size(streaming_chunk_size)
+    if input_file == "-":
+        # stdin to stdout, frame by frame, the messages go to stderr
+        zpn = zipnn.ZipNN(
+            bytearray_dtype=dtype,
+            is_streaming=True,
+            streaming_chunk=streaming_chunk_size,
+            streaming_index=streaming_index,
+            method=method,
+            threads=threads,
+        )
+        start_time = time.time()
+        file_size_before, file_size_after = zpn.compress_file(sys.stdin.buffer, sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+        print(
+            f"Compressed stdin to stdout: {file_size_before} bytes to {file_size_after} bytes in {time.time() - start_time:.02f}s",
+            file=sys.stderr,
+        )
+        return
+
     full_path = input_file
     if not os.path.exists(full_path):
         print(f"{RED}File not found{RESET}")
@@ -92,6 +112,7 @@ def compress_file(
             bytearray_dtype=dtype,
             is_streaming=is_streaming,
             streaming_chunk=streaming_chunk_size,
+            streaming_index=streaming_index,
             method=method,
             threads=threads
         )
@@ -99,7 +120,12 @@ def compress_file(
     file_size_after = 0
     start_time=time.time()
     write_time=0
-    if not test:
+    if not test and is_streaming:
+        # Frame by frame with bounded memory, reading, compression and writing overlap
+        file_size_before, file_size_after = zpn.compress_file(input_file, output_file)
+        compress_time = time.time() - start_time
+        load_time = 0
+    elif not test:
         with open(input_file, "rb") as infile, open(output_file, "wb") as outfile:
             chunk = infile.read()
             load_time=time.time()-start_time
@@ -168,7 +194,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "input_file",
         type=str,
-        help="Specify the path to the file to compress.",
+        help="Specify the path to the file to compress, - compresses stdin to stdout with streaming.",
     )
     parser.add_argument(
         "--dtype",
@@ -219,6 +245,11 @@ if __name__ == "__main__":
         action="store_true",
         help="A flag to compress using streaming.",
     )#
+    parser.add_argument(
+        "--streaming_index",
+        action="store_true",
+        help="A flag to end streaming compressed files with an index of their frames.",
+    )
     parser.add_argument(
         "--threads",
         type=int,
@@ -247,5 +278,7 @@ if __name__ == "__main__":
         optional_kwargs["is_streaming"] = args.is_streaming#
     if args.threads:
         optional_kwargs["threads"] = args.threads#
+    if args.streaming_index:
+        optional_kwargs["streaming_index"] = args.streaming_index
     check_and_install_zipnn()
     compress_file(args.input_file, **optional_kwargs)
@@ -34,7 +34,7 @@ def check_and_install_zipnn():
         import zipnn
 
 
-def compress_safetensors_file(filename,delete=False,force=False,hf_cache=False,method=None,threads=None):
+def compress_safetensors_file(filename,delete=False,force=False,hf_cache=False,method=None,threads=None,dictionary=False):
     """
     Compress a safetensors file.
     """
@@ -46,6 +46,7 @@ def compress_safetensors_file(filename,delete=False,force=False,hf_cache=False,m
     from zipnn.util_safetensors import (
         build_compressed_tensor_info,
         set_compressed_tensors_metadata,
+        set_dictionary_metadata,
         COMPRESSED_DTYPE, COMPRESSION_METHOD
     )
     import torch
@@ -70,35 +71,47 @@ def compress_safetensors_file(filename,delete=False,force=False,hf_cache=False,m
             return
     print(f"Compressing {filename}...")
 
+    dictionary_bytes=None
+    if dictionary:
+        # One dictionary trained on the tensors of the file, stored once in its metadata
+        if isinstance(dictionary, str):
+            with open(dictionary, "rb") as dictionary_file:
+                dictionary_bytes = dictionary_file.read()
+        else:
+            with safe_open(filename, "pt", "cpu") as f:
+                dictionary_bytes = ZipNN(input_format="torch").train_dictionary(
+                    f.get_tensor(name) for name in f.keys())
+
+    znn = ZipNN(
+        input_format="torch",
+        method = method if method is not None else COMPRESSION_METHOD,
+        threads=threads,
+        dictionary=dictionary_bytes)
     time_start=time.time()
     with safe_open(filename, "pt", "cpu") as f:
         load_time_sum+=time.time()-time_start
         
+        float_names = []
         for name in f.keys():
             time_start=time.time()
             tensor = f.get_tensor(name)
             load_time_sum+=time.time()-time_start
             
-            if not zipnn_is_floating_point(EnumFormat.TORCH.value, tensor, tensor.dtype):
-                tensors[name] = tensor
-                continue
+            tensors[name] = tensor
+            if zipnn_is_floating_point(EnumFormat.TORCH.value, tensor, tensor.dtype):
+                float_names.append(name)
 
-            compressed_tensor_info = build_compressed_tensor_info(tensor)
-            znn = ZipNN(
-                input_format="torch",
-                bytearray_dtype=tensor.dtype,
-                method = method if method is not None else COMPRESSION_METHOD,
-                threads=threads)
+        # All the tensors in one call, the small ones share the threads with the large ones
+        time_start=time.time()
+        compressed_bufs = znn.compress_batch([tensors[name] for name in float_names])
+        comp_time_sum+=time.time()-time_start
 
+        for name, compressed_buf in zip(float_names, compressed_bufs):
+            tensor = tensors[name]
+            compressed_tensor_info = build_compressed_tensor_info(tensor)
             uncompressed_size = tensor.element_size() * tensor.nelement()
             og_len+=uncompressed_size
-            tensor_save = tensor.clone()
-            time_start=time.time()
-            compressed_buf = znn.compress(tensor)
-            comp_time_sum+=time.time()-time_start
-            #uncompressed_buf = znn.decompress(compressed_buf)
             compressed_size = len(compressed_buf)       
-            #print("Are the original and decompressed byte strings the same [TORCH]? ", torch.equal(tensor_save.to(torch.uint8), uncompressed_buf.to(torch.uint8)))
 
             if compressed_size >= uncompressed_size:
                 tensors[name] = tensor
@@ -116,6 +129,9 @@ def compress_safetensors_file(filename,delete=False,force=False,hf_cache=False,m
 
         metadata = f.metadata()
 
+    if dictionary_bytes is not None:
+        metadata = metadata or {}
+        set_dictionary_metadata(dictionary_bytes, metadata)
     #print(metadata,compressed_tensor_info)
     #exit()
     set_compressed_tensors_metadata(compressed_tensor_infos, metadata)
@@ -183,6 +199,12 @@ if __name__ == "__main__":
         default=None,
         help="The amount of threads to be used.",
     )
+    parser.add_argument(
+        "--dictionary",
+        type=str,
+        default=None,
+        help="'train' to train a dictionary on the tensors of the file, or the path of a dictionary file. It is stored in the metadata of the compressed file.",
+    )
     args = parser.parse_args()
     optional_kwargs = {}
     if args.delete:
@@ -195,5 +217,7 @@ if __name__ == "__main__":
         optional_kwargs["method"] = args.method
     if args.threads:
         optional_kwargs["threads"] = args.threads#
+    if args.dictionary:
+        optional_kwargs["dictionary"] = True if args.dictionary == "train" else args.dictionary
     check_and_install_zipnn()
     compress_safetensors_file(args.input_file,**optional_kwargs)
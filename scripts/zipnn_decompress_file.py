@@ -24,9 +24,33 @@ def check_and_install_zipnn():
         import zipnn
 
 
-def decompress_file(input_file, delete=False, force=False, hf_cache=False,threads=None):
+def print_stage_stats(stats):
+    print(
+        f"Stages busy: read {stats['read_utilization']*100:.0f}%, decompress {stats['code_utilization']*100:.0f}%, "
+        f"write {stats['write_utilization']*100:.0f}% of {stats['wall_s']:.02f}s for {stats['items']} frames, "
+        f"the bottleneck is {stats['bottleneck'].replace('code', 'decompress')}",
+        file=sys.stderr,
+    )
+
+
+def decompress_file(input_file, delete=False, force=False, hf_cache=False,threads=None,use_mmap=False,stats=False):
     import zipnn
 
+    if input_file == "-":
+        # stdin to stdout, frame by frame, the messages go to stderr
+        zpn = zipnn.ZipNN(is_streaming=True, threads=threads)
+        start_time = time.time()
+        stage_stats = {}
+        file_size_before, file_size_after = zpn.decompress_file(sys.stdin.buffer, sys.stdout.buffer, stats=stage_stats)
+        sys.stdout.buffer.flush()
+        print(
+            f"Decompressed stdin to stdout: {file_size_before} bytes to {file_size_after} bytes in {time.time() - start_time:.02f}s",
+            file=sys.stderr,
+        )
+        if stats:
+            print_stage_stats(stage_stats)
+        return
+
     if not input_file.endswith(".znn"):
         raise ValueError("Input file does not have the '.znn' suffix")
 
@@ -46,25 +70,16 @@ def decompress_file(input_file, delete=False, force=False, hf_cache=False,thread
         output_file = input_file[:-4]
         zpn = zipnn.ZipNN(is_streaming=True,threads=threads)
 
-        file_size_before = 0
-        file_size_after = 0
         start_time=time.time()
-        with open(input_file, "rb") as infile, open(output_file, "wb") as outfile:
-            chunk = infile.read()
-            load_time=time.time()-start_time
-            file_size_before = len(chunk)
-            start_time = time.time()
-            d_data = zpn.decompress(chunk)
-            decomp_time = time.time() - start_time
-            file_size_after = len(d_data)
-            start_time=time.time()
-            outfile.write(d_data)
-            write_time=time.time()-start_time
-            print(f"Decompressed {input_file} to {output_file} using {zpn.threads} threads")
-            print(f"sum of load times: {load_time}s")
-            #print(f"sum of decomp times: {decomp_time}s")
-            print(f"decomp file written in {write_time}s")
-        
+        # Frame by frame with bounded memory, reading, decompression and writing overlap,
+        # or all the frames at once between memory maps of the files
+        stage_stats = {}
+        file_size_before, file_size_after = zpn.decompress_file(input_file, output_file, use_mmap=use_mmap, stats=stage_stats)
+        decomp_time = time.time() - start_time
+        print(f"Decompressed {input_file} to {output_file} using {zpn.threads} threads")
+        if stats:
+            print_stage_stats(stage_stats)
+
         print(
             f"{GREEN}Back to original size: {file_size_after/GB:.02f}GB size before decompression: {file_size_before/GB:.02f}GB, decompress time {decomp_time:.02f}s{RESET}"
             )
@@ -96,7 +111,7 @@ if __name__ == "__main__":
     check_and_install_zipnn()
 
     parser = argparse.ArgumentParser(description="Enter a file path to decompress.")
-    parser.add_argument("input_file", type=str, help="Specify the path to the file to decompress.")
+    parser.add_argument("input_file", type=str, help="Specify the path to the file to decompress, - decompresses stdin to stdout.")
     parser.add_argument(
         "--delete",
         action="store_true",
@@ -116,6 +131,16 @@ if __name__ == "__main__":
         default=None,
         help="The amount of threads to be used.",
     )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="A flag to decompress between memory maps of the files instead of reading and writing them.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="A flag to print how busy the read, decompress and write stages were, to find the bottleneck.",
+    )
     args = parser.parse_args()
     optional_kwargs = {}
     if args.delete:
@@ -126,5 +151,9 @@ if __name__ == "__main__":
         optional_kwargs["hf_cache"] = args.hf_cache
     if args.threads:
         optional_kwargs["threads"] = args.threads#
+    if args.mmap:
+        optional_kwargs["use_mmap"] = args.mmap
+    if args.stats:
+        optional_kwargs["stats"] = args.stats
 
     decompress_file(args.input_file, **optional_kwargs)
@@ -42,6 +42,7 @@ def decompress_safetensors_file(filename, delete=False,force=False,hf_cache=Fals
     from zipnn.util_torch import zipnn_is_floating_point,ZipNNDtypeEnum
     from zipnn.util_safetensors import (
         get_compressed_tensors_metadata,
+        get_dictionary_metadata,
         COMPRESSED_DTYPE, COMPRESSION_METHOD
     )
     import torch
@@ -77,7 +78,8 @@ def decompress_safetensors_file(filename, delete=False,force=False,hf_cache=Fals
                 input_format="torch",
                 bytearray_dtype=COMPRESSED_DTYPE,
                 method=COMPRESSION_METHOD,
-                threads=threads)
+                threads=threads,
+                dictionary=get_dictionary_metadata(L))
         for name in f.keys():
             time_start=time.time()
             tensor = f.get_tensor(name)
@@ -92,21 +94,24 @@ def decompress_safetensors_file(filename, delete=False,force=False,hf_cache=Fals
             
             #L=f.metadata()
             #D=get_compressed_tensors_metadata(L)
+            tensors[name]=tensor
             if name not in D.keys(): 
-                tensors[name]=tensor
                 continue
-            
             comp_len+=tensor.element_size() * tensor.nelement()
-            time_start=time.time()
-            decompressed_buf = znn.decompress(tensor.contiguous().numpy())
-            decomp_time_sum+=time.time()-time_start
-            decomp_len+=decompressed_buf.element_size() * decompressed_buf.nelement()
 
+        # All the compressed tensors in one call, their chunks share the threads
+        compressed_names = [name for name in tensors if name in D.keys()]
+        time_start=time.time()
+        decompressed_bufs = znn.decompress_batch([tensors[name].contiguous().numpy() for name in compressed_names])
+        decomp_time_sum+=time.time()-time_start
+        for name, decompressed_buf in zip(compressed_names, decompressed_bufs):
+            decomp_len+=decompressed_buf.element_size() * decompressed_buf.nelement()
             tensors[name] = decompressed_buf
 
         metadata = f.metadata()
         if metadata:
             metadata.pop("znn_compressed_vectors", None)
+            metadata.pop("znn_dictionary", None)
 
     time_start=time.time()
     save_file(tensors, decompressed_path, metadata)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+KERNELS = ["split16", "combine16", "split32", "combine32", "reorder16", "revert16", "reorder32", "revert32"]
+
+
+def benchmark_kernels(size, iterations, levels=None):
+    import zipnn_core
+
+    supported = zipnn_core.supported_simd_levels()
+    if levels is None:
+        levels = supported
+    selected = zipnn_core.get_simd_level()
+    results = {}
+    try:
+        for level in levels:
+            if level not in supported:
+                print(f"Skipping {level}, not supported by this CPU")
+                continue
+            zipnn_core.set_simd_level(level)
+            results[level] = {kernel: zipnn_core.benchmark_kernel(kernel, size, iterations) for kernel in KERNELS}
+    finally:
+        zipnn_core.set_simd_level(selected)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the GB/s of the byte grouping and bit reordering kernels for every SIMD level.")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Bytes per kernel call, the default is one compression chunk.")
+    parser.add_argument("--iterations", type=int, default=2000, help="Kernel calls per measurement.")
+    parser.add_argument("--levels", nargs="+", help="SIMD levels to measure, the default is all the supported ones.")
+    args = parser.parse_args()
+
+    results = benchmark_kernels(args.size, args.iterations, args.levels)
+    print(f"{'level':<8}" + "".join(f"{kernel:>11}" for kernel in KERNELS) + "   (GB/s)")
+    for level, speeds in results.items():
+        print(f"{level:<8}" + "".join(f"{speeds[kernel]:>11.1f}" for kernel in KERNELS))
+
+
+if __name__ == "__main__":
+    main()
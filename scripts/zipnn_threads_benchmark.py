@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+KB = 1024
+GB = 1024 * 1024 * 1024
+
+
+def parse_size(text):
+    units = {"K": KB, "M": KB * KB, "G": GB}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit, scale in (("GB", GB), ("MB", KB * KB), ("KB", KB)):
+        if size >= scale:
+            return f"{size // scale}{unit}"
+    return f"{size}B"
+
+
+def best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_threads(sizes, threads, min_bytes):
+    import torch
+    import zipnn_core
+    from zipnn import ZipNN
+
+    zpn = ZipNN(input_format="torch", bytearray_dtype="bfloat16", threads=threads)
+    results = []
+    try:
+        for size in sizes:
+            data = torch.randn(size // 2, dtype=torch.bfloat16)
+            repeats = max(1, min(1000, min_bytes // size))
+            row = {"size": size}
+            for mode, adaptive in (("adaptive", True), ("fixed", False)):
+                zipnn_core.set_adaptive_threads(adaptive)
+                compressed = zpn.compress(data)
+                row[f"{mode}_compress"] = size / best_time(lambda: zpn.compress(data), repeats) / GB
+                row[f"{mode}_decompress"] = size / best_time(lambda: zpn.decompress(compressed), repeats) / GB
+                del compressed
+            del data
+            results.append(row)
+    finally:
+        zipnn_core.set_adaptive_threads(True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure compression and decompression GB/s over tensor sizes, with the thread count the core adapts "
+        "to the work of each call and with every call running all the threads."
+    )
+    parser.add_argument("--min-size", default="1KB", help="Smallest tensor, the default is 1KB.")
+    parser.add_argument("--max-size", default="4GB", help="Largest tensor, the default is 4GB (needs about 3 times that in memory).")
+    parser.add_argument("--threads", type=int, default=0, help="Maximum threads, the default is min(logical CPUs, 16).")
+    parser.add_argument("--min-bytes", default="256MB", help="Bytes processed per measurement, small tensors are repeated.")
+    args = parser.parse_args()
+
+    sizes = []
+    size = parse_size(args.min_size)
+    while size <= parse_size(args.max_size):
+        sizes.append(size)
+        size *= 4
+
+    import zipnn_core
+
+    print(f"{'size':>8}{'comp':>11}{'comp fixed':>12}{'decomp':>11}{'decomp fixed':>14}   (GB/s)")
+    for row in benchmark_threads(sizes, args.threads, parse_size(args.min_bytes)):
+        print(
+            f"{format_size(row['size']):>8}{row['adaptive_compress']:>11.2f}{row['fixed_compress']:>12.2f}"
+            f"{row['adaptive_decompress']:>11.2f}{row['fixed_decompress']:>14.2f}"
+        )
+    stats = zipnn_core.get_task_stats()
+    print(f"Measured cost: compression {stats['compress_ns_per_kb']} ns/KB, decompression {stats['decompress_ns_per_kb']} ns/KB")
+
+
+if __name__ == "__main__":
+    main()
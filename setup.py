@@ -19,6 +19,10 @@ zipnn_core_extension = Extension(
     sources=[
         "csrc/zipnn_core_module.c",
         "csrc/zipnn_core.c",
+        "csrc/zipnn_thread_pool.c",
+        "csrc/zipnn_buffer.c",
+        "csrc/zipnn_simd.c",
+        "csrc/zipnn_zstd.c",
         "csrc/data_manipulation_dtype16.c",
         "csrc/data_manipulation_dtype32.c",
         "include/FiniteStateEntropy/lib/fse_compress.c",
@@ -28,14 +32,14 @@ zipnn_core_extension = Extension(
         "include/FiniteStateEntropy/lib/entropy_common.c",
         "include/FiniteStateEntropy/lib/hist.c",
     ],
-    include_dirs=["include/FiniteStateEntropy/lib/", "csrc/"],
+    include_dirs=["include/FiniteStateEntropy/lib/", "csrc/", "include/zstd/lib/"],
     extra_compile_args=["-O3", "-Wall", "-Wextra"],
     extra_link_args=["-O3", "-Wall", "-Wextra"],
 )
 
 setup(
     name="zipnn",
-    version="0.5.3",
+    version="0.6.0",
     author="ZipNN Contributors",
     description="A Lossless Compression Library for AI pipelines",
     long_description=open("README.md").read(),
@@ -0,0 +1,194 @@
+from zipnn import ZipNN
+import copy
+import os
+import threading
+import time
+import unittest
+import torch
+
+
+def create_tensor(size_in_mb):
+    num_elements = int(size_in_mb * 1024 * 1024) // 2
+    return torch.rand(num_elements, dtype=torch.bfloat16) * 2 - 1
+
+
+def test_gil_released_during_decompression():
+    # A Python thread keeps ticking while the native core decompresses;
+    # if the GIL were held, the ticker would stall for the whole call.
+    zpn = ZipNN(input_format="torch")
+    original_tensor = create_tensor(64)
+    compressed_data = zpn.compress(original_tensor.clone())
+
+    ticks = []
+    stop = threading.Event()
+
+    def ticker():
+        while not stop.is_set():
+            ticks.append(time.perf_counter())
+            time.sleep(0.001)
+
+    ticker_thread = threading.Thread(target=ticker)
+    ticker_thread.start()
+    try:
+        time.sleep(0.05)
+        start = time.perf_counter()
+        decompressed_data = zpn.decompress(compressed_data)
+        end = time.perf_counter()
+    finally:
+        stop.set()
+        ticker_thread.join()
+
+    if not torch.equal(original_tensor, decompressed_data):
+        raise ValueError("Error - original and decompressed tensors are NOT equal.")
+
+    inside = [start] + [t for t in ticks if start <= t <= end] + [end]
+    max_gap = max(b - a for a, b in zip(inside, inside[1:]))
+    print(f"decompress {end - start:.3f}s, ticks during call {len(inside) - 2}, max gap {max_gap:.3f}s")
+    if max_gap > 0.5 * (end - start):
+        raise ValueError("Error - Python threads were blocked during decompression (GIL held).")
+
+
+def test_parallel_decompression_scaling():
+    # N Python threads, each decompressing a different tensor with a single
+    # native thread, should scale close to linearly with the available cores.
+    cpus = os.cpu_count() or 1
+    if cpus < 2:
+        raise unittest.SkipTest("needs at least 2 CPUs")
+    num_threads = min(cpus, 4)
+
+    originals = [create_tensor(16) for _ in range(num_threads)]
+    codecs = [ZipNN(input_format="torch", threads=1) for _ in range(num_threads)]
+    blobs = [codecs[i].compress(originals[i].clone()) for i in range(num_threads)]
+    results = [None] * num_threads
+
+    def work(i):
+        results[i] = codecs[i].decompress(blobs[i])
+
+    start = time.perf_counter()
+    for i in range(num_threads):
+        work(i)
+    serial_time = time.perf_counter() - start
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    parallel_time = time.perf_counter() - start
+
+    for original, result in zip(originals, results):
+        if not torch.equal(original, result):
+            raise ValueError("Error - original and decompressed tensors are NOT equal.")
+
+    speedup = serial_time / parallel_time
+    print(f"{num_threads} threads: serial {serial_time:.3f}s parallel {parallel_time:.3f}s speedup {speedup:.2f}")
+    if speedup < 0.6 * num_threads:
+        raise ValueError(f"Error - decompression in {num_threads} threads scaled only {speedup:.2f}x.")
+
+
+def test_worker_pool_lifecycle():
+    # The native pool is resized, pinned, shut down and restarted lazily;
+    # results must not depend on its state.
+    import zipnn_core
+
+    zpn = ZipNN(input_format="torch", threads=4)
+    original_tensor = create_tensor(2)
+
+    def round_trip():
+        decompressed_data = zpn.decompress(zpn.compress(original_tensor.clone()))
+        if not torch.equal(original_tensor, decompressed_data):
+            raise ValueError("Error - original and decompressed tensors are NOT equal.")
+
+    default_workers = zipnn_core.get_num_workers()
+    try:
+        zipnn_core.set_num_workers(3)
+        if zipnn_core.get_num_workers() != 3:
+            raise ValueError("Error - set_num_workers did not resize the pool.")
+        round_trip()
+        zipnn_core.pin_workers([0])
+        round_trip()
+        zipnn_core.pin_workers(None)
+        zipnn_core.shutdown_pool()
+        round_trip()
+        zipnn_core.set_num_workers(0)
+        round_trip()
+    finally:
+        zipnn_core.set_num_workers(-1)
+    if zipnn_core.get_num_workers() != default_workers:
+        raise ValueError("Error - set_num_workers(-1) did not restore the default.")
+
+    # Many small tensors, the case the pool is there for
+    small = [create_tensor(0.004) for _ in range(500)]
+    for t in small:
+        if not torch.equal(t, zpn.decompress(zpn.compress(t.clone()))):
+            raise ValueError("Error - original and decompressed tensors are NOT equal.")
+
+
+def test_adaptive_threads():
+    # Small inputs run on the calling thread alone, large ones on the pool;
+    # the streams must not depend on the number of tasks.
+    import zipnn_core
+
+    zpn = ZipNN(input_format="torch", threads=4)
+    small_tensor = create_tensor(0.016)
+    before = zipnn_core.get_task_stats()
+    compressed_data = zpn.compress(small_tensor.clone())
+    if not torch.equal(small_tensor, zpn.decompress(compressed_data)):
+        raise ValueError("Error - original and decompressed tensors are NOT equal.")
+    after = zipnn_core.get_task_stats()
+    for stage in ("compress", "decompress"):
+        if after[f"{stage}_inline_calls"] != before[f"{stage}_inline_calls"] + 1:
+            raise ValueError(f"Error - the small {stage} call did not run inline.")
+        if after[f"{stage}_pool_calls"] != before[f"{stage}_pool_calls"]:
+            raise ValueError(f"Error - the small {stage} call used the pool.")
+
+    large_tensor = create_tensor(8)
+    compressed_data = zpn.compress(large_tensor.clone())
+    stats = zipnn_core.get_task_stats()
+    if stats["compress_ns_per_kb"] == 0 or stats["decompress_ns_per_kb"] == 0:
+        raise ValueError("Error - the cost per KB is not measured.")
+    try:
+        zipnn_core.set_adaptive_threads(False)
+        before = zipnn_core.get_task_stats()
+        fixed_data = zpn.compress(large_tensor.clone())
+        if zipnn_core.get_task_stats()["compress_pool_calls"] != before["compress_pool_calls"] + 1:
+            raise ValueError("Error - without adaptation the large call did not use the pool.")
+    finally:
+        zipnn_core.set_adaptive_threads(True)
+    if bytes(compressed_data) != bytes(fixed_data):
+        raise ValueError("Error - the stream depends on the number of tasks.")
+    if not torch.equal(large_tensor, zpn.decompress(fixed_data)):
+        raise ValueError("Error - original and decompressed tensors are NOT equal.")
+
+
+def test_shared_codec_threads():
+    # One instance serves concurrent calls of different dtypes and shapes,
+    # and decompressing data of another configuration leaves it unchanged.
+    from concurrent.futures import ThreadPoolExecutor
+
+    zpn = ZipNN(input_format="torch", threads=2)
+    tensors = []
+    for i, dtype in enumerate((torch.bfloat16, torch.float16, torch.float32, torch.float8_e4m3fn) * 4):
+        tensors.append((torch.randn(64 + i, 1024 * (i + 1)) * 0.02).to(dtype))
+    expected = [bytes(ZipNN(input_format="torch", threads=2).compress(tensor)) for tensor in tensors]
+
+    def round_trip(i):
+        for _ in range(3):
+            compressed_data = zpn.compress(tensors[i])
+            if bytes(compressed_data) != expected[i]:
+                raise ValueError(f"Error - {tensors[i].dtype} the stream of the shared instance is NOT equal.")
+            if not torch.equal(tensors[i], zpn.decompress(compressed_data)):
+                raise ValueError(f"Error - {tensors[i].dtype} original and decompressed tensors are NOT equal.")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(round_trip, range(len(tensors))))
+
+    zpn = ZipNN(bytearray_dtype="float32")
+    config = {key: copy.copy(value) for key, value in vars(zpn).items()}
+    data = os.urandom(4096) + bytes(300 * 1024)
+    other = ZipNN(method="HUFFMAN", is_streaming=True, streaming_chunk=64 * 1024, compression_chunk=64 * 1024)
+    if bytes(zpn.decompress(other.compress(data))) != data:
+        raise ValueError("Error - original and decompressed data are NOT equal.")
+    if vars(zpn) != config:
+        raise ValueError("Error - decompression changed the configuration of the instance.")
@@ -267,3 +267,1022 @@ def test_byte_torch_streaming():
     
     if os.path.exists(file_path):
         os.remove(file_path)
+
+
+def current_rss():
+    # Resident set size in bytes (Linux), falls back to the peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def test_compression_rss_soak(duration=None):
+    # Compress and decompress in a loop and check that RSS stays flat, every
+    # result buffer must be freed once its views are gone.
+    # ZIPNN_SOAK_SECONDS sets the duration of the quick run (5 seconds).
+    import time
+    if duration is None:
+        duration = float(os.environ.get("ZIPNN_SOAK_SECONDS", "5"))
+    zpn_torch = ZipNN(input_format='torch')
+    zpn_bytes = ZipNN()
+    original_tensor = torch.rand(2 * 1024 * 1024, dtype=torch.bfloat16) * 2 - 1
+    original_bytes = os.urandom(4 * 1024 * 1024)
+
+    def one_round():
+        decompressed_data = zpn_torch.decompress(zpn_torch.compress(original_tensor.clone()))
+        if not torch.equal(original_tensor, decompressed_data):
+            raise ValueError("Error - original file and decompressed file are NOT equal.")
+        decompressed_data = zpn_bytes.decompress(zpn_bytes.compress(bytearray(original_bytes)))
+        if not original_bytes == decompressed_data:
+            raise ValueError("Error - original file and decompressed file are NOT equal.")
+
+    # Warm up the allocator and the worker pool before taking the baseline
+    for _ in range(5):
+        one_round()
+    baseline = current_rss()
+
+    rounds = 0
+    start = time.time()
+    while time.time() - start < duration:
+        one_round()
+        rounds += 1
+    growth = current_rss() - baseline
+    print(f"soak: {rounds} rounds in {duration}s, RSS growth {growth / 2**20:.1f}MB")
+    if growth > 64 * 1024 * 1024:
+        raise ValueError(f"Error - RSS grew by {growth / 2**20:.1f}MB during the soak test.")
+
+
+def test_compression_rss_soak_long():
+    # The real soak run, ten minutes of test_compression_rss_soak, only with
+    # ZIPNN_SLOW_TESTS=1 (a slow leak doesn't show in the seconds of the quick run).
+    import unittest
+    if os.environ.get("ZIPNN_SLOW_TESTS") != "1":
+        raise unittest.SkipTest("set ZIPNN_SLOW_TESTS=1 to run the slow tests")
+    test_compression_rss_soak(duration=600)
+
+
+def test_compression_peak_memory():
+    # The compressor writes every chunk straight into the result buffer, so the
+    # traced peak is one worst case output (about the input size), not the
+    # input plus two copies of the output. The result memory comes from
+    # PyMem_RawMalloc, which tracemalloc sees.
+    import tracemalloc
+    zpn = ZipNN(input_format='torch')
+    original_tensor = torch.rand(8 * 1024 * 1024, dtype=torch.bfloat16) * 2 - 1
+    input_len = original_tensor.numel() * original_tensor.element_size()
+
+    tracemalloc.start()
+    try:
+        compressed_data = zpn.compress(original_tensor.clone())
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    print(f"compressed {len(compressed_data) / 2**20:.1f}MB, traced peak {peak / 2**20:.1f}MB")
+    if peak > 1.1 * input_len + 1024 * 1024:
+        raise ValueError(f"Error - compression peaked at {peak / 2**20:.1f}MB for a {input_len / 2**20:.1f}MB input.")
+    if current > len(compressed_data) + 1024 * 1024:
+        raise ValueError("Error - the result buffer was not shrunk to the compressed size.")
+    if not torch.equal(original_tensor, zpn.decompress(compressed_data)):
+        raise ValueError("Error - original file and decompressed file are NOT equal.")
+
+
+def test_scratch_allocations():
+    # Every worker reuses its scratch buffers for all of its chunks, so the
+    # native allocation calls per GB stay far below the number of chunks
+    # (a GB is 4096 chunks of 256KB).
+    import zipnn_core
+    zpn = ZipNN(input_format='torch')
+    original_tensor = torch.rand(64 * 1024 * 1024, dtype=torch.bfloat16) * 2 - 1
+
+    zipnn_core.reset_alloc_stats()
+    compressed_data = zpn.compress(original_tensor.clone())
+    decompressed_data = zpn.decompress(compressed_data)
+    stats = zipnn_core.get_alloc_stats()
+    if not torch.equal(original_tensor, decompressed_data):
+        raise ValueError("Error - original file and decompressed file are NOT equal.")
+
+    print(f"allocation calls per GB: compress {stats['compress_allocs_per_gb']:.0f}, decompress {stats['decompress_allocs_per_gb']:.0f}")
+    if stats['compress_bytes'] != original_tensor.numel() * 2:
+        raise ValueError("Error - the compressed bytes were not counted.")
+    if stats['compress_allocs_per_gb'] > 512 or stats['decompress_allocs_per_gb'] > 512:
+        raise ValueError("Error - compression allocates per chunk.")
+
+    # The scratch buffers hold the short tail of the last chunk as well
+    for bytearray_dtype in ('bfloat16', 'float16', 'float32'):
+        zpn = ZipNN(bytearray_dtype=bytearray_dtype)
+        for length in (1, 2, 3, 5, 256 * 1024 + 3, 1024 * 1024 + 1):
+            original_bytes = os.urandom(length)
+            if original_bytes != zpn.decompress(zpn.compress(bytearray(original_bytes))):
+                raise ValueError(f"Error - {bytearray_dtype} bytes of length {length} are NOT equal after decompression.")
+
+
+def test_simd_levels_identical():
+    # Every instruction set of the byte grouping kernels writes exactly the
+    # same stream, including the scalar tails of odd lengths.
+    import zipnn_core
+    levels = zipnn_core.supported_simd_levels()
+    best = zipnn_core.get_simd_level()
+    print(f"SIMD levels: {levels}, selected {best}")
+
+    cases = []
+    for dtype in (torch.bfloat16, torch.float16, torch.float32):
+        for numel in (1, 3, 17, 1000, 256 * 1024 + 5):
+            cases.append(('torch', dtype, torch.rand(numel, dtype=torch.float32).to(dtype) * 2 - 1))
+    for bytearray_dtype in ('bfloat16', 'float16', 'float32'):
+        for length in (1, 3, 63, 129, 4099, 256 * 1024 + 7):
+            cases.append(('byte', bytearray_dtype, os.urandom(length)))
+
+    try:
+        for input_format, dtype, original in cases:
+            streams = []
+            for level in levels:
+                zipnn_core.set_simd_level(level)
+                if input_format == 'torch':
+                    zpn = ZipNN(input_format='torch')
+                    compressed = bytes(zpn.compress(original.clone()))
+                    if not torch.equal(original, zpn.decompress(compressed)):
+                        raise ValueError(f"Error - {dtype} tensor is NOT equal after decompression with {level}.")
+                else:
+                    zpn = ZipNN(bytearray_dtype=dtype)
+                    compressed = bytes(zpn.compress(bytearray(original)))
+                    if original != zpn.decompress(compressed):
+                        raise ValueError(f"Error - {dtype} bytes are NOT equal after decompression with {level}.")
+                streams.append(compressed)
+            if any(stream != streams[0] for stream in streams):
+                raise ValueError(f"Error - {dtype} streams differ between SIMD levels {levels}.")
+    finally:
+        zipnn_core.set_simd_level(None)
+
+    if zipnn_core.get_simd_level() != best:
+        raise ValueError("Error - set_simd_level(None) did not restore the best level.")
+    try:
+        zipnn_core.set_simd_level("no-such-level")
+    except ValueError:
+        pass
+    else:
+        raise ValueError("Error - an unknown SIMD level was accepted.")
+
+
+def test_tiled_byte_transforms():
+    # The bits are reordered and the bytes grouped tile by tile (16KB), the
+    # lengths around the tile edges round trip and the input is not modified.
+    tile = 16 * 1024
+    lengths = (tile - 1, tile, tile + 1, tile + 2, 3 * tile + 3, 256 * 1024 + 6)
+    for bytearray_dtype in ('bfloat16', 'float16', 'float32'):
+        zpn = ZipNN(bytearray_dtype=bytearray_dtype)
+        for length in lengths:
+            original_bytes = bytearray(os.urandom(length))
+            saved_bytes = bytes(original_bytes)
+            decompressed_bytes = zpn.decompress(zpn.compress(original_bytes))
+            if original_bytes != saved_bytes:
+                raise ValueError(f"Error - {bytearray_dtype} compression modified its input of length {length}.")
+            if decompressed_bytes != saved_bytes:
+                raise ValueError(f"Error - {bytearray_dtype} bytes of length {length} are NOT equal after decompression.")
+
+    zpn = ZipNN(input_format='torch')
+    for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn):
+        original_tensor = (torch.randn(3 * tile + 5) * 0.02).to(dtype)
+        saved_tensor = original_tensor.clone()
+        decompressed_tensor = zpn.decompress(zpn.compress(original_tensor))
+        if not torch.equal(original_tensor.view(torch.uint8), saved_tensor.view(torch.uint8)):
+            raise ValueError(f"Error - {dtype} compression modified its input tensor.")
+        if not torch.equal(decompressed_tensor.view(torch.uint8), saved_tensor.view(torch.uint8)):
+            raise ValueError(f"Error - {dtype} tensor is NOT equal after decompression.")
+
+
+def test_early_abort_incompressible():
+    # The low (mantissa) byte group of bf16 weights does not compress, after
+    # check_th_after_percent of the chunks the rest of it is stored without
+    # calling the entropy coder. The exponent group is still compressed.
+    import zipnn_core
+    original_tensor = (torch.randn(16 * 1024 * 1024) * 0.02).to(torch.bfloat16)
+    mantissa_bytes = original_tensor.numel()
+
+    skipped = {}
+    for check_th_after_percent in (10, 100):
+        zpn = ZipNN(input_format='torch', check_th_after_percent=check_th_after_percent)
+        zipnn_core.reset_alloc_stats()
+        compressed_data = zpn.compress(original_tensor.clone())
+        stats = zipnn_core.get_alloc_stats()
+        if not torch.equal(original_tensor, zpn.decompress(compressed_data)):
+            raise ValueError("Error - original tensor and decompressed tensor are NOT equal.")
+        if len(compressed_data) >= original_tensor.numel() * 2 * 0.9:
+            raise ValueError("Error - the exponent group was not compressed.")
+        skipped[check_th_after_percent] = stats['entropy_skipped_bytes']
+        print(f"check after {check_th_after_percent}%: stored {stats['stored_bytes']}, skipped the entropy coder {stats['entropy_skipped_bytes']}")
+
+    # Every mantissa chunk after the checked 10% (13 of the 128 chunks) is stored
+    chunks = original_tensor.numel() * 2 // zpn.compression_chunk
+    checked = -(-chunks * 10 // 100)
+    if skipped[10] != mantissa_bytes // chunks * (chunks - checked):
+        raise ValueError(f"Error - the incompressible group was not aborted after the checked chunks: {skipped[10]}.")
+    if skipped[100] != 0:
+        raise ValueError("Error - check_th_after_percent=100 aborted a group.")
+
+    # The decision doesn't depend on the order the workers finish in
+    zpn = ZipNN(input_format='torch', threads=8)
+    first = bytes(zpn.compress(original_tensor.clone()))
+    for _ in range(5):
+        if bytes(zpn.compress(original_tensor.clone())) != first:
+            raise ValueError("Error - the early abort gave different outputs with threads.")
+
+    # A compressible group is never aborted
+    zpn = ZipNN(input_format='torch')
+    zipnn_core.reset_alloc_stats()
+    zeros = torch.zeros(4 * 1024 * 1024, dtype=torch.bfloat16)
+    if not torch.equal(zeros, zpn.decompress(zpn.compress(zeros.clone()))):
+        raise ValueError("Error - zeros are NOT equal after decompression.")
+    if zipnn_core.get_alloc_stats()['entropy_skipped_bytes'] != 0:
+        raise ValueError("Error - a compressible group was aborted.")
+
+
+def test_chunk_codec_selection():
+    # With method AUTO every chunk of every byte group picks Huffman, FSE, zstd
+    # or the all-zero type, HUFFMAN keeps every chunk on Huffman.
+    def compressed_sizes(original_tensor):
+        sizes = {}
+        for method in ('HUFFMAN', 'AUTO'):
+            zpn = ZipNN(input_format='torch', method=method)
+            compressed_data = zpn.compress(original_tensor.clone())
+            if not torch.equal(original_tensor, zpn.decompress(compressed_data)):
+                raise ValueError(f"Error - {method} original tensor and decompressed tensor are NOT equal.")
+            sizes[method] = len(compressed_data)
+        return sizes
+
+    # All zero, only the chunk types are stored
+    sizes = compressed_sizes(torch.zeros(4 * 1024 * 1024, dtype=torch.bfloat16))
+    if sizes['AUTO'] > 64 * 1024 or sizes['AUTO'] >= sizes['HUFFMAN']:
+        raise ValueError(f"Error - all zero tensor compressed to {sizes}.")
+
+    # Pruned rows, the zeros come in runs (zstd)
+    pruned = (torch.randn(4096, 1024) * 0.02).to(torch.bfloat16)
+    pruned[torch.rand(4096) < 0.7] = 0
+    sizes = compressed_sizes(pruned.flatten())
+    if sizes['AUTO'] >= sizes['HUFFMAN']:
+        raise ValueError(f"Error - pruned rows did not compress better with AUTO {sizes}.")
+
+    # Scattered zeros, one dominant byte value (FSE)
+    sparse = (torch.randn(4 * 1024 * 1024) * 0.02).to(torch.bfloat16)
+    sparse[torch.rand(sparse.numel()) < 0.9] = 0
+    sizes = compressed_sizes(sparse)
+    if sizes['AUTO'] >= sizes['HUFFMAN']:
+        raise ValueError(f"Error - scattered zeros did not compress better with AUTO {sizes}.")
+
+    # Plain weights of every byte grouping still round trip
+    for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn):
+        compressed_sizes((torch.randn(1024 * 1024) * 0.02).to(dtype))
+
+
+def test_decompress_range():
+    # decompress_range decodes only the chunks covering the range, it returns
+    # the same bytes as slicing the full decompression
+    import zipnn_core
+    for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn):
+        original_tensor = (torch.randn(3 * 1024 * 1024 + 7) * 0.02).to(dtype)
+        original_bytes = original_tensor.view(torch.uint8).numpy().tobytes()
+        zpn = ZipNN(input_format='torch')
+        compressed_data = zpn.compress(original_tensor.clone())
+        chunk = 256 * 1024
+        for offset, length in ((0, len(original_bytes)), (0, 1), (chunk - 3, 6), (5 * chunk + 11, 3 * chunk),
+                               (len(original_bytes) - 5, 5), (len(original_bytes), 0), (12345, 0)):
+            data = bytes(zpn.decompress_range(compressed_data, offset, length))
+            if data != original_bytes[offset : offset + length]:
+                raise ValueError(f"Error - {dtype} range ({offset}, {length}) is NOT equal.")
+
+        zipnn_core.reset_alloc_stats()
+        zpn.decompress_range(compressed_data, 2 * chunk + 100, 200)
+        if zipnn_core.get_alloc_stats()['decompress_bytes'] > chunk:
+            raise ValueError("Error - decompress_range decoded more than the covering chunk.")
+
+        try:
+            zpn.decompress_range(compressed_data, len(original_bytes) - 5, 6)
+            raise ValueError("Error - a range out of the data was accepted.")
+        except ValueError as e:
+            if "out of the original data" not in str(e):
+                raise
+
+    # Streaming frames, the range crosses frame boundaries
+    original_bytes = (torch.randn(600 * 1024) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy().tobytes()
+    zpn = ZipNN(is_streaming=True, streaming_chunk=256 * 1024)
+    compressed_data = zpn.compress(original_bytes)
+    for offset, length in ((0, len(original_bytes)), (256 * 1024 - 10, 20), (100, 700 * 1024), (len(original_bytes) - 1, 1)):
+        if bytes(zpn.decompress_range(compressed_data, offset, length)) != original_bytes[offset : offset + length]:
+            raise ValueError(f"Error - streaming range ({offset}, {length}) is NOT equal.")
+
+    # A chunk index that doesn't fit the data is rejected before any chunk is decoded:
+    # [chunk types][cumulative sizes][shared tables] of 2 byte groups follow the header
+    zpn = ZipNN(bytearray_dtype='bfloat16')
+    compressed_data = bytes(zpn.compress(original_bytes))
+    num_chunks = -(-len(original_bytes) // zpn.compression_chunk)
+    types, sizes = zpn.header_length, zpn.header_length + 2 * num_chunks
+    tables = sizes + 2 * num_chunks * 8
+    corrupted = {
+        "chunk type": compressed_data[:types] + bytes([9]) + compressed_data[types + 1 :],
+        "cumulative size": compressed_data[:sizes] + (2**40).to_bytes(8, "little") + compressed_data[sizes + 8 :],
+        "table length": compressed_data[:tables] + (60000).to_bytes(2, "little") + compressed_data[tables + 2 :],
+        "truncated data": compressed_data[: tables + 2],
+    }
+    for name, data in corrupted.items():
+        for decompress in (
+            lambda: zpn.decompress(data),
+            lambda: zpn.decompress_range(data, 100, 1000),
+            lambda: zpn.decompress_into(data, bytearray(len(original_bytes))),
+        ):
+            try:
+                decompress()
+                raise ValueError(f"Error - data with a corrupted {name} was decompressed.")
+            except ValueError as e:
+                if "corrupted" not in str(e):
+                    raise
+
+
+def test_shared_huffman_table():
+    # One Huffman table per byte group, chunks whose distribution drifts away
+    # from it keep their own table
+    sizes = {}
+    drifting = torch.cat([(torch.randn(2 * 1024 * 1024) * 0.02), (torch.rand(2 * 1024 * 1024) * 1000)]).to(torch.bfloat16)
+    for shared in (False, True):
+        for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn):
+            original_tensor = (torch.randn(4 * 1024 * 1024) * 0.02).to(dtype)
+            for compression_chunk in (64 * 1024, 256 * 1024):
+                zpn = ZipNN(input_format='torch', compression_chunk=compression_chunk, shared_huffman_table=shared)
+                compressed_data = zpn.compress(original_tensor.clone())
+                if not torch.equal(original_tensor, zpn.decompress(compressed_data)):
+                    raise ValueError(f"Error - {dtype} shared={shared} original tensor and decompressed tensor are NOT equal.")
+                sizes[(shared, dtype, compression_chunk)] = len(compressed_data)
+
+        zpn = ZipNN(input_format='torch', shared_huffman_table=shared)
+        compressed_data = zpn.compress(drifting.clone())
+        if not torch.equal(drifting, zpn.decompress(compressed_data)):
+            raise ValueError(f"Error - drifting shared={shared} original tensor and decompressed tensor are NOT equal.")
+        sizes[(shared, 'drifting')] = len(compressed_data)
+        original_bytes = drifting.view(torch.uint8).numpy().tobytes()
+        if bytes(zpn.decompress_range(compressed_data, 3 * 1024 * 1024 + 5, 2 * 1024 * 1024)) != original_bytes[3 * 1024 * 1024 + 5 : 5 * 1024 * 1024 + 5]:
+            raise ValueError(f"Error - drifting shared={shared} range is NOT equal.")
+
+    for key in sizes:
+        if key[0] and sizes[key] > sizes[(False,) + key[1:]] * 1.005:
+            raise ValueError(f"Error - the shared table grew {key[1:]} from {sizes[(False,) + key[1:]]} to {sizes[key]}.")
+    if sizes[(True, torch.bfloat16, 256 * 1024)] == sizes[(False, torch.bfloat16, 256 * 1024)] and sizes[(True, torch.bfloat16, 64 * 1024)] == sizes[(False, torch.bfloat16, 64 * 1024)]:
+        raise ValueError("Error - the shared table was not used.")
+
+
+def test_dictionary():
+    # Tensors of one family share a dictionary, the streams only keep its id.
+    # A chunk with a value the dictionary tables cannot code keeps its own table.
+    from zipnn.util_safetensors import set_dictionary_metadata, get_dictionary_metadata
+    torch.manual_seed(12)
+    family = [(torch.randn(64 * 1024) * 0.02).to(dtype) for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn) for _ in range(4)]
+    dictionary = ZipNN(input_format='torch').train_dictionary(family)
+    small_sizes = [0, 0]
+    for dtype in (torch.bfloat16, torch.float32, torch.float8_e4m3fn):
+        for numel in (2 * 1024, 16 * 1024, 1024 * 1024):
+            original_tensor = (torch.randn(numel) * 0.02).to(dtype)
+            compressed_plain = ZipNN(input_format='torch').compress(original_tensor.clone())
+            zpn = ZipNN(input_format='torch', dictionary=dictionary)
+            compressed_data = zpn.compress(original_tensor.clone())
+            if not torch.equal(original_tensor, ZipNN(input_format='torch', dictionary=dictionary).decompress(compressed_data)):
+                raise ValueError(f"Error - {dtype} {numel} original tensor and decompressed tensor are NOT equal.")
+            original_bytes = original_tensor.view(torch.uint8).numpy().tobytes()
+            if bytes(zpn.decompress_range(compressed_data, 100, 1000)) != original_bytes[100:1100]:
+                raise ValueError(f"Error - {dtype} {numel} range is NOT equal.")
+            if len(compressed_data) > len(compressed_plain) * 1.005:
+                raise ValueError(f"Error - {dtype} {numel} the dictionary grew the data: {len(compressed_data)} > {len(compressed_plain)}.")
+            if numel <= 16 * 1024:
+                small_sizes[0] += len(compressed_plain)
+                small_sizes[1] += len(compressed_data)
+            if bytes(compressed_data) == bytes(compressed_plain):
+                continue
+            try:
+                ZipNN(input_format='torch').decompress(compressed_data)
+                raise AssertionError
+            except ValueError:
+                pass
+            except AssertionError:
+                raise ValueError(f"Error - {dtype} {numel} decompressed without the dictionary.")
+    if small_sizes[1] >= small_sizes[0]:
+        raise ValueError(f"Error - the dictionary did not help small tensors: {small_sizes[1]} >= {small_sizes[0]}.")
+
+    metadata = {"format": "pt"}
+    set_dictionary_metadata(dictionary, metadata)
+    if get_dictionary_metadata(metadata) != dictionary or get_dictionary_metadata({"format": "pt"}) is not None:
+        raise ValueError("Error - the dictionary metadata is NOT equal.")
+
+
+def test_batch():
+    # Many tensors in one native call give the same streams as one call each
+    torch.manual_seed(13)
+    tensors = []
+    for numel in (1, 17, 1024, 64 * 1024, 1024 * 1024 + 5):
+        for dtype in (torch.bfloat16, torch.float16, torch.float32, torch.float8_e4m3fn):
+            tensors.append((torch.randn(numel) * 0.02).to(dtype))
+    tensors.append(torch.zeros(300 * 1024, dtype=torch.bfloat16))
+    for method in ('HUFFMAN', 'AUTO'):
+        zpn = ZipNN(input_format='torch', method=method)
+        compressed_list = zpn.compress_batch([tensor.clone() for tensor in tensors])
+        for tensor, compressed_data in zip(tensors, compressed_list):
+            if bytes(compressed_data) != bytes(ZipNN(input_format='torch', method=method).compress(tensor.clone())):
+                raise ValueError(f"Error - {method} {tensor.dtype} {tensor.numel()} the batch stream is NOT equal to a single call.")
+        for tensor, decompressed_data in zip(tensors, zpn.decompress_batch(compressed_list)):
+            if not torch.equal(tensor, decompressed_data):
+                raise ValueError(f"Error - {method} {tensor.dtype} {tensor.numel()} original tensor and decompressed tensor are NOT equal.")
+
+    zpn = ZipNN(bytearray_dtype='float32')
+    buffers = [os.urandom(length) for length in (4, 4096, 300 * 1024)]
+    compressed_list = zpn.compress_batch([bytearray(buffer) for buffer in buffers])
+    if [bytes(data) for data in zpn.decompress_batch(compressed_list)] != buffers:
+        raise ValueError("Error - the decompressed byte buffers are NOT equal.")
+    if zpn.compress_batch([]) != [] or zpn.decompress_batch([]) != []:
+        raise ValueError("Error - an empty batch is not empty.")
+
+
+def test_zero_copy():
+    # Compression reads the tensor, ndarray or buffer in place and decompression
+    # hands out the native result buffer (as the tensor storage), so the traced
+    # peak of a call stays below its worst case output plus a small constant
+    # (a streaming frame).
+    import tracemalloc
+    torch.manual_seed(14)
+    tensor = torch.randn(4 * 1024 * 1024) * 0.02
+    input_len = tensor.numel() * tensor.element_size()
+    cases = [
+        ('torch', ZipNN(input_format='torch'), tensor),
+        ('numpy', ZipNN(input_format='numpy'), tensor.numpy()),
+        ('byte', ZipNN(bytearray_dtype='float32'), memoryview(tensor.numpy()).cast('B')),
+        ('streaming', ZipNN(bytearray_dtype='float32', is_streaming=True, streaming_chunk=1024 * 1024), memoryview(tensor.numpy()).cast('B')),
+    ]
+    for name, zpn, data in cases:
+        tracemalloc.start()
+        try:
+            compressed_data = zpn.compress(data)
+            compress_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            decompressed_data = zpn.decompress(compressed_data)
+            decompress_peak = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+
+        print(f"{name}: compression peak {compress_peak / 2**20:.1f}MB, decompression peak {decompress_peak / 2**20:.1f}MB, input {input_len / 2**20:.1f}MB")
+        if compress_peak > 1.05 * input_len + 1024 * 1024:
+            raise ValueError(f"Error - {name} compression copied the input, peak {compress_peak / 2**20:.1f}MB.")
+        if decompress_peak > input_len + 2 * 1024 * 1024:
+            raise ValueError(f"Error - {name} decompression copied the output, peak {decompress_peak / 2**20:.1f}MB.")
+        if name == 'torch':
+            equal = torch.equal(tensor, decompressed_data)
+        elif name == 'numpy':
+            equal = np.array_equal(tensor.numpy(), decompressed_data)
+        else:
+            equal = bytes(decompressed_data) == bytes(data)
+        if not equal:
+            raise ValueError(f"Error - {name} original and decompressed data are NOT equal.")
+
+
+def test_decompress_into():
+    # The core writes the output straight into a caller buffer: a tensor, a
+    # parameter, a numpy array, an mmap or shared memory, with no allocation
+    # of the output size.
+    import mmap
+    import tempfile
+    import tracemalloc
+    from multiprocessing import shared_memory
+    torch.manual_seed(15)
+    zpn = ZipNN(input_format='torch')
+    for dtype in (torch.bfloat16, torch.float16, torch.float32, torch.float8_e4m3fn):
+        tensor = (torch.randn(257, 1031) * 0.02).to(dtype)
+        compressed_data = zpn.compress(tensor)
+        out = torch.empty_like(tensor)
+        data_ptr = out.data_ptr()
+        if zpn.decompress_into(compressed_data, out) is not out or out.data_ptr() != data_ptr:
+            raise ValueError(f"Error - {dtype} decompress_into did not return its output.")
+        if not torch.equal(tensor, out):
+            raise ValueError(f"Error - {dtype} original tensor and decompressed tensor are NOT equal.")
+
+    tensor = torch.randn(1024, 1024) * 0.02
+    compressed_data = zpn.compress(tensor)
+    parameter = torch.nn.Parameter(torch.empty(1024, 1024))
+    tracemalloc.start()
+    try:
+        zpn.decompress_into(compressed_data, parameter.data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    if not torch.equal(tensor, parameter.data):
+        raise ValueError("Error - the parameter was not filled in place.")
+    if peak > 256 * 1024:
+        raise ValueError(f"Error - decompress_into allocated {peak / 2**20:.1f}MB.")
+
+    raw = tensor.numpy().tobytes()
+    array = np.empty(1024 * 1024, dtype=np.float32)
+    zpn.decompress_into(compressed_data, array)
+    if array.tobytes() != raw:
+        raise ValueError("Error - the numpy array was not filled.")
+    with tempfile.TemporaryFile() as f:
+        f.truncate(len(raw) + 4096)
+        with mmap.mmap(f.fileno(), len(raw) + 4096) as mm:
+            zpn.decompress_into(compressed_data, memoryview(mm)[4096:])
+            if mm[4096:] != raw:
+                raise ValueError("Error - the mmap slice was not filled.")
+    shm = shared_memory.SharedMemory(create=True, size=len(raw))
+    try:
+        zpn.decompress_into(compressed_data, shm.buf[: len(raw)])
+        if bytes(shm.buf[: len(raw)]) != raw:
+            raise ValueError("Error - the shared memory was not filled.")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    streaming = ZipNN(bytearray_dtype='float32', is_streaming=True, streaming_chunk=256 * 1024)
+    out = bytearray(len(raw))
+    streaming.decompress_into(streaming.compress(raw), out)
+    if out != raw:
+        raise ValueError("Error - the streaming data was not decompressed into the buffer.")
+
+    for bad_out in (torch.empty(1024, 1023), torch.empty(1024, 1024, dtype=torch.int32), bytes(len(raw)), bytearray(len(raw) + 1)):
+        try:
+            zpn.decompress_into(compressed_data, bad_out)
+        except ValueError:
+            continue
+        raise ValueError("Error - decompress_into accepted a wrong output.")
+
+
+def test_compress_decompress_iter():
+    # The generators frame the data like a streaming compress, whatever the
+    # sizes of the pieces, and keep the memory to a few frames.
+    import random
+    import tracemalloc
+    torch.manual_seed(16)
+    random.seed(16)
+    streaming_chunk = 256 * 1024
+    zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk)
+    data = memoryview((torch.randn(3 * 1024 * 1024 + 7) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+
+    def pieces(buffer):
+        offset = 0
+        while offset < len(buffer):
+            size = random.choice((1, 31, 33, 4096, streaming_chunk - 1, streaming_chunk, 3 * streaming_chunk + 5))
+            yield buffer[offset : offset + size]
+            offset += size
+
+    compressed_data = b"".join(zpn.compress_iter(pieces(data)))
+    if compressed_data != bytes(zpn.compress(data)):
+        raise ValueError("Error - compress_iter is NOT equal to a streaming compress.")
+    if b"".join(zpn.decompress_iter(pieces(compressed_data))) != data:
+        raise ValueError("Error - original and decompress_iter data are NOT equal.")
+    if list(zpn.compress_iter([])) != [] or list(zpn.decompress_iter([b""])) != []:
+        raise ValueError("Error - an empty stream is not empty.")
+    try:
+        list(zpn.decompress_iter([compressed_data[:-1]]))
+        raise ValueError("Error - a truncated stream was accepted.")
+    except ValueError as e:
+        if "middle of a frame" not in str(e):
+            raise
+
+    # A 64MB stream through both generators, generated and checked piece by piece
+    def source():
+        for _ in range(64):
+            yield memoryview((torch.randn(512 * 1024) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+
+    total = 0
+    tracemalloc.start()
+    try:
+        for frame in zpn.decompress_iter(zpn.compress_iter(source())):
+            total += len(frame)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    if total != 64 * 1024 * 1024:
+        raise ValueError(f"Error - decompress_iter returned {total} bytes.")
+    if peak > 8 * streaming_chunk:
+        raise ValueError(f"Error - the generators peaked at {peak / 2**20:.1f}MB.")
+
+
+def test_compress_decompress_file():
+    # File to file through the pipeline gives the frames of a streaming compress
+    # and keeps the memory to a few frames whatever the file size.
+    import io
+    import tempfile
+    import tracemalloc
+    torch.manual_seed(19)
+    streaming_chunk = 256 * 1024
+    zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk)
+    data = memoryview((torch.randn(3 * 1024 * 1024 + 7) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        original_path = os.path.join(tmp_dir, "data.bin")
+        compressed_path = original_path + ".znn"
+        decompressed_path = os.path.join(tmp_dir, "data.out")
+        with open(original_path, "wb") as f:
+            f.write(data)
+        sizes = zpn.compress_file(original_path, compressed_path)
+        with open(compressed_path, "rb") as f:
+            compressed_data = f.read()
+        if compressed_data != bytes(zpn.compress(data)) or sizes != (len(data), len(compressed_data)):
+            raise ValueError("Error - compress_file is NOT equal to a streaming compress.")
+        if zpn.decompress_file(compressed_path, decompressed_path) != (len(compressed_data), len(data)):
+            raise ValueError("Error - decompress_file returned wrong sizes.")
+        with open(decompressed_path, "rb") as f:
+            if f.read() != data:
+                raise ValueError("Error - original and decompress_file data are NOT equal.")
+        if zpn.decompress_read_file(compressed_path) != data:
+            raise ValueError("Error - original and decompress_read_file data are NOT equal.")
+
+        # A 64MB file through both, the memory stays at a few frames
+        with open(original_path, "wb") as f:
+            for _ in range(64):
+                f.write((torch.randn(512 * 1024) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy().tobytes())
+        tracemalloc.start()
+        try:
+            zpn.compress_file(original_path, compressed_path)
+            zpn.decompress_file(compressed_path, decompressed_path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        if os.path.getsize(decompressed_path) != 64 * 1024 * 1024:
+            raise ValueError("Error - decompress_file wrote a wrong size.")
+        if peak > 12 * streaming_chunk:
+            raise ValueError(f"Error - the file pipeline peaked at {peak / 2**20:.1f}MB.")
+
+    # File objects, e.g. stdin and stdout, and a single frame of a non streaming compress
+    compressed = io.BytesIO()
+    zpn.compress_file(io.BytesIO(data), compressed)
+    decompressed = io.BytesIO()
+    zpn.decompress_file(io.BytesIO(compressed.getvalue()), decompressed)
+    if decompressed.getvalue() != data:
+        raise ValueError("Error - original and decompress_file data through file objects are NOT equal.")
+    single_frame = ZipNN(bytearray_dtype='bfloat16').compress(data)
+    decompressed = io.BytesIO()
+    zpn.decompress_file(io.BytesIO(single_frame), decompressed)
+    if decompressed.getvalue() != data:
+        raise ValueError("Error - original and decompress_file data of a single frame are NOT equal.")
+    try:
+        zpn.decompress_file(io.BytesIO(compressed.getvalue()[:-1]), io.BytesIO())
+        raise ValueError("Error - a truncated file was accepted.")
+    except ValueError as e:
+        if "middle of a frame" not in str(e):
+            raise
+
+
+def test_streaming_frames_parallel():
+    # The frames of streaming data decode together into their offsets, the
+    # same as frame by frame, with the delta and into a caller buffer too.
+    import zipnn_core
+    torch.manual_seed(20)
+    data = memoryview((torch.randn(5 * 1024 * 1024 + 3) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+    for streaming_chunk in (64 * 1024, 1024 * 1024):
+        zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk, threads=4)
+        compressed_data = zpn.compress(data)
+        frame_by_frame = b"".join(zpn.decompress_iter([compressed_data]))
+        if zpn.decompress(compressed_data) != data or frame_by_frame != data:
+            raise ValueError(f"Error - streaming decompress of {streaming_chunk} byte frames is NOT equal.")
+        out = bytearray(len(data))
+        zpn.decompress_into(compressed_data, out)
+        if out != data:
+            raise ValueError("Error - streaming decompress_into is NOT equal.")
+
+    base = bytes(torch.randn(len(data) // 2).to(torch.bfloat16).view(torch.uint8).numpy())
+    zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=256 * 1024, delta_compressed_type='byte')
+    if zpn.decompress(zpn.compress(data, delta_second_data=base), delta_second_data=base) != data:
+        raise ValueError("Error - streaming delta decompress is NOT equal.")
+
+    # A batch job with an output of another length is refused
+    single = ZipNN(bytearray_dtype='bfloat16')
+    compressed_data = single.compress(data)
+    header = single._retrieve_header(compressed_data)
+    try:
+        zipnn_core.decompress_batch([single._decompress_job(compressed_data, header) + (bytearray(len(data) - 1),)], 1)
+        raise ValueError("Error - a short output buffer was accepted.")
+    except ValueError as e:
+        if "length of the original data" not in str(e):
+            raise
+
+
+def test_streaming_index():
+    # Streaming data with an index decodes like data without one through every
+    # path, and the index maps the original offsets to the frames.
+    import io
+    torch.manual_seed(21)
+    streaming_chunk = 256 * 1024
+    data = memoryview((torch.randn(1024 * 1024 + 9) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+    plain = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk)
+    zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk, streaming_index=True)
+    plain_data = bytes(plain.compress(data))
+    compressed_data = bytes(zpn.compress(data))
+    if b"".join(zpn.compress_iter([data])) != compressed_data:
+        raise ValueError("Error - compress_iter with an index is NOT equal to compress.")
+    compressed = io.BytesIO()
+    zpn.compress_file(io.BytesIO(data), compressed)
+    if compressed.getvalue() != compressed_data or not compressed_data.startswith(plain_data):
+        raise ValueError("Error - compress_file with an index is NOT equal to compress.")
+
+    entries = zpn.read_index(io.BytesIO(compressed_data))
+    if plain.read_index(plain_data) is not None or entries != zpn.read_index(compressed_data):
+        raise ValueError("Error - read_index is wrong.")
+    if len(entries) != -(-len(data) // streaming_chunk) or entries[-1].orig_offset + entries[-1].orig_length != len(data):
+        raise ValueError("Error - the index doesn't cover the frames.")
+    for entry in entries:
+        frame = compressed_data[entry.comp_offset : entry.comp_offset + entry.comp_length]
+        if plain.decompress(frame) != data[entry.orig_offset : entry.orig_offset + entry.orig_length]:
+            raise ValueError("Error - an index entry doesn't point at its frame.")
+
+    # Old readers of the same data and the new ones of data without an index
+    for reader_data in (compressed_data, plain_data):
+        if plain.decompress(reader_data) != data or b"".join(plain.decompress_iter([reader_data])) != data:
+            raise ValueError("Error - decompress of indexed data is NOT equal.")
+        out = io.BytesIO()
+        plain.decompress_file(io.BytesIO(reader_data), out)
+        if out.getvalue() != data:
+            raise ValueError("Error - decompress_file of indexed data is NOT equal.")
+        for offset, length in ((0, 10), (streaming_chunk - 3, 6), (len(data) - 7, 7), (100, 3 * streaming_chunk)):
+            if bytes(plain.decompress_range(reader_data, offset, length)) != data[offset : offset + length]:
+                raise ValueError("Error - decompress_range of indexed data is NOT equal.")
+
+    try:
+        plain.decompress(compressed_data[:-20] + compressed_data[-16:])
+        raise ValueError("Error - a damaged index was accepted.")
+    except ValueError as e:
+        if "index" not in str(e):
+            raise
+
+    # The data of an empty input is the index alone, every path decodes it to nothing
+    empty = zpn.compress(b"")
+    if zpn.decompress(empty) != b"" or b"".join(zpn.decompress_iter([empty])) != b"":
+        raise ValueError("Error - decompress of an empty input with an index is NOT empty.")
+    if zpn.decompress_into(empty, bytearray()) != b"" or bytes(zpn.decompress_range(empty, 0, 0)) != b"":
+        raise ValueError("Error - decompress_into or decompress_range of an empty input with an index is NOT empty.")
+    delta = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_index=True, delta_compressed_type="byte")
+    if delta.decompress(delta.compress(b"", delta_second_data=b""), delta_second_data=b"") != b"":
+        raise ValueError("Error - delta decompress of an empty input with an index is NOT empty.")
+
+
+def test_zipnn_open():
+    # zipnn.open gives file objects: the writer produces the frames of a
+    # streaming compress, the reader seeks and reads any range with the
+    # memory of a few frames, with and without an index.
+    import io
+    import random
+    import tracemalloc
+    import zipnn
+    torch.manual_seed(22)
+    random.seed(22)
+    streaming_chunk = 256 * 1024
+    data = bytes((torch.randn(3 * 1024 * 1024 + 5) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy())
+    for streaming_index in (True, False):
+        compressed = io.BytesIO()
+        with zipnn.open(compressed, "wb", streaming_chunk=streaming_chunk, streaming_index=streaming_index) as writer:
+            for offset in range(0, len(data), 100003):
+                writer.write(data[offset : offset + 100003])
+        expected = ZipNN(is_streaming=True, streaming_chunk=streaming_chunk, streaming_index=streaming_index).compress(data)
+        if compressed.getvalue() != expected:
+            raise ValueError("Error - ZipNNWriter is NOT equal to a streaming compress.")
+        with zipnn.open(io.BytesIO(compressed.getvalue())) as reader:
+            if reader.read() != data or reader.read(10) != b"":
+                raise ValueError("Error - ZipNNReader read is NOT equal.")
+            for _ in range(100):
+                offset = random.randrange(len(data))
+                length = random.randrange(3 * streaming_chunk)
+                if reader.seek(offset) != offset or reader.read(length) != data[offset : offset + length]:
+                    raise ValueError("Error - ZipNNReader seek and read is NOT equal.")
+            if reader.seek(-7, 2) != len(data) - 7 or reader.read() != data[-7:]:
+                raise ValueError("Error - ZipNNReader seek from the end is NOT equal.")
+
+    # Reading the whole file keeps to a few frames
+    compressed = io.BytesIO(compressed.getvalue())
+    tracemalloc.start()
+    try:
+        with zipnn.open(compressed, cache_frames=2, read_ahead=1) as reader:
+            piece = bytearray(64 * 1024)
+            while reader.readinto(piece):
+                pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    if peak > 8 * streaming_chunk:
+        raise ValueError(f"Error - ZipNNReader peaked at {peak / 2**20:.1f}MB.")
+
+    # A checkpoint loads through the reader
+    state_dict = {"weight": torch.randn(512, 1024), "step": torch.arange(3)}
+    compressed = io.BytesIO()
+    with zipnn.open(compressed, "wb", bytearray_dtype="float32") as writer:
+        torch.save(state_dict, writer)
+    with zipnn.open(io.BytesIO(compressed.getvalue())) as reader:
+        loaded = torch.load(reader, weights_only=True)
+    if not torch.equal(loaded["weight"], state_dict["weight"]) or not torch.equal(loaded["step"], state_dict["step"]):
+        raise ValueError("Error - torch.load through ZipNNReader is NOT equal.")
+
+    # A file that isn't ZipNN is rejected as such
+    try:
+        zipnn.open(io.BytesIO(b"not a zipnn file " * 256))
+        raise ValueError("Error - ZipNNReader accepted a file that isn't ZipNN.")
+    except ValueError as e:
+        if "Not a ZipNN file" not in str(e):
+            raise
+
+
+def test_decompress_mmap():
+    # decompress_file with use_mmap decodes between maps of the files with
+    # almost nothing on the heap, for streaming and single frame files.
+    import tempfile
+    import tracemalloc
+    torch.manual_seed(23)
+    data = memoryview((torch.randn(8 * 1024 * 1024 + 3) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy()).cast('B')
+    compressors = (
+        ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=256 * 1024),
+        ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=1024 * 1024, streaming_index=True),
+        ZipNN(bytearray_dtype='bfloat16'),
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        compressed_path = os.path.join(tmp_dir, "data.znn")
+        decompressed_path = os.path.join(tmp_dir, "data")
+        for zpn in compressors:
+            compressed_data = zpn.compress(data)
+            with open(compressed_path, "wb") as f:
+                f.write(compressed_data)
+            tracemalloc.start()
+            try:
+                sizes = zpn.decompress_file(compressed_path, decompressed_path, use_mmap=True)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            if sizes != (len(compressed_data), len(data)):
+                raise ValueError("Error - decompress_file with use_mmap returned wrong sizes.")
+            with open(decompressed_path, "rb") as f:
+                if f.read() != data:
+                    raise ValueError("Error - original and decompress_file with use_mmap data are NOT equal.")
+            if peak > 1024 * 1024:
+                raise ValueError(f"Error - decompress_file with use_mmap peaked at {peak / 2**20:.1f}MB on the heap.")
+            if zpn.is_streaming and zpn.decompress_read_file(compressed_path) != data:
+                raise ValueError("Error - original and decompress_read_file data are NOT equal.")
+
+        # An empty input with an index is the index alone, both paths decompress it to an empty file
+        empty_path = os.path.join(tmp_dir, "empty")
+        with open(empty_path, "wb"):
+            pass
+        zpn = compressors[1]
+        zpn.compress_file(empty_path, compressed_path)
+        for use_mmap in (False, True):
+            if zpn.decompress_file(compressed_path, decompressed_path, use_mmap=use_mmap) != (os.path.getsize(compressed_path), 0):
+                raise ValueError(f"Error - decompress_file of an empty file (use_mmap={use_mmap}) returned wrong sizes.")
+            if os.path.getsize(decompressed_path) != 0:
+                raise ValueError(f"Error - decompress_file of an empty file (use_mmap={use_mmap}) is not empty.")
+        if zpn.decompress_read_file(compressed_path) != b"":
+            raise ValueError("Error - decompress_read_file of an empty file is not empty.")
+
+        base = bytes(len(data))
+        delta = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, delta_compressed_type='byte')
+        with open(compressed_path, "wb") as f:
+            f.write(delta.compress(data, delta_second_data=base))
+        try:
+            delta.decompress_file(compressed_path, decompressed_path, use_mmap=True)
+            raise ValueError("Error - delta compressed data was decompressed without its base.")
+        except ValueError as e:
+            if "Delta" not in str(e):
+                raise
+
+
+def test_pipeline_stats():
+    # The file pipeline reports how busy every stage was, and a slow stage
+    # shows up as the bottleneck.
+    import io
+    import time
+    torch.manual_seed(24)
+    streaming_chunk = 256 * 1024
+    zpn = ZipNN(bytearray_dtype='bfloat16', is_streaming=True, streaming_chunk=streaming_chunk)
+    data = bytes((torch.randn(2 * 1024 * 1024) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy())
+    frames = len(data) // streaming_chunk
+
+    class SlowWriter(io.BytesIO):
+        def write(self, b):
+            time.sleep(0.02)
+            return super().write(b)
+
+    class SlowReader(io.BytesIO):
+        def readinto(self, b):
+            time.sleep(0.02)
+            return super().readinto(memoryview(b)[: 64 * 1024])
+
+    stats = {}
+    compressed = io.BytesIO()
+    zpn.compress_file(SlowReader(data), compressed, stats=stats)
+    if stats["items"] != frames or stats["bottleneck"] != "read":
+        raise ValueError(f"Error - compress_file stats are wrong: {stats}")
+    stats = {}
+    decompressed = SlowWriter()
+    zpn.decompress_file(io.BytesIO(compressed.getvalue()), decompressed, stats=stats)
+    if decompressed.getvalue() != data or stats["items"] != frames or stats["bottleneck"] != "write":
+        raise ValueError(f"Error - decompress_file stats are wrong: {stats}")
+    for stage in ("read", "code", "write"):
+        if not 0 <= stats[f"{stage}_utilization"] <= 1.05 or stats[f"{stage}_s"] > stats["wall_s"] * 1.05:
+            raise ValueError(f"Error - the {stage} utilization is wrong: {stats}")
+
+
+def test_delta_fused_xor():
+    # Delta compression XORs the base inside the native core, chunk by chunk:
+    # the output is the compression of data ^ base, and a "file" base is
+    # mapped, not read into memory.
+    import importlib.util
+    import tempfile
+    import tracemalloc
+    torch.manual_seed(25)
+    for dtype, torch_dtype in (('bfloat16', torch.bfloat16), ('float32', torch.float32)):
+        base_tensor = torch.randn(3 * 1024 * 1024 + 5) * 0.02
+        base = bytes(base_tensor.to(torch_dtype).view(torch.uint8).numpy())
+        data = bytes((base_tensor + torch.randn(base_tensor.shape) * 1e-4).to(torch_dtype).view(torch.uint8).numpy())
+        xored = np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), np.frombuffer(base, dtype=np.uint8)).tobytes()
+
+        # Only the delta flag of the header differs from the compression of the XOR
+        compressed_delta = bytes(ZipNN(bytearray_dtype=dtype, delta_compressed_type='byte').compress(data, delta_second_data=base))
+        compressed_xor = bytes(ZipNN(bytearray_dtype=dtype).compress(xored))
+        if compressed_delta[:9] + compressed_delta[10:] != compressed_xor[:9] + compressed_xor[10:]:
+            raise ValueError(f"Error - {dtype} delta compression differs from the compression of the XOR.")
+
+        # Without byte grouping the XOR feeds the codec one chunk at a time (zstd is optional)
+        if importlib.util.find_spec("zstandard") is not None:
+            one_group = ZipNN(bytearray_dtype=dtype, method='zstd', byte_reorder=9 if dtype == 'bfloat16' else 0b1_01_01_001, delta_compressed_type='byte')
+            compressed_delta = one_group.compress(data, delta_second_data=base)
+            if one_group.decompress(compressed_delta, delta_second_data=base) != data:
+                raise ValueError(f"Error - {dtype} delta compression without byte grouping is NOT equal.")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            base_path = os.path.join(tmp_dir, "base")
+            with open(base_path, "wb") as f:
+                f.write(base)
+            for is_streaming in (False, True):
+                for delta_type, second in (('byte', bytearray(base)), ('file', base_path)):
+                    zpn = ZipNN(bytearray_dtype=dtype, delta_compressed_type=delta_type, is_streaming=is_streaming, streaming_chunk=1024 * 1024)
+                    compressed_data = zpn.compress(data, delta_second_data=second)
+                    tracemalloc.start()
+                    try:
+                        decompressed_data = zpn.decompress(compressed_data, delta_second_data=second)
+                        peak = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+                    if decompressed_data != data:
+                        raise ValueError(f"Error - {dtype} delta ({delta_type}, streaming {is_streaming}) data are NOT equal.")
+                    if delta_type == 'file' and peak > len(data) + 1024 * 1024:
+                        raise ValueError(f"Error - delta decompression with a file base peaked at {peak / 2**20:.1f}MB.")
+                    try:
+                        zpn.decompress(compressed_data, delta_second_data=bytearray(base[:-1]) if delta_type == 'byte' else os.devnull)
+                        raise ValueError("Error - delta decompression accepted a base of another length.")
+                    except ValueError as e:
+                        if "Length of delta file" not in str(e):
+                            raise
+
+    # Tensors and arrays are XORed as their bytes, the lengths are compared in bytes
+    base_tensor = (torch.randn(512, 1027) * 0.02).to(torch.bfloat16)
+    tensor = (base_tensor.float() + torch.randn(base_tensor.shape) * 1e-4).to(torch.bfloat16)
+    zpn = ZipNN(input_format='torch', delta_compressed_type='byte')
+    if not torch.equal(zpn.decompress(zpn.compress(tensor, delta_second_data=base_tensor), delta_second_data=base_tensor), tensor):
+        raise ValueError("Error - torch delta data are NOT equal.")
+    try:
+        zpn.compress(tensor, delta_second_data=base_tensor.float())
+        raise ValueError("Error - delta compression accepted a base of another length in bytes.")
+    except ValueError as e:
+        if "Length of delta file" not in str(e):
+            raise
+    base_array = np.random.default_rng(25).standard_normal((300, 301), dtype=np.float32)
+    array = base_array + np.float32(1e-4)
+    zpn = ZipNN(input_format='numpy', delta_compressed_type='byte')
+    if not np.array_equal(zpn.decompress(zpn.compress(array, delta_second_data=base_array), delta_second_data=base_array), array):
+        raise ValueError("Error - numpy delta data are NOT equal.")
+
+
+def test_format_version():
+    # Every frame carries the version of its format, data of a newer
+    # major.minor format is rejected with a clear error, and method='huffman'
+    # writes only the Huffman and stored chunks that 0.5.x reads.
+    torch.manual_seed(26)
+    data = bytes((torch.randn(1024 * 1024) * 0.02).to(torch.bfloat16).view(torch.uint8).numpy())
+    zpn = ZipNN(bytearray_dtype='bfloat16')
+    compressed_data = bytearray(zpn.compress(data))
+    if tuple(compressed_data[2:5]) != (0, 6, 0):
+        raise ValueError(f"Error - the header carries version {tuple(compressed_data[2:5])}.")
+    num_chunks = -(-len(data) // zpn.compression_chunk)
+    if 5 not in compressed_data[zpn.header_length : zpn.header_length + 2 * num_chunks]:
+        raise ValueError("Error - the default configuration didn't use the shared Huffman tables.")
+    compressed_data[3] = 7
+    try:
+        zpn.decompress(compressed_data)
+        raise ValueError("Error - data of a newer format was decompressed.")
+    except ValueError as e:
+        if "newer format" not in str(e):
+            raise
+    compressed_data[3] = 5
+    if zpn.decompress(compressed_data) != data:
+        raise ValueError("Error - data of an older version is NOT equal after decompression.")
+
+    # Without chunk type 5 there is no shared table block, the layout of 0.5.x
+    huffman = ZipNN(bytearray_dtype='bfloat16', method='huffman', shared_huffman_table=False)
+    compressed_data = bytes(huffman.compress(data))
+    chunk_types = set(compressed_data[huffman.header_length : huffman.header_length + 2 * num_chunks])
+    if not chunk_types <= {0, 1}:
+        raise ValueError(f"Error - method='huffman' wrote the chunk types {chunk_types}.")
+    sizes = np.frombuffer(compressed_data, dtype=np.uint64, count=2 * num_chunks, offset=huffman.header_length + 2 * num_chunks)
+    if len(compressed_data) != huffman.header_length + 2 * num_chunks * 9 + int(sizes[num_chunks - 1] + sizes[-1]):
+        raise ValueError("Error - method='huffman' without shared tables doesn't have the 0.5.x layout.")
+    if huffman.decompress(compressed_data) != data:
+        raise ValueError("Error - original and decompressed data are NOT equal.")
@@ -2,7 +2,8 @@
 
 import unittest
 from test_one_model import test_compression_decompression_float
-from simple_stress_tests import test_byte_torch_streaming
+from simple_stress_tests import test_byte_torch_streaming, test_compression_rss_soak, test_compression_rss_soak_long, test_compression_peak_memory, test_scratch_allocations, test_simd_levels_identical, test_tiled_byte_transforms, test_early_abort_incompressible, test_chunk_codec_selection, test_decompress_range, test_shared_huffman_table, test_dictionary, test_batch, test_zero_copy, test_decompress_into, test_compress_decompress_iter, test_compress_decompress_file, test_streaming_frames_parallel, test_streaming_index, test_zipnn_open, test_decompress_mmap, test_pipeline_stats, test_delta_fused_xor, test_format_version
+from concurrency_tests import test_gil_released_during_decompression, test_parallel_decompression_scaling, test_worker_pool_lifecycle, test_adaptive_threads, test_shared_codec_threads
 
 class TestSuite(unittest.TestCase):
 
@@ -11,6 +12,90 @@ class TestSuite(unittest.TestCase):
 
     def test_byte_torch_streaming(self):
         test_byte_torch_streaming()
+
+    def test_compression_rss_soak(self):
+        test_compression_rss_soak()
+
+    def test_compression_rss_soak_long(self):
+        test_compression_rss_soak_long()
+
+    def test_compression_peak_memory(self):
+        test_compression_peak_memory()
+
+    def test_scratch_allocations(self):
+        test_scratch_allocations()
+
+    def test_simd_levels_identical(self):
+        test_simd_levels_identical()
+
+    def test_tiled_byte_transforms(self):
+        test_tiled_byte_transforms()
+
+    def test_early_abort_incompressible(self):
+        test_early_abort_incompressible()
+
+    def test_chunk_codec_selection(self):
+        test_chunk_codec_selection()
+
+    def test_decompress_range(self):
+        test_decompress_range()
+
+    def test_shared_huffman_table(self):
+        test_shared_huffman_table()
+
+    def test_dictionary(self):
+        test_dictionary()
+
+    def test_batch(self):
+        test_batch()
+
+    def test_zero_copy(self):
+        test_zero_copy()
+
+    def test_decompress_into(self):
+        test_decompress_into()
+
+    def test_compress_decompress_iter(self):
+        test_compress_decompress_iter()
+
+    def test_compress_decompress_file(self):
+        test_compress_decompress_file()
+
+    def test_streaming_frames_parallel(self):
+        test_streaming_frames_parallel()
+
+    def test_streaming_index(self):
+        test_streaming_index()
+
+    def test_zipnn_open(self):
+        test_zipnn_open()
+
+    def test_decompress_mmap(self):
+        test_decompress_mmap()
+
+    def test_pipeline_stats(self):
+        test_pipeline_stats()
+
+    def test_delta_fused_xor(self):
+        test_delta_fused_xor()
+
+    def test_format_version(self):
+        test_format_version()
+
+    def test_gil_released_during_decompression(self):
+        test_gil_released_during_decompression()
+
+    def test_parallel_decompression_scaling(self):
+        test_parallel_decompression_scaling()
+
+    def test_worker_pool_lifecycle(self):
+        test_worker_pool_lifecycle()
+
+    def test_adaptive_threads(self):
+        test_adaptive_threads()
+
+    def test_shared_codec_threads(self):
+        test_shared_codec_threads()
     
 
 
@@ -1 +1,2 @@
 from .zipnn import ZipNN, zipnn_hf, zipnn_safetensors
+from .util_io import ZipNNReader, ZipNNWriter, open
@@ -0,0 +1,65 @@
+"""
+Utils for ZipNN dictionaries, the Huffman tables of the byte groups trained once
+per model family and referenced by id from the compressed data.
+
+The format is b"ZND1", uint32 id, uint16 number of entries and per entry
+[dtype code][bit_reorder][byte_reorder][num_buf][uint32 length][tables], all little endian.
+The tables are the output of zipnn_core.train_tables.
+"""
+from typing import Dict, NamedTuple, Tuple
+import struct
+import zlib
+
+
+DICTIONARY_MAGIC = b"ZND1"
+
+
+class DictionaryEntry(NamedTuple):
+    """
+    The tables of one dtype.
+
+    Attributes:
+        bit_reorder (int): The bit reorder the tables were trained with.
+        byte_reorder (int): The byte reorder the tables were trained with.
+        num_buf (int): The number of byte groups.
+        tables (bytes): [uint16 length][Huffman table] per byte group, length 0 for a group without a table.
+    """
+    bit_reorder: int
+    byte_reorder: int
+    num_buf: int
+    tables: bytes
+
+
+def pack_dictionary(entries: Dict[int, DictionaryEntry]) -> bytes:
+    """
+    returns the dictionary of the entries keyed by dtype code, its id is the crc32 of the entries.
+    """
+    body = [struct.pack("<H", len(entries))]
+    for dtype_code, entry in sorted(entries.items()):
+        body.append(struct.pack("<BBBBI", dtype_code, entry.bit_reorder, entry.byte_reorder, entry.num_buf, len(entry.tables)))
+        body.append(entry.tables)
+    body = b"".join(body)
+    dict_id = zlib.crc32(body) or 1  # 0 is no dictionary
+    return DICTIONARY_MAGIC + struct.pack("<I", dict_id) + body
+
+
+def unpack_dictionary(data: bytes) -> Tuple[int, Dict[int, DictionaryEntry]]:
+    """
+    returns the id and the entries keyed by dtype code of a dictionary.
+    """
+    mv = memoryview(data)
+    if len(mv) < 10 or mv[:4] != DICTIONARY_MAGIC:
+        raise ValueError("Not a ZipNN dictionary")
+    dict_id, count = struct.unpack_from("<IH", mv, 4)
+    pos = 10
+    entries = {}
+    for _ in range(count):
+        if pos + 8 > len(mv):
+            raise ValueError("The ZipNN dictionary is truncated")
+        dtype_code, bit_reorder, byte_reorder, num_buf, length = struct.unpack_from("<BBBBI", mv, pos)
+        pos += 8
+        if pos + length > len(mv):
+            raise ValueError("The ZipNN dictionary is truncated")
+        entries[dtype_code] = DictionaryEntry(bit_reorder, byte_reorder, num_buf, mv[pos : pos + length].tobytes())
+        pos += length
+    return dict_id, entries
@@ -1,5 +1,6 @@
 # util for ZipNN Header
 from enum import Enum
+from typing import NamedTuple, Optional, Tuple
 
 
 class EnumMethod(Enum):
@@ -44,6 +45,44 @@ class EnumLossy(Enum):
                 return cls.__members__[value]
 
 
+class ZipNNHeader(NamedTuple):
+    """
+    The values of the header of one compressed frame, the per-call state of a decompression.
+
+    Attributes:
+        version (Tuple[int, int, int]): The ZipNN version that compressed the frame.
+        byte_reorder (int): The byte grouping of the frame.
+        bit_reorder (int): The bit reorder of the frame.
+        method (int): The EnumMethod value of the frame.
+        input_format (int): The EnumFormat value, the format of the decompressed output.
+        delta_compressed_type: 0, "byte" or "file".
+        lossy_compressed_type (int): The EnumLossy value of the frame.
+        lossy_compressed_factor (int): The lossy compression factor.
+        lossy_is_int (int): 1 if the lossy data was transferred to integers.
+        is_streaming (int): 1 if the frame is part of a stream.
+        compression_chunk (int): The chunk size of the frame.
+        dtype (int): The ZipNNDtypeEnum code of the data.
+        original_len (int): The length of the original data in bytes.
+        shape (Optional[Tuple[int, ...]]): The shape of a torch or numpy input, None for bytes.
+        length (int): The length of the header, with the shape.
+    """
+    version: Tuple[int, int, int]
+    byte_reorder: int
+    bit_reorder: int
+    method: int
+    input_format: int
+    delta_compressed_type: object
+    lossy_compressed_type: int
+    lossy_compressed_factor: int
+    lossy_is_int: int
+    is_streaming: int
+    compression_chunk: int
+    dtype: int
+    original_len: int
+    shape: Optional[Tuple[int, ...]]
+    length: int
+
+
 def bools_to_bitmask(bools) -> bytes:
     """
     Constructs a bitmask by setting bits corresponding to the indices of True values in a list of booleans,
@@ -0,0 +1,143 @@
+"""
+Utils for the index of ZipNN streaming data, the footer of container format v2.
+
+Streaming data is a sequence of frames, each with its own 32-byte header. With an index the data ends
+with one more block that maps the original offsets to the frames, so a reader finds any frame from the
+end of the data in O(1) instead of walking every header before it:
+[b"ZI"][uint8 version 2][13 reserved][uint64 0][uint64 block length], a 32-byte header walkers skip as a frame
+[uint64 number of frames][uint64 original length]
+per frame [uint64 compressed offset][uint64 compressed length][uint64 original offset][uint64 original length]
+          [dtype code][method][byte_reorder][bit_reorder][log2 compression chunk][input_format][2 reserved]
+[uint64 block length][b"ZNINDEX2"], the trailer
+all little endian. Data without an index (v0.5 and earlier) has no trailer and decodes as before.
+"""
+from typing import List, NamedTuple, Optional
+import struct
+
+
+INDEX_MAGIC = b"ZI"
+INDEX_VERSION = 2
+TRAILER_MAGIC = b"ZNINDEX2"
+TRAILER_LENGTH = 16
+_BLOCK_HEADER_LENGTH = 48
+_ENTRY = struct.Struct("<QQQQBBBBBBxx")
+
+
+class IndexEntry(NamedTuple):
+    """
+    One frame of indexed streaming data.
+
+    Attributes:
+        comp_offset (int): The offset of the frame in the compressed data.
+        comp_length (int): The length of the frame, with its header.
+        orig_offset (int): The offset of the frame's data in the original data.
+        orig_length (int): The length of the frame's original data.
+        dtype (int): The ZipNNDtypeEnum code of the frame.
+        method (int): The EnumMethod value of the frame.
+        byte_reorder (int): The byte grouping of the frame.
+        bit_reorder (int): The bit reorder of the frame.
+        compression_chunk (int): The chunk size of the frame, chunk k holds [k * compression_chunk, (k + 1) * compression_chunk).
+        input_format (int): The EnumFormat value of the frame.
+    """
+    comp_offset: int
+    comp_length: int
+    orig_offset: int
+    orig_length: int
+    dtype: int
+    method: int
+    byte_reorder: int
+    bit_reorder: int
+    compression_chunk: int
+    input_format: int
+
+
+def index_entry(header, comp_offset: int, orig_offset: int) -> IndexEntry:
+    """
+    returns the entry of the frame with the 32-byte header at the offsets.
+    """
+    return IndexEntry(
+        comp_offset,
+        int.from_bytes(header[24:32], byteorder="little"),
+        orig_offset,
+        int.from_bytes(header[16:24], byteorder="little"),
+        header[15],
+        header[7],
+        header[5],
+        header[6],
+        1 << header[14],
+        header[8],
+    )
+
+
+def is_index(header) -> bool:
+    """
+    returns True if the frame header is the header of an index block.
+    """
+    return bytes(header[:2]) == INDEX_MAGIC
+
+
+def pack_index(entries: List[IndexEntry]) -> bytes:
+    """
+    returns the index block of the frames.
+    """
+    length = _BLOCK_HEADER_LENGTH + len(entries) * _ENTRY.size + TRAILER_LENGTH
+    orig_length = entries[-1].orig_offset + entries[-1].orig_length if entries else 0
+    body = [
+        INDEX_MAGIC + bytes([INDEX_VERSION]) + bytes(13),
+        struct.pack("<QQQQ", 0, length, len(entries), orig_length),
+    ]
+    for entry in entries:
+        body.append(
+            _ENTRY.pack(
+                entry.comp_offset,
+                entry.comp_length,
+                entry.orig_offset,
+                entry.orig_length,
+                entry.dtype,
+                entry.method,
+                entry.byte_reorder,
+                entry.bit_reorder,
+                entry.compression_chunk.bit_length() - 1,
+                entry.input_format,
+            )
+        )
+    body.append(struct.pack("<Q", length) + TRAILER_MAGIC)
+    return b"".join(body)
+
+
+def index_length(trailer) -> int:
+    """
+    returns the length of the index block ending with the trailer (the last 16 bytes of the data), 0 for data without an index.
+    """
+    if len(trailer) < TRAILER_LENGTH or bytes(trailer[-8:]) != TRAILER_MAGIC:
+        return 0
+    return struct.unpack_from("<Q", trailer, len(trailer) - TRAILER_LENGTH)[0]
+
+
+def unpack_index(block, data_length: Optional[int] = None) -> List[IndexEntry]:
+    """
+    returns the entries of an index block. With data_length, the length of the data ending with the block,
+    the frames must tile the data before it.
+    """
+    mv = memoryview(block)
+    if len(mv) < _BLOCK_HEADER_LENGTH + TRAILER_LENGTH or not is_index(mv):
+        raise ValueError("Not a ZipNN index")
+    if mv[2] != INDEX_VERSION:
+        raise ValueError(f"Unsupported ZipNN index version {mv[2]}")
+    _, length, count, orig_length = struct.unpack_from("<QQQQ", mv, 16)
+    if length != len(mv) or length != _BLOCK_HEADER_LENGTH + count * _ENTRY.size + TRAILER_LENGTH:
+        raise ValueError("The ZipNN index is truncated")
+    entries = []
+    comp_offset = 0
+    orig_offset = 0
+    for pos in range(_BLOCK_HEADER_LENGTH, _BLOCK_HEADER_LENGTH + count * _ENTRY.size, _ENTRY.size):
+        fields = _ENTRY.unpack_from(mv, pos)
+        entry = IndexEntry(*fields[:8], 1 << fields[8], fields[9])
+        if entry.comp_offset != comp_offset or entry.orig_offset != orig_offset:
+            raise ValueError("The ZipNN index doesn't match the frames")
+        comp_offset += entry.comp_length
+        orig_offset += entry.orig_length
+        entries.append(entry)
+    if orig_offset != orig_length or (data_length is not None and comp_offset + length != data_length):
+        raise ValueError("The ZipNN index doesn't match the frames")
+    return entries
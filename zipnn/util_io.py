@@ -0,0 +1,326 @@
+"""
+File objects of ZipNN streaming files: ZipNNReader reads and seeks in the original data of a compressed
+file, decoding only the frames it touches, and ZipNNWriter compresses what is written to it frame by frame.
+Both keep the memory to a few frames whatever the file size.
+"""
+import bisect
+import builtins
+import collections
+import concurrent.futures
+import io
+import os
+import threading
+
+from zipnn.util_index import index_entry, is_index, pack_index
+
+
+def open(file, mode: str = "rb", zpn=None, **kwargs):
+    """
+    Opens a ZipNN streaming file like the builtin open.
+
+    Parameters
+    -------------------------------------
+    file: string or file
+            The path of the file, or a binary file object (seekable for reading), which is not closed.
+
+    mode: string
+            "rb" (or "r") to read the original data of a compressed file, "wb" (or "w") to write a compressed file.
+            Default is "rb".
+
+    zpn: ZipNN
+            The ZipNN instance to decompress or compress with, a writer needs is_streaming.
+            Default is None, a ZipNN of the keyword arguments (streaming with an index for a writer).
+
+    kwargs:
+            The keyword arguments of ZipNNReader or ZipNNWriter.
+
+    Returns
+    -------------------------------------
+    A ZipNNReader or a ZipNNWriter.
+    """
+    if mode in ("rb", "r"):
+        return ZipNNReader(file, zpn, **kwargs)
+    if mode in ("wb", "w"):
+        return ZipNNWriter(file, zpn, **kwargs)
+    raise ValueError(f"Unsupported mode {mode}, use 'rb' or 'wb'")
+
+
+def _open_file(file, mode):
+    """
+    returns the file object and True if it was opened here and has to be closed.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        return builtins.open(file, mode), True
+    return file, False
+
+
+class ZipNNReader(io.RawIOBase):
+    """
+    A read-only, seekable file object of the original data of a compressed file, for torch.load, tarfile,
+    safetensors and any reader of streams. The frames are found from the index of the file (streaming_index)
+    or by a scan of their headers, a frame is decoded when a read touches it, the next frames are decoded
+    ahead on a worker while the current one is consumed, and the last decoded frames are kept in an LRU.
+    """
+
+    def __init__(self, file, zpn=None, cache_frames: int = 4, read_ahead: int = 2, threads: int = 0):
+        """
+        Parameters
+        -------------------------------------
+        file: string or file
+                The path of the compressed file or a seekable binary file object of it.
+
+        zpn: ZipNN
+                The ZipNN instance to decompress with.
+                Default is None, a new ZipNN with threads.
+
+        cache_frames: int
+                The decoded frames kept for later reads and seeks back.
+                Default is 4.
+
+        read_ahead: int
+                The frames after the current one decoded ahead on a worker, 0 decodes only on read.
+                Default is 2.
+
+        threads: int
+                The threads of the default ZipNN.
+                Default is 0, the ZipNN default.
+        """
+        super().__init__()
+        if zpn is None:
+            from zipnn.zipnn import ZipNN
+
+            zpn = ZipNN(threads=threads)
+        self._zpn = zpn
+        self._file, self._owns_file = _open_file(file, "rb")
+        self._file_lock = threading.Lock()
+        try:
+            self._frames = self._find_frames()
+        except BaseException:
+            if self._owns_file:
+                self._file.close()
+            raise
+        self._starts = [entry.orig_offset for entry in self._frames]
+        self._length = self._frames[-1].orig_offset + self._frames[-1].orig_length if self._frames else 0
+        self._pos = 0
+        self._cache = collections.OrderedDict()
+        self._cache_frames = max(1, cache_frames)
+        self._read_ahead = max(0, read_ahead)
+        self._pending = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if self._read_ahead else None
+
+    def _find_frames(self):
+        """
+        returns the index entries of the frames of the file, from its index or from a scan of the frame headers.
+        """
+        frames = self._zpn.read_index(self._file)
+        if frames is not None:
+            return frames
+        frames = []
+        comp_offset = orig_offset = 0
+        self._file.seek(0)
+        while True:
+            header = self._file.read(self._zpn.header_length)
+            if not header:
+                return frames
+            if len(header) < self._zpn.header_length:
+                raise ValueError("The compressed data ends in the middle of a frame")
+            if is_index(header):
+                return frames
+            if header[0:2] != b"ZN":
+                raise ValueError("Not a ZipNN file")
+            entry = index_entry(header, comp_offset, orig_offset)
+            if entry.comp_length <= self._zpn.header_length:
+                raise ValueError("Not a ZipNN frame")
+            if header[9] != 0:
+                raise ValueError("ZipNNReader doesn't support delta compressed data.")
+            frames.append(entry)
+            comp_offset += entry.comp_length
+            orig_offset += entry.orig_length
+            self._file.seek(comp_offset)
+
+    def _decode(self, number):
+        """
+        reads and decompresses the frame of the number.
+        """
+        entry = self._frames[number]
+        with self._file_lock:
+            self._file.seek(entry.comp_offset)
+            frame = self._file.read(entry.comp_length)
+        if len(frame) != entry.comp_length:
+            raise ValueError("The compressed data ends in the middle of a frame")
+        header = self._zpn._retrieve_header(frame)
+        if header.delta_compressed_type != 0 or header.lossy_compressed_type != 0:
+            raise ValueError("ZipNNReader doesn't support delta or lossy compressed data.")
+        out = bytearray(header.original_len)
+        self._zpn._decompress_bin_into(frame, memoryview(out), header)
+        return out
+
+    def _frame(self, number):
+        """
+        returns the decoded frame of the number, from the cache, the read ahead or decoded now,
+        and starts the read ahead of the next frames.
+        """
+        data = self._cache.get(number)
+        if data is not None:
+            self._cache.move_to_end(number)
+        else:
+            future = self._pending.pop(number, None)
+            data = future.result() if future is not None else self._decode(number)
+            self._cache[number] = data
+            while len(self._cache) > self._cache_frames:
+                self._cache.popitem(last=False)
+        # Frames passed by a seek are not needed any more
+        for stale in [n for n in self._pending if n < number or n > number + self._read_ahead]:
+            self._pending.pop(stale).cancel()
+        for ahead in range(number + 1, min(number + 1 + self._read_ahead, len(self._frames))):
+            if ahead not in self._cache and ahead not in self._pending:
+                self._pending[ahead] = self._executor.submit(self._decode, ahead)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        self._checkClosed()
+        mv = memoryview(b).cast("B")
+        filled = 0
+        while filled < len(mv) and self._pos < self._length:
+            number = bisect.bisect_right(self._starts, self._pos) - 1
+            entry = self._frames[number]
+            data = self._frame(number)
+            start = self._pos - entry.orig_offset
+            count = min(len(mv) - filled, entry.orig_length - start)
+            mv[filled : filled + count] = memoryview(data)[start : start + count]
+            filled += count
+            self._pos += count
+        return filled
+
+    def readall(self):
+        self._checkClosed()
+        out = bytearray(max(0, self._length - self._pos))
+        return bytes(memoryview(out)[: self.readinto(out)])
+
+    def close(self):
+        if self.closed:
+            return
+        if self._executor is not None:
+            for future in self._pending.values():
+                future.cancel()
+            self._executor.shutdown(wait=True)
+        self._pending.clear()
+        self._cache.clear()
+        if self._owns_file:
+            self._file.close()
+        super().close()
+
+
+class ZipNNWriter(io.RawIOBase):
+    """
+    A write-only file object that compresses the data written to it into a ZipNN streaming file, frame by
+    frame, with the memory of one streaming_chunk. The file is the same as compress gives for all the data,
+    with an index at its end if the ZipNN has streaming_index. The last frame and the index are written by close.
+    """
+
+    def __init__(self, file, zpn=None, **zipnn_kwargs):
+        """
+        Parameters
+        -------------------------------------
+        file: string or file
+                The path of the compressed file or a binary file object to write it to.
+
+        zpn: ZipNN
+                The ZipNN instance to compress with, it needs is_streaming and no delta compression.
+                Default is None, a ZipNN of zipnn_kwargs with is_streaming and streaming_index.
+
+        zipnn_kwargs:
+                The keyword arguments of the default ZipNN, e.g. bytearray_dtype.
+        """
+        super().__init__()
+        if zpn is None:
+            from zipnn.zipnn import ZipNN
+
+            zipnn_kwargs.setdefault("is_streaming", True)
+            zipnn_kwargs.setdefault("streaming_index", True)
+            zpn = ZipNN(**zipnn_kwargs)
+        if not zpn.is_streaming:
+            raise ValueError("ZipNNWriter needs is_streaming=True.")
+        if zpn.delta_compressed_type != 0:
+            raise ValueError("ZipNNWriter doesn't support delta compression.")
+        self._zpn = zpn
+        self._file, self._owns_file = _open_file(file, "wb")
+        self._pending = bytearray(zpn.streaming_chunk)
+        self._filled = 0
+        self._index_entries = []
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._written
+
+    def _write_frame(self, data):
+        frame = self._zpn.compress_torch_numpy_byte(data)
+        self._zpn._add_index_entry(self._index_entries, frame)
+        self._file.write(frame)
+
+    def write(self, b):
+        self._checkClosed()
+        mv = memoryview(b).cast("B")
+        chunk_size = len(self._pending)
+        offset = 0
+        if self._filled:
+            # Complete the frame started by the previous writes
+            offset = min(chunk_size - self._filled, len(mv))
+            self._pending[self._filled : self._filled + offset] = mv[:offset]
+            self._filled += offset
+            if self._filled == chunk_size:
+                self._write_frame(self._pending)
+                self._filled = 0
+        # Whole frames are compressed from the buffer in place
+        while len(mv) - offset >= chunk_size:
+            self._write_frame(mv[offset : offset + chunk_size])
+            offset += chunk_size
+        rest = len(mv) - offset
+        self._pending[self._filled : self._filled + rest] = mv[offset:]
+        self._filled += rest
+        self._written += len(mv)
+        return len(mv)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._filled:
+                self._write_frame(memoryview(self._pending)[: self._filled])
+                self._filled = 0
+            if self._zpn.streaming_index:
+                self._file.write(pack_index(self._index_entries))
+            self._file.flush()
+        finally:
+            if self._owns_file:
+                self._file.close()
+            super().close()
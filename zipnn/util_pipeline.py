@@ -0,0 +1,170 @@
+"""
+Utils for the bounded-memory file pipeline of ZipNN: a reader thread, the coding on the calling thread
+and a writer thread, connected by bounded queues, so reading, coding and writing overlap.
+And the memory maps of the files that are decoded in place.
+"""
+import contextlib
+import mmap
+import os
+import queue
+import threading
+import time
+from typing import NamedTuple
+
+
+_END = object()
+
+
+def read_full(f, mv: memoryview) -> int:
+    """
+    reads into mv until it is full or the file ends, pipes and sockets return short reads. Returns the bytes read.
+    """
+    filled = 0
+    while filled < len(mv):
+        count = f.readinto(mv[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+@contextlib.contextmanager
+def open_stream(file, mode: str):
+    """
+    opens a path, a file object (e.g. sys.stdin.buffer) is used as is and not closed.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, mode) as f:
+            yield f
+    else:
+        yield file
+
+
+@contextlib.contextmanager
+def map_file(f, length: int = 0, write: bool = False):
+    """
+    maps the open file f (all of it for length 0), read-only or writable, with sequential access hints
+    so the kernel reads ahead and drops the pages behind.
+    """
+    mm = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+    if hasattr(mm, "madvise"):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+        if not write:
+            mm.madvise(mmap.MADV_WILLNEED)
+    try:
+        yield mm
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            # An error being raised still references a view of the map, it is unmapped with the view
+            pass
+
+
+class PipelineStats(NamedTuple):
+    """
+    The time every stage of a pipeline was busy, to find its bottleneck.
+
+    Attributes:
+        items (int): The items (frames) that passed through.
+        wall_s (float): The time of the whole pipeline in seconds.
+        read_s (float): The time the reader was reading, not waiting for room in its queue.
+        code_s (float): The time the coding was running, not waiting for items.
+        write_s (float): The time the writer was writing, not waiting for items.
+    """
+    items: int
+    wall_s: float
+    read_s: float
+    code_s: float
+    write_s: float
+
+    def as_dict(self) -> dict:
+        """
+        returns the times with the utilization of every stage (its busy share of the wall time) and the
+        busiest stage, the bottleneck.
+        """
+        stats = self._asdict()
+        busy = {"read": self.read_s, "code": self.code_s, "write": self.write_s}
+        for stage, busy_s in busy.items():
+            stats[f"{stage}_utilization"] = busy_s / self.wall_s if self.wall_s > 0 else 0.0
+        stats["bottleneck"] = max(busy, key=busy.get)
+        return stats
+
+
+def run_pipeline(read_items, code_item, write_item, depth: int) -> PipelineStats:
+    """
+    runs the generator read_items on a reader thread and write_item on a writer thread, code_item runs on the
+    calling thread between them. At most depth items wait in each queue. The first error of a stage is raised.
+    Returns the PipelineStats of the run.
+    """
+    read_queue = queue.Queue(depth)
+    write_queue = queue.Queue(depth)
+    stop = threading.Event()
+    errors = []
+    # The busy seconds of the reader, the coding and the writer, every stage adds only to its own
+    busy = [0.0, 0.0, 0.0]
+    items = 0
+
+    def put_read(item):
+        # The calling thread stops taking items after an error
+        while not stop.is_set():
+            try:
+                read_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            iterator = iter(read_items)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                busy[0] += time.perf_counter() - start
+                if item is _END:
+                    break
+                if not put_read(item):
+                    return
+                del item
+        except BaseException as e:  # raised on the calling thread
+            errors.append(e)
+        put_read(_END)
+
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _END:
+                return
+            if not errors:
+                start = time.perf_counter()
+                try:
+                    write_item(item)
+                except BaseException as e:  # raised on the calling thread
+                    errors.append(e)
+                busy[2] += time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        while not errors:
+            item = read_queue.get()
+            if item is _END:
+                break
+            start = time.perf_counter()
+            coded = code_item(item)
+            busy[1] += time.perf_counter() - start
+            items += 1
+            del item
+            write_queue.put(coded)
+            del coded
+    finally:
+        stop.set()
+        write_queue.put(_END)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return PipelineStats(items, time.perf_counter() - wall_start, busy[0], busy[1], busy[2])
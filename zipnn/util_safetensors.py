@@ -1,12 +1,14 @@
 """
 Utils for handling safetensors files.
 """
-from typing import Dict, TypedDict
+from typing import Dict, Optional, TypedDict
+import base64
 import json
 import torch
 
 
 METADATA_KEY = "znn_compressed_vectors"
+DICTIONARY_KEY = "znn_dictionary"
 
 
 COMPRESSION_METHOD = "HUFFMAN"
@@ -56,3 +58,20 @@ def get_compressed_tensors_metadata(metadata: Dict[str, str]) -> Dict[str, Compr
         return json.loads(metadata.get(METADATA_KEY) or {})
     else:
         return {}
+
+
+def set_dictionary_metadata(dictionary: bytes, metadata: Dict[str, str]):
+    """
+    stores the ZipNN dictionary of the file once in its metadata.
+    """
+    if metadata is not None:
+        metadata[DICTIONARY_KEY] = base64.b64encode(dictionary).decode("ascii")
+
+
+def get_dictionary_metadata(metadata: Dict[str, str]) -> Optional[bytes]:
+    """
+    retrieves the ZipNN dictionary of the file, None if the file has none.
+    """
+    if metadata and DICTIONARY_KEY in metadata:
+        return base64.b64decode(metadata[DICTIONARY_KEY])
+    return None
@@ -168,6 +168,30 @@ def zipnn_is_floating_point(data_format_value, data, bytearray_dtype):
         return bytearray_dtype in ("float64", "float32", "float16", "bfloat16","float8_e4m3fn","float8_e5m2")
 
 
+def zipnn_nbytes(data):
+    """
+    returns the length in bytes of a tensor, a numpy array or a buffer.
+    """
+    if isinstance(data, torch.Tensor):
+        return data.numel() * data.element_size()
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    return memoryview(data).nbytes
+
+
+def zipnn_byte_view(data):
+    """
+    returns a flat byte memoryview of a CPU tensor, a numpy array or a buffer, without a copy if it is contiguous.
+    """
+    if isinstance(data, torch.Tensor):
+        if data.device.type != "cpu":
+            raise ValueError("Only CPU tensors can be viewed as bytes")
+        return memoryview(data.detach().contiguous().view(-1).view(torch.uint8).numpy())
+    if isinstance(data, np.ndarray):
+        return memoryview(np.ascontiguousarray(data).reshape(-1).view(np.uint8))
+    return memoryview(data).cast("B")
+
+
 from enum import Enum
 import torch
 import numpy as np
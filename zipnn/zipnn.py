@@ -1,12 +1,15 @@
+import contextlib
 import time
 import os
+import bisect
 import math
 import multiprocessing
+import threading
 import numpy as np
 from safetensors.torch import safe_open
 import torch
 import zipnn_core
-from zipnn.util_header import EnumMethod, EnumFormat, EnumLossy
+from zipnn.util_header import EnumMethod, EnumFormat, EnumLossy, ZipNNHeader
 from zipnn.util_torch import (
     ZipNNDtypeEnum,
     zipnn_multiply_if_max_below,
@@ -15,13 +18,20 @@ from zipnn.util_torch import (
     zipnn_pack_shape,
     zipnn_unpack_shape,
     zipnn_is_floating_point,
+    zipnn_nbytes,
+    zipnn_byte_view,
 )
 from zipnn.util_safetensors import (
     COMPRESSION_METHOD,
     COMPRESSED_DTYPE,
-    get_compressed_tensors_metadata
+    get_compressed_tensors_metadata,
+    get_dictionary_metadata,
 )
+from zipnn.util_dictionary import DictionaryEntry, pack_dictionary, unpack_dictionary
 from zipnn.util_patch import multi_process_patcher
+from zipnn.util_index import IndexEntry, index_entry, index_length, is_index, pack_index, unpack_index, TRAILER_LENGTH
+from zipnn.util_io import ZipNNReader
+from zipnn.util_pipeline import PipelineStats, map_file, open_stream, read_full, run_pipeline
 
 
 class ZipNN:
@@ -35,6 +45,8 @@ class ZipNN:
         threads: int = 0,
         compression_threshold=0.95,
         check_th_after_percent=10,
+        shared_huffman_table: bool = True,
+        dictionary=None,
         byte_reorder: int = 0,
         reorder_signbit: int = 0,
         delta_compressed_type: str = 0,
@@ -43,6 +55,7 @@ class ZipNN:
         compression_chunk=256 * 1024,
         is_streaming: bool = False,
         streaming_chunk: int = 1024 * 1024,
+        streaming_index: bool = False,
         input_file: str = None,
         compressed_file: str = None,
         decompressed_file: str = None,
@@ -76,6 +89,7 @@ class ZipNN:
 
          threads: int
                  The maximum threads for the compressio/decompression and for the byte/bit reorder.
+                 The native core uses fewer for small inputs, by their measured cost.
                  If 0, the code decide according to the dataset len.
                  Default is the number of logical CPU threads
 
@@ -86,9 +100,24 @@ class ZipNN:
 
          check_th_after_percent: int
                  Check the compression threshold after % from the number of chunk and stop compressing if not pass the compression_threshold.
+                 The remaining chunks of a byte group that does not pass are stored without running the entropy coder, 0 or 100 compress every chunk.
                  Only relevant for a compression that uses byte grouping.
                  Default is 10[%]
 
+         shared_huffman_table: bool
+                 Build one Huffman table per byte group from a few sampled chunks and store it once, instead of a table in every chunk.
+                 A chunk whose own table would be clearly smaller keeps it.
+                 The tables are a format of 0.6.0 (the header version), False writes data that 0.5.x reads with method='huffman'.
+                 Only relevant for a compression that uses byte grouping.
+                 Default is True.
+
+         dictionary: bytes or string
+                 A dictionary from train_dictionary, or the path of a file with one.
+                 The shared Huffman tables of the dictionary are used instead of the sampled ones and only their id is stored,
+                 which helps small tensors. Data compressed with a dictionary needs the same dictionary to decompress.
+                 Only relevant for a compression that uses byte grouping and shared_huffman_table.
+                 Default is None.
+
          byte_reorder: int
                  Number of grouping.
                  4 Groups - Nu,ber for the group and zero for truncate.
@@ -109,10 +138,11 @@ class ZipNN:
                  Default is 0 [Auto decision]
 
         delta_compressed_type: string
-               NOT IMPLEMENTED YET.
-               Type for delta compression.
-               Options are 'byte', 'file'.
-               Default is "0" (NOT IMPLEMENTED YET).
+               Type for delta compression, the data is compressed as its XOR with a base of the same length in bytes
+               (delta_second_data of compress and decompress), e.g. the weights of a fine-tuned model against the base model.
+               The native core XORs every chunk right before its byte grouping and right after its decoding.
+               Options are 'byte' (the base is a tensor, an array or a buffer) and 'file' (the path of the base, memory mapped).
+               Default is 0, no delta compression.
 
          lossy_compressed_type: string
                  Type for lossy compression.
@@ -138,6 +168,12 @@ class ZipNN:
                  Only relevant if is_steaming is True.
                  Default is 1MB.
 
+         streaming_index: bool
+                 If true – streaming data ends with an index of its frames (container format v2), so readers find
+                 any original offset without walking the frame headers. Data without an index decodes as before.
+                 Only relevant if is_steaming is True.
+                 Default is False.
+
          input_file: string
                  Path to the input file.
                  If ‘file’ is the input type – enter file name.
@@ -167,6 +203,8 @@ class ZipNN:
          Returns
          -------------------------------------
          ZipNN class instance supporting a specific compression and decompression based on the input given.
+         The instance only holds this configuration, the header values of a call are kept by the call,
+         so one instance can compress and decompress from many threads at once.
         """
 
         self.method = EnumMethod(method).value
@@ -177,6 +215,8 @@ class ZipNN:
         self.threads = threads or min(multiprocessing.cpu_count(), 16)
         self.compression_threshold = compression_threshold
         self.check_th_after_percent = check_th_after_percent
+        self.shared_huffman_table = shared_huffman_table
+        self._load_dictionary(dictionary)
         self.byte_reorder = byte_reorder
         self.reorder_signbit = reorder_signbit
 
@@ -200,6 +240,7 @@ class ZipNN:
             raise ValueError("streaming_chunk must be a number that is a power of 2.")
 
         self.streaming_chunk = streaming_chunk
+        self.streaming_index = streaming_index
 
         self.input_file = input_file
         self.compressed_file = compressed_file
@@ -207,17 +248,99 @@ class ZipNN:
 
         self.lz4_compression_level = lz4_compression_level
 
+        # The header of every frame carries the version, a reader rejects data of a newer major.minor format
         self._version_major = 0
-        self._version_minor = 5
-        self._version_tiny = 3
+        self._version_minor = 6
+        self._version_tiny = 0
         self._import_dependencies(zstd_level)
 
         self.header_length = 32
+        # The header fields of the configuration, every compression fills a copy of it
         self._header = bytearray(self.header_length)
-        self._ext_header = b""
-        self._shape_size = 0
         self._update_header()
 
+    def _load_dictionary(self, dictionary):
+        """
+        Reads the entries of a dictionary, the tables are loaded into zipnn_core on first use.
+        """
+        self._dictionary_id = 0
+        self._dictionary_entries = {}
+        self._dictionary_capsules = {}
+        if dictionary is None:
+            return
+        if isinstance(dictionary, (str, os.PathLike)):
+            with open(dictionary, "rb") as dictionary_file:
+                dictionary = dictionary_file.read()
+        self._dictionary_id, self._dictionary_entries = unpack_dictionary(dictionary)
+
+    def _dictionary_capsule(self, dtype_code, num_buf, bit_reorder, byte_reorder):
+        """
+        Returns the zipnn_core dictionary for the dtype, or None if there is none.
+        """
+        entry = self._dictionary_entries.get(dtype_code)
+        if entry is None or (entry.num_buf, entry.bit_reorder, entry.byte_reorder) != (num_buf, bit_reorder, byte_reorder):
+            return None
+        if dtype_code not in self._dictionary_capsules:
+            self._dictionary_capsules[dtype_code] = zipnn_core.load_dictionary(entry.tables, num_buf, self._dictionary_id)
+        return self._dictionary_capsules[dtype_code]
+
+    def train_dictionary(self, samples, max_sample_bytes: int = 4 * 1024 * 1024):
+        """
+        Trains a dictionary, the Huffman tables of the byte groups of every dtype in the samples.
+        Models of one family have similar byte distributions, so one dictionary serves all their files.
+
+        Parameters
+        -------------------------------------
+        samples: iterable
+                Tensors (torch input_format) or bytes of bytearray_dtype (byte input_format).
+
+        max_sample_bytes: int
+                Only the first max_sample_bytes of every sample are used.
+                Default is 4MB.
+
+        Returns
+        -------------------------------------
+        The dictionary bytes, pass them as the dictionary of ZipNN.
+        """
+        grouped = {}
+        for sample in samples:
+            if self.input_format == EnumFormat.TORCH.value:
+                dtype_code = ZipNNDtypeEnum.from_dtype(sample.dtype).code
+                ba = memoryview(sample.contiguous().view(-1).view(torch.uint8).numpy()).cast("B")
+            elif self.input_format == EnumFormat.BYTE.value:
+                dtype_code = ZipNNDtypeEnum.from_dtype(self.bytearray_dtype).code
+                ba = memoryview(sample).cast("B")
+            else:
+                raise ValueError("train_dictionary supports the torch and byte input_format")
+            if dtype_code in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
+                params = (1, 1, 10)
+            elif dtype_code in (ZipNNDtypeEnum.FLOAT32.code, ZipNNDtypeEnum.FLOAT.code):
+                params = (4, 1, 220)
+            elif dtype_code == ZipNNDtypeEnum.BFLOAT16.code:
+                params = (2, 1, 10)
+            elif dtype_code in (ZipNNDtypeEnum.FLOAT16.code, ZipNNDtypeEnum.HALF.code):
+                params = (2, 0, 10)
+            else:
+                continue
+            size = min(len(ba), max_sample_bytes)
+            size -= size % params[0]
+            grouped.setdefault(dtype_code, (params, []))[1].append(ba[:size])
+
+        entries = {}
+        for dtype_code, ((num_buf, bit_reorder, byte_reorder), parts) in grouped.items():
+            data = b"".join(parts)
+            if not data:
+                continue
+            tables = zipnn_core.train_tables(
+                data,
+                num_buf,
+                bit_reorder,
+                byte_reorder,
+                self.compression_chunk if num_buf != 1 else min(128 * 1024, self.compression_chunk),
+            )
+            entries[dtype_code] = DictionaryEntry(bit_reorder, byte_reorder, num_buf, tables)
+        return pack_dictionary(entries)
+
     def _import_dependencies(self, zstd_level):
         """
         Importing needed dependencies, based on the ZipNN compression method.
@@ -239,12 +362,13 @@ class ZipNN:
         if self.method == EnumMethod.HUFFMAN.value or self.method == EnumMethod.AUTO.value:
             pass 
         elif self.method == EnumMethod.ZSTD.value:
-            try: 
+            try:
+                global zstd
                 import zstandard as zstd
             except ImportError as exc:
                 raise ImportError("zstandard library is not installed. Please install it to use  zstandard compression: pip install zstandard ") from exc
-            self._zstd_compress = zstd.ZstdCompressor(level=zstd_level, threads=self.threads)
-            self._zstd_decompress = zstd.ZstdDecompressor()
+            self._zstd_level = zstd_level
+            self._zstd_local = threading.local()
 
         elif self.method == EnumMethod.LZ4.value:
             try:
@@ -267,6 +391,16 @@ class ZipNN:
             if self.input_format != EnumFormat.TORCH.value:
                 raise ValueError("When use lossy compression the input have to be torch.tensor")
 
+    def _zstd_codec(self):
+        """
+        Returns the zstd compressor and decompressor of the calling thread, zstandard objects can't be shared between threads.
+        """
+        codec = getattr(self._zstd_local, "codec", None)
+        if codec is None:
+            codec = (zstd.ZstdCompressor(level=self._zstd_level, threads=self.threads), zstd.ZstdDecompressor())
+            self._zstd_local.codec = codec
+        return codec
+
     def use_var(self, data, class_var):
         """
         Used to update ZipNN attributes. Updates to data if it isn't null, or to the ZipNN class default if it is.
@@ -286,7 +420,8 @@ class ZipNN:
 
     # Header: at least 8 Bytes
     # [0:1] 2 Bytes [ZN]
-    # [2:4] 3 Bytes [Versions]
+    # [2:4] 3 Bytes [Versions], from 0.6.0 a reader rejects a newer major.minor: 0.6.0 added the FSE, zstd and
+    #       all zero chunks and the shared Huffman tables (and dictionary references) after the cumulative sizes
     # [5] 1 Byte [byte_reorder]
     # [6] 1 Byte [bit_reorder]
     # [9] 1 Byte [delta compression]
@@ -300,7 +435,7 @@ class ZipNN:
     # [15] = self.dtype
     # [16-23] = original size
     # [24-32] = compressed file size
-    # In case the input_format is TORCH or NUMPY we add to self._ext_header the shape of the data in zipnn_pack format
+    # In case the input_format is TORCH or NUMPY we add to the header of the call the shape of the data in zipnn_pack format
 
     # byte order for 64bit
     # Not implemented yet
@@ -308,38 +443,32 @@ class ZipNN:
     # Only in case of torch/ numpy
     # torch.shape/ numpy.shape
 
-    def _update_header_lossy(self, lossy_type, lossy_factor, lossy_is_int):
+    def _update_header_lossy(self, header, lossy_type, lossy_factor, lossy_is_int):
         """
-        Updates header with values of lossy compression.
+        Updates the header of a call with values of lossy compression.
         """
-        self._header[10] = lossy_type.value
-        self._header[11] = lossy_factor
-        self._header[12] = lossy_is_int
+        header[10] = lossy_type.value
+        header[11] = lossy_factor
+        header[12] = lossy_is_int
 
-    def _update_header_original_len(self, original_len):
+    def _update_header_original_len(self, header, original_len):
         original_bytes_len = (original_len).to_bytes(8, byteorder="little")
-        self._header[16:24] = original_bytes_len
+        header[16:24] = original_bytes_len
 
-    def _update_header_comp_len(self, comp_len):
+    def _update_header_comp_len(self, header, comp_len):
         """
-        Updates header with the overall compression size
+        Updates the header of a call with the overall compression size
         """
         comp_bytes_len = (comp_len + 32).to_bytes(8, byteorder="little")
-        self._header[24:32] = comp_bytes_len
-
-    def _update_header_dtype(self, byte_reorder: int, bit_reorder: int, dtype_code: int):
-        """
-        Updates header with byte_reorder, bit_reorder, dtype_value
-        """
-        self._header[5] = byte_reorder
-        self._header[6] = bit_reorder
-        self._header[15] = dtype_code
+        header[24:32] = comp_bytes_len
 
-    def _update_data_shape(self, shape):
+    def _update_header_dtype(self, header, byte_reorder: int, bit_reorder: int, dtype_code: int):
         """
-        Updates the shape of the data add to the and of the header
+        Updates the header of a call with byte_reorder, bit_reorder, dtype_value
         """
-        self._ext_header = zipnn_pack_shape(shape)
+        header[5] = byte_reorder
+        header[6] = bit_reorder
+        header[15] = dtype_code
 
     #
     #        Parameters
@@ -354,7 +483,7 @@ class ZipNN:
 
     def _update_header(self, lossy_compressed_type=None, lossy_compressed_factor=None):
         """
-        Updates header with dtype if it's torch decompression.
+        Fills the header template with the fields of the configuration, once in __init__.
 
         Parameters
         -------------------------------------
@@ -395,7 +524,7 @@ class ZipNN:
 
     def _retrieve_header(self, ba_compress):
         """
-        Retrieves header values, and returns header length.
+        Retrieves header values, the instance is left unchanged.
 
         Parameters
         -------------------------------------
@@ -404,38 +533,40 @@ class ZipNN:
 
         Returns
         -------------------------------------
-        The header length.
+        The ZipNNHeader of the data, its length is the header length.
         """
         mv = memoryview(ba_compress)
         header = mv[: self.header_length]
         if header[0:2].tobytes().decode("ascii") != "ZN":
             raise ValueError("Header should start with ZN")
-        self.version_major = int(header[2])
-        self.version_minor = int(header[3])
-        self.version_tiny = int(header[4])
-        self._byte_reorder = int(header[5])
-        self._bit_reorder = int(header[6])
-        self.method = int(header[7])
-        self.input_format = int(header[8])
-        self.delta_compressed_type = (
-            0 if self._header[9] == 0 else "byte" if self._header[9] == 1 else "file" if self._header[9] == 2 else 0
+        version = (int(header[2]), int(header[3]), int(header[4]))
+        if version[:2] > (self._version_major, self._version_minor):
+            raise ValueError(
+                f"The data was compressed by ZipNN {'.'.join(map(str, version))}, a newer format than ZipNN "
+                f"{self._version_major}.{self._version_minor}.{self._version_tiny} reads, please upgrade zipnn."
+            )
+        input_format = int(header[8])
+        shape = None
+        shape_size = 0
+        if input_format in (EnumFormat.TORCH.value, EnumFormat.NUMPY.value):
+            shape, shape_size = zipnn_unpack_shape(mv[self.header_length :])
+        return ZipNNHeader(
+            version=version,
+            byte_reorder=int(header[5]),
+            bit_reorder=int(header[6]),
+            method=int(header[7]),
+            input_format=input_format,
+            delta_compressed_type=0 if header[9] == 0 else "byte" if header[9] == 1 else "file" if header[9] == 2 else 0,
+            lossy_compressed_type=int(header[10]),
+            lossy_compressed_factor=int(header[11]),
+            lossy_is_int=int(header[12]),
+            is_streaming=1 if int(header[13]) > 127 else 0,
+            compression_chunk=2 ** header[14],
+            dtype=int(header[15]),
+            original_len=int.from_bytes(header[16:24], byteorder="little"),
+            shape=shape,
+            length=self.header_length + shape_size,
         )
-        self.lossy_compressed_type = int(header[10])
-        self.lossy_compressed_factor = int(header[11])
-        self._lossy_is_int = int(header[12])
-        streaming_vals = int(header[13])
-        if streaming_vals > 127:
-            self.is_streaming = 1
-            # self.streaming_chunk = 2 ** (128 - streaming_vals)
-        else:
-            self.is_streaming = 0
-        self.compression_chunk = 2 ** header[14]
-        self.dtype = int(header[15])
-        self.original_len = int.from_bytes(header[16:24], byteorder="little")
-
-        if self.input_format in (EnumFormat.TORCH.value, EnumFormat.NUMPY.value):
-            self.shape_bytes, self._shape_size = zipnn_unpack_shape(mv[self.header_length :])
-        return self.header_length + self._shape_size
 
 
     def __metadata__(self):
@@ -570,8 +701,8 @@ class ZipNN:
                 Default is None.
 
         delta_second_data: string
-                If compression is delta compression,then second data is needed. It's type options are ‘byte’, ‘torch’, ‘file’.
-                If file, enter filename.
+                The base of delta compression, needed with delta_compressed_type: a tensor, an array or a buffer for 'byte',
+                the path of the base file for 'file'. It must have the length of data in bytes.
                 Default is None.
 
         compress_cpu_gpu: string
@@ -588,59 +719,184 @@ class ZipNN:
 
         Returns
         -------------------------------------
-        Returns the output of one of the following: compress_delta, compress_bin, compress_torch, compress_file
+        Returns the output of one of the following: compress_bin, compress_torch, compress_file
         (depends on the type of the data compressed), which will be the compressed file,
         in the format chosen in the ZipNN class instance configuration.
         """
-        if self.delta_compressed_type == "byte":
-            if len(data) != len(delta_second_data):
-                raise ValueError("Length of delta file has to match the length of the original file.")
-        elif self.delta_compressed_type == "file":
-            try:
-                with open(delta_second_data, "rb") as file:
-                    file_data = file.read()
-                delta_second_data = file_data
-            except Exception:
-                raise FileNotFoundError("Encountered an error when reading the delta file")
-            if len(data) != len(file_data):
+        with self._delta_base(delta_second_data) as delta_base:
+            if delta_base is not None and zipnn_nbytes(data) != len(delta_base):
                 raise ValueError("Length of delta file has to match the length of the original file.")
-            delta_second_data = file_data
-        else:  # self.delta_compressed_type="0"
-            if delta_second_data != None:
-                raise ValueError("ZipNN isn't set for delta compression, but delta_second_data is not null.")
+            return self._compress_delta_base(data, delta_base, lossy_compressed_type, lossy_compressed_factor)
 
+    def _compress_delta_base(self, data, delta_base, lossy_compressed_type, lossy_compressed_factor):
+        """
+        compress with the delta base (a byte buffer of the length of data, or None), it is XORed into every chunk
+        by the native core.
+        """
         if self.is_streaming and self.input_format == EnumFormat.BYTE.value:
             mv_data = memoryview(data)
-            if delta_second_data:
-                mv_delta = memoryview(delta_second_data)
             CHUNK_SIZE = self.streaming_chunk
             # Compression into bytearray
             compressed_buffer = bytearray()
+            index_entries = []
             remaining_bytes = len(data)
             offset = 0
 
             while remaining_bytes > 0:
                 chunk_size = min(CHUNK_SIZE, remaining_bytes)
                 chunk = mv_data[offset : offset + chunk_size]
-                if delta_second_data:
-                    chunk_delta = mv_delta[offset : offset + chunk_size]
-                    array1 = np.frombuffer(chunk, dtype=np.uint8)
-                    array2 = np.frombuffer(chunk_delta, dtype=np.uint8)
-                    chunk = np.bitwise_xor(array1, array2).tobytes()
-                compressed_chunk = self.compress_torch_numpy_byte(chunk, lossy_compressed_type, lossy_compressed_factor)
+                chunk_delta = delta_base[offset : offset + chunk_size] if delta_base is not None else None
+                compressed_chunk = self.compress_torch_numpy_byte(
+                    chunk, lossy_compressed_type, lossy_compressed_factor, delta_base=chunk_delta
+                )
                 if compressed_chunk:
                     compressed_buffer.extend(compressed_chunk)
+                    self._add_index_entry(index_entries, compressed_chunk)
                 offset += chunk_size
                 remaining_bytes -= chunk_size
+            if self.streaming_index:
+                compressed_buffer.extend(pack_index(index_entries))
             return compressed_buffer
         else:
-            if delta_second_data:
-                array1 = np.frombuffer(data, dtype=np.uint8)
-                array2 = np.frombuffer(delta_second_data, dtype=np.uint8)
-                data = np.bitwise_xor(array1, array2).tobytes()
-            #        if self.delta_compressed_type is not None:
-            #            return self.compress_delta(data, delta_second_data, lossy_compressed_type, lossy_compressed_factor)
-            return self.compress_torch_numpy_byte(data, lossy_compressed_type, lossy_compressed_factor)
+            return self.compress_torch_numpy_byte(data, lossy_compressed_type, lossy_compressed_factor, delta_base=delta_base)
+
+    def compress_iter(self, buffers):
+        """
+        Compresses a stream of buffers incrementally, frame by frame, so data of any size can pass through
+        a pipe or a socket with the memory of a few streaming_chunk. Needs is_streaming.
+
+        Parameters
+        -------------------------------------
+        buffers: iterable
+                Buffers of the data in any sizes, e.g. the reads of a file.
+
+        Returns
+        -------------------------------------
+        A generator of the compressed frames (and the index block last with streaming_index),
+        together the same as compress gives for all the data.
+        """
+        if not self.is_streaming:
+            raise ValueError("compress_iter needs is_streaming=True.")
+        if self.delta_compressed_type != 0:
+            raise ValueError("compress_iter doesn't support delta compression.")
+        index_entries = []
+        for frame in self._compress_frames(buffers):
+            self._add_index_entry(index_entries, frame)
+            yield frame
+        if self.streaming_index:
+            yield pack_index(index_entries)
+
+    def _compress_frames(self, buffers):
+        """
+        Yields the compressed frames of compress_iter.
+        """
+        chunk_size = self.streaming_chunk
+        pending = bytearray(chunk_size)
+        filled = 0
+        for buffer in buffers:
+            mv = memoryview(buffer).cast("B")
+            offset = 0
+            if filled:
+                # Complete the frame started by the previous buffers
+                offset = min(chunk_size - filled, len(mv))
+                pending[filled : filled + offset] = mv[:offset]
+                filled += offset
+                if filled < chunk_size:
+                    continue
+                yield self.compress_torch_numpy_byte(pending)
+                filled = 0
+            # Whole frames are compressed from the buffer in place
+            while len(mv) - offset >= chunk_size:
+                yield self.compress_torch_numpy_byte(mv[offset : offset + chunk_size])
+                offset += chunk_size
+            filled = len(mv) - offset
+            pending[:filled] = mv[offset:]
+        if filled:
+            yield self.compress_torch_numpy_byte(memoryview(pending)[:filled])
+
+    def compress_file(self, src, dst, pipeline_depth: int = 2, stats: dict = None):
+        """
+        Compresses a file into a file with bounded memory. A reader thread fills reusable buffers of
+        streaming_chunk with readinto, the frames are compressed on the calling thread and a writer thread
+        writes them, so reading, compression and writing overlap. The peak memory is about
+        2 * (pipeline_depth + 2) * streaming_chunk whatever the file size. Needs is_streaming.
+
+        Parameters
+        -------------------------------------
+        src: string or file
+                The path of the file to compress, or a binary file object (e.g. sys.stdin.buffer).
+
+        dst: string or file
+                The path of the compressed file, or a binary file object (e.g. sys.stdout.buffer).
+                File objects are not closed.
+
+        pipeline_depth: int
+                The buffers waiting between the reader, the compression and the writer.
+                Default is 2.
+
+        stats: dict
+                If given, it is filled with the busy seconds and the utilization of the read, code and write
+                stages, the frames and the wall time, and the bottleneck stage.
+                Default is None.
+
+        Returns
+        -------------------------------------
+        A tuple of the original and the compressed sizes in bytes. The output is the same as
+        compress gives for all the data.
+        """
+        if not self.is_streaming:
+            raise ValueError("compress_file needs is_streaming=True.")
+        if self.delta_compressed_type != 0:
+            raise ValueError("compress_file doesn't support delta compression.")
+        if pipeline_depth < 1:
+            raise ValueError("pipeline_depth must be at least 1")
+        # A buffer is reused only after the frames of pipeline_depth + 1 later buffers were taken from the queue
+        ring = [bytearray(self.streaming_chunk) for _ in range(pipeline_depth + 2)]
+        sizes = [0, 0]
+        index_entries = []
+
+        with open_stream(src, "rb") as infile, open_stream(dst, "wb") as outfile:
+
+            def read_items():
+                index = 0
+                while True:
+                    buf = ring[index % len(ring)]
+                    count = read_full(infile, memoryview(buf))
+                    if count:
+                        yield buf, count
+                    if count < len(buf):
+                        return
+                    index += 1
+
+            def code_item(item):
+                buf, count = item
+                sizes[0] += count
+                return self.compress_torch_numpy_byte(memoryview(buf)[:count])
+
+            def write_item(frame):
+                sizes[1] += len(frame)
+                self._add_index_entry(index_entries, frame)
+                outfile.write(frame)
+
+            pipeline_stats = run_pipeline(read_items(), code_item, write_item, pipeline_depth)
+            if self.streaming_index:
+                write_item(pack_index(index_entries))
+        if stats is not None:
+            stats.update(pipeline_stats.as_dict())
+        return sizes[0], sizes[1]
+
+    def _add_index_entry(self, index_entries, frame):
+        """
+        Appends the index entry of the next compressed frame of streaming data to index_entries.
+        """
+        if not self.streaming_index or is_index(frame):
+            return
+        comp_offset = orig_offset = 0
+        if index_entries:
+            last = index_entries[-1]
+            comp_offset = last.comp_offset + last.comp_length
+            orig_offset = last.orig_offset + last.orig_length
+        index_entries.append(index_entry(frame, comp_offset, orig_offset))
 
     def compress_method(self, data: memoryview):
         """
@@ -658,7 +914,7 @@ class ZipNN:
         if self.method == EnumMethod.HUFFMAN.value or self.method == EnumMethod.AUTO.value:
             pass 
         if self.method in (EnumMethod.ZSTD.value, EnumMethod.AUTO.value):
-            return self._zstd_compress.compress(data)
+            return self._zstd_codec()[0].compress(data)
 
         if self.method == EnumMethod.LZ4.value:
             return lz4.frame.compress(data)
@@ -667,6 +923,34 @@ class ZipNN:
             return snappy.compress(data)
         raise ValueError(f"Unsupported method {self.method}")
 
+    def _compress_method_delta(self, data: memoryview, delta_base):
+        """
+        compress_method of data XORed with delta_base. The XOR is written natively into a scratch of one
+        compression_chunk that feeds a streaming compressor, so the XORed data never exists as a whole
+        (snappy's block format takes all the input at once).
+        """
+        data = memoryview(data).cast("B")
+        delta_base = memoryview(delta_base).cast("B")
+        if self.method == EnumMethod.SNAPPY.value:
+            xored = bytearray(len(data))
+            zipnn_core.xor_into(xored, data, delta_base)
+            return snappy.compress(xored)
+        if self.method in (EnumMethod.ZSTD.value, EnumMethod.AUTO.value):
+            compressor = self._zstd_codec()[0].compressobj(size=len(data))
+            out = []
+        elif self.method == EnumMethod.LZ4.value:
+            compressor = lz4.frame.LZ4FrameCompressor()
+            out = [compressor.begin(source_size=len(data))]
+        else:
+            raise ValueError(f"Unsupported method {self.method}")
+        scratch = memoryview(bytearray(min(self.compression_chunk, len(data))))
+        for offset in range(0, len(data), len(scratch)):
+            length = min(len(scratch), len(data) - offset)
+            zipnn_core.xor_into(scratch[:length], data[offset : offset + length], delta_base[offset : offset + length])
+            out.append(compressor.compress(scratch[:length]))
+        out.append(compressor.flush())
+        return b"".join(out)
+
     def compress_bin(
         self,
         ba: memoryview,
@@ -678,6 +962,9 @@ class ZipNN:
         num_buf: int,
         shape,
         skip_split: bool,
+        batch_jobs: list = None,
+        header: bytearray = None,
+        delta_base=None,
     ):
         """
         Compresses byte data.
@@ -687,31 +974,52 @@ class ZipNN:
         ba: memoryview
                 Byte data to compress.
 
+        batch_jobs: list
+                If given, the zipnn_core job of the data is appended to it instead of compressing (see compress_batch).
+                Default is None.
+
+        header: bytearray
+                The header of this call, filled with the dtype by compress_torch_numpy_byte.
+                Default is None, a copy of the configuration header.
+
+        delta_base: buffer
+                The base of delta compression, bytes of the length of ba XORed into every chunk before its split.
+                Default is None.
+
         Returns
         -------------------------------------
-        Returns a byte array of the header, data, and some metadata.
+        Returns a byte array of the header, data, and some metadata, or None for batch_jobs.
         """
         compress_bin_time = time.time()
         is_print = 0
+        if header is None:
+            header = bytearray(self._header)
 
         if (self.byte_reorder == 0b1_01_01_001 and dtype_size == 32) or (self.byte_reorder == 0b0_00_01_001 and dtype_size == 16):
             # one group
+            if batch_jobs is not None:
+                raise ValueError("compress_batch supports only byte grouped data")
             stime = time.time()
-            ba_comp = self._header + self.compress_method(ba)
+            # The header records the one group byte_reorder (not the grouping of the dtype) for the decompression
+            self._update_header_dtype(header, byte_reorder=self.byte_reorder, bit_reorder=0, dtype_code=header[15])
+            self._update_header_original_len(header, len(ba))
+            if delta_base is not None:
+                ba_comp = header + self._compress_method_delta(ba, delta_base)
+            else:
+                ba_comp = header + self.compress_method(ba)
             if self.input_format == EnumFormat.BYTE.value:
-                self._update_header_comp_len(len(ba_comp))
-                return b"".join([self._header] + [ba_comp])
+                self._update_header_comp_len(header, len(ba_comp))
+                return b"".join([header] + [ba_comp])
         else:
             stime = time.time()
 
             if is_print:
                 start_time = time.time()
-            self._update_header_original_len(len(ba))
+            self._update_header_original_len(header, len(ba))
+            python_header = header
             if self.input_format in (EnumFormat.TORCH.value, EnumFormat.NUMPY.value):
-                self._update_data_shape(shape)
-            python_header = self._header + self._ext_header
-            ba_saved = bytearray(ba)
-            ba_comp = zipnn_core.zipnn_core(
+                python_header = header + zipnn_pack_shape(shape)
+            job = (
                 python_header,
                 ba,
                 num_buf,
@@ -719,9 +1027,21 @@ class ZipNN:
                 byte_reorder,
                 is_review,
                 self.compression_chunk if num_buf!=1 else min(128*1024,self.compression_chunk), # Huffman compression is limited to a 128K buffer; therefore, we restrict it to 128K in the case of FP8.
+            )
+            dictionary = self._dictionary_capsule(header[15], num_buf, bit_reorder, byte_reorder)
+            delta = () if delta_base is None else (delta_base,)
+            if batch_jobs is not None:
+                batch_jobs.append(job + (dictionary,) + delta)
+                return None
+            ba_comp = zipnn_core.zipnn_core(
+                *job,
                 self.compression_threshold,
                 self.check_th_after_percent,
                 self.threads,
+                1 if self.method == EnumMethod.AUTO.value else 0,  # AUTO picks Huffman, FSE, zstd or all-zero per chunk
+                1 if self.shared_huffman_table else 0,
+                dictionary,
+                *delta,
             )
             #
             #ba_decom = zipnn_core.combine_dtype(
@@ -745,7 +1065,9 @@ class ZipNN:
             print("compress_bin_time ", time.time() - compress_bin_time)
         return ba_comp
 
-    def compress_torch_numpy_byte(self, data, lossy_compressed_type=None, lossy_compressed_factor=None):
+    def compress_torch_numpy_byte(
+        self, data, lossy_compressed_type=None, lossy_compressed_factor=None, batch_jobs=None, delta_base=None
+    ):
         """
         Compresses torch.
 
@@ -762,6 +1084,14 @@ class ZipNN:
                 ZipNN attribute lossy_compressed_factor.
                 Default is None.
 
+        batch_jobs: list
+                Passed to compress_bin.
+                Default is None.
+
+        delta_base: buffer
+                Passed to compress_bin.
+                Default is None.
+
         Returns
         -------------------------------------
         Byte array of compressed data.
@@ -834,7 +1164,8 @@ class ZipNN:
             else:
                 raise ValueError("Support only uint32 with NumPy format")
 
-        self._update_header_dtype(byte_reorder=byte_reorder, bit_reorder=bit_reorder, dtype_code=dtype_enum)
+        header = bytearray(self._header)
+        self._update_header_dtype(header, byte_reorder=byte_reorder, bit_reorder=bit_reorder, dtype_code=dtype_enum)
 
         is_review = 0
 
@@ -845,7 +1176,7 @@ class ZipNN:
                 data = data.view(torch.uint8)
             ba = memoryview(data.contiguous().view(-1).numpy()).cast("B")
         elif self.input_format == EnumFormat.NUMPY.value:
-            ba = data.tobytes()
+            ba = memoryview(np.ascontiguousarray(data)).cast("B")
         elif self.input_format == EnumFormat.BYTE.value:
             ba = data
         else:
@@ -864,9 +1195,66 @@ class ZipNN:
             num_buf=num_buf,
             shape=shape,
             skip_split=skip_split,
+            batch_jobs=batch_jobs,
+            header=header,
+            delta_base=delta_base,
         )
 
-    def lossy_compress(self, data, lossy_type, lossy_factor):
+    def compress_batch(self, data_list):
+        """
+        Compresses many tensors (or byte buffers) in one native call.
+        The chunks of all of them share the threads, so a file of many small tensors keeps them busy
+        and the per-call setup is paid once.
+
+        Parameters
+        -------------------------------------
+        data_list: list
+                The data to compress, each in the input_format of the instance.
+
+        Returns
+        -------------------------------------
+        A list with the compressed data of every input, the same as compress gives for it.
+        """
+        if self.is_streaming or self.delta_compressed_type != 0:
+            raise ValueError("compress_batch doesn't support streaming or delta compression.")
+        batch_jobs = []
+        for data in data_list:
+            self.compress_torch_numpy_byte(data, batch_jobs=batch_jobs)
+        return zipnn_core.compress_batch(
+            batch_jobs,
+            self.compression_threshold,
+            self.check_th_after_percent,
+            self.threads,
+            1 if self.method == EnumMethod.AUTO.value else 0,
+            1 if self.shared_huffman_table else 0,
+        )
+
+    def decompress_batch(self, data_list):
+        """
+        Decompresses many outputs of compress or compress_batch in one native call, their chunks share the threads.
+
+        Parameters
+        -------------------------------------
+        data_list: list
+                The compressed data, not streaming or delta compressed.
+
+        Returns
+        -------------------------------------
+        A list with the decompressed data of every input, the same as decompress gives for it.
+        """
+        batch_jobs = []
+        for data in data_list:
+            mv = memoryview(data)
+            if self._is_streaming(mv) or mv[9] != 0:
+                raise ValueError("decompress_batch doesn't support streaming or delta compressed data.")
+            header = self._retrieve_header(data)
+            if header.input_format == EnumFormat.NUMPY.value and (header.byte_reorder in (9, 255)):
+                raise ValueError("decompress_batch doesn't support truncated numpy data.")
+            batch_jobs.append(self._decompress_job(mv, header))
+        decompressed = zipnn_core.decompress_batch(batch_jobs, self.threads)
+        return [self.decompress_bin(data, ba_decom) for data, ba_decom in zip(data_list, decompressed)]
+
+    def lossy_compress(self, data, lossy_type, lossy_factor, header):
         """
         Handles lossy compression.
 
@@ -881,6 +1269,9 @@ class ZipNN:
         lossy_factor: int
                 ZipNN attribute lossy_compressed_factor.
 
+        header: bytearray
+                The header of the call, updated with the lossy values.
+
         Returns
         -------------------------------------
         Data after lossy compression.
@@ -891,7 +1282,7 @@ class ZipNN:
             multiplier = 2**lossy_factor
             max_val = bit_size - 1 - lossy_factor
             data, lossy_is_int = zipnn_multiply_if_max_below(data, max_val, multiplier, lossy_compressed_dtype)
-            self._update_header_lossy(lossy_type, lossy_factor, lossy_is_int)
+            self._update_header_lossy(header, lossy_type, lossy_factor, lossy_is_int)
 
         elif lossy_type == EnumLossy.UNSIGN:
             raise ValueError('lossy_compressed_type is "unsign" -> not implemented yet')
@@ -900,26 +1291,33 @@ class ZipNN:
 
         return data
 
-    def compress_delta(self, delta_second_data, lossy_compressed_type, lossy_compressed_factor):
+    @contextlib.contextmanager
+    def _delta_base(self, delta_second_data):
         """
-        Handles delta compression.
-
-        Parameters
-        -------------------------------------
-        delta_second_data: string
-                Type of second data for the delta compression.
-
-        lossy_type: string
-                ZipNN attribute lossy_compressed_type.
-
-        lossy_factor: int
-                ZipNN attribute lossy_compressed_factor.
-
-        Returns
-        -------------------------------------
-        Data after lossy compression.
+        yields the base of delta compression as a byte buffer, or None without delta compression.
+        A tensor or an array base is viewed as its bytes, a "file" base is memory mapped instead of read,
+        the native core XORs it chunk by chunk.
         """
-        raise ImportError("Not implemented Yet")
+        if self.delta_compressed_type == "byte":
+            if delta_second_data is None:
+                raise ValueError("delta_second_data is None or not set for delta copression")
+            yield zipnn_byte_view(delta_second_data)
+        elif self.delta_compressed_type == "file":
+            try:
+                file = open(delta_second_data, "rb")
+            except Exception:
+                raise FileNotFoundError("Encountered an error when reading the delta file")
+            with file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    # An empty file can't be mapped
+                    yield memoryview(b"")
+                else:
+                    with map_file(file) as mm, memoryview(mm) as mv:
+                        yield mv
+        else:  # self.delta_compressed_type==0
+            if delta_second_data is not None:
+                raise ValueError("ZipNN isn't set for delta compression, but delta_second_data is not null.")
+            yield None
 
     #################
     # decompression #
@@ -939,72 +1337,551 @@ class ZipNN:
             Compression will be done by choice, in the CPU or GPU.
             Default is cpu.
 
+        delta_second_data: string
+            The base the data was delta compressed with, a tensor, an array or a buffer for 'byte',
+            the path of the base file for 'file'. Default is None.
+
         Returns
         -------------------------------------
         Returns the output of decompress_bin or decompress_read_file (depends on the type of the data compressed),
         which will be the compressed file, in the format chosen in the ZipNN class instance configuration.
         """
-        if self.delta_compressed_type == "byte":
-            if delta_second_data is None:
-                raise ValueError("delta_second_data is None or not set for delta copression")
-        elif self.delta_compressed_type == "file":
-            try:
-                with open(delta_second_data, "rb") as file:
-                    file_data = file.read()
-                delta_second_data = file_data
-            except Exception:
-                raise FileNotFoundError("Encountered an error when reading the delta file")
-        else:  # self.delta_compressed_type==0
-            if delta_second_data != None:
-                raise ValueError("ZipNN isn't set for delta compression, but delta_second_data is not null.")
+        with self._delta_base(delta_second_data) as delta_base:
+            return self._decompress_delta_base(data, delta_base)
 
+    def _decompress_delta_base(self, data, delta_base):
+        """
+        decompress with the delta base (a byte buffer of the original length, or None), every chunk is XORed
+        with it by the native core right after it is decoded.
+        """
         mv_data = memoryview(data)
 
-        was_data_delta_compressed = mv_data[9]
-        if was_data_delta_compressed == 0 and self.delta_compressed_type != 0:
+        was_data_delta_compressed = 0 if is_index(mv_data) else mv_data[9]
+        if was_data_delta_compressed == 0 and self.delta_compressed_type != 0 and not is_index(mv_data):
             raise ValueError("The data wasn't compressed using delta compression and you're trying to delta-decompress it.")
         if was_data_delta_compressed != 0 and self.delta_compressed_type == 0:
             raise ValueError("The data was compressed using delta compression and you're trying to decompress it normally.")
-        if delta_second_data:
-            mv_delta = memoryview(delta_second_data)
 
-        comp_chunk_size = mv_data[13]  # 0 if no streaming > 127
-        if self.input_format == EnumFormat.BYTE.value and comp_chunk_size > 127:  # xor inside streaming
-            decompressed_buffer = bytearray()
-            offset = 0
-            compressed_length = len(data)
-            offset_delta = 0
-            while offset < compressed_length:
-                header = mv_data[offset : offset + 32]
-                mid_chunk_len = int.from_bytes(header[24:32], byteorder="little") - 32
-                chunk = mv_data[offset : offset + mid_chunk_len + 32]
-                decompressed_chunk = self.decompress_bin(chunk)
-                if decompressed_chunk:
-                    if delta_second_data:
-                        if offset_delta + len(decompressed_chunk) > len(mv_delta):
-                            raise ValueError("Length of delta file has to match the length of the decompressed file.")
-                        chunk_delta = mv_delta[offset_delta : offset_delta + len(decompressed_chunk)]
-                        array1 = np.frombuffer(decompressed_chunk, dtype=np.uint8)
-                        array2 = np.frombuffer(chunk_delta, dtype=np.uint8)
-                        decompressed_chunk = np.bitwise_xor(array1, array2).tobytes()
-                        offset_delta += len(decompressed_chunk)
-                    decompressed_buffer.extend(decompressed_chunk)
-                offset += mid_chunk_len + 32
-            if delta_second_data and offset_delta != len(mv_delta):
+        if self.input_format == EnumFormat.BYTE.value and self._is_streaming(mv_data):  # xor inside streaming
+            # The frame headers give the output length, so every frame is decoded straight into place
+            frames, decompressed_length = self._streaming_frames(mv_data)
+            if delta_base is not None and decompressed_length != len(delta_base):
                 raise ValueError("Length of delta file has to match the length of the decompressed file.")
+            decompressed_buffer = bytearray(decompressed_length)
+            self._decompress_frames_into(frames, memoryview(decompressed_buffer), delta_base)
             return decompressed_buffer
 
-        if delta_second_data:
-            decompressed_buffer = self.decompress_bin(data)
-            if len(decompressed_buffer) != len(delta_second_data):
+        if delta_base is not None:
+            header = self._retrieve_header(mv_data)
+            if header.original_len != len(delta_base):
                 raise ValueError("Length of delta file has to match the length of the decompressed file.")
-            array1 = np.frombuffer(decompressed_buffer, dtype=np.uint8)
-            array2 = np.frombuffer(delta_second_data, dtype=np.uint8)
-            final_data = np.bitwise_xor(array1, array2).tobytes()
-            return final_data
+            # The output of the format, every chunk is decoded into it and XORed with the base
+            dtype = next(member for member in ZipNNDtypeEnum if member.code == header.dtype)
+            if header.input_format == EnumFormat.TORCH.value:
+                decompressed = torch.empty(header.shape, dtype=dtype.torch_dtype)
+            elif header.input_format == EnumFormat.NUMPY.value:
+                decompressed = np.empty(header.shape, dtype=dtype.numpy_dtype)
+            else:
+                decompressed = bytearray(header.original_len)
+            self._decompress_bin_into(mv_data, zipnn_byte_view(decompressed), header, delta_base)
+            return decompressed
         return self.decompress_bin(data)
 
-    def decompress_method(self, data):
+    def decompress_iter(self, buffers):
+        """
+        Decompresses a stream of compressed buffers incrementally, every frame as soon as it is complete,
+        so data of any size can pass through a pipe or a socket with the memory of a few streaming_chunk.
+
+        Parameters
+        -------------------------------------
+        buffers: iterable
+                Buffers of the output of compress_iter (or of a streaming compress) in any sizes,
+                a frame may be split between them.
+
+        Returns
+        -------------------------------------
+        A generator of the decompressed frames.
+        """
+        if self.delta_compressed_type != 0:
+            raise ValueError("decompress_iter doesn't support delta compression.")
+        pending = bytearray()
+        for buffer in buffers:
+            mv = memoryview(buffer).cast("B")
+            offset = 0
+            # Complete the frame (or its header) started by the previous buffers
+            while pending and offset < len(mv):
+                need = (self._frame_len(pending) if len(pending) >= self.header_length else self.header_length) - len(pending)
+                pending += mv[offset : offset + need]
+                offset += min(need, len(mv) - offset)
+                if len(pending) >= self.header_length and len(pending) == self._frame_len(pending):
+                    if not is_index(pending):
+                        yield self._decompress_frame(pending)
+                    pending = bytearray()
+            # Whole frames are decompressed from the buffer in place
+            while len(mv) - offset >= self.header_length:
+                frame_len = self._frame_len(mv[offset:])
+                if len(mv) - offset < frame_len:
+                    break
+                if not is_index(mv[offset:]):
+                    yield self._decompress_frame(mv[offset : offset + frame_len])
+                offset += frame_len
+            pending += mv[offset:]
+        if pending:
+            raise ValueError("The compressed data ends in the middle of a frame")
+
+    def _decompress_file_mmap(self, src, dst, stats=None):
+        """
+        Decompresses the file src into the file dst through memory maps of both, for decompress_file.
+        """
+        if not isinstance(src, (str, os.PathLike)) or not isinstance(dst, (str, os.PathLike)):
+            raise ValueError("decompress_file with use_mmap needs the paths of the files")
+        start = time.perf_counter()
+        frame_count = original_len = 0
+        with open(src, "rb") as infile, open(dst, "w+b") as outfile:
+            compressed_len = os.fstat(infile.fileno()).st_size
+            if compressed_len:
+                with map_file(infile) as mm_in:
+                    frames, original_len = self._mapped_frames(memoryview(mm_in))
+                    frame_count = len(frames)
+                    outfile.truncate(original_len)
+                    if original_len:
+                        with map_file(outfile, original_len, write=True) as mm_out:
+                            self._decompress_frames_into(frames, memoryview(mm_out))
+                    # The views of the maps are released before they are closed
+                    del frames
+        if stats is not None:
+            wall_s = time.perf_counter() - start
+            stats.update(PipelineStats(frame_count, wall_s, 0.0, wall_s, 0.0).as_dict())
+        return compressed_len, original_len
+
+    def _mapped_frames(self, mv_data):
+        """
+        Returns the frames of the compressed data like _streaming_frames, the data itself if it is a single frame.
+        """
+        if self._is_streaming(mv_data):
+            if not is_index(mv_data) and mv_data[9] != 0:
+                raise ValueError("Delta compressed data can't be decompressed into a buffer.")
+            return self._streaming_frames(mv_data)
+        if mv_data[9] != 0:
+            raise ValueError("Delta compressed data can't be decompressed into a buffer.")
+        original_len = self._retrieve_header(mv_data).original_len
+        return [(mv_data, 0, original_len)], original_len
+
+    def _is_streaming(self, mv_data):
+        """
+        Returns whether the compressed data is streaming, the index alone (the streaming data of an empty input) is.
+        """
+        return is_index(mv_data) or mv_data[13] > 127
+
+    def _frame_len(self, frame):
+        """
+        Returns the length of the compressed frame starting at frame, from its header.
+        """
+        frame_len = int.from_bytes(frame[24:32], byteorder="little")
+        if frame_len <= self.header_length:
+            raise ValueError("Not a ZipNN frame")
+        return frame_len
+
+    def _decompress_frame(self, frame):
+        """
+        Decompresses one frame of decompress_iter.
+        """
+        if frame[9] != 0:
+            raise ValueError("decompress_iter doesn't support delta compressed data.")
+        return self.decompress_bin(frame)
+
+    def decompress_file(self, src, dst, pipeline_depth: int = 2, use_mmap: bool = False, stats: dict = None):
+        """
+        Decompresses a file into a file with bounded memory. A reader thread reads every frame into a
+        reusable buffer with readinto, the frames are decompressed on the calling thread into reusable
+        buffers and a writer thread writes them, so reading, decompression and writing overlap.
+        The peak memory is about 2 * (pipeline_depth + 2) frames, a streaming file of any size needs
+        about 2 * (pipeline_depth + 2) * streaming_chunk.
+
+        Parameters
+        -------------------------------------
+        src: string or file
+                The path of the compressed file, or a binary file object (e.g. sys.stdin.buffer).
+
+        dst: string or file
+                The path of the decompressed file, or a binary file object (e.g. sys.stdout.buffer).
+                File objects are not closed.
+
+        pipeline_depth: int
+                The frames waiting between the reader, the decompression and the writer.
+                Default is 2.
+
+        use_mmap: bool
+                Map both files instead, src and dst must be paths. The native core reads the frames straight
+                from the map of the compressed file and decodes all of them at once into the map of the output,
+                with no buffers on the heap, and the kernel does the I/O.
+                Default is False.
+
+        stats: dict
+                If given, it is filled with the busy seconds and the utilization of the read, code and write
+                stages, the frames and the wall time, and the bottleneck stage. With use_mmap the I/O is
+                part of the code stage.
+                Default is None.
+
+        Returns
+        -------------------------------------
+        A tuple of the compressed and the original sizes in bytes.
+        """
+        if use_mmap:
+            return self._decompress_file_mmap(src, dst, stats)
+        if pipeline_depth < 1:
+            raise ValueError("pipeline_depth must be at least 1")
+        # A buffer is reused only after pipeline_depth + 1 later frames were taken from its queue
+        in_ring = [bytearray(self.header_length) for _ in range(pipeline_depth + 2)]
+        out_ring = [bytearray() for _ in range(pipeline_depth + 2)]
+        sizes = [0, 0]
+        count = [0]
+
+        with open_stream(src, "rb") as infile, open_stream(dst, "wb") as outfile:
+
+            def read_items():
+                index = 0
+                while True:
+                    slot = index % len(in_ring)
+                    filled = read_full(infile, memoryview(in_ring[slot])[: self.header_length])
+                    if filled == 0:
+                        return
+                    if filled < self.header_length:
+                        raise ValueError("The compressed data ends in the middle of a frame")
+                    frame_len = self._frame_len(in_ring[slot])
+                    if len(in_ring[slot]) < frame_len:
+                        buf = bytearray(frame_len)
+                        buf[: self.header_length] = memoryview(in_ring[slot])[: self.header_length]
+                        in_ring[slot] = buf
+                    mv = memoryview(in_ring[slot])[:frame_len]
+                    if read_full(infile, mv[self.header_length :]) < frame_len - self.header_length:
+                        raise ValueError("The compressed data ends in the middle of a frame")
+                    yield mv
+                    index += 1
+
+            def code_item(frame):
+                sizes[0] += len(frame)
+                if is_index(frame):
+                    return frame[:0]
+                header = self._retrieve_header(frame)
+                if header.delta_compressed_type != 0:
+                    raise ValueError("decompress_file doesn't support delta compressed data.")
+                if header.lossy_compressed_type != 0:
+                    raise ValueError("decompress_file doesn't support lossy compressed data.")
+                slot = count[0] % len(out_ring)
+                count[0] += 1
+                if len(out_ring[slot]) < header.original_len:
+                    out_ring[slot] = bytearray(header.original_len)
+                mv_out = memoryview(out_ring[slot])[: header.original_len]
+                self._decompress_bin_into(frame, mv_out, header)
+                return mv_out
+
+            def write_item(mv_out):
+                sizes[1] += len(mv_out)
+                outfile.write(mv_out)
+
+            pipeline_stats = run_pipeline(read_items(), code_item, write_item, pipeline_depth)
+        if stats is not None:
+            stats.update(pipeline_stats.as_dict())
+        return sizes[0], sizes[1]
+
+    def decompress_into(self, data, out):
+        """
+        Decompresses data straight into a preallocated output, without an intermediate buffer,
+        e.g. to fill the parameters of a model in place.
+
+        Parameters
+        -------------------------------------
+        data: bytes
+                Data compressed by compress, not delta compressed.
+
+        out: torch.Tensor or writable buffer
+                A contiguous CPU tensor (a torch.empty, a parameter's .data), a numpy array, an mmap slice,
+                shared memory or any writable buffer with exactly the length of the original data in bytes.
+                A tensor for torch compressed data must have its dtype.
+
+        Returns
+        -------------------------------------
+        Returns out.
+        """
+        mv_data = memoryview(data)
+        if not is_index(mv_data) and mv_data[9] != 0:
+            raise ValueError("decompress_into doesn't support delta compressed data.")
+        if isinstance(out, torch.Tensor):
+            if out.device.type != "cpu" or not out.is_contiguous():
+                raise ValueError("decompress_into needs a contiguous CPU tensor")
+            mv_out = memoryview(out.detach().view(-1).view(torch.uint8).numpy())
+        else:
+            mv_out = memoryview(out)
+            if mv_out.readonly:
+                raise ValueError("decompress_into needs a writable output")
+            mv_out = mv_out.cast("B")
+
+        if not self._is_streaming(mv_data):  # a single frame
+            header = self._retrieve_header(mv_data)
+            if isinstance(out, torch.Tensor) and header.input_format == EnumFormat.TORCH.value:
+                if ZipNNDtypeEnum.from_dtype(out.dtype).code != header.dtype:
+                    raise ValueError(f"decompress_into got a {out.dtype} tensor for data of another dtype")
+            self._decompress_bin_into(mv_data, mv_out, header)
+            return out
+
+        frames, decompressed_length = self._streaming_frames(mv_data)
+        if decompressed_length != len(mv_out):
+            raise ValueError(f"The output has {len(mv_out)} bytes, the original data has {decompressed_length}")
+        self._decompress_frames_into(frames, mv_out)
+        return out
+
+    def _streaming_frames(self, mv_data):
+        """
+        Returns the (frame, original offset, original length) of every frame of streaming data and the original length,
+        from the index of the data if it has one.
+        """
+        index_entries = self._data_index(mv_data)
+        if index_entries is not None:
+            frames = [(mv_data[e.comp_offset : e.comp_offset + e.comp_length], e.orig_offset, e.orig_length) for e in index_entries]
+            return frames, sum(e.orig_length for e in index_entries)
+        frames = []
+        offset = 0
+        original_len = 0
+        while offset < len(mv_data):
+            header = mv_data[offset : offset + 32]
+            if is_index(header):
+                break
+            frame_len = int.from_bytes(header[24:32], byteorder="little")
+            frame_orig_len = int.from_bytes(header[16:24], byteorder="little")
+            frames.append((mv_data[offset : offset + frame_len], original_len, frame_orig_len))
+            original_len += frame_orig_len
+            offset += frame_len
+        return frames, original_len
+
+    def _data_index(self, mv_data):
+        """
+        Returns the index entries of streaming data in memory, None if it has no index.
+        """
+        length = index_length(mv_data[-TRAILER_LENGTH:])
+        if length == 0:
+            return None
+        return unpack_index(mv_data[len(mv_data) - length :], len(mv_data))
+
+    def read_index(self, data):
+        """
+        Reads the index of streaming data compressed with streaming_index, from its end only.
+
+        Parameters
+        -------------------------------------
+        data: string, file or bytes
+                The path of a compressed file, a seekable binary file object or the compressed data.
+
+        Returns
+        -------------------------------------
+        A list of IndexEntry, one per frame in order with its compressed and original offsets, lengths,
+        dtype and codec, or None if the data has no index.
+        """
+        if not isinstance(data, (str, os.PathLike)) and not hasattr(data, "seek"):
+            return self._data_index(memoryview(data))
+        with open_stream(data, "rb") as f:
+            data_length = f.seek(0, os.SEEK_END)
+            if data_length < TRAILER_LENGTH:
+                return None
+            f.seek(data_length - TRAILER_LENGTH)
+            length = index_length(f.read(TRAILER_LENGTH))
+            if length == 0:
+                return None
+            if length > data_length:
+                raise ValueError("The ZipNN index is truncated")
+            f.seek(data_length - length)
+            return unpack_index(f.read(length), data_length)
+
+    def _decompress_frames_into(self, frames, mv_out, delta_base=None):
+        """
+        Decompresses the frames of _streaming_frames into their offsets of mv_out in one native call,
+        the chunks of all the frames share the threads instead of a few chunks of one frame at a time.
+        With a delta base of the length of mv_out every frame is XORed with its slice of it.
+        """
+        batch_jobs = []
+        for frame, out_offset, frame_len in frames:
+            header = self._retrieve_header(frame)
+            if header.original_len != frame_len:
+                raise ValueError("The frame header doesn't match the streaming data")
+            if header.lossy_compressed_type != 0:
+                raise ValueError("Lossy compressed data can't be decompressed into a buffer.")
+            if self._is_one_group(header):
+                # Not a native job, the codec decodes the frame as a whole
+                self._decompress_bin_into(
+                    frame,
+                    mv_out[out_offset : out_offset + frame_len],
+                    header,
+                    None if delta_base is None else delta_base[out_offset : out_offset + frame_len],
+                )
+                continue
+            job = self._decompress_job(frame, header) + (mv_out[out_offset : out_offset + frame_len],)
+            if delta_base is not None:
+                job += (delta_base[out_offset : out_offset + frame_len],)
+            batch_jobs.append(job)
+        zipnn_core.decompress_batch(batch_jobs, self.threads)
+
+    def _decompress_job(self, ba_compress, header):
+        """
+        Returns the arguments of the native decompression of one compressed frame, a job of decompress_batch.
+        """
+        num_buf = self._num_buf(header.dtype)
+        if header.input_format == EnumFormat.NUMPY.value and (header.byte_reorder in (9, 255)):
+            raise ValueError("Truncated numpy data can't be decompressed into a buffer.")
+        if self._is_one_group(header):
+            raise ValueError("decompress_batch supports only byte grouped data")
+        return (
+            memoryview(ba_compress)[header.length :],
+            num_buf,
+            header.bit_reorder,
+            header.byte_reorder,
+            header.compression_chunk if num_buf != 1 else min(128 * 1024, header.compression_chunk),
+            header.original_len,
+            self._dictionary_capsule(header.dtype, num_buf, header.bit_reorder, header.byte_reorder),
+        )
+
+    def _decompress_bin_into(self, ba_compress, mv_out, header=None, delta_base=None):
+        """
+        Decompresses one compressed frame into mv_out, a writable byte buffer of its original length,
+        XORed with the delta base of that length if given.
+        """
+        if header is None:
+            header = self._retrieve_header(ba_compress)
+        num_buf = self._num_buf(header.dtype)
+        if header.input_format == EnumFormat.NUMPY.value and (header.byte_reorder in (9, 255)):
+            raise ValueError("decompress_into doesn't support truncated numpy data.")
+        if len(mv_out) != header.original_len:
+            raise ValueError(f"The output has {len(mv_out)} bytes, the original data has {header.original_len}")
+        if self._is_one_group(header):
+            ba_decom = self._decompress_one_group(ba_compress, header)
+            if len(ba_decom) != len(mv_out):
+                raise ValueError(f"The output has {len(mv_out)} bytes, the original data has {len(ba_decom)}")
+            if delta_base is None:
+                mv_out[:] = ba_decom
+            else:
+                zipnn_core.xor_into(mv_out, ba_decom, delta_base)
+            return
+
+        mv = memoryview(ba_compress)
+        zipnn_core.decompress_into(
+            mv[header.length :],
+            num_buf,
+            header.bit_reorder,
+            header.byte_reorder,
+            header.compression_chunk if num_buf != 1 else min(128 * 1024, header.compression_chunk),
+            header.original_len,
+            mv_out,
+            self.threads,
+            self._dictionary_capsule(header.dtype, num_buf, header.bit_reorder, header.byte_reorder),
+            *(() if delta_base is None else (delta_base,)),
+        )
+
+    def decompress_range(self, data, offset, length):
+        """
+        Decompresses only the bytes [offset, offset + length) of the original data, using the chunk index
+        of the compressed data to decode just the chunks covering the range.
+
+        Parameters
+        -------------------------------------
+        data: bytes
+                Data compressed by compress, with any input_format.
+
+        offset: int
+                Offset of the range in the original bytes (for a tensor, in its raw bytes).
+
+        length: int
+                Length of the range in bytes.
+
+        Returns
+        -------------------------------------
+        Returns the bytes of the range (a memoryview when it is inside one compressed frame).
+        """
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative")
+        mv_data = memoryview(data)
+        if not is_index(mv_data) and mv_data[9] != 0:
+            raise ValueError("decompress_range doesn't support delta compressed data.")
+
+        if not self._is_streaming(mv_data):  # a single frame
+            return self._decompress_range_bin(mv_data, offset, length)
+
+        # Streaming, find the frames of the range by their original offsets (from the index if the data has one)
+        frames, original_len = self._streaming_frames(mv_data)
+        end = offset + length
+        if end > original_len:
+            raise ValueError(f"Range is out of the original data, its length is {original_len}")
+        pieces = []
+        first = bisect.bisect_right([frame_start for _, frame_start, _ in frames], offset) - 1
+        for frame, frame_start, frame_orig_len in frames[max(first, 0) :]:
+            if frame_start >= end:
+                break
+            start = max(offset, frame_start) - frame_start
+            stop = min(end, frame_start + frame_orig_len) - frame_start
+            if stop > start:
+                pieces.append(self._decompress_range_bin(frame, start, stop - start))
+        if len(pieces) == 1:
+            return pieces[0]
+        return b"".join(pieces)
+
+    def _num_buf(self, dtype):
+        """
+        Returns the number of byte groups of the dtype code of a retrieved header.
+        """
+        if dtype in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
+            return 1
+        if dtype in (ZipNNDtypeEnum.FLOAT32.code, ZipNNDtypeEnum.FLOAT.code):
+            return 4
+        if dtype in (ZipNNDtypeEnum.BFLOAT16.code, ZipNNDtypeEnum.FLOAT16.code, ZipNNDtypeEnum.HALF.code):
+            return 2
+        raise ValueError(f"Unsupported Dtype {dtype}")
+
+    def _is_one_group(self, header):
+        """
+        Returns whether the frame of a retrieved header was compressed without byte grouping, by compress_method
+        alone (its payload follows a second copy of the header).
+        """
+        return (
+            header.byte_reorder == 0b1_01_01_001 and header.dtype in (ZipNNDtypeEnum.FLOAT32.code, ZipNNDtypeEnum.FLOAT.code)
+        ) or (
+            header.byte_reorder == 0b0_00_01_001
+            and header.dtype in (ZipNNDtypeEnum.BFLOAT16.code, ZipNNDtypeEnum.FLOAT16.code, ZipNNDtypeEnum.HALF.code)
+        )
+
+    def _decompress_one_group(self, ba_compress, header):
+        """
+        Decompresses a frame compressed without byte grouping.
+        """
+        if header.input_format != EnumFormat.BYTE.value:
+            raise ValueError(f"Unsupported Torch with byte_reorder 0b1_01_01_001 or 0b0_00_01_001")
+        return self.decompress_method(memoryview(ba_compress)[2 * header.length :], header.method)
+
+    def _decompress_range_bin(self, ba_compress, offset, length):
+        """
+        Decompresses the bytes [offset, offset + length) of one compressed frame.
+        """
+        header = self._retrieve_header(ba_compress)
+        num_buf = self._num_buf(header.dtype)
+        if header.input_format == EnumFormat.NUMPY.value and (header.byte_reorder in (9, 255)):
+            raise ValueError("decompress_range doesn't support truncated numpy data.")
+        if offset + length > header.original_len:
+            raise ValueError(f"Range is out of the original data, its length is {header.original_len}")
+        if self._is_one_group(header):
+            return memoryview(self._decompress_one_group(ba_compress, header))[offset : offset + length]
+
+        mv = memoryview(ba_compress)
+        return zipnn_core.decompress_range(
+            mv[header.length :],
+            num_buf,
+            header.bit_reorder,
+            header.byte_reorder,
+            header.compression_chunk if num_buf != 1 else min(128 * 1024, header.compression_chunk),
+            header.original_len,
+            offset,
+            length,
+            self.threads,
+            self._dictionary_capsule(header.dtype, num_buf, header.bit_reorder, header.byte_reorder),
+        )
+
+    def decompress_method(self, data, method=None):
         """
         Chooses decompression based on decompression method.
 
@@ -1013,19 +1890,24 @@ class ZipNN:
         data: byte
                 Data to decompress.
 
+        method: int
+                The method in the header of the data.
+                Default is None, the method of the instance.
+
         Returns
         -------------------------------------
         Decompression of the data in the chosen method.
         """
-        if self.method == EnumMethod.ZSTD.value or self.method == EnumMethod.AUTO.value:
-            return self._zstd_decompress.decompress(data)
-        if self.method == EnumMethod.LZ4.value:
+        method = self.use_var(method, self.method)
+        if method == EnumMethod.ZSTD.value or method == EnumMethod.AUTO.value:
+            return self._zstd_codec()[1].decompress(data)
+        if method == EnumMethod.LZ4.value:
             return lz4.frame.decompress(data)
-        if self.method == EnumMethod.SNAPPY.value:
+        if method == EnumMethod.SNAPPY.value:
             return snappy.decompress(data)
-        raise ValueError(f"Unsupported method {self.method}")
+        raise ValueError(f"Unsupported method {method}")
 
-    def decompress_lossy(self, tensor, original_dtype):
+    def decompress_lossy(self, tensor, original_dtype, header):
         """
         Handles lossy decompression.
 
@@ -1037,17 +1919,20 @@ class ZipNN:
         original_dtype: string
                 Original dtype value of the tensor.
 
+        header: ZipNNHeader
+                The header of the compressed data.
+
         Returns
         -------------------------------------
         Tensor data after lossy decompression.
         """
-        if self._lossy_is_int == 0:  # no need to transfer to integer from float
+        if header.lossy_is_int == 0:  # no need to transfer to integer from float
             tensor = tensor.view(original_dtype)
             return tensor
         # transfer from integer to float
         bit_size, int_dtype = zipnn_get_dtype_bits(original_dtype)
         tensor = tensor.view(int_dtype)
-        lossy_factor = self.lossy_compressed_factor
+        lossy_factor = header.lossy_compressed_factor
         divisor = 2**lossy_factor
         decompress_tensor = zipnn_divide_int(tensor, divisor)
         return decompress_tensor
@@ -1069,7 +1954,7 @@ class ZipNN:
             out_file_handler.write(ba_decom)
         return 0
 
-    def decompress_bin(self, ba_compress: bytes):
+    def decompress_bin(self, ba_compress: bytes, ba_decom=None):
         """
         Decompresses byte data from either a byte array or a tensor.
 
@@ -1078,21 +1963,20 @@ class ZipNN:
         ba_compress: byte
                 Byte data to decompress.
 
+        ba_decom: memoryview
+                The data already decompressed by decompress_batch, only the output is built.
+                Default is None.
+
         Returns
         -------------------------------------
         Returns a byte array of the decompressed data.
         """
         is_print = 0
-        after_header = self._retrieve_header(ba_compress)
-
-        dtype_size = 0  # Need to implement
+        header = self._retrieve_header(ba_compress)
+        after_header = header.length
 
-        if (self.byte_reorder == 0b1_01_01_001 and dtype_size == 32) or (self.byte_reorder == 0b0_00_01_001 and dtype_size == 16):
-            mv = memoryview(ba_compress[after_header:])
-            ba_decom = self.decompress_method(mv[after_header:])
-            if self.input_format == EnumFormat.BYTE.value:
-                return ba_decom
-            raise ValueError(f"Unsupported Torch with byte_reorder 0b1_01_01_001 or 0b0_00_01_001")
+        if self._is_one_group(header):
+            return self._decompress_one_group(ba_compress, header)
         else:
             float32 = 0
             bfloat16 = 0
@@ -1100,37 +1984,39 @@ class ZipNN:
             uint16 = 0
             uint32 = 0
             float8 = 0
-            if self.dtype in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
+            if header.dtype in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
                 # FP8 handeling
                 groups = 1
                 float8 = 1
-            elif self.dtype in (ZipNNDtypeEnum.FLOAT32.code, ZipNNDtypeEnum.FLOAT.code):
+            elif header.dtype in (ZipNNDtypeEnum.FLOAT32.code, ZipNNDtypeEnum.FLOAT.code):
                 groups = 4
                 float32 = 1
-            elif self.dtype == ZipNNDtypeEnum.BFLOAT16.code:
+            elif header.dtype == ZipNNDtypeEnum.BFLOAT16.code:
                 groups = 2
                 bfloat16 = 1
-            elif self.dtype in (ZipNNDtypeEnum.FLOAT16.code, ZipNNDtypeEnum.HALF.code):
+            elif header.dtype in (ZipNNDtypeEnum.FLOAT16.code, ZipNNDtypeEnum.HALF.code):
                 groups = 2
                 float16 = 1
-            elif self.dtype in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
+            elif header.dtype in (ZipNNDtypeEnum.FLOAT8_E4M3FN.code, ZipNNDtypeEnum.FLOAT8_E5M2.code):
                 groups = 2
                 float8 = 1
-            elif self.dtype == ZipNNDtypeEnum.UINT32.code:
+            elif header.dtype == ZipNNDtypeEnum.UINT32.code:
                 groups = 1
                 uint32 = 1
             else:
-                raise ValueError(f"Unsupported Dtype {self.dtype}")
+                raise ValueError(f"Unsupported Dtype {header.dtype}")
 
             skip_combine = 0
-            if self.input_format == EnumFormat.NUMPY.value and (self._byte_reorder in (9, 255)):
+            if header.input_format == EnumFormat.NUMPY.value and (header.byte_reorder in (9, 255)):
                 skip_combine = 1
 
             ba_bg = []
             start_len = after_header + groups
             start_ba = [start_len + 8 * groups]
             end_ba = []
-            if skip_combine == 0:
+            if ba_decom is not None:
+                pass
+            elif skip_combine == 0:
                 num_buf = 4
                 if uint32:
                     raise ValueError("Unsupported uinit32 in this version yet! please try version 0.1.1")
@@ -1143,59 +2029,60 @@ class ZipNN:
                 ba_decom = zipnn_core.combine_dtype(
                     mv[after_header:],
                     num_buf,
-                    self._bit_reorder,
-                    self._byte_reorder,
-                    self.compression_chunk if num_buf!=1 else min(128*1024,self.compression_chunk),
-                    self.original_len,
+                    header.bit_reorder,
+                    header.byte_reorder,
+                    header.compression_chunk if num_buf!=1 else min(128*1024,header.compression_chunk),
+                    header.original_len,
                     self.threads,
+                    self._dictionary_capsule(header.dtype, num_buf, header.bit_reorder, header.byte_reorder),
                 )
             else:
                 ba_decom = ba_bg[0]
             
-            if self.input_format == EnumFormat.BYTE.value:
+            if header.input_format == EnumFormat.BYTE.value:
                 return ba_decom
 
-            if self.input_format == EnumFormat.TORCH.value:
+            if header.input_format == EnumFormat.TORCH.value:
                 if float32:
                     array = np.frombuffer(ba_decom, dtype=np.float32)
-                    array = array.reshape(self.shape_bytes)
+                    array = array.reshape(header.shape)
                     tensor = torch.from_numpy(array)
                 elif bfloat16:
                     array = np.frombuffer(ba_decom, dtype=np.uint16)
-                    array = array.reshape(self.shape_bytes)
+                    array = array.reshape(header.shape)
                     tensor = torch.from_numpy(array)
                     tensor = tensor.view(torch.bfloat16)
                 elif float16:
                     array = np.frombuffer(ba_decom, dtype=np.float16)
-                    array = array.reshape(self.shape_bytes)
+                    array = array.reshape(header.shape)
                     tensor = torch.from_numpy(array)
                 elif float8:
                     # FP8 handeling
                     array = np.frombuffer(ba_decom, dtype=np.uint8) 
-                    new_shape = tuple(dim for dim in self.shape_bytes)
+                    new_shape = tuple(dim for dim in header.shape)
                     array = array.reshape(new_shape)
                     tensor = torch.from_numpy(array)
-                    if self.dtype==ZipNNDtypeEnum.FLOAT8_E5M2.code:
+                    if header.dtype==ZipNNDtypeEnum.FLOAT8_E5M2.code:
                         tensor = tensor.view(torch.float8_e5m2)
                     else:
                         tensor = tensor.view(torch.float8_e4m3fn)
                 return tensor
 
-            if self.input_format == EnumFormat.NUMPY.value:
+            if header.input_format == EnumFormat.NUMPY.value:
                 if float32:
                     array = np.frombuffer(ba_decom, dtype=np.float32)
                 elif float16:
                     array = np.frombuffer(ba_decom, dtype=np.float16)
                 elif uint32:
-                    if self._byte_reorder == 9:  # Truncate MSB, mid-high
+                    if header.byte_reorder == 9:  # Truncate MSB, mid-high
                         array_uint16 = np.frombuffer(ba_decom, dtype=np.uint16)
                         array = array_uint16.astype(np.uint32)
                     else:
                         array = np.frombuffer(ba_decom, dtype=np.uint32)
-                array = array.reshape(self.shape_bytes)
+                array = array.reshape(header.shape)
                 return array
 
-            raise ValueError(f"Unsupported input_format {self.input_format}")
+            raise ValueError(f"Unsupported input_format {header.input_format}")
 
     def decompress_read_file(self, data):
         """
@@ -1214,8 +2101,17 @@ class ZipNN:
         if not os.path.exists(filename):
             raise FileNotFoundError(f"The file at {filename} was not found.")
         with open(filename, "rb") as in_file_handler:
-            ba = in_file_handler.read()
-        return self.decompress_bin(ba)
+            header = in_file_handler.read(self.header_length)
+            if len(header) < self.header_length or not self._is_streaming(header):
+                # A single frame is decompressed as a whole
+                return self.decompress_bin(header + in_file_handler.read())
+            # Streaming data is decoded from a map of the file, all the frames at once into the output
+            with map_file(in_file_handler) as mm:
+                frames, original_len = self._mapped_frames(memoryview(mm))
+                ba_decom = bytearray(original_len)
+                self._decompress_frames_into(frames, memoryview(ba_decom))
+                del frames
+        return ba_decom
 
 
 def zipnn_hf(replace_local_file: bool = False):
@@ -1279,15 +2175,15 @@ def zipnn_hf(replace_local_file: bool = False):
             d_data = b""
             if not os.path.exists(output_file):
                 znn = ZipNN(is_streaming=True)
-                with open(checkpoint_file, "rb") as infile:
-                    chunk = infile.read()
-                    d_data += znn.decompress(chunk)
-
-                    ### Save the decompressed file
-                    if replace_local_file:
-                        with open(output_file, "wb") as outfile:
-                            outfile.write(d_data)
-                            
+                if replace_local_file:
+                    ### Save the decompressed file, decoded between memory maps of the files
+                    znn.decompress_file(checkpoint_file, output_file, use_mmap=True)
+                elif checkpoint_file.endswith(".safetensors.znn"):
+                    d_data = znn.decompress_read_file(checkpoint_file)
+                else:
+                    ### torch.load reads the checkpoint through the frames of the compressed file
+                    d_data = ZipNNReader(checkpoint_file, znn)
+
                 ### Replace the local file with the decompressed file
                 if replace_local_file:
                     blob_name = os.path.join(snapshot_path, os.readlink(checkpoint_file))
@@ -1313,7 +2209,7 @@ def zipnn_hf(replace_local_file: bool = False):
                     file_name = os.path.basename(output_file)
                     blob_name = os.path.join(snapshot_path, os.readlink(os.path.join(snapshot_path, WEIGHTS_INDEX_NAME)))
                     replace_in_file(file_path=blob_name, old=f"{file_name}.znn", new=f"{file_name}")
-            elif d_data:
+            elif isinstance(d_data, ZipNNReader) or d_data:
                 if checkpoint_file.endswith(".safetensors.znn"):
                     length_of_header = unpack('<Q', d_data[:8])[0]
                     header_data = d_data[8:8 + length_of_header]
@@ -1326,7 +2222,7 @@ def zipnn_hf(replace_local_file: bool = False):
                             f"The safetensors archive passed at {checkpoint_file} does not contain the valid metadata. Make sure "
                             "you save your model with the `save_pretrained` method."
                         )
-                    return load(d_data)
+                    return load(bytes(d_data))  # safetensors takes only bytes
                 try:
                     if map_location is None:
                         if (
@@ -1350,12 +2246,14 @@ def zipnn_hf(replace_local_file: bool = False):
                     ):
                         extra_args = {"mmap": True}
                     weights_only_kwarg = {"weights_only": weights_only} if is_torch_greater_or_equal("1.13") else {}
-                    return torch.load(
-                        BytesIO(d_data),
-                        map_location=map_location,
-                        **weights_only_kwarg,
-                        **extra_args,
-                    )
+                    ### The reader is closed (its file and read-ahead thread) whether the load succeeds or not
+                    with d_data if isinstance(d_data, ZipNNReader) else BytesIO(d_data) as checkpoint:
+                        return torch.load(
+                            checkpoint,
+                            map_location=map_location,
+                            **weights_only_kwarg,
+                            **extra_args,
+                        )
                 except Exception as e:
                     try:
                         with open(checkpoint_file) as f:
@@ -1483,11 +2381,7 @@ def zipnn_hf(replace_local_file: bool = False):
                     output_file = resolved_archive_file.replace(".znn", "")
                     if not os.path.exists(output_file):
                         znn = ZipNN(is_streaming=True)
-                        with open(resolved_archive_file, "rb") as infile, open(output_file, "wb") as outfile:
-                            d_data = b""
-                            chunk = infile.read()
-                            d_data += znn.decompress(chunk)
-                            outfile.write(d_data)
+                        znn.decompress_file(resolved_archive_file, output_file, use_mmap=True)
                         snapshot_path = os.path.dirname(resolved_archive_file)
                         blob_name = os.path.join(snapshot_path, os.readlink(resolved_archive_file))
                         os.rename(output_file, blob_name)
@@ -1577,15 +2471,11 @@ def replace_in_file(file_path, old: str, new: str) -> None:
         file.write(file_data)
 
 
-#    def decompress_delta(self, base_path, delta_file):
-#        return 0
-
-
-def decompress_safetensors_tensor(tensor: torch.tensor) -> torch.tensor:
+def decompress_safetensors_tensor(tensor: torch.tensor, dictionary: bytes = None) -> torch.tensor:
     """
     decompress a tensor from a compressed safetensors file.
     """
-    znn = ZipNN(input_format="torch", bytearray_dtype=COMPRESSED_DTYPE, method=COMPRESSION_METHOD)
+    znn = ZipNN(input_format="torch", bytearray_dtype=COMPRESSED_DTYPE, method=COMPRESSION_METHOD, dictionary=dictionary)
     return znn.decompress(tensor.contiguous().numpy())
 
 
@@ -1597,6 +2487,7 @@ class SafeOpen:
     def __init__(self, filename, framework, device="cpu"):
         self._f = safe_open(filename, framework, device)
         self.compressed_tensors_metadata = get_compressed_tensors_metadata(self._f.metadata())
+        self.dictionary = get_dictionary_metadata(self._f.metadata())
 
     def get_tensor(self, name):
         """
@@ -1604,7 +2495,7 @@ class SafeOpen:
         """
         if name not in self.compressed_tensors_metadata:
             return self._f.get_tensor(name)
-        return decompress_safetensors_tensor(self._f.get_tensor(name))
+        return decompress_safetensors_tensor(self._f.get_tensor(name), self.dictionary)
 
     def get_slice(self, name):
         """